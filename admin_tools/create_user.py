@@ -1,18 +1,29 @@
 #!/usr/bin/env python3
 import boto3
+import csv
 import json
 import argparse
 import os
 import string
 import random
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+# Cognito admin APIs have low per-account quotas: botocore's adaptive mode retries throttles
+# with backoff and slows the client down to the rate Cognito accepts
+MAX_ATTEMPTS = 8
+RESULT_COLUMNS = ['email', 'status', 'password', 'error']
+
 
 def generate_password():
     """Generate a strong random password"""
     length = 12
     chars = string.ascii_letters + string.digits + "!@#$%^&*"
+    rng = random.SystemRandom()
     while True:
-        password = ''.join(random.choice(chars) for _ in range(length))
+        password = ''.join(rng.choice(chars) for _ in range(length))
         if (any(c.islower() for c in password)
                 and any(c.isupper() for c in password)
                 and any(c.isdigit() for c in password)
@@ -22,65 +33,162 @@ def generate_password():
 def get_cognito_ids():
     """Get Cognito Pool ID and Client ID from CloudFormation outputs"""
     cf = boto3.client('cloudformation')
-    
+
     try:
         response = cf.describe_stacks(StackName='serverless-dynamic-workflows-dev')
         outputs = response['Stacks'][0]['Outputs']
-        
+
         user_pool_id = next(o['OutputValue'] for o in outputs if o['OutputKey'] == 'UserPoolId')
         client_id = next(o['OutputValue'] for o in outputs if o['OutputKey'] == 'UserPoolClientId')
-        
+
         return user_pool_id, client_id
     except Exception as e:
         print(f"Error getting Cognito IDs: {str(e)}")
         sys.exit(1)
 
-def create_user(email):
-    """Create a new Cognito user"""
-    user_pool_id, client_id = get_cognito_ids()
+def cognito_client(workers=1):
+    """One client shared by all threads: boto3 clients are thread safe, the pool must fit the workers"""
+    return boto3.client('cognito-idp', config=Config(
+        max_pool_connections=max(10, workers),
+        retries={'mode': 'adaptive', 'max_attempts': MAX_ATTEMPTS}
+    ))
+
+class PasswordNotSet(Exception):
+    """The user was created but still has its temporary password (FORCE_CHANGE_PASSWORD)"""
+
+    def __init__(self, temporary_password, error):
+        super().__init__(error)
+        self.temporary_password = temporary_password
+
+def provision_user(cognito, user_pool_id, email):
+    """Create a confirmed user with a permanent random password and return the password"""
     password = generate_password()
-    
-    cognito = boto3.client('cognito-idp')
-    
+
+    # Create user
+    cognito.admin_create_user(
+        UserPoolId=user_pool_id,
+        Username=email,
+        TemporaryPassword=password,
+        UserAttributes=[
+            {'Name': 'email', 'Value': email},
+            {'Name': 'email_verified', 'Value': 'true'}
+        ],
+        MessageAction='SUPPRESS'  # Don't send email
+    )
+
+    # Set permanent password. The user exists from here on: a rerun would only report `exists`,
+    # so hand back the temporary password instead of losing it
     try:
-        # Create user
-        cognito.admin_create_user(
-            UserPoolId=user_pool_id,
-            Username=email,
-            TemporaryPassword=password,
-            UserAttributes=[
-                {'Name': 'email', 'Value': email},
-                {'Name': 'email_verified', 'Value': 'true'}
-            ],
-            MessageAction='SUPPRESS'  # Don't send email
-        )
-        
-        # Set permanent password
         cognito.admin_set_user_password(
             UserPoolId=user_pool_id,
             Username=email,
             Password=password,
             Permanent=True
         )
-        
+    except Exception as e:
+        error = e.response['Error']['Message'] if isinstance(e, ClientError) else str(e)
+        raise PasswordNotSet(password, error) from e
+    return password
+
+def create_user(email):
+    """Create a new Cognito user"""
+    user_pool_id, client_id = get_cognito_ids()
+    cognito = cognito_client()
+
+    try:
+        password = provision_user(cognito, user_pool_id, email)
+
         return {
             'email': email,
             'password': password,
             'user_pool_id': user_pool_id,
             'client_id': client_id
         }
-        
+
+    except PasswordNotSet as e:
+        print(f"User {email} was created but its password could not be made permanent: {e}")
+        print(f"Temporary password (must be changed at first sign-in): {e.temporary_password}")
+        sys.exit(1)
     except Exception as e:
         print(f"Error creating user: {str(e)}")
         sys.exit(1)
 
+def read_users_file(path):
+    """Read emails from a CSV file with an `email` column or a JSON list of emails / {"email": ...} objects"""
+    with open(path, newline='') as f:
+        if path.endswith('.json'):
+            entries = json.load(f)
+            emails = [entry if isinstance(entry, str) else entry['email'] for entry in entries]
+        else:
+            emails = [row['email'] for row in csv.DictReader(f)]
+    return [email.strip() for email in emails if email and email.strip()]
+
+def create_users(emails, user_pool_id, workers=8, cognito=None):
+    """
+    Create users concurrently with at most `workers` requests in flight.
+    Returns one result per email, in input order; failures don't stop the batch. Users whose
+    password couldn't be made permanent are `created_password_not_set` with their temporary password.
+    """
+    cognito = cognito or cognito_client(workers)
+
+    def create(email):
+        try:
+            return {'email': email, 'status': 'created', 'password': provision_user(cognito, user_pool_id, email),
+                    'error': ''}
+        except PasswordNotSet as e:
+            return {'email': email, 'status': 'created_password_not_set', 'password': e.temporary_password,
+                    'error': str(e)}
+        except ClientError as e:
+            status = 'exists' if e.response['Error']['Code'] == 'UsernameExistsException' else 'failed'
+            return {'email': email, 'status': status, 'password': '', 'error': e.response['Error']['Message']}
+        except Exception as e:
+            return {'email': email, 'status': 'failed', 'password': '', 'error': str(e)}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(create, emails))
+
+def write_results(results, path):
+    """Write bulk results to a file only the current user can read (it contains passwords)"""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    os.chmod(path, 0o600)
+    with os.fdopen(fd, 'w', newline='') as f:
+        if path.endswith('.json'):
+            json.dump(results, f, indent=2)
+        else:
+            writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS)
+            writer.writeheader()
+            writer.writerows(results)
+
 def main():
     parser = argparse.ArgumentParser(description='Create a Cognito user')
-    parser.add_argument('--email', required=True, help='Email address for the new user')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--email', help='Email address for the new user')
+    group.add_argument('--from-file', help='CSV (email column) or JSON file with the users to create')
+    parser.add_argument('--output', default='created-users.csv',
+                        help='Results file for --from-file, .csv or .json (default: created-users.csv)')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent Cognito requests (default: 8)')
     args = parser.parse_args()
-    
+
+    if args.from_file:
+        emails = read_users_file(args.from_file)
+        user_pool_id, client_id = get_cognito_ids()
+        results = create_users(emails, user_pool_id, args.workers)
+        write_results(results, args.output)
+
+        failed = [r for r in results if r['status'] == 'failed']
+        temporary = [r for r in results if r['status'] == 'created_password_not_set']
+        print(f"\nCreated {sum(r['status'] == 'created' for r in results)} of {len(results)} users "
+              f"({sum(r['status'] == 'exists' for r in results)} already existed, {len(failed)} failed, "
+              f"{len(temporary)} created with a temporary password only)")
+        print(f"User Pool ID: {user_pool_id}")
+        print(f"Client ID: {client_id}")
+        print(f"Credentials written to {args.output}")
+        for result in failed + temporary:
+            print(f"  {result['email']}: {result['error']}")
+        sys.exit(1 if failed or temporary else 0)
+
     user_info = create_user(args.email)
-    
+
     print("\nUser created successfully!")
     print("------------------------")
     print(f"Email: {user_info['email']}")
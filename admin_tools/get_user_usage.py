@@ -1,30 +1,126 @@
 # admin_tools/get_user_usage.py
 import os
 import boto3
+import csv
 import json
 import argparse
+import queue
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date
 from dateutil.relativedelta import relativedelta
 
+STACK_NAME = 'serverless-dynamic-workflows-dev'
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'serverless-dynamic-workflows')
+CACHE_MAX_AGE = 24 * 60 * 60
+# Items buffered between the scan/query workers and the report writer
+QUEUE_SIZE = 10000
+REPORT_COLUMNS = ['userId', 'email', 'period', 'apiCalls']
+# yearMonth of the daily usage items (functions/base/api_usage/handler.py), the monthly ones are YYYY-MM
+DAY_PREFIX = 'DAY#'
+
 
 def get_table_name():
-    """Get DynamoDB table name from CloudFormation outputs"""
-    cf = boto3.client('cloudformation')
+    """DynamoDB usage table name"""
+    # The table name follows the pattern from serverless.yml: ${self:service}-api-usage-${self:provider.stage}
+    # where service is 'serverless-dynamic-workflows' and stage is 'dev'
+    service_name = 'serverless-dynamic-workflows'
+    stage = 'dev'
+    return f"{service_name}-api-usage-{stage}"
+
+
+def _cache_path(name):
+    return os.path.join(CACHE_DIR, f"{name}.json")
+
 
+def _read_cache(name, max_age=CACHE_MAX_AGE):
+    """Return a cached JSON document if it is younger than max_age seconds"""
+    path = _cache_path(name)
     try:
-        stack_name = 'serverless-dynamic-workflows-dev'
+        if time.time() - os.path.getmtime(path) < max_age:
+            with open(path) as f:
+                return json.load(f)
+    except (OSError, ValueError):
+        pass
+    return None
 
-        # The table name follows the pattern from serverless.yml: ${self:service}-api-usage-${self:provider.stage}
-        # where service is 'serverless-dynamic-workflows' and stage is 'dev'
-        service_name = 'serverless-dynamic-workflows'
-        stage = 'dev'
-        table_name = f"{service_name}-api-usage-{stage}"
 
-        return table_name
-    except Exception as e:
-        print(f"Error getting table name: {str(e)}")
-        sys.exit(1)
+def _write_cache(name, data):
+    """Readable by the current user only: the user index maps emails to subs"""
+    os.makedirs(CACHE_DIR, mode=0o700, exist_ok=True)
+    path = _cache_path(name)
+    with open(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+        json.dump(data, f)
+    # Files written before this were created with the default umask
+    os.chmod(path, 0o600)
+
+
+def get_user_pool_id(refresh=False):
+    """Get UserPoolId from CloudFormation outputs, cached between runs"""
+    cached = None if refresh else _read_cache(f"{STACK_NAME}-outputs")
+    if cached is None:
+        cf = boto3.client('cloudformation')
+        response = cf.describe_stacks(StackName=STACK_NAME)
+        cached = {o['OutputKey']: o['OutputValue'] for o in response['Stacks'][0]['Outputs']}
+        _write_cache(f"{STACK_NAME}-outputs", cached)
+    return cached['UserPoolId']
+
+
+def find_user_id(email):
+    """Cognito sub (Username) of one user, with a single filtered list_users"""
+    cognito = boto3.client('cognito-idp')
+    response = cognito.list_users(UserPoolId=get_user_pool_id(), Filter=f'email = "{email}"', Limit=1)
+    return response['Users'][0]['Username'] if response['Users'] else None
+
+
+def get_email_index(refresh=False):
+    """
+    Map every user's email to its Cognito sub (Username) for bulk reports, listing the pool once
+    and caching the result instead of running a filtered list_users per email.
+    """
+    user_pool_id = get_user_pool_id(refresh)
+    cache_name = f"users-{user_pool_id}"
+    index = None if refresh else _read_cache(cache_name)
+    if index is None:
+        cognito = boto3.client('cognito-idp')
+        index = {}
+        for page in cognito.get_paginator('list_users').paginate(UserPoolId=user_pool_id):
+            for user in page['Users']:
+                attributes = {a['Name']: a['Value'] for a in user.get('Attributes', [])}
+                if 'email' in attributes:
+                    index[attributes['email'].lower()] = user['Username']
+        _write_cache(cache_name, index)
+    return index
+
+
+def usage_key_range(start, end, daily=False):
+    """yearMonth bounds of the monthly items, or of the daily ones, between two YYYY-MM[-DD] dates"""
+    if not daily:
+        return start[:7], end[:7]
+    start = start if len(start) == 10 else f"{start[:7]}-01"
+    end = end if len(end) == 10 else f"{end[:7]}-31"
+    return f"{DAY_PREFIX}{start}", f"{DAY_PREFIX}{end}"
+
+
+def query_user_items(table, user_id, start_key, end_key):
+    """All usage items of a user between two yearMonth keys, following LastEvaluatedKey"""
+    items = []
+    kwargs = {
+        'KeyConditionExpression': 'userId = :uid AND yearMonth BETWEEN :start AND :end',
+        'ExpressionAttributeValues': {
+            ':uid': user_id,
+            ':start': start_key,
+            ':end': end_key
+        }
+    }
+    while True:
+        response = table.query(**kwargs)
+        items.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            return items
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
 
 
 def get_usage_data(email=None, user_id=None, months=1):
@@ -36,26 +132,11 @@ def get_usage_data(email=None, user_id=None, months=1):
     try:
         # If email is provided, get the user_id from Cognito
         if email and not user_id:
-            cognito = boto3.client('cognito-idp')
-            cf = boto3.client('cloudformation')
-
-            # Get UserPoolId from CloudFormation outputs
-            response = cf.describe_stacks(StackName='serverless-dynamic-workflows-dev')
-            outputs = response['Stacks'][0]['Outputs']
-            user_pool_id = next(o['OutputValue'] for o in outputs if o['OutputKey'] == 'UserPoolId')
-
-            # Get user by email
-            response = cognito.list_users(
-                UserPoolId=user_pool_id,
-                Filter=f'email = "{email}"'
-            )
-
-            if not response['Users']:
+            user_id = find_user_id(email)
+            if not user_id:
                 print(f"No user found with email: {email}")
                 sys.exit(1)
 
-            user_id = response['Users'][0]['Username']
-
         # Get usage data from DynamoDB
         dynamodb = boto3.resource('dynamodb')
         table = dynamodb.Table(get_table_name())
@@ -68,19 +149,10 @@ def get_usage_data(email=None, user_id=None, months=1):
         start_month = start_date.strftime('%Y-%m')
         end_month = end_date.strftime('%Y-%m')
 
-        response = table.query(
-            KeyConditionExpression='userId = :uid AND yearMonth BETWEEN :start AND :end',
-            ExpressionAttributeValues={
-                ':uid': user_id,
-                ':start': start_month,
-                ':end': end_month
-            }
-        )
-
         return {
             'userId': user_id,
             'email': email,
-            'usage': response['Items']
+            'usage': query_user_items(table, user_id, start_month, end_month)
         }
 
     except Exception as e:
@@ -88,14 +160,214 @@ def get_usage_data(email=None, user_id=None, months=1):
         sys.exit(1)
 
 
+class _Stopped(Exception):
+    """The consumer of iter_usage_items went away"""
+
+
+def _put(out, item, stop):
+    """Put on the bounded queue, giving up once `stop` is set instead of blocking forever"""
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            pass
+    raise _Stopped()
+
+
+def _scan_segment(table_name, segment, total_segments, start_key, end_key, out, stop):
+    """Scan one segment of the usage table and push its items to the output queue"""
+    table = boto3.session.Session().resource('dynamodb').Table(table_name)
+    kwargs = {
+        'Segment': segment,
+        'TotalSegments': total_segments,
+        'FilterExpression': 'yearMonth BETWEEN :start AND :end',
+        'ExpressionAttributeValues': {':start': start_key, ':end': end_key}
+    }
+    while not stop.is_set():
+        response = table.scan(**kwargs)
+        for item in response['Items']:
+            _put(out, item, stop)
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def _query_users(table_name, user_ids, start_key, end_key, out, stop):
+    """Query the usage of a batch of users and push their items to the output queue"""
+    table = boto3.session.Session().resource('dynamodb').Table(table_name)
+    for user_id in user_ids:
+        if stop.is_set():
+            return
+        for item in query_user_items(table, user_id, start_key, end_key):
+            _put(out, item, stop)
+
+
+def iter_usage_items(start_key, end_key, user_ids=None, workers=8):
+    """
+    Stream usage items between two yearMonth keys (see usage_key_range) of every user (parallel segmented scan) or of the given users
+    (parallel queries) as soon as each page arrives. The workers stop when the consumer does
+    (an error while writing the report, a break, the generator being closed).
+    """
+    out = queue.Queue(maxsize=QUEUE_SIZE)
+    stop = threading.Event()
+    done = object()
+    # Resolved here: the workers only create their own session (the default one isn't thread-safe)
+    table_name = get_table_name()
+
+    if user_ids is None:
+        jobs = [(_scan_segment, (table_name, segment, workers, start_key, end_key, out, stop))
+                for segment in range(workers)]
+    else:
+        user_ids = list(user_ids)
+        jobs = [(_query_users, (table_name, user_ids[i::workers], start_key, end_key, out, stop))
+                for i in range(workers)]
+
+    errors = []
+
+    def run(job, args):
+        try:
+            job(*args)
+        except _Stopped:
+            return
+        except Exception as e:
+            errors.append(e)
+        try:
+            _put(out, done, stop)
+        except _Stopped:
+            pass
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            for job, args in jobs:
+                pool.submit(run, job, args)
+
+            remaining = len(jobs)
+            while remaining:
+                item = out.get()
+                if item is done:
+                    remaining -= 1
+                else:
+                    yield item
+        finally:
+            # Unblock the workers before the pool waits for them
+            stop.set()
+            while True:
+                try:
+                    out.get_nowait()
+                except queue.Empty:
+                    break
+
+    if errors:
+        raise errors[0]
+
+
+def usage_rows(items, emails_by_user):
+    """Flatten usage items into report rows, one per monthly or daily item"""
+    for item in items:
+        period = item['yearMonth']
+        yield {
+            'userId': item['userId'],
+            'email': emails_by_user.get(item['userId'], ''),
+            'period': period[len(DAY_PREFIX):] if period.startswith(DAY_PREFIX) else period,
+            'apiCalls': int(item.get('apiCalls', 0))
+        }
+
+
+def write_report(rows, output):
+    """Stream rows to CSV (or stdout), or to Parquet when the output ends with .parquet"""
+    count = 0
+    if output and output.endswith('.parquet'):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            print("Error: Parquet output requires pyarrow (pip install pyarrow)")
+            sys.exit(1)
+
+        schema = pa.schema([('userId', pa.string()), ('email', pa.string()),
+                            ('period', pa.string()), ('apiCalls', pa.int64())])
+        batch = []
+        with pq.ParquetWriter(output, schema) as writer:
+            for row in rows:
+                batch.append(row)
+                count += 1
+                if len(batch) == 50000:
+                    writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                    batch = []
+            if batch:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+        return count
+
+    f = open(output, 'w', newline='') if output else sys.stdout
+    try:
+        writer = csv.DictWriter(f, fieldnames=REPORT_COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    finally:
+        if output:
+            f.close()
+    return count
+
+
+def bulk_report(start, end, user_ids=None, emails=None, output=None, daily=False, workers=8):
+    """Write a usage report for all users, or the given users/emails, between two YYYY-MM[-DD] dates"""
+    try:
+        email_index = get_email_index()
+    except Exception as e:
+        print(f"Warning: could not load Cognito users, emails will be empty: {str(e)}")
+        email_index = {}
+
+    if emails:
+        missing = [email for email in emails if email.lower() not in email_index]
+        if missing:
+            email_index = get_email_index(refresh=True)
+        user_ids = list(user_ids or []) + [email_index[e.lower()] for e in emails if e.lower() in email_index]
+        for email in emails:
+            if email.lower() not in email_index:
+                print(f"Warning: no user found with email: {email}", file=sys.stderr)
+
+    emails_by_user = {sub: email for email, sub in email_index.items()}
+    items = iter_usage_items(*usage_key_range(start, end, daily), user_ids, workers)
+    return write_report(usage_rows(items, emails_by_user), output)
+
+
+def _read_list(path):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
 def main():
-    parser = argparse.ArgumentParser(description='Get API usage data for a user')
+    parser = argparse.ArgumentParser(description='Get API usage data for a user, or a bulk report for many users')
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument('--email', help='Email address of the user')
     group.add_argument('--user-id', help='Cognito user ID')
+    group.add_argument('--all-users', action='store_true', help='Report on every user with usage in the range')
+    group.add_argument('--users-file', help='File with one user ID or email per line')
     parser.add_argument('--months', type=int, default=1, help='Number of months to retrieve (default: 1)')
+    parser.add_argument('--start', help='Report start, YYYY-MM or YYYY-MM-DD (bulk mode, default: this month)')
+    parser.add_argument('--end', help='Report end, YYYY-MM or YYYY-MM-DD (bulk mode, default: this month)')
+    parser.add_argument('--daily', action='store_true', help='One row per user and day instead of per month')
+    parser.add_argument('--output', help='Report file (.csv or .parquet, default: CSV to stdout)')
+    parser.add_argument('--workers', type=int, default=8, help='Parallel scan segments / query workers (default: 8)')
     args = parser.parse_args()
 
+    if args.all_users or args.users_file:
+        this_month = date.today().strftime('%Y-%m')
+        user_ids, emails = None, None
+        if args.users_file:
+            entries = _read_list(args.users_file)
+            emails = [e for e in entries if '@' in e]
+            user_ids = [e for e in entries if '@' not in e]
+
+        started = time.time()
+        count = bulk_report(args.start or this_month, args.end or this_month, user_ids, emails,
+                            args.output, args.daily, args.workers)
+        print(f"Wrote {count} rows in {time.time() - started:.1f}s", file=sys.stderr)
+        return
+
     email = os.getenv('EMAIL') if not args.email else args.email
     user_id = os.getenv('USER_ID') if not args.user_id else args.user_id
 
@@ -117,4 +389,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
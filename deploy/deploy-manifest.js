@@ -0,0 +1,278 @@
+// deploy/deploy-manifest.js
+const fs = require('fs');
+const path = require('path');
+const crypto = require('crypto');
+const { execSync } = require('child_process');
+
+// Written after every successful deploy, one per stage and region since image URIs are regional
+const MANIFEST_DIR = 'layer';
+const IGNORED = new Set(['.git', '__pycache__', '.pytest_cache', 'node_modules']);
+
+function manifestPath(servicePath, stage, region) {
+  return path.join(servicePath, MANIFEST_DIR, `deploy-manifest.${stage}.${region}.json`);
+}
+
+function readManifest(servicePath, stage, region) {
+  const filePath = manifestPath(servicePath, stage, region);
+  return fs.existsSync(filePath) ? JSON.parse(fs.readFileSync(filePath, 'utf-8')) : null;
+}
+
+function writeManifest(servicePath, stage, region, manifest) {
+  const filePath = manifestPath(servicePath, stage, region);
+  fs.mkdirSync(path.dirname(filePath), { recursive: true });
+  fs.writeFileSync(filePath, JSON.stringify(manifest, null, 2));
+}
+
+// Hash of a file, or of every file under a directory (relative paths and contents, sorted)
+function hashPath(target) {
+  const hash = crypto.createHash('sha256');
+  const walk = dir => {
+    fs.readdirSync(dir, { withFileTypes: true })
+      .sort((a, b) => (a.name < b.name ? -1 : 1))
+      .forEach(entry => {
+        if (IGNORED.has(entry.name) || entry.name.endsWith('.pyc')) return;
+        const fullPath = path.join(dir, entry.name);
+        if (entry.isDirectory()) {
+          walk(fullPath);
+        } else if (entry.isFile()) {
+          hash.update(`${path.relative(target, fullPath)}\0`);
+          hash.update(fs.readFileSync(fullPath));
+          hash.update('\0');
+        }
+      });
+  };
+
+  if (!fs.existsSync(target)) return null;
+  if (fs.statSync(target).isDirectory()) {
+    walk(target);
+  } else {
+    hash.update(fs.readFileSync(target));
+  }
+  return hash.digest('hex').slice(0, 16);
+}
+
+// A deploy/ script and the deploy/ modules it requires, transitively: { 'deploy/<file>': hash }
+function moduleHashes(entry) {
+  const hashes = {};
+  const visit = file => {
+    const key = `deploy/${path.relative(__dirname, file).split(path.sep).join('/')}`;
+    if (key in hashes) return;
+    hashes[key] = hashPath(file);
+    const source = fs.existsSync(file) ? fs.readFileSync(file, 'utf-8') : '';
+    for (const [, required] of source.matchAll(/require\(['"](\.\/[^'"]+)['"]\)/g)) {
+      const resolved = path.resolve(path.dirname(file), required);
+      visit(resolved.endsWith('.js') ? resolved : `${resolved}.js`);
+    }
+  };
+  visit(entry);
+  return Object.fromEntries(Object.entries(hashes).sort(([a], [b]) => (a < b ? -1 : 1)));
+}
+
+function pluginRepoName(pluginPath) {
+  return pluginPath.split('/').pop().replace('.git', '');
+}
+
+function localHead(checkoutDir) {
+  try {
+    return execSync('git rev-parse HEAD', { cwd: checkoutDir, stdio: ['ignore', 'pipe', 'ignore'] }).toString().trim();
+  } catch (error) {
+    return null;
+  }
+}
+
+function remoteHead(gitUrl) {
+  try {
+    const output = execSync(`git ls-remote ${gitUrl} HEAD`, { stdio: ['ignore', 'pipe', 'ignore'], timeout: 30000 });
+    return output.toString().split(/\s/)[0] || null;
+  } catch (error) {
+    return null;
+  }
+}
+
+/**
+ * Content hashes of everything a deploy builds from: every lib function, the shared function
+ * code, flows (including plugin flows), requirement and lock files, plugin checkouts and the
+ * generators that turn them into Dockerfiles and state machines.
+ */
+function snapshot(servicePath) {
+  const functionsDir = path.join(servicePath, 'functions');
+  const libDir = path.join(functionsDir, 'lib');
+  const functions = {};
+  if (fs.existsSync(functionsDir)) {
+    fs.readdirSync(functionsDir, { withFileTypes: true }).forEach(entry => {
+      if (entry.name === 'lib' || IGNORED.has(entry.name)) return;
+      functions[`functions/${entry.name}`] = hashPath(path.join(functionsDir, entry.name));
+    });
+  }
+  if (fs.existsSync(libDir)) {
+    fs.readdirSync(libDir, { withFileTypes: true })
+      .filter(entry => entry.isDirectory() && !IGNORED.has(entry.name))
+      .forEach(entry => { functions[`functions/lib/${entry.name}`] = hashPath(path.join(libDir, entry.name)); });
+  }
+
+  const pluginsDir = path.join(servicePath, '.plugins');
+  const plugins = {};
+  const flowDirs = ['flows'];
+  if (fs.existsSync(pluginsDir)) {
+    fs.readdirSync(pluginsDir, { withFileTypes: true }).filter(entry => entry.isDirectory()).forEach(entry => {
+      const checkout = path.join(pluginsDir, entry.name);
+      plugins[entry.name] = { commit: localHead(checkout), hash: hashPath(checkout) };
+      flowDirs.push(path.join('.plugins', entry.name, 'flows'));
+    });
+  }
+
+  const flows = {};
+  flowDirs.forEach(dir => {
+    const flowsDir = path.join(servicePath, dir);
+    if (!fs.existsSync(flowsDir)) return;
+    fs.readdirSync(flowsDir).filter(file => file.endsWith('.yml') || file.endsWith('.yaml')).forEach(file => {
+      const content = fs.readFileSync(path.join(flowsDir, file), 'utf-8');
+      const match = content.match(/^name:\s*['"]?([^'"\s#]+)/m);
+      if (match) flows[match[1]] = { file: path.join(dir, file), hash: hashPath(path.join(flowsDir, file)) };
+    });
+  });
+
+  const requirements = {};
+  const layerDir = path.join(servicePath, MANIFEST_DIR);
+  (fs.existsSync(layerDir) ? fs.readdirSync(layerDir) : [])
+    .filter(file => /^requirements.*\.(txt|lock)$/.test(file))
+    .forEach(file => { requirements[`layer/${file}`] = hashPath(path.join(servicePath, MANIFEST_DIR, file)); });
+
+  return {
+    functions,
+    flows,
+    plugins,
+    requirements,
+    generators: {
+      containers: hashPath(path.join(__dirname, 'setup-containers.js')),
+      // The generator and every module it requires (retry.js, warmup.js, input-source.js...)
+      stepFunctions: moduleHashes(path.join(__dirname, 'generate-step-functions.js'))
+    }
+  };
+}
+
+// Files an image installs its dependencies from (see ContainerSetup.installStep)
+function imageRequirementFiles(imageName, locked) {
+  const ext = locked ? 'lock' : 'txt';
+  if (imageName === 'baseimage') return [`layer/requirements-base.${ext}`];
+  if (imageName === 'heavyimage') return [`layer/requirements.${ext}`];
+  return [`layer/requirements-base.${ext}`, `layer/requirements-${imageName}.${ext}`];
+}
+
+// Images the functions use, and whether each one copies the plugin checkouts
+function imageOptions(functions, imagePlan, locked) {
+  const pluginFunctions = new Set(imagePlan?.pluginFunctions || []);
+  const images = {};
+  Object.entries(functions).forEach(([functionName, config]) => {
+    const name = config.image?.name;
+    if (!name) return;
+    images[name] = images[name] || { locked, withPlugins: name === 'heavyimage' };
+    if (name !== 'baseimage' && pluginFunctions.has(functionName)) images[name].withPlugins = true;
+  });
+  return images;
+}
+
+// Everything that ends up in an image: all function code, its requirement files, the
+// Dockerfile template and, for images that copy .plugins, the plugin checkouts
+function imageInputs(current, imageName, { locked, withPlugins }) {
+  const inputs = { ...current.functions, 'deploy/setup-containers.js': current.generators.containers };
+  imageRequirementFiles(imageName, locked).forEach(file => { inputs[file] = current.requirements[file] || null; });
+  if (withPlugins) {
+    Object.entries(current.plugins).forEach(([name, plugin]) => { inputs[`.plugins/${name}`] = plugin.hash; });
+  }
+  return inputs;
+}
+
+function changedInputs(previous, current) {
+  const keys = new Set([...Object.keys(previous || {}), ...Object.keys(current)]);
+  return [...keys].sort().filter(key => (previous || {})[key] !== current[key]).map(key => {
+    if (!previous || !(key in previous)) return `${key} added`;
+    if (!(key in current)) return `${key} removed`;
+    return `${key} changed`;
+  });
+}
+
+/**
+ * What the next deploy would do with each image, plugin and state machine compared with the
+ * last deployed manifest. `images` maps image names to { locked, withPlugins }, `remotes` maps
+ * plugin names to the remote HEAD (null when unknown).
+ */
+function buildPlan(manifest, current, images, remotes = {}) {
+  const plan = { plugins: [], images: [], stateMachines: [] };
+
+  Object.entries(remotes).forEach(([name, remote]) => {
+    const local = current.plugins[name]?.commit;
+    if (!local) {
+      plan.plugins.push({ name, action: 'fetch', reasons: ['not checked out'] });
+    } else if (remote && remote !== local) {
+      plan.plugins.push({ name, action: 'fetch', reasons: [`remote ${remote.slice(0, 7)} != checkout ${local.slice(0, 7)}`] });
+    } else {
+      plan.plugins.push({ name, action: 'skip', reasons: [remote ? `up to date at ${local.slice(0, 7)}` : 'remote unreachable'] });
+    }
+  });
+
+  Object.entries(images).forEach(([name, options]) => {
+    const previous = manifest?.images?.[name];
+    const reasons = changedInputs(previous?.inputs, imageInputs(current, name, options));
+    if (!previous?.uri) {
+      plan.images.push({ name, action: 'build', reasons: ['not built by a previous deploy'] });
+    } else {
+      plan.images.push({ name, action: reasons.length ? 'build' : 'reuse', reasons });
+    }
+  });
+
+  const previousFlows = manifest?.snapshot?.flows || {};
+  const previousGenerator = manifest?.snapshot?.generators?.stepFunctions;
+  // Manifests written before the modules were hashed one by one have a single hash
+  const generatorReasons = !manifest ? [] : typeof previousGenerator === 'object' && previousGenerator
+    ? changedInputs(previousGenerator, current.generators.stepFunctions)
+    : ['deploy/generate-step-functions.js changed'];
+  new Set([...Object.keys(previousFlows), ...Object.keys(current.flows)]).forEach(name => {
+    const before = previousFlows[name];
+    const after = current.flows[name];
+    if (!before) {
+      plan.stateMachines.push({ name, action: 'create', reasons: [after.file] });
+    } else if (!after) {
+      plan.stateMachines.push({ name, action: 'delete', reasons: [`${before.file} removed`] });
+    } else if (before.hash !== after.hash || generatorReasons.length) {
+      plan.stateMachines.push({
+        name,
+        action: 'update',
+        reasons: before.hash !== after.hash ? [`${after.file} changed`] : generatorReasons
+      });
+    } else {
+      plan.stateMachines.push({ name, action: 'unchanged', reasons: [] });
+    }
+  });
+  plan.stateMachines.sort((a, b) => (a.name < b.name ? -1 : 1));
+
+  return plan;
+}
+
+function formatPlan(plan) {
+  const sections = [['Plugins', plan.plugins], ['Images', plan.images], ['State machines', plan.stateMachines]];
+  return sections.filter(([, entries]) => entries.length).map(([title, entries]) => [
+    `${title}:`,
+    ...entries.map(({ name, action, reasons }) => {
+      const shown = reasons.slice(0, 5).join(', ') + (reasons.length > 5 ? `, ${reasons.length - 5} more` : '');
+      return `  ${action.padEnd(9)} ${name}${shown ? ` (${shown})` : ''}`;
+    })
+  ].join('\n')).join('\n\n');
+}
+
+module.exports = {
+  buildPlan,
+  changedInputs,
+  formatPlan,
+  hashPath,
+  imageInputs,
+  imageOptions,
+  localHead,
+  manifestPath,
+  moduleHashes,
+  pluginRepoName,
+  readManifest,
+  remoteHead,
+  snapshot,
+  writeManifest
+};
@@ -0,0 +1,33 @@
+// deploy/function-config.js
+const fs = require('fs');
+const path = require('path');
+const yaml = require('js-yaml');
+
+// Sidecar file next to a function's handler.py with its deployment settings
+const CONFIG_FILE = 'function.yml';
+
+const DEFAULTS = {
+  memorySize: 256,
+  timeout: 900
+};
+
+function loadFunctionConfig(functionDir, defaults = DEFAULTS) {
+  const configPath = path.join(functionDir, CONFIG_FILE);
+  if (!fs.existsSync(configPath)) {
+    return { ...defaults };
+  }
+
+  const config = yaml.load(fs.readFileSync(configPath, 'utf8')) || {};
+  return { ...defaults, ...config };
+}
+
+// Environment of a `logging:` setting (level, sampleRate, maxPayloadChars), see functions/base/logs/payload.py
+function loggingEnvironment(logging = {}) {
+  const environment = {};
+  if (logging.level) environment.LOG_LEVEL = String(logging.level).toUpperCase();
+  if (logging.sampleRate !== undefined) environment.LOG_SAMPLE_RATE = String(logging.sampleRate);
+  if (logging.maxPayloadChars !== undefined) environment.LOG_PAYLOAD_CHARS = String(logging.maxPayloadChars);
+  return environment;
+}
+
+module.exports = { CONFIG_FILE, DEFAULTS, loadFunctionConfig, loggingEnvironment };
@@ -2,6 +2,12 @@
 const fs = require('fs');
 const path = require('path');
 const yaml = require('js-yaml');
+const { loadFunctionConfig } = require('./function-config');
+const { addInputSourceResources, withInputSource } = require('./input-source');
+const { withRetries } = require('./retry');
+const { addRouterAliases, routedFunctions } = require('./router');
+const { addWarmupResources, warmupFunctions, warmupSettings } = require('./warmup');
+const { addWatchdogResources, flowBudget, withTimeout } = require('./watchdog');
 
 const cfSchema = yaml.DEFAULT_SCHEMA.extend([
   new yaml.Type('!GetAtt', {
@@ -14,6 +20,139 @@ const cfSchema = yaml.DEFAULT_SCHEMA.extend([
   })
 ]);
 
+// Execution history events sent to CloudWatch Logs unless a flow sets `logging:` (ALL logs every state's data)
+const DEFAULT_FLOW_LOGGING = { level: 'ERROR', includeExecutionData: true };
+const LOG_LEVELS = ['ALL', 'ERROR', 'FATAL', 'OFF'];
+
+function loggingConfiguration(logging) {
+  const settings = logging === false ? { level: 'OFF' } : { ...DEFAULT_FLOW_LOGGING, ...(logging || {}) };
+  const level = String(settings.level).toUpperCase();
+  if (!LOG_LEVELS.includes(level)) throw new Error(`Unknown flow log level ${settings.level} (use ${LOG_LEVELS.join(', ')})`);
+  return {
+    Level: level,
+    IncludeExecutionData: Boolean(settings.includeExecutionData),
+    Destinations: [{
+      CloudWatchLogsLogGroup: {
+        LogGroupArn: {
+          'Fn::Sub': 'arn:aws:logs:${AWS::Region}:${AWS::AccountId}:log-group:/aws/vendedlogs/states/${self:service}-${self:provider.stage}:*'
+        }
+      }
+    }]
+  };
+}
+
+// Logical id prefix of a flow function: functions/lib/hello_world/handler.handler -> <prefix>HelloWorld
+function functionLogicalName(handler, prefix) {
+  const handlerParts = handler.split('/');
+  const functionDir = handlerParts[handlerParts.length - 2];
+  const normalizedName = functionDir
+    .replace(/-/g, '_')
+    .replace(/[^a-zA-Z0-9_]/g, '')
+    .replace(/_([a-z])/g, (_, letter) => letter.toUpperCase());
+  return `${prefix}${normalizedName.charAt(0).toUpperCase()}${normalizedName.slice(1)}`;
+}
+
+// Logical id of what flows invoke for a function: its Lambda, or the router alias standing in for it
+function functionResourceId(logicalName, routed = {}) {
+  return routed[logicalName] || `${logicalName}LambdaFunction`;
+}
+
+function functionArn(logicalName, routed = {}) {
+  // Ref of an alias is its ARN
+  return routed[logicalName]
+    ? { Ref: routed[logicalName] }
+    : { 'Fn::GetAtt': [`${logicalName}LambdaFunction`, 'Arn'] };
+}
+
+// Functions of a functions/lib directory with `warmup:` in their function.yml
+function functionWarmTargets(libDir, functionPrefix, routed = {}) {
+  if (!fs.existsSync(libDir)) return [];
+  return fs.readdirSync(libDir, { withFileTypes: true })
+    .filter(dirent => dirent.isDirectory() && fs.existsSync(path.join(libDir, dirent.name, 'handler.py')))
+    .flatMap(dirent => {
+      const settings = warmupSettings(loadFunctionConfig(path.join(libDir, dirent.name)).warmup);
+      if (!settings) return [];
+      const handler = `functions/lib/${dirent.name}/handler.handler`;
+      return [{ logicalId: functionResourceId(functionLogicalName(handler, functionPrefix), routed), ...settings }];
+    });
+}
+
+function addFlowResources(resources, flowContent, functionPrefix, warmTargets = [], routed = {}, budgets = [], sources = []) {
+  const variables = {};
+
+  // Handle function ARNs
+  (flowContent.functions || []).forEach(func => {
+    variables[`${func.name}Arn`] = functionArn(functionLogicalName(func.handler, functionPrefix), routed);
+  });
+
+  // Handle state machine references
+  const stateMachineReferences = flowContent.stateMachineReferences || [];
+  stateMachineReferences.forEach(stateMachineName => {
+    variables[stateMachineName] = {
+      'Fn::GetAtt': [`${stateMachineName}StateMachine`, 'Arn']
+    };
+  });
+
+  // Functions and referenced flows are created first (see tools/flows for the full graph)
+  const functionDependencies = (flowContent.functions || [])
+    .map(func => functionResourceId(functionLogicalName(func.handler, functionPrefix), routed));
+  const stateMachineDependencies = stateMachineReferences.map(name => `${name}StateMachine`);
+
+  // maxDurationSeconds becomes the machine's TimeoutSeconds, the watchdog also enforces maxStateTransitions
+  const budget = flowBudget(flowContent);
+  if (budget) budgets.push({ flow: flowContent.name, ...budget });
+
+  // A Map reading its items from `inputSource` (see deploy/input-source.js)
+  const { definition, dependencies: sourceDependencies } = withInputSource(flowContent.definition, flowContent, variables);
+  const source = flowContent.inputSource;
+  if (source) sources.push({ flow: flowContent.name, source, generatorArn: source.function && variables[`${source.function}Arn`] });
+
+  resources[`${flowContent.name}StateMachine`] = {
+    Type: 'AWS::StepFunctions::StateMachine',
+    DependsOn: [
+      'StepFunctionsExecutionRole', 'StateMachineLogGroup', ...functionDependencies, ...stateMachineDependencies,
+      ...sourceDependencies
+    ],
+    Properties: {
+      StateMachineName: flowContent.name,
+      DefinitionString: {
+        'Fn::Sub': [
+          // Task retries from `retryPolicy` (see deploy/retry.js)
+          JSON.stringify(withTimeout(withRetries(definition, flowContent), budget?.maxDurationSeconds)),
+          variables
+        ]
+      },
+      RoleArn: { 'Fn::GetAtt': ['StepFunctionsExecutionRole', 'Arn'] },
+      LoggingConfiguration: loggingConfiguration(flowContent.logging)
+    }
+  };
+
+  if (flowContent.schedule) {
+    resources[`${flowContent.name}ScheduleRule`] = {
+      Type: 'AWS::Events::Rule',
+      Properties: {
+        Name: `${flowContent.name}-schedule`,
+        Description: `Schedule for ${flowContent.name}`,
+        ScheduleExpression: flowContent.schedule,
+        State: 'ENABLED',
+        Targets: [{
+          Id: `${flowContent.name}Target`,
+          Arn: { 'Fn::GetAtt': [`${flowContent.name}StateMachine`, 'Arn'] },
+          RoleArn: { 'Fn::GetAtt': ['EventBridgeExecutionRole', 'Arn'] },
+          Input: flowContent.input ? JSON.stringify(flowContent.input) : '{}'
+        }]
+      }
+    };
+  }
+
+  const warmup = warmupSettings(flowContent.warmup);
+  if (warmup) {
+    warmupFunctions(flowContent, warmup).forEach(func => {
+      warmTargets.push({ ...warmup, logicalId: functionResourceId(functionLogicalName(func.handler, functionPrefix), routed) });
+    });
+  }
+}
+
 module.exports = async () => {
   const resources = {};
 
@@ -84,98 +223,26 @@ module.exports = async () => {
     }
   };
 
+  // Lib functions with `router:` in their function.yml are served by their group's router (see deploy/router.js)
+  const libDir = path.join(__dirname, '..', 'functions', 'lib');
+  const routed = addRouterAliases(resources, routedFunctions(libDir).map(route => ({
+    ...route, logicalName: functionLogicalName(`functions/lib/${route.dirName}/handler.handler`, 'Lib')
+  })));
+
+  // Lib functions and first states of flows declaring `warmup:` (see deploy/warmup.js)
+  const warmTargets = functionWarmTargets(libDir, 'Lib', routed);
+  // Flows with maxDurationSeconds / maxStateTransitions (see deploy/watchdog.js)
+  const budgets = [];
+  // Flows with inputSource, for the permissions reading them (see deploy/input-source.js)
+  const sources = [];
+
   const flowsDir = path.join(__dirname, '..', 'flows');
   const flowFiles = fs.readdirSync(flowsDir).filter(f => f.endsWith('.yml') || f.endsWith('.yaml'));
 
   for (const file of flowFiles) {
     const flowContent = yaml.load(fs.readFileSync(path.join(flowsDir, file), 'utf8'), { schema: cfSchema });
     if (!flowContent?.name || !flowContent?.definition) continue;
-
-    const variables = {};
-
-    // Handle function ARNs
-    if (flowContent.functions) {
-      flowContent.functions.forEach(func => {
-        const handlerParts = func.handler.split('/');
-        const functionDir = handlerParts[handlerParts.length - 2];
-
-        const normalizedName = functionDir
-          .replace(/-/g, '_')
-          .replace(/[^a-zA-Z0-9_]/g, '')
-          .replace(/_([a-z])/g, (_, letter) => letter.toUpperCase());
-        const functionName = `Lib${normalizedName.charAt(0).toUpperCase()}${normalizedName.slice(1)}`;
-
-        variables[`${func.name}Arn`] = {
-          'Fn::GetAtt': [`${functionName}LambdaFunction`, 'Arn']
-        };
-      });
-    }
-
-    // Handle state machine references
-    if (flowContent.stateMachineReferences) {
-      flowContent.stateMachineReferences.forEach(stateMachineName => {
-        variables[stateMachineName] = {
-          'Fn::GetAtt': [`${stateMachineName}StateMachine`, 'Arn']
-        };
-      });
-    }
-
-    // Get function dependencies
-    const functionDependencies = flowContent.functions
-      ? flowContent.functions.map(func => {
-          const handlerParts = func.handler.split('/');
-          const functionDir = handlerParts[handlerParts.length - 2];
-          const normalizedName = functionDir
-            .replace(/-/g, '_')
-            .replace(/[^a-zA-Z0-9_]/g, '')
-            .replace(/_([a-z])/g, (_, letter) => letter.toUpperCase());
-          return `Lib${normalizedName.charAt(0).toUpperCase()}${normalizedName.slice(1)}LambdaFunction`;
-        })
-      : [];
-
-    resources[`${flowContent.name}StateMachine`] = {
-      Type: 'AWS::StepFunctions::StateMachine',
-      DependsOn: ['StepFunctionsExecutionRole', 'StateMachineLogGroup', ...functionDependencies],
-      Properties: {
-        StateMachineName: flowContent.name,
-        DefinitionString: {
-          'Fn::Sub': [
-            JSON.stringify(flowContent.definition),
-            variables
-          ]
-        },
-        RoleArn: { 'Fn::GetAtt': ['StepFunctionsExecutionRole', 'Arn'] },
-        LoggingConfiguration: {
-          Level: 'ALL',
-          IncludeExecutionData: true,
-          Destinations: [{
-            CloudWatchLogsLogGroup: {
-              LogGroupArn: {
-                'Fn::Sub': 'arn:aws:logs:${AWS::Region}:${AWS::AccountId}:log-group:/aws/vendedlogs/states/${self:service}-${self:provider.stage}:*'
-              }
-            }
-          }]
-        }
-      }
-    };
-
-    if (flowContent.schedule) {
-      resources[`${flowContent.name}ScheduleRule`] = {
-        Type: 'AWS::Events::Rule',
-        Properties: {
-          Name: `${flowContent.name}-schedule`,
-          Description: `Schedule for ${flowContent.name}`,
-          ScheduleExpression: flowContent.schedule,
-          State: 'ENABLED',
-          Targets: [{
-            Id: `${flowContent.name}Target`,
-            Arn: { 'Fn::GetAtt': [`${flowContent.name}StateMachine`, 'Arn'] },
-            RoleArn: { 'Fn::GetAtt': ['EventBridgeExecutionRole', 'Arn'] },
-            Input: flowContent.input ? JSON.stringify(flowContent.input) : '{}'
-          }]
-        }
-      };
-    }
+    addFlowResources(resources, flowContent, 'Lib', warmTargets, routed, budgets, sources);
   }
 
   const pluginsDir = path.join(process.cwd(), '.plugins');
@@ -192,96 +259,19 @@ module.exports = async () => {
         for (const file of pluginFlowFiles) {
           const flowContent = yaml.load(fs.readFileSync(path.join(pluginFlowsDir, file), 'utf8'), { schema: cfSchema });
           if (!flowContent?.name || !flowContent?.definition) continue;
-
-          const variables = {};
-
-          // Handle function ARNs for plugin flows
-          if (flowContent.functions) {
-            flowContent.functions.forEach(func => {
-              const handlerParts = func.handler.split('/');
-              const functionDir = handlerParts[handlerParts.length - 2];
-
-              const normalizedName = functionDir
-                .replace(/-/g, '_')
-                .replace(/[^a-zA-Z0-9_]/g, '')
-                .replace(/_([a-z])/g, (_, letter) => letter.toUpperCase());
-              const functionName = `PrivateLib${normalizedName.charAt(0).toUpperCase()}${normalizedName.slice(1)}`;
-
-              variables[`${func.name}Arn`] = {
-                'Fn::GetAtt': [`${functionName}LambdaFunction`, 'Arn']
-              };
-            });
-          }
-
-          // Handle state machine references
-          if (flowContent.stateMachineReferences) {
-            flowContent.stateMachineReferences.forEach(stateMachineName => {
-              variables[stateMachineName] = {
-                'Fn::GetAtt': [`${stateMachineName}StateMachine`, 'Arn']
-              };
-            });
-          }
-
-          // Get function dependencies for plugin flows
-          const functionDependencies = flowContent.functions
-            ? flowContent.functions.map(func => {
-                const handlerParts = func.handler.split('/');
-                const functionDir = handlerParts[handlerParts.length - 2];
-                const normalizedName = functionDir
-                  .replace(/-/g, '_')
-                  .replace(/[^a-zA-Z0-9_]/g, '')
-                  .replace(/_([a-z])/g, (_, letter) => letter.toUpperCase());
-                return `PrivateLib${normalizedName.charAt(0).toUpperCase()}${normalizedName.slice(1)}LambdaFunction`;
-              })
-            : [];
-
-          resources[`${flowContent.name}StateMachine`] = {
-            Type: 'AWS::StepFunctions::StateMachine',
-            DependsOn: ['StepFunctionsExecutionRole', 'StateMachineLogGroup', ...functionDependencies],
-            Properties: {
-              StateMachineName: flowContent.name,
-              DefinitionString: {
-                'Fn::Sub': [
-                  JSON.stringify(flowContent.definition),
-                  variables
-                ]
-              },
-              RoleArn: { 'Fn::GetAtt': ['StepFunctionsExecutionRole', 'Arn'] },
-              LoggingConfiguration: {
-                Level: 'ALL',
-                IncludeExecutionData: true,
-                Destinations: [{
-                  CloudWatchLogsLogGroup: {
-                    LogGroupArn: {
-                      'Fn::Sub': 'arn:aws:logs:${AWS::Region}:${AWS::AccountId}:log-group:/aws/vendedlogs/states/${self:service}-${self:provider.stage}:*'
-                    }
-                  }
-                }]
-              }
-            }
-          };
-
-          if (flowContent.schedule) {
-            resources[`${flowContent.name}ScheduleRule`] = {
-              Type: 'AWS::Events::Rule',
-              Properties: {
-                Name: `${flowContent.name}-schedule`,
-                Description: `Schedule for ${flowContent.name}`,
-                ScheduleExpression: flowContent.schedule,
-                State: 'ENABLED',
-                Targets: [{
-                  Id: `${flowContent.name}Target`,
-                  Arn: { 'Fn::GetAtt': [`${flowContent.name}StateMachine`, 'Arn'] },
-                  RoleArn: { 'Fn::GetAtt': ['EventBridgeExecutionRole', 'Arn'] },
-                  Input: flowContent.input ? JSON.stringify(flowContent.input) : '{}'
-                }]
-              }
-            };
-          }
+          // Plugin functions are deployed as PrivateLib* functions
+          addFlowResources(resources, flowContent, 'PrivateLib', warmTargets, {}, budgets, sources);
         }
       }
+      warmTargets.push(...functionWarmTargets(path.join(pluginsDir, pluginDir, 'functions', 'lib'), 'PrivateLib'));
     }
   }
 
+  addWarmupResources(resources, warmTargets);
+  addWatchdogResources(resources, budgets);
+  addInputSourceResources(resources, sources);
+
   return { Resources: resources };
-};
\ No newline at end of file
+};
+
+module.exports.addFlowResources = addFlowResources;
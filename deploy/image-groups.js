@@ -0,0 +1,132 @@
+// deploy/image-groups.js
+const fs = require('fs');
+const path = require('path');
+const crypto = require('crypto');
+const { loadFunctionConfig } = require('./function-config');
+
+const PLAN_PATH = path.join('layer', 'image-plan.json');
+const DEFAULT_MAX_IMAGES = 3;
+
+function parseRequirements(content) {
+  return content.split('\n')
+    .map(line => line.trim())
+    .filter(line => line && !line.startsWith('#'));
+}
+
+function requirementName(line) {
+  return line.split(/[=<>!~\[;@ ]/)[0].trim().toLowerCase().replace(/_/g, '-');
+}
+
+function readRequirementsFile(filePath) {
+  return fs.existsSync(filePath) ? parseRequirements(fs.readFileSync(filePath, 'utf-8')) : [];
+}
+
+// A function declares its dependencies in function.yml (`requirements:`) or in a requirements.txt
+// next to its handler; functions that declare nothing get `fallback`
+function functionRequirements(functionDir, fallback = []) {
+  const config = loadFunctionConfig(functionDir, {});
+  if (Array.isArray(config.requirements)) {
+    return config.requirements.map(String).map(line => line.trim()).filter(Boolean);
+  }
+  const requirementsPath = path.join(functionDir, 'requirements.txt');
+  return fs.existsSync(requirementsPath) ? readRequirementsFile(requirementsPath) : fallback;
+}
+
+function imageName(requirements) {
+  const hash = crypto.createHash('sha1').update([...requirements].sort().join('\n')).digest('hex');
+  return `deps-${hash.slice(0, 8)}`;
+}
+
+// Two dependency sets can share an image unless they pin the same package differently
+function conflicts(a, b) {
+  const byName = new Map([...a].map(line => [requirementName(line), line]));
+  return [...b].some(line => byName.has(requirementName(line)) && byName.get(requirementName(line)) !== line);
+}
+
+function weight(requirements, weights) {
+  return [...requirements].reduce((total, line) => total + (weights[requirementName(line)] || 1), 0);
+}
+
+/**
+ * Group functions by dependency set into at most maxImages images.
+ *
+ * Starts with one cluster per distinct set and repeatedly merges the pair whose merge adds
+ * the least dead weight: every function in a cluster pays for the whole union of its
+ * dependencies at cold start, so merging A and B costs
+ *   w(A u B) * (nA + nB) - w(A) * nA - w(B) * nB
+ * where w() sums package weights (1 unless configured). Conflicting pins are never merged.
+ * Entries without dependencies use the base image, except plugin entries: only the heavy image
+ * and group images with plugin functions copy .plugins/.
+ */
+function clusterFunctions(entries, maxImages = DEFAULT_MAX_IMAGES, weights = {}) {
+  const assignments = {};
+  const bySet = new Map();
+
+  entries.forEach(({ name, requirements, plugin }) => {
+    if (!requirements.length) {
+      assignments[name] = plugin ? 'heavyimage' : 'baseimage';
+      return;
+    }
+    const key = [...new Set(requirements)].sort().join('\n');
+    if (!bySet.has(key)) bySet.set(key, { requirements: new Set(requirements), functions: [] });
+    bySet.get(key).functions.push(name);
+  });
+
+  const clusters = [...bySet.values()];
+  while (clusters.length > Math.max(1, maxImages)) {
+    let best = null;
+    for (let i = 0; i < clusters.length; i++) {
+      for (let j = i + 1; j < clusters.length; j++) {
+        const a = clusters[i];
+        const b = clusters[j];
+        if (conflicts(a.requirements, b.requirements)) continue;
+        const union = new Set([...a.requirements, ...b.requirements]);
+        const cost = weight(union, weights) * (a.functions.length + b.functions.length)
+          - weight(a.requirements, weights) * a.functions.length
+          - weight(b.requirements, weights) * b.functions.length;
+        if (!best || cost < best.cost) best = { i, j, cost, union };
+      }
+    }
+    if (!best) break;  // only conflicting sets left
+
+    const merged = {
+      requirements: best.union,
+      functions: [...clusters[best.i].functions, ...clusters[best.j].functions]
+    };
+    clusters.splice(best.j, 1);
+    clusters.splice(best.i, 1, merged);
+  }
+
+  const images = {};
+  clusters.forEach(cluster => {
+    const requirements = [...cluster.requirements].sort();
+    const name = imageName(requirements);
+    images[name] = { requirements, functions: [...cluster.functions].sort() };
+    cluster.functions.forEach(fn => { assignments[fn] = name; });
+  });
+
+  return { images, assignments };
+}
+
+function writePlan(servicePath, plan) {
+  const planPath = path.join(servicePath, PLAN_PATH);
+  fs.mkdirSync(path.dirname(planPath), { recursive: true });
+  fs.writeFileSync(planPath, JSON.stringify(plan, null, 2));
+}
+
+function readPlan(servicePath) {
+  const planPath = path.join(servicePath, PLAN_PATH);
+  return fs.existsSync(planPath) ? JSON.parse(fs.readFileSync(planPath, 'utf-8')) : null;
+}
+
+module.exports = {
+  DEFAULT_MAX_IMAGES,
+  PLAN_PATH,
+  clusterFunctions,
+  functionRequirements,
+  parseRequirements,
+  readPlan,
+  readRequirementsFile,
+  requirementName,
+  writePlan
+};
@@ -0,0 +1,208 @@
+// deploy/input-source.js
+
+// Writes DynamoDB and generator function sources to S3 for the Map to read (functions/base/input_source)
+const INPUT_SOURCE_FUNCTION = 'InputSourceLambdaFunction';
+const INPUT_SOURCE_ROLE = 'InputSourceRole';
+const INPUTS_BUCKET = 'InputsBucket';
+const DISTRIBUTED_MAP_POLICY = 'DistributedMapPolicy';
+const LOAD_STATE = 'LoadInputSource';
+const DEFAULT_MAX_CONCURRENCY = 100;
+
+// Name of the Map reading the source: `map:`, or the first state when it is a Map
+function sourceMap(definition, source) {
+  const name = source.map || definition.StartAt;
+  if (definition.States?.[name]?.Type !== 'Map') {
+    throw new Error(`inputSource needs a top-level Map state (set inputSource.map), ${name} is not one`);
+  }
+  return name;
+}
+
+// Sources Step Functions can't read on its own are written to S3 by the input source function first
+function isMaterialized(source) {
+  return Boolean(source.dynamodb || source.function);
+}
+
+function readerConfig(key) {
+  if (/manifest\.json$/.test(key)) return { InputType: 'MANIFEST' };  // S3 Inventory
+  if (/\.csv$/.test(key)) return { InputType: 'CSV', CSVHeaderLocation: 'FIRST_ROW' };
+  if (/\.jsonl$/.test(key)) return { InputType: 'JSONL' };
+  return { InputType: 'JSON' };
+}
+
+function itemReader(source) {
+  if (isMaterialized(source)) {
+    return {
+      Resource: 'arn:aws:states:::s3:getObject',
+      ReaderConfig: { InputType: 'JSON' },
+      Parameters: { 'Bucket.$': '$.inputSource.bucket', 'Key.$': '$.inputSource.key' }
+    };
+  }
+  if (source.s3.key) {
+    return {
+      Resource: 'arn:aws:states:::s3:getObject',
+      ReaderConfig: readerConfig(source.s3.key),
+      Parameters: { Bucket: source.s3.bucket, Key: source.s3.key }
+    };
+  }
+  // Every object under the prefix is an item ({Key, Size, ...})
+  return {
+    Resource: 'arn:aws:states:::s3:listObjectsV2',
+    Parameters: { Bucket: source.s3.bucket, Prefix: source.s3.prefix || '' }
+  };
+}
+
+// The Map as a Distributed Map streaming its items from the source, its results written to S3
+function distributedMap(state, source, flowName) {
+  const { Iterator, ItemProcessor, ItemsPath, Parameters, ...rest } = state;
+  const map = {
+    ...rest,
+    ItemReader: itemReader(source),
+    ItemProcessor: {
+      ...(ItemProcessor || Iterator),
+      ProcessorConfig: { Mode: 'DISTRIBUTED', ExecutionType: source.executionType || 'STANDARD' }
+    },
+    MaxConcurrency: state.MaxConcurrency || Number(source.maxConcurrency || DEFAULT_MAX_CONCURRENCY)
+  };
+  if (Parameters) map.ItemSelector = Parameters;
+  if (source.batchSize) map.ItemBatcher = { MaxItemsPerBatch: Number(source.batchSize) };
+  // Millions of results don't fit in a state's output
+  map.ResultWriter = state.ResultWriter || {
+    Resource: 'arn:aws:states:::s3:putObject',
+    Parameters: { Bucket: `\${${INPUTS_BUCKET}}`, Prefix: `results/${flowName}` }
+  };
+  return map;
+}
+
+function loadState(source, flowName, next) {
+  const { dynamodb, function: generator, input } = source;
+  return {
+    Type: 'Task',
+    Resource: 'arn:aws:states:::lambda:invoke',
+    Parameters: {
+      FunctionName: '${InputSourceArn}',
+      Payload: {
+        flow: flowName,
+        'execution.$': '$$.Execution.Name',
+        // A generator is a `functions` entry, its ARN variable is substituted like the Task resources
+        source: dynamodb ? { dynamodb } : { function: `\${${generator}Arn}`, input: input || {} }
+      }
+    },
+    ResultSelector: { 'bucket.$': '$.Payload.bucket', 'key.$': '$.Payload.key', 'count.$': '$.Payload.count' },
+    ResultPath: '$.inputSource',
+    Next: next
+  };
+}
+
+function redirect(state, from, to) {
+  const next = { ...state };
+  if (next.Next === from) next.Next = to;
+  if (next.Default === from) next.Default = to;
+  if (next.Choices) next.Choices = next.Choices.map(choice => (choice.Next === from ? { ...choice, Next: to } : choice));
+  if (next.Catch) next.Catch = next.Catch.map(catcher => (catcher.Next === from ? { ...catcher, Next: to } : catcher));
+  return next;
+}
+
+/**
+ * Definition reading the Map's items from the flow's `inputSource` (an S3 prefix or file, a DynamoDB
+ * query or a generator function) instead of its input. Adds the variables it refers to and returns
+ * the resources the state machine then depends on (see addInputSourceResources).
+ */
+function withInputSource(definition, flowContent, variables) {
+  const source = flowContent.inputSource;
+  if (!source) return { definition, dependencies: [] };
+
+  const mapName = sourceMap(definition, source);
+  let states = { ...definition.States, [mapName]: distributedMap(definition.States[mapName], source, flowContent.name) };
+  let startAt = definition.StartAt;
+  const dependencies = [INPUTS_BUCKET, DISTRIBUTED_MAP_POLICY];
+  variables[INPUTS_BUCKET] = { Ref: INPUTS_BUCKET };
+
+  if (isMaterialized(source)) {
+    // Loaded right before the Map: what led to the Map now leads to the load
+    states = Object.fromEntries(Object.entries(states).map(([name, state]) => [name, redirect(state, mapName, LOAD_STATE)]));
+    states[LOAD_STATE] = loadState(source, flowContent.name, mapName);
+    if (startAt === mapName) startAt = LOAD_STATE;
+    variables.InputSourceArn = { 'Fn::GetAtt': [INPUT_SOURCE_FUNCTION, 'Arn'] };
+    dependencies.push(INPUT_SOURCE_FUNCTION);
+  }
+  return { definition: { ...definition, StartAt: startAt, States: states }, dependencies };
+}
+
+/**
+ * What the flows' sources need to be read, and nothing more: `sources` are { flow, source, generatorArn }.
+ * The state machines get a policy for child executions, the inputs bucket and the S3 sources; the
+ * input source function gets its own role for the inputs bucket, the DynamoDB tables and generators.
+ */
+function addInputSourceResources(resources, sources) {
+  const buckets = [...new Set(sources.filter(({ source }) => source.s3).map(({ source }) => source.s3.bucket))].sort();
+  const tables = [...new Set(sources.filter(({ source }) => source.dynamodb).map(({ source }) => source.dynamodb.table))].sort();
+  const generators = sources.filter(({ generatorArn }) => generatorArn).map(({ generatorArn }) => generatorArn);
+
+  resources[DISTRIBUTED_MAP_POLICY] = {
+    Type: 'AWS::IAM::Policy',
+    Properties: {
+      PolicyName: 'DistributedMapPolicy',
+      Roles: [{ Ref: 'StepFunctionsExecutionRole' }],
+      PolicyDocument: { Version: '2012-10-17', Statement: distributedMapStatements(buckets) }
+    }
+  };
+
+  const statements = [{
+    Effect: 'Allow',
+    Action: ['s3:PutObject', 's3:AbortMultipartUpload'],
+    Resource: { 'Fn::Sub': `\${${INPUTS_BUCKET}.Arn}/inputs/*` }
+  }];
+  if (tables.length) {
+    statements.push({
+      Effect: 'Allow',
+      Action: ['dynamodb:Query', 'dynamodb:Scan'],
+      Resource: tables.flatMap(table => [
+        { 'Fn::Sub': `arn:aws:dynamodb:\${AWS::Region}:\${AWS::AccountId}:table/${table}` },
+        { 'Fn::Sub': `arn:aws:dynamodb:\${AWS::Region}:\${AWS::AccountId}:table/${table}/index/*` }
+      ])
+    });
+  }
+  if (generators.length) {
+    statements.push({ Effect: 'Allow', Action: ['lambda:InvokeFunction'], Resource: generators });
+  }
+  resources[INPUT_SOURCE_ROLE] = {
+    Type: 'AWS::IAM::Role',
+    Properties: {
+      AssumeRolePolicyDocument: {
+        Version: '2012-10-17',
+        Statement: [{ Effect: 'Allow', Principal: { Service: 'lambda.amazonaws.com' }, Action: 'sts:AssumeRole' }]
+      },
+      ManagedPolicyArns: ['arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole'],
+      Policies: [{
+        PolicyName: 'InputSourcePolicy',
+        PolicyDocument: { Version: '2012-10-17', Statement: statements }
+      }]
+    }
+  };
+}
+
+// Distributed Maps run child executions, read their items and write their results
+function distributedMapStatements(buckets = []) {
+  return [{
+    Effect: 'Allow',
+    Action: ['states:DescribeExecution', 'states:StopExecution'],
+    Resource: { 'Fn::Sub': 'arn:aws:states:${AWS::Region}:${AWS::AccountId}:execution:*' }
+  }, {
+    Effect: 'Allow',
+    Action: ['s3:GetObject', 's3:PutObject', 's3:AbortMultipartUpload', 's3:ListMultipartUploadParts'],
+    Resource: { 'Fn::Sub': `\${${INPUTS_BUCKET}.Arn}/*` }
+  }, {
+    Effect: 'Allow',
+    Action: ['s3:ListBucket'],
+    Resource: [{ 'Fn::GetAtt': [INPUTS_BUCKET, 'Arn'] }, ...buckets.map(bucket => `arn:aws:s3:::${bucket}`)]
+  }, ...(buckets.length ? [{
+    Effect: 'Allow',
+    Action: ['s3:GetObject'],
+    Resource: buckets.map(bucket => `arn:aws:s3:::${bucket}/*`)
+  }] : [])];
+}
+
+module.exports = {
+  DISTRIBUTED_MAP_POLICY, INPUTS_BUCKET, INPUT_SOURCE_FUNCTION, INPUT_SOURCE_ROLE, LOAD_STATE,
+  addInputSourceResources, distributedMap, distributedMapStatements, itemReader, withInputSource
+};
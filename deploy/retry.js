@@ -0,0 +1,82 @@
+// deploy/retry.js
+
+// Retried unless a policy names its own errors: Lambda throttles and service errors, Step Functions start limits
+const TRANSIENT_ERRORS = [
+  'Lambda.ServiceException',
+  'Lambda.AWSLambdaException',
+  'Lambda.SdkClientException',
+  'Lambda.TooManyRequestsException',
+  'StepFunctions.ExecutionLimitExceededException',
+  'StepFunctions.SdkClientException'
+];
+const DEFAULT_POLICY = {
+  errors: TRANSIENT_ERRORS,
+  maxAttempts: 3,
+  intervalSeconds: 1,
+  backoffRate: 2,
+  maxDelaySeconds: 30,
+  jitter: true
+};
+
+// `retryPolicy: true` (defaults), a map overriding `base`, or false / missing (none)
+function retryPolicy(setting, base = DEFAULT_POLICY) {
+  if (!setting) return null;
+  return setting === true ? { ...base } : { ...base, ...setting };
+}
+
+function retrier(policy) {
+  const retry = {
+    ErrorEquals: [...policy.errors],
+    IntervalSeconds: Number(policy.intervalSeconds),
+    MaxAttempts: Number(policy.maxAttempts),
+    BackoffRate: Number(policy.backoffRate)
+  };
+  if (policy.maxDelaySeconds) retry.MaxDelaySeconds = Number(policy.maxDelaySeconds);
+  if (policy.jitter) retry.JitterStrategy = 'FULL';
+  return retry;
+}
+
+// Name of the `functions` entry a Task invokes (${<name>Arn} as Resource or lambda:invoke FunctionName)
+function taskFunction(state) {
+  for (const value of [state.Resource, state.Parameters?.FunctionName]) {
+    const match = typeof value === 'string' && value.match(/^\$\{(\w+)Arn\}$/);
+    if (match) return match[1];
+  }
+  return null;
+}
+
+function addRetries(machine, policyOf) {
+  if (!machine?.States) return machine;
+  const states = {};
+  Object.entries(machine.States).forEach(([name, state]) => {
+    const next = { ...state };
+    if (state.Type === 'Task' && !state.Retry) {
+      // A Retry written in the definition is kept as it is
+      const policy = policyOf(taskFunction(state));
+      if (policy) next.Retry = [retrier(policy)];
+    }
+    if (state.Branches) next.Branches = state.Branches.map(branch => addRetries(branch, policyOf));
+    ['Iterator', 'ItemProcessor'].forEach(key => {
+      if (state[key]) next[key] = addRetries(state[key], policyOf);
+    });
+    states[name] = next;
+  });
+  return { ...machine, States: states };
+}
+
+/**
+ * Definition with a Retry on every Task, from the flow's `retryPolicy` and the `retryPolicy`
+ * of the `functions` entry the Task invokes (merged over the flow's, false turns it off).
+ */
+function withRetries(definition, flowContent) {
+  const flowPolicy = retryPolicy(flowContent.retryPolicy);
+  const functionPolicies = {};
+  (flowContent.functions || []).forEach(func => {
+    if (func.retryPolicy !== undefined) functionPolicies[func.name] = retryPolicy(func.retryPolicy, flowPolicy || DEFAULT_POLICY);
+  });
+  if (!flowPolicy && !Object.keys(functionPolicies).length) return definition;
+
+  return addRetries(definition, name => (name in functionPolicies ? functionPolicies[name] : flowPolicy));
+}
+
+module.exports = { DEFAULT_POLICY, TRANSIENT_ERRORS, retrier, retryPolicy, withRetries };
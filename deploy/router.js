@@ -0,0 +1,86 @@
+// deploy/router.js
+const fs = require('fs');
+const path = require('path');
+const { loadFunctionConfig } = require('./function-config');
+
+// `router: true` in a function.yml puts it in this group, `router: <group>` in another one
+const DEFAULT_GROUP = 'shared';
+const ROUTER_HANDLER = 'functions/base/router/handler.handler';
+const ROUTER_MODULE = 'functions.base.router.handler';
+// The directory name is the alias name the router dispatches on
+const ROUTABLE_NAME = /^[A-Za-z0-9_-]+$/;
+
+function routerGroup(value) {
+  if (!value) return null;
+  return value === true ? DEFAULT_GROUP : String(value);
+}
+
+function pascalCase(name) {
+  const normalized = name
+    .replace(/-/g, '_')
+    .replace(/[^a-zA-Z0-9_]/g, '')
+    .replace(/_([a-z])/g, (_, letter) => letter.toUpperCase());
+  return `${normalized.charAt(0).toUpperCase()}${normalized.slice(1)}`;
+}
+
+// Serverless function key of a group's router: shared -> routerShared
+function routerFunctionName(group) {
+  return `router${pascalCase(group)}`;
+}
+
+function routerLogicalId(group) {
+  return `Router${pascalCase(group)}LambdaFunction`;
+}
+
+// Alias of the router standing in for a function: LibPing -> LibPingRouterAlias
+function routerAliasLogicalId(functionLogicalName) {
+  return `${functionLogicalName}RouterAlias`;
+}
+
+// { dirName, group } of the functions of a functions/lib directory served by a router
+function routedFunctions(libDir) {
+  if (!fs.existsSync(libDir)) return [];
+  return fs.readdirSync(libDir, { withFileTypes: true })
+    .filter(dirent => dirent.isDirectory() && fs.existsSync(path.join(libDir, dirent.name, 'handler.py')))
+    .flatMap(dirent => {
+      const group = routerGroup(loadFunctionConfig(path.join(libDir, dirent.name)).router);
+      return group && ROUTABLE_NAME.test(dirent.name) ? [{ dirName: dirent.name, group }] : [];
+    });
+}
+
+/**
+ * One alias of its group's router per routed function, named after the function's directory:
+ * Step Functions and the warmer invoke the alias and the router imports the matching handler.
+ * `routes` are { dirName, group, logicalName } and the aliases all point to $LATEST so that
+ * every function of a group shares the same containers.
+ */
+function addRouterAliases(resources, routes) {
+  const aliases = {};
+  routes.forEach(({ dirName, group, logicalName }) => {
+    const aliasId = routerAliasLogicalId(logicalName);
+    resources[aliasId] = {
+      Type: 'AWS::Lambda::Alias',
+      Properties: {
+        FunctionName: { Ref: routerLogicalId(group) },
+        FunctionVersion: '$LATEST',
+        Name: dirName,
+        Description: `Routes to functions/lib/${dirName}`
+      }
+    };
+    aliases[logicalName] = aliasId;
+  });
+  return aliases;
+}
+
+module.exports = {
+  DEFAULT_GROUP,
+  ROUTER_HANDLER,
+  ROUTER_MODULE,
+  ROUTABLE_NAME,
+  addRouterAliases,
+  routedFunctions,
+  routerAliasLogicalId,
+  routerFunctionName,
+  routerGroup,
+  routerLogicalId
+};
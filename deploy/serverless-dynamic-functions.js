@@ -2,18 +2,69 @@
 const fs = require('fs');
 const path = require('path');
 const { execSync } = require('child_process');
+const { loadFunctionConfig, loggingEnvironment } = require('./function-config');
+const { ROUTABLE_NAME, ROUTER_HANDLER, ROUTER_MODULE, routerFunctionName, routerGroup } = require('./router');
+const {
+  DEFAULT_MAX_IMAGES, clusterFunctions, functionRequirements, readPlan, readRequirementsFile, writePlan
+} = require('./image-groups');
+const {
+  buildPlan, formatPlan, imageOptions, localHead, pluginRepoName, readManifest, remoteHead, snapshot
+} = require('./deploy-manifest');
 
 class ServerlessDynamicFunctions {
   constructor(serverless) {
     this.serverless = serverless;
+    this.commands = {
+      plan: {
+        usage: 'Show which plugins, images and state machines the next deploy would rebuild, and why',
+        lifecycleEvents: ['plan']
+      }
+    };
     this.hooks = {
       'before:package:initialize': async () => {
         await this.downloadPlugins();
+        this.configureUsageLimits();
+        this.configureLogging();
+        this.writeFlowSchemas();
         this.addDynamicFunctions();
-      }
+      },
+      'plan:plan': () => this.printPlan()
     };
   }
 
+  configureUsageLimits() {
+    // Environment variables must be strings, so the limits are passed to the middleware as JSON
+    const usage = this.serverless.service.custom?.usage || {};
+    const environment = this.serverless.service.provider.environment || {};
+    environment.USAGE_ENFORCEMENT = usage.enforcement || 'off';
+    environment.USAGE_LIMITS = JSON.stringify(usage.limits || {});
+    this.serverless.service.provider.environment = environment;
+    this.serverless.cli.log(`Usage enforcement: ${environment.USAGE_ENFORCEMENT}`);
+
+    const admission = this.serverless.service.custom?.admission || {};
+    environment.ADMISSION_MODE = admission.mode || 'direct';
+    environment.ADMISSION_LIMITS = JSON.stringify(admission.limits || {});
+    this.serverless.cli.log(`Admission: ${environment.ADMISSION_MODE}`);
+  }
+
+  configureLogging() {
+    // Defaults of every function, a function's `logging:` in function.yml overrides them
+    const logging = this.serverless.service.custom?.logging || {};
+    const environment = this.serverless.service.provider.environment || {};
+    Object.assign(environment, loggingEnvironment(logging));
+    this.serverless.service.provider.environment = environment;
+  }
+
+  // The flows' inputSchema, checked by run_flow (functions/base/run_flow/schemas.py) from the image
+  writeFlowSchemas() {
+    const python = this.serverless.service.custom?.containers?.python || 'python3';
+    try {
+      execSync(`${python} -m tools.flows schemas`, { cwd: this.serverless.config.servicePath, stdio: 'inherit' });
+    } catch (error) {
+      throw new Error('Could not write the flow input schemas, see the output above');
+    }
+  }
+
   async downloadPlugins() {
     const plugins = this.serverless.service.custom?.plugins?.packages || [];
     for (const pluginPath of plugins) {
@@ -24,14 +75,23 @@ class ServerlessDynamicFunctions {
         // Create plugins directory if it doesn't exist
         fs.mkdirSync(path.join(process.cwd(), '.plugins'), { recursive: true });
 
-        // Remove existing plugin directory if it exists
-        if (fs.existsSync(modulePath)) {
-          fs.rmSync(modulePath, { recursive: true });
-        }
-
-        // Clone the plugin
+        // Keep a checkout that is already at the remote HEAD (or can't be compared while offline)
         const gitUrl = pluginPath.replace('git+', '');
-        execSync(`git clone ${gitUrl} ${modulePath}`);
+        const local = fs.existsSync(modulePath) ? localHead(modulePath) : null;
+        const remote = local ? remoteHead(gitUrl) : null;
+        if (local && (!remote || remote === local)) {
+          this.serverless.cli.log(remote
+            ? `Plugin ${repoName} is up to date at ${local.slice(0, 7)}`
+            : `Could not reach ${gitUrl}, using the existing checkout of ${repoName}`);
+        } else {
+          // Remove existing plugin directory if it exists
+          if (fs.existsSync(modulePath)) {
+            fs.rmSync(modulePath, { recursive: true });
+          }
+
+          // Clone the plugin
+          execSync(`git clone ${gitUrl} ${modulePath}`);
+        }
 
         // Create __init__.py files in plugin's functions directory
         const pluginFunctionsDir = path.join(modulePath, 'functions');
@@ -80,6 +140,11 @@ class ServerlessDynamicFunctions {
 
     this.serverless.cli.log(`Found ${directories.length} function directories`);
 
+    // Dependencies of every function, grouped into images once all functions are known
+    const imageEntries = [];
+    // Functions served by a shared router Lambda, by group (see deploy/router.js)
+    const routerGroups = {};
+
     directories.forEach(dir => {
       const dirName = dir.name;
       const normalizedName = this.normalizeFunctionName(dirName);
@@ -96,7 +161,25 @@ class ServerlessDynamicFunctions {
       const fullName = `${this.serverless.service.service}-${this.serverless.service.provider.stage}-${functionName}`;
       const truncatedName = this.truncateName(fullName);
 
-      // Use base image for public functions
+      // Resources come from the function's function.yml (see tools/power_tuning.py)
+      const functionConfig = loadFunctionConfig(path.join(libDir, dirName));
+
+      const group = routerGroup(functionConfig.router);
+      if (group && !ROUTABLE_NAME.test(dirName)) {
+        this.serverless.cli.log(`Warning: ${dirName} can't be routed (alias names allow letters, digits, - and _), deploying it on its own`);
+      } else if (group) {
+        const routes = routerGroups[group] = routerGroups[group] || [];
+        routes.push({ dirName, functionConfig, requirements: functionRequirements(path.join(libDir, dirName)) });
+        return;
+      }
+
+      imageEntries.push({
+        name: functionName,
+        module: `functions.lib.${dirName}.handler`,
+        requirements: functionRequirements(path.join(libDir, dirName))
+      });
+
+      // Use base image for public functions unless they declare dependencies
       this.serverless.service.functions[functionName] = {
         name: truncatedName,
         logicalId: functionName,
@@ -104,13 +187,13 @@ class ServerlessDynamicFunctions {
           name: 'baseimage',
           command: [`functions/lib/${dirName}/handler.handler`]
         },
-        timeout: 900,
-        memorySize: 256,
+        timeout: functionConfig.timeout,
+        memorySize: functionConfig.memorySize,
         environment: {
           API_USAGE_TABLE: "${self:service}-api-usage-${self:provider.stage}",
           POWERTOOLS_SERVICE_NAME: "${self:service}",
-          LOG_LEVEL: "INFO",
-          DEPLOYMENT_REGION: "${self:provider.region}"
+          DEPLOYMENT_REGION: "${self:provider.region}",
+          ...loggingEnvironment(functionConfig.logging)
         },
         events: [{
           httpApi: {
@@ -124,6 +207,10 @@ class ServerlessDynamicFunctions {
       };
     });
 
+    Object.entries(routerGroups).forEach(([group, routes]) => {
+      imageEntries.push(this.addRouterFunction(group, routes));
+    });
+
     // Handle plugin functions with heavy image
     const plugins = this.serverless.service.custom?.plugins?.packages || [];
     plugins.forEach(pluginPath => {
@@ -148,8 +235,21 @@ class ServerlessDynamicFunctions {
 
                 // Create new config without handler property
                 const { handler, ...configWithoutHandler } = config;
+                const functionDir = path.join(modulePath, path.dirname(handler));
+                const functionConfig = loadFunctionConfig(
+                  functionDir,
+                  { timeout: config.timeout || 900, memorySize: config.memorySize || 1024 }
+                );
+
+                // Functions that declare nothing need their plugin's requirements, not every plugin's
+                imageEntries.push({
+                  name: functionName,
+                  module: handler.replace(/\.[^.]+$/, '').replace(/\//g, '.'),
+                  requirements: functionRequirements(functionDir, readRequirementsFile(path.join(modulePath, 'requirements.txt'))),
+                  plugin: true
+                });
 
-                // Use heavy image for plugin functions
+                // Image is assigned by assignImages (heavy image in legacy mode)
                 this.serverless.service.functions[functionName] = {
                     ...configWithoutHandler,
                     name: truncatedName,
@@ -158,16 +258,16 @@ class ServerlessDynamicFunctions {
                         name: 'heavyimage',
                         command: [handler]  // Use the handler value here
                     },
-                    timeout: 900,
-                    memorySize: 1024,
+                    timeout: functionConfig.timeout,
+                    memorySize: functionConfig.memorySize,
                     environment: {
                         ...(config.environment || {}),
                         // Updated PYTHONPATH for container environment
                         PYTHONPATH: '/var/task:/var/task/.plugins/${repoName}',
                         API_USAGE_TABLE: "${self:service}-api-usage-${self:provider.stage}",
                         POWERTOOLS_SERVICE_NAME: "${self:service}",
-                        LOG_LEVEL: "INFO",
-                        DEPLOYMENT_REGION: "${self:provider.region}"
+                        DEPLOYMENT_REGION: "${self:provider.region}",
+                        ...loggingEnvironment(functionConfig.logging)
                     }
                 };
             });
@@ -177,8 +277,106 @@ class ServerlessDynamicFunctions {
     }
 });
 
+    this.assignImages(imageEntries);
+
     this.serverless.cli.log(`Total functions added: ${Object.keys(this.serverless.service.functions).length}`);
   }
+
+  /**
+   * One Lambda serving the HTTP routes of every function of a group, with the largest timeout
+   * and memory any of them asks for. Flows and the warmer reach each function through an alias
+   * of the router created by generate-step-functions.js. Returns the router's image entry,
+   * which needs the dependencies of all its functions.
+   */
+  addRouterFunction(group, routes) {
+    const functionName = routerFunctionName(group);
+    const fullName = `${this.serverless.service.service}-${this.serverless.service.provider.stage}-${functionName}`;
+    this.serverless.cli.log(`Adding router ${functionName} for ${routes.map(route => route.dirName).join(', ')}`);
+
+    this.serverless.service.functions[functionName] = {
+      name: this.truncateName(fullName),
+      logicalId: functionName,
+      image: {
+        name: 'baseimage',
+        command: [ROUTER_HANDLER]
+      },
+      timeout: Math.max(...routes.map(route => route.functionConfig.timeout)),
+      memorySize: Math.max(...routes.map(route => route.functionConfig.memorySize)),
+      // One environment for the group, so its functions log with the custom.logging defaults
+      environment: {
+        API_USAGE_TABLE: "${self:service}-api-usage-${self:provider.stage}",
+        POWERTOOLS_SERVICE_NAME: "${self:service}",
+        DEPLOYMENT_REGION: "${self:provider.region}"
+      },
+      events: routes.map(route => ({
+        httpApi: {
+          path: `/lib/${route.dirName}`,
+          method: 'POST',
+          authorizer: {
+            name: 'cognitoAuthorizer'
+          }
+        }
+      }))
+    };
+
+    const requirements = [...new Set(routes.flatMap(route => route.requirements))].sort();
+    return { name: functionName, module: ROUTER_MODULE, requirements };
+  }
+
+  assignImages(entries) {
+    const containers = this.serverless.service.custom?.containers || {};
+    const maxImages = containers.maxImages ?? DEFAULT_MAX_IMAGES;
+    const functions = this.serverless.service.functions;
+
+    if (maxImages === 0) {
+      // Legacy layout: everything with dependencies (and every plugin function) shares the heavy image
+      entries.forEach(({ name, requirements, plugin }) => {
+        functions[name].image.name = plugin || requirements.length ? 'heavyimage' : 'baseimage';
+      });
+      this.imagePlan = { images: {}, assignments: {}, modules: {} };
+      if (!this.planning) writePlan(this.serverless.config.servicePath, this.imagePlan);
+      return;
+    }
+
+    const plan = clusterFunctions(entries, maxImages, containers.packageWeights || {});
+    plan.pluginFunctions = entries.filter(entry => entry.plugin).map(entry => entry.name);
+    plan.modules = Object.fromEntries(entries.map(entry => [entry.name, entry.module]));
+
+    const ecrImages = this.serverless.service.provider.ecr.images;
+    Object.entries(plan.images).forEach(([imageName, image]) => {
+      ecrImages[imageName] = { path: './', file: `Dockerfile.${imageName}` };
+      this.serverless.cli.log(`Image ${imageName}: ${image.requirements.length} packages for ${image.functions.join(', ')}`);
+    });
+    Object.entries(plan.assignments).forEach(([name, imageName]) => {
+      functions[name].image.name = imageName;
+    });
+
+    // Read by setup-containers.js to write the Dockerfiles and by tools/image_report.py
+    this.imagePlan = plan;
+    if (!this.planning) writePlan(this.serverless.config.servicePath, plan);
+  }
+
+  printPlan() {
+    const servicePath = this.serverless.config.servicePath;
+    const provider = this.serverless.getProvider('aws');
+    const containers = this.serverless.service.custom?.containers || {};
+
+    // Resolve functions and images in memory only, nothing is cloned or written
+    const remotes = {};
+    (this.serverless.service.custom?.plugins?.packages || [])
+      .filter(pluginPath => pluginPath.startsWith('git+'))
+      .forEach(pluginPath => { remotes[pluginRepoName(pluginPath)] = remoteHead(pluginPath.replace('git+', '')); });
+    this.planning = true;
+    this.addDynamicFunctions();
+
+    const images = imageOptions(this.serverless.service.functions, this.imagePlan || readPlan(servicePath),
+      containers.lockRequirements !== false);
+    const manifest = readManifest(servicePath, provider.getStage(), provider.getRegion());
+    if (!manifest) {
+      this.serverless.cli.log(`No previous deploy recorded for ${provider.getStage()} in ${provider.getRegion()}, everything will be built`);
+    }
+    console.log(formatPlan(buildPlan(manifest, snapshot(servicePath), images, remotes)));
+  }
 }
 
 module.exports = ServerlessDynamicFunctions;
\ No newline at end of file
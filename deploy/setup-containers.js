@@ -3,6 +3,18 @@ const fs = require('fs');
 const path = require('path');
 const { execSync } = require('child_process');
 const AWS = require('aws-sdk');
+const { readPlan } = require('./image-groups');
+const {
+  changedInputs, imageInputs, imageOptions, readManifest, snapshot, writeManifest
+} = require('./deploy-manifest');
+
+const SITE_PACKAGES = '/var/lang/lib/python3.9/site-packages';
+
+// Drop files never imported at runtime and byte-compile what is left, so cold starts
+// neither pull test suites/docs from the image nor compile modules on the read-only filesystem
+const SLIM_SITE_PACKAGES = `( find ${SITE_PACKAGES} -depth -type d \\( -name tests -o -name docs -o -name doc -o -name examples \\) -exec rm -rf {} + ; \\
+    find ${SITE_PACKAGES} -type f \\( -name '*.pyi' -o -name '*.md' -o -name '*.rst' \\) -delete ; \\
+    python -m compileall -q -j 0 ${SITE_PACKAGES} > /dev/null ; true )`;
 
 class ContainerSetup {
  constructor(serverless) {
@@ -11,10 +23,67 @@ class ContainerSetup {
      'before:package:initialize': async () => {
        await this.setupECR();
        await this.setupContainers();
-     }
+       this.reuseImages();
+     },
+     'after:deploy:deploy': () => this.recordDeploy()
    };
  }
 
+ writeIfChanged(filePath, content) {
+   // Unchanged files keep their mtime, so nothing downstream sees them as modified
+   if (!fs.existsSync(filePath) || fs.readFileSync(filePath, 'utf-8') !== content) {
+     fs.writeFileSync(filePath, content);
+   }
+ }
+
+ // Images whose inputs are the same as in the last deploy point at the image that deploy pushed
+ // instead of being rebuilt; see deploy-manifest.js and `serverless plan`
+ reuseImages() {
+   const servicePath = this.serverless.config.servicePath;
+   const provider = this.serverless.getProvider('aws');
+   const manifest = readManifest(servicePath, provider.getStage(), provider.getRegion());
+
+   this.deploySnapshot = snapshot(servicePath);
+   this.deployImages = imageOptions(this.serverless.service.functions, readPlan(servicePath), this.locked);
+
+   const ecrImages = this.serverless.service.provider.ecr.images;
+   Object.entries(this.deployImages).forEach(([name, options]) => {
+     const previous = manifest?.images?.[name];
+     const reasons = changedInputs(previous?.inputs, imageInputs(this.deploySnapshot, name, options));
+     if (previous?.uri && !reasons.length && ecrImages[name]) {
+       ecrImages[name] = { uri: previous.uri };
+       this.serverless.cli.log(`Image ${name} unchanged, reusing ${previous.uri}`);
+     } else if (previous?.uri) {
+       this.serverless.cli.log(`Rebuilding ${name}: ${reasons.slice(0, 5).join(', ')}`);
+     }
+   });
+ }
+
+ recordDeploy() {
+   if (!this.deploySnapshot) return;
+   const servicePath = this.serverless.config.servicePath;
+   const provider = this.serverless.getProvider('aws');
+   const resources = this.serverless.service.provider.compiledCloudFormationTemplate?.Resources || {};
+   const functions = this.serverless.service.functions;
+
+   // The packaged template holds the pushed image (repository@digest) of every function
+   const images = {};
+   Object.entries(this.deployImages).forEach(([name, options]) => {
+     const functionName = Object.keys(functions).find(fn => functions[fn].image?.name === name);
+     const imageUri = resources[provider.naming.getLambdaLogicalId(functionName)]?.Properties?.Code?.ImageUri;
+     images[name] = {
+       inputs: imageInputs(this.deploySnapshot, name, options),
+       uri: typeof imageUri === 'string' ? imageUri : null
+     };
+   });
+
+   writeManifest(servicePath, provider.getStage(), provider.getRegion(), {
+     deployedAt: new Date().toISOString(),
+     snapshot: this.deploySnapshot,
+     images
+   });
+ }
+
  async setupECR() {
    const region = this.serverless.service.provider.region;
    const serviceName = this.serverless.service.service;
@@ -37,7 +106,8 @@ class ContainerSetup {
      }
 
      // Create repositories if they don't exist
-     const repositories = ['baseimage', 'heavyimage'];
+     const plan = readPlan(this.serverless.config.servicePath) || { images: {} };
+     const repositories = ['baseimage', 'heavyimage', ...Object.keys(plan.images)];
      for (const repo of repositories) {
        const repoName = `${serviceName}/${repo}`;
        try {
@@ -64,19 +134,34 @@ class ContainerSetup {
    }
  }
 
+ installStep(name) {
+   if (!this.locked) {
+     return `COPY layer/${name}.txt .
+RUN pip install --no-cache-dir -r ${name}.txt \\
+ && ${SLIM_SITE_PACKAGES}`;
+   }
+   // Locked wheels are bind-mounted from the build context so they never end up in a layer
+   return `COPY layer/${name}.lock .
+RUN --mount=type=bind,source=layer/wheels,target=/tmp/wheels \\
+    pip install --no-cache-dir --require-hashes --find-links /tmp/wheels -r ${name}.lock \\
+ && ${SLIM_SITE_PACKAGES}`;
+ }
+
  async setupContainers() {
+   // Pin every image to a resolved, hashed requirements set unless disabled
+   this.locked = this.serverless.service.custom?.containers?.lockRequirements !== false;
+
    // Create base Dockerfile with minimal dependencies
    const baseDockerfile = `FROM public.ecr.aws/lambda/python:3.9
 
 # Install core dependencies
-COPY layer/requirements-base.txt .
-RUN pip install -r requirements-base.txt
+${this.installStep('requirements-base')}
 
 # Copy function code
 COPY functions/ ./functions/
 
 # Create necessary __init__.py files
-RUN find functions -type d -exec touch {}/__init__.py \\;
+RUN find functions -type d -exec touch {}/__init__.py \\; && python -m compileall -q functions
 
 CMD ["handler.handler"]`;
 
@@ -84,8 +169,7 @@ CMD ["handler.handler"]`;
    const heavyDockerfile = `FROM public.ecr.aws/lambda/python:3.9
 
 # Copy and install all requirements
-COPY layer/requirements.txt .
-RUN pip install -r requirements.txt
+${this.installStep('requirements')}
 
 # Copy function code and plugins
 COPY functions/ ./functions/
@@ -104,19 +188,115 @@ RUN for plugin in .plugins/*; do \\
 CMD ["handler.handler"]`;
 
    // Write Dockerfiles
-   fs.writeFileSync('Dockerfile.base', baseDockerfile);
-   fs.writeFileSync('Dockerfile.heavy', heavyDockerfile);
+   this.writeIfChanged('Dockerfile.base', baseDockerfile);
+   this.writeIfChanged('Dockerfile.heavy', heavyDockerfile);
 
    // Create requirements-base.txt with minimal dependencies
    const baseRequirements = `aws-lambda-powertools
-boto3`;
+boto3
+cryptography
+fastjsonschema`;
 
    const layerPath = path.join(this.serverless.config.servicePath, 'layer');
    fs.mkdirSync(layerPath, { recursive: true });
-   fs.writeFileSync(path.join(layerPath, 'requirements-base.txt'), baseRequirements);
+   this.writeIfChanged(path.join(layerPath, 'requirements-base.txt'), baseRequirements);
+
+   if (this.locked) {
+     // Wheels are copied from the local wheelhouse on every deploy, drop the ones no lock needs anymore
+     fs.rmSync(path.join(layerPath, 'wheels'), { recursive: true, force: true });
+     this.lockRequirements('requirements-base', { base: 'layer/requirements-base.txt' });
+     this.lockRequirements('requirements', {
+       base: 'layer/requirements-base.txt',
+       main: 'layer/requirements.txt',
+       ...this.pluginRequirementSources()
+     });
+   } else {
+     // Merge plugin requirements
+     await this.mergeRequirements();
+   }
+
+   // One image per dependency group (see image-groups.js)
+   this.writeGroupImages(layerPath);
+ }
+
+ pluginRequirementSources() {
+   const sources = {};
+   const plugins = this.serverless.service.custom?.plugins?.packages || [];
+   plugins.filter(pluginPath => pluginPath.startsWith('git+')).forEach(pluginPath => {
+     const repoName = pluginPath.split('/').pop().replace('.git', '');
+     sources[`plugin:${repoName}`] = path.join('.plugins', repoName, 'requirements.txt');
+   });
+   return sources;
+ }
 
-   // Merge plugin requirements
-   await this.mergeRequirements();
+ // Resolve the sources into layer/<name>.lock with tools/lock_requirements.py; the resolution is
+ // cached by its inputs, so this only runs pip when a requirements file changed
+ lockRequirements(name, sources) {
+   const python = this.serverless.service.custom?.containers?.python || 'python3';
+   const args = Object.entries(sources)
+     .map(([source, filePath]) => `--source ${JSON.stringify(`${source}=${filePath}`)}`)
+     .join(' ');
+
+   try {
+     execSync(`${python} -m tools.lock_requirements ${args} --output layer/${name}.lock --wheels layer/wheels`, {
+       cwd: this.serverless.config.servicePath,
+       stdio: 'inherit'
+     });
+   } catch (error) {
+     throw new Error(`Could not lock ${name}.txt, see the output above`);
+   }
+ }
+
+ groupDockerfile(imageName, withPlugins) {
+   // The base requirements layer comes first and is identical in every image,
+   // so Docker builds it once and every group only adds its own packages on top
+   const pluginSteps = withPlugins ? `COPY .plugins/ ./.plugins/
+
+# Create necessary __init__.py files
+RUN find functions .plugins -type d -exec touch {}/__init__.py \\;
+
+# Create symlinks for plugin functions
+RUN for plugin in .plugins/*; do \\
+      if [ -d "$plugin/functions/lib" ]; then \\
+        cp -r $plugin/functions/lib/* functions/lib/; \\
+      fi \\
+    done` : `# Create necessary __init__.py files
+RUN find functions -type d -exec touch {}/__init__.py \\;`;
+
+   return `FROM public.ecr.aws/lambda/python:3.9
+
+# Shared layer: core dependencies
+${this.installStep('requirements-base')}
+
+# Dependencies of this image's functions
+${this.installStep(`requirements-${imageName}`)}
+
+# Copy function code and plugins
+COPY functions/ ./functions/
+${pluginSteps}
+
+RUN python -m compileall -q functions
+
+CMD ["handler.handler"]`;
+ }
+
+ writeGroupImages(layerPath) {
+   const plan = readPlan(this.serverless.config.servicePath);
+   if (!plan) return;
+
+   const pluginFunctions = new Set(plan.pluginFunctions || []);
+   Object.entries(plan.images).forEach(([imageName, image]) => {
+     this.writeIfChanged(path.join(layerPath, `requirements-${imageName}.txt`), image.requirements.join('\n'));
+     if (this.locked) {
+       this.lockRequirements(`requirements-${imageName}`, {
+         base: 'layer/requirements-base.txt',
+         [imageName]: `layer/requirements-${imageName}.txt`
+       });
+     }
+     const withPlugins = image.functions.some(fn => pluginFunctions.has(fn));
+     this.writeIfChanged(`Dockerfile.${imageName}`, this.groupDockerfile(imageName, withPlugins));
+     this.serverless.cli.log(`Wrote Dockerfile.${imageName} (${image.functions.length} functions)`);
+   });
  }
 
  async mergeRequirements() {
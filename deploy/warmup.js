@@ -0,0 +1,88 @@
+// deploy/warmup.js
+
+// `warmup: true` in a function.yml or flow file, or a mapping overriding these
+const DEFAULT_WARMUP = {
+  schedule: 'rate(5 minutes)',
+  concurrency: 1
+};
+
+function warmupSettings(value) {
+  if (!value) return null;
+  const settings = value === true ? { ...DEFAULT_WARMUP } : { ...DEFAULT_WARMUP, ...value };
+  return settings.enabled === false ? null : settings;
+}
+
+// ${<name>Arn} variables used by the states a machine starts with, following Parallel branches and Map iterators
+function entryVariables(machine) {
+  const state = machine?.States?.[machine?.StartAt];
+  if (!state) return [];
+  const names = [...JSON.stringify({ Resource: state.Resource, Parameters: state.Parameters })
+    .matchAll(/\$\{(\w+)Arn\}/g)].map(match => match[1]);
+  (state.Branches || []).forEach(branch => names.push(...entryVariables(branch)));
+  ['Iterator', 'ItemProcessor'].forEach(key => { if (state[key]) names.push(...entryVariables(state[key])); });
+  return names;
+}
+
+// `functions` entries of a flow to keep warm: the ones listed in warmup.functions, else those of its first states
+function warmupFunctions(flowContent, settings) {
+  const wanted = new Set(settings.functions || entryVariables(flowContent.definition));
+  return (flowContent.functions || []).filter(func => wanted.has(func.name));
+}
+
+// Schedule expression -> part of a logical id: rate(5 minutes) -> Rate5Minutes
+function scheduleId(schedule) {
+  return schedule
+    .split(/[^a-zA-Z0-9]+/)
+    .filter(Boolean)
+    .map(part => part.charAt(0).toUpperCase() + part.slice(1))
+    .join('');
+}
+
+/**
+ * One rule per schedule invoking the warmer with every function to keep warm on it.
+ * `targets` are { logicalId, schedule, concurrency } (a function listed several times
+ * keeps the highest concurrency).
+ */
+function addWarmupResources(resources, targets) {
+  const schedules = {};
+  targets.forEach(({ logicalId, schedule, concurrency }) => {
+    const functions = schedules[schedule] = schedules[schedule] || {};
+    functions[logicalId] = Math.max(functions[logicalId] || 0, concurrency);
+  });
+
+  Object.keys(schedules).sort().forEach(schedule => {
+    const id = `Warmup${scheduleId(schedule)}`;
+    const input = {
+      targets: Object.keys(schedules[schedule]).sort().map(logicalId => ({
+        function: `\${${logicalId}}`,
+        concurrency: schedules[schedule][logicalId]
+      }))
+    };
+
+    resources[`${id}Rule`] = {
+      Type: 'AWS::Events::Rule',
+      Properties: {
+        Description: `Keeps ${input.targets.length} function(s) warm, ${schedule}`,
+        ScheduleExpression: schedule,
+        State: 'ENABLED',
+        Targets: [{
+          Id: `${id}Target`,
+          Arn: { 'Fn::GetAtt': ['WarmerLambdaFunction', 'Arn'] },
+          // Ref of a function is its name, which the warmer invokes
+          Input: { 'Fn::Sub': JSON.stringify(input) }
+        }]
+      }
+    };
+    resources[`${id}Permission`] = {
+      Type: 'AWS::Lambda::Permission',
+      Properties: {
+        Action: 'lambda:InvokeFunction',
+        FunctionName: { 'Fn::GetAtt': ['WarmerLambdaFunction', 'Arn'] },
+        Principal: 'events.amazonaws.com',
+        SourceArn: { 'Fn::GetAtt': [`${id}Rule`, 'Arn'] }
+      }
+    };
+  });
+}
+
+module.exports = { DEFAULT_WARMUP, addWarmupResources, entryVariables, warmupFunctions, warmupSettings };
@@ -0,0 +1,63 @@
+// deploy/watchdog.js
+
+// Flow file keys: a hard deadline for each execution and a cap on its state transitions
+const BUDGET_KEYS = ['maxDurationSeconds', 'maxStateTransitions'];
+const WATCHDOG_SCHEDULE = 'rate(5 minutes)';
+
+function flowBudget(flowContent) {
+  const budget = {};
+  BUDGET_KEYS.forEach(key => {
+    if (flowContent[key]) budget[key] = Number(flowContent[key]);
+  });
+  return Object.keys(budget).length ? budget : null;
+}
+
+// TimeoutSeconds of the state machine, keeping a shorter one already in the definition
+function withTimeout(definition, maxDurationSeconds) {
+  if (!maxDurationSeconds) return definition;
+  const timeout = definition.TimeoutSeconds
+    ? Math.min(definition.TimeoutSeconds, maxDurationSeconds)
+    : maxDurationSeconds;
+  return { ...definition, TimeoutSeconds: timeout };
+}
+
+/**
+ * Scheduled rule invoking the watchdog with the budget of every flow declaring one.
+ * `budgets` are { flow, maxDurationSeconds, maxStateTransitions }.
+ */
+function addWatchdogResources(resources, budgets, schedule = WATCHDOG_SCHEDULE) {
+  if (!budgets.length) return;
+  const input = {
+    flows: [...budgets].sort((a, b) => a.flow.localeCompare(b.flow)).map(({ flow, ...budget }) => ({
+      flow,
+      stateMachineArn: `\${${flow}StateMachine}`,
+      ...budget
+    }))
+  };
+
+  resources.WatchdogRule = {
+    Type: 'AWS::Events::Rule',
+    Properties: {
+      Description: `Stops executions of ${budgets.length} flow(s) running over budget, ${schedule}`,
+      ScheduleExpression: schedule,
+      State: 'ENABLED',
+      Targets: [{
+        Id: 'WatchdogTarget',
+        Arn: { 'Fn::GetAtt': ['WatchdogLambdaFunction', 'Arn'] },
+        // Ref of a state machine is its ARN
+        Input: { 'Fn::Sub': JSON.stringify(input) }
+      }]
+    }
+  };
+  resources.WatchdogPermission = {
+    Type: 'AWS::Lambda::Permission',
+    Properties: {
+      Action: 'lambda:InvokeFunction',
+      FunctionName: { 'Fn::GetAtt': ['WatchdogLambdaFunction', 'Arn'] },
+      Principal: 'events.amazonaws.com',
+      SourceArn: { 'Fn::GetAtt': ['WatchdogRule', 'Arn'] }
+    }
+  };
+}
+
+module.exports = { BUDGET_KEYS, WATCHDOG_SCHEDULE, addWatchdogResources, flowBudget, withTimeout };
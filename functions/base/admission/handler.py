@@ -0,0 +1,289 @@
+# functions/base/admission/handler.py
+"""
+Queued admission for POST /run/{flow_name}: with ADMISSION_MODE=queued, run_flow stores a
+ticket and queues the request instead of calling StartExecution, so bursts don't hit the
+Step Functions start throttles or the Lambda concurrency limits. The dispatcher, invoked
+by the queue as requests arrive and every minute as a sweeper, starts the queued executions at ADMISSION_LIMITS' ratePerSecond, keeps each flow under its
+maxConcurrent running executions and takes users in turn, so one user's burst can't hold
+back the others: the queue is FIFO with a message group per user, and SQS doesn't deliver
+more of a group while some of it is in flight, so every buffer holds at most a batch of each
+user's requests however many they queued. GET /run/{flow_name}/{ticket} resolves a ticket to its execution.
+"""
+import os
+import json
+import time
+import uuid
+import boto3
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from botocore.exceptions import ClientError
+from aws_lambda_powertools import Logger
+
+from functions.base.run_flow.names import execution_name
+
+logger = Logger()
+
+QUEUED, STARTED, FAILED = 'QUEUED', 'STARTED', 'FAILED'
+TICKET_TTL_SECONDS = 7 * 24 * 60 * 60
+
+DEFAULT_LIMITS = {'ratePerSecond': 10, 'maxConcurrent': 200}
+# Messages buffered per dispatch round, so users can be taken in turn (at most a receive batch per user)
+BUFFER_SIZE = 100
+# Stop this long before the dispatcher's timeout
+TIME_MARGIN_MS = 5000
+# Requests the queue delivered that can't start yet come back after this long, not in a busy loop
+DEFER_SECONDS = 10
+# Start errors meaning "not now": the request stays queued
+RETRY_LATER_ERRORS = {'ThrottlingException', 'ExecutionLimitExceeded', 'TooManyRequestsException'}
+
+
+def get_table():
+    """Lazy initialization of the tickets table"""
+    if not hasattr(get_table, 'table'):
+        get_table.table = boto3.resource('dynamodb').Table(os.environ['ADMISSION_TABLE'])
+    return get_table.table
+
+
+def get_queue():
+    if not hasattr(get_queue, 'client'):
+        get_queue.client = boto3.client('sqs')
+    return get_queue.client
+
+
+def get_sfn():
+    if not hasattr(get_sfn, 'client'):
+        get_sfn.client = boto3.client('stepfunctions')
+    return get_sfn.client
+
+
+def admission_mode() -> str:
+    """'queued' queues POST /run requests, anything else starts them directly"""
+    return os.environ.get('ADMISSION_MODE', 'direct').lower()
+
+
+def load_limits() -> Dict[str, Any]:
+    """
+    ADMISSION_LIMITS (JSON), cached per container:
+    {"ratePerSecond": 10, "maxConcurrent": 200, "flows": {"<flow>": {"maxConcurrent": 5}}}
+    """
+    raw = os.environ.get('ADMISSION_LIMITS', '')
+    if getattr(load_limits, 'raw', None) != raw:
+        load_limits.raw = raw
+        load_limits.limits = {**DEFAULT_LIMITS, **(json.loads(raw) if raw else {})}
+    return load_limits.limits
+
+
+def flow_concurrency(limits: Dict[str, Any], flow_name: str) -> int:
+    return int(limits.get('flows', {}).get(flow_name, {}).get('maxConcurrent', limits['maxConcurrent']))
+
+
+def enqueue(flow_name: str, state_machine_arn: str, user_id: str, execution_input: Dict[str, Any]) -> Dict[str, Any]:
+    """Store a QUEUED ticket and queue the request, returning the ticket"""
+    now = int(time.time())
+    ticket = {
+        'ticketId': uuid.uuid4().hex,
+        'flow': flow_name,
+        'userId': user_id,
+        'status': QUEUED,
+        'createdAt': now,
+        'ttl': now + TICKET_TTL_SECONDS
+    }
+    get_table().put_item(Item=ticket)
+    get_queue().send_message(
+        QueueUrl=os.environ['ADMISSION_QUEUE_URL'],
+        # A group per user: a user's backlog only holds back that user's next requests
+        MessageGroupId=user_id,
+        MessageDeduplicationId=ticket['ticketId'],
+        MessageBody=json.dumps({
+            'ticketId': ticket['ticketId'],
+            'flow': flow_name,
+            'stateMachineArn': state_machine_arn,
+            'userId': user_id,
+            'input': execution_input
+        })
+    )
+    return ticket
+
+
+def get_ticket(ticket_id: str) -> Optional[Dict[str, Any]]:
+    """The ticket, or None (also when admission isn't deployed)"""
+    if not os.environ.get('ADMISSION_TABLE') and not hasattr(get_table, 'table'):
+        return None
+    return get_table().get_item(Key={'ticketId': ticket_id}).get('Item')
+
+
+def _resolve(ticket_id: str, status: str, **attributes) -> None:
+    names = {'#status': 'status'}
+    values = {':status': status}
+    sets = ['#status = :status']
+    for i, (name, value) in enumerate(attributes.items()):
+        names[f"#a{i}"] = name
+        values[f":a{i}"] = value
+        sets.append(f"#a{i} = :a{i}")
+    get_table().update_item(Key={'ticketId': ticket_id}, UpdateExpression=f"SET {', '.join(sets)}",
+                            ExpressionAttributeNames=names, ExpressionAttributeValues=values)
+
+
+def fair_order(requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Round robin over users, each user's requests in arrival order"""
+    by_user: Dict[str, List[Dict]] = OrderedDict()
+    for request in requests:
+        by_user.setdefault(request['userId'], []).append(request)
+    ordered = []
+    while by_user:
+        for user_id in list(by_user):
+            ordered.append(by_user[user_id].pop(0))
+            if not by_user[user_id]:
+                del by_user[user_id]
+    return ordered
+
+
+def running_count(state_machine_arn: str, cap: int) -> int:
+    """RUNNING executions of a state machine, counted no further than `cap`"""
+    count = 0
+    pages = get_sfn().get_paginator('list_executions').paginate(stateMachineArn=state_machine_arn,
+                                                                  statusFilter='RUNNING')
+    for page in pages:
+        count += len(page['executions'])
+        if count >= cap:
+            break
+    return count
+
+
+def receive(queue_url: str, limit: int = BUFFER_SIZE) -> List[Dict[str, Any]]:
+    """Up to `limit` queued requests, each with its receipt handle"""
+    requests = []
+    while len(requests) < limit:
+        response = get_queue().receive_message(QueueUrl=queue_url, MaxNumberOfMessages=min(10, limit - len(requests)),
+                                               WaitTimeSeconds=0 if requests else 1)
+        messages = response.get('Messages', [])
+        if not messages:
+            break
+        for message in messages:
+            requests.append({**json.loads(message['Body']), 'receiptHandle': message['ReceiptHandle']})
+    return requests
+
+
+def _release(queue_url: str, requests: List[Dict[str, Any]], delay: int = 0) -> None:
+    """Make requests that weren't started visible again, for the next round or after `delay` seconds"""
+    for i in range(0, len(requests), 10):
+        get_queue().change_message_visibility_batch(QueueUrl=queue_url, Entries=[
+            {'Id': str(j), 'ReceiptHandle': request['receiptHandle'], 'VisibilityTimeout': delay}
+            for j, request in enumerate(requests[i:i + 10])
+        ])
+
+
+def start(request: Dict[str, Any]) -> str:
+    """Start the execution of a request: STARTED, FAILED (ticket resolved) or RETRY"""
+    # Named after the ticket, so a redelivered request starts nothing new, and after its owner for list_runs
+    name = execution_name(request['userId'], request['ticketId'])
+    try:
+        response = get_sfn().start_execution(stateMachineArn=request['stateMachineArn'], name=name,
+                                             input=json.dumps(request['input']))
+        _resolve(request['ticketId'], STARTED, executionArn=response['executionArn'], startedAt=int(time.time()))
+        return STARTED
+    except ClientError as e:
+        code = e.response['Error']['Code']
+        if code in RETRY_LATER_ERRORS:
+            return 'RETRY'
+        if code == 'ExecutionAlreadyExists':
+            arn = request['stateMachineArn'].replace(':stateMachine:', ':execution:') + f":{name}"
+            _resolve(request['ticketId'], STARTED, executionArn=arn, startedAt=int(time.time()))
+            return STARTED
+        error = 'Flow not found' if code == 'StateMachineDoesNotExist' else code
+        _resolve(request['ticketId'], FAILED, error=error)
+        return FAILED
+
+
+def start_requests(requests: List[Dict[str, Any]], limits: Dict[str, Any], deadline: float) -> tuple:
+    """Start what the limits allow from a buffer of requests: counts, the requests done and those deferred"""
+    interval = 1 / float(limits['ratePerSecond'])
+    running: Dict[str, int] = {}
+    counts = {STARTED: 0, FAILED: 0, 'deferred': 0, 'throttled': 0}
+    done, deferred = [], []
+    next_start = time.monotonic()
+
+    for request in fair_order(requests):
+        arn, flow = request['stateMachineArn'], request['flow']
+        cap = flow_concurrency(limits, flow)
+        if flow not in running:
+            running[flow] = running_count(arn, cap)
+        if running[flow] >= cap or time.monotonic() + interval > deadline:
+            deferred.append(request)
+            continue
+
+        wait = next_start - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        next_start = max(next_start, time.monotonic()) + interval
+
+        outcome = start(request)
+        if outcome == 'RETRY':
+            # Step Functions is throttling: leave the rest for the next round
+            deferred.append(request)
+            counts['throttled'] = 1
+            deadline = 0
+            continue
+        counts[outcome] += 1
+        running[flow] += 1 if outcome == STARTED else 0
+        done.append(request)
+
+    counts['deferred'] = len(deferred)
+    return counts, done, deferred
+
+
+def dispatch_round(queue_url: str, limits: Dict[str, Any], deadline: float) -> Dict[str, int]:
+    """Start what the limits allow from one buffer of queued requests"""
+    requests = receive(queue_url)
+    if not requests:
+        return {}
+
+    counts, done, deferred = start_requests(requests, limits, deadline)
+    for i in range(0, len(done), 10):
+        get_queue().delete_message_batch(QueueUrl=queue_url, Entries=[
+            {'Id': str(j), 'ReceiptHandle': request['receiptHandle']} for j, request in enumerate(done[i:i + 10])
+        ])
+    if deferred:
+        _release(queue_url, deferred)
+    return counts
+
+
+def admit(records: List[Dict[str, Any]], limits: Dict[str, Any], deadline: float) -> Dict[str, Any]:
+    """
+    Start the requests the queue delivered. Lambda deletes the messages of the ones done, the
+    deferred ones are reported as failures and come back after DEFER_SECONDS
+    """
+    requests = [{**json.loads(record['body']), 'receiptHandle': record['receiptHandle'],
+                 'messageId': record['messageId']} for record in records]
+    counts, _, deferred = start_requests(requests, limits, deadline)
+    if deferred:
+        _release(os.environ['ADMISSION_QUEUE_URL'], deferred, DEFER_SECONDS)
+    logger.info(f"Admitted: {counts[STARTED]} started, {counts[FAILED]} failed, {counts['deferred']} deferred")
+    return {'batchItemFailures': [{'itemIdentifier': request['messageId']} for request in deferred]}
+
+
+def dispatch(event, context):
+    """
+    Start queued executions. Invoked by the queue with the requests it delivers, or scheduled:
+    then until the queue is empty, everything is capped or time is up
+    """
+    queue_url = os.environ['ADMISSION_QUEUE_URL']
+    limits = load_limits()
+    remaining_ms = context.get_remaining_time_in_millis() if context else 60000
+    deadline = time.monotonic() + (remaining_ms - TIME_MARGIN_MS) / 1000
+    if event.get('Records'):
+        return admit(event['Records'], limits, deadline)
+
+    totals = {STARTED: 0, FAILED: 0, 'deferred': 0}
+    while time.monotonic() < deadline:
+        counts = dispatch_round(queue_url, limits, deadline)
+        totals[STARTED] += counts.get(STARTED, 0)
+        totals[FAILED] += counts.get(FAILED, 0)
+        # Requests released by an earlier round are received again, only the last round's are left
+        totals['deferred'] = counts.get('deferred', 0)
+        # Nothing left, nothing more can start or Step Functions is throttling: wait for the next run
+        if not counts or not counts[STARTED] + counts[FAILED] or counts['throttled']:
+            break
+
+    logger.info(f"Dispatched: {totals[STARTED]} started, {totals[FAILED]} failed, {totals['deferred']} left queued")
+    return {'started': totals[STARTED], 'failed': totals[FAILED], 'deferred': totals['deferred']}
@@ -0,0 +1,174 @@
+# functions/base/admission/local.py
+"""
+In-memory stand-ins for the admission queue, the tickets table and Step Functions, so queued
+admission can be exercised without AWS:
+
+    admission = LocalAdmission().install()
+    ticket = handler.enqueue('helloWorldFlow', arn, 'user-1', {'__user_id': 'user-1'})
+    admission.deliver()      # or admission.dispatch(), the scheduled sweep
+    handler.get_ticket(ticket['ticketId'])['status']   # 'STARTED'
+"""
+import re
+import itertools
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from botocore.exceptions import ClientError
+
+from functions.base.admission import handler
+
+
+def _error(code: str, operation: str) -> ClientError:
+    return ClientError({'Error': {'Code': code, 'Message': code}}, operation)
+
+
+class LocalQueue:
+    """
+    The subset of a FIFO SQS queue the dispatcher uses: received messages stay invisible until
+    deleted or released, and a message group with messages in flight delivers nothing more
+    """
+
+    def __init__(self):
+        self.messages: List[Dict[str, Any]] = []
+        self._ids = itertools.count(1)
+
+    def send_message(self, QueueUrl, MessageBody, MessageGroupId=None, MessageDeduplicationId=None):
+        message_id = f"msg-{next(self._ids)}"
+        self.messages.append({'MessageId': message_id, 'Body': MessageBody, 'group': MessageGroupId,
+                              'visible': True})
+        return {'MessageId': message_id}
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, **kwargs):
+        in_flight = {message['group'] for message in self.messages if not message['visible']}
+        received = []
+        for message in self.messages:
+            if len(received) == MaxNumberOfMessages:
+                break
+            if message['visible'] and message['group'] not in in_flight:
+                message['visible'] = False
+                message['ReceiptHandle'] = f"{message['MessageId']}-{next(self._ids)}"
+                received.append({'MessageId': message['MessageId'], 'Body': message['Body'],
+                                 'ReceiptHandle': message['ReceiptHandle']})
+        return {'Messages': received} if received else {}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        handles = {entry['ReceiptHandle'] for entry in Entries}
+        self.messages = [m for m in self.messages if m.get('ReceiptHandle') not in handles]
+        return {'Successful': [{'Id': entry['Id']} for entry in Entries]}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        handles = {entry['ReceiptHandle'] for entry in Entries if entry['VisibilityTimeout'] == 0}
+        for message in self.messages:
+            if message.get('ReceiptHandle') in handles:
+                message['visible'] = True
+        return {'Successful': [{'Id': entry['Id']} for entry in Entries]}
+
+    def expire(self) -> None:
+        """Let the visibility timeouts pass: every message in flight is visible again"""
+        for message in self.messages:
+            message['visible'] = True
+
+    def waiting(self) -> int:
+        return len(self.messages)
+
+
+class LocalTable:
+    """The subset of a DynamoDB Table the tickets use"""
+
+    def __init__(self):
+        self.items: Dict[str, Dict] = {}
+
+    def put_item(self, Item):
+        self.items[Item['ticketId']] = dict(Item)
+
+    def get_item(self, Key):
+        item = self.items.get(Key['ticketId'])
+        return {'Item': dict(item)} if item else {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeNames, ExpressionAttributeValues):
+        item = self.items.setdefault(Key['ticketId'], dict(Key))
+        for name, value in re.findall(r'(#\w+) = (:\w+)', UpdateExpression):
+            item[ExpressionAttributeNames[name]] = ExpressionAttributeValues[value]
+
+
+class _Paginator:
+    def __init__(self, sfn: 'LocalStepFunctions'):
+        self.sfn = sfn
+
+    def paginate(self, stateMachineArn, statusFilter=None, page_size=100):
+        executions = [e for e in self.sfn.executions.values()
+                      if e['stateMachineArn'] == stateMachineArn and statusFilter in (None, e['status'])]
+        for i in range(0, max(len(executions), 1), page_size):
+            yield {'executions': executions[i:i + page_size]}
+
+
+class LocalStepFunctions:
+    """
+    Starts executions of the state machines in `flows` (all RUNNING until finished), raising
+    ThrottlingException for the next `throttle` starts
+    """
+
+    def __init__(self, flows: List[str], region: str = 'eu-west-1', account_id: str = '123456789012'):
+        self.state_machines = {f"arn:aws:states:{region}:{account_id}:stateMachine:{flow}" for flow in flows}
+        self.executions: Dict[str, Dict[str, Any]] = {}
+        self.started: List[str] = []
+        self.throttle = 0
+
+    def get_paginator(self, operation):
+        assert operation == 'list_executions'
+        return _Paginator(self)
+
+    def start_execution(self, stateMachineArn, name, input):
+        if self.throttle:
+            self.throttle -= 1
+            raise _error('ThrottlingException', 'StartExecution')
+        if stateMachineArn not in self.state_machines:
+            raise _error('StateMachineDoesNotExist', 'StartExecution')
+        arn = stateMachineArn.replace(':stateMachine:', ':execution:') + f":{name}"
+        if arn in self.executions:
+            raise _error('ExecutionAlreadyExists', 'StartExecution')
+        self.executions[arn] = {'executionArn': arn, 'stateMachineArn': stateMachineArn, 'name': name,
+                                'status': 'RUNNING', 'input': input}
+        self.started.append(arn)
+        return {'executionArn': arn}
+
+    def finish(self, execution_arn: str, status: str = 'SUCCEEDED') -> None:
+        self.executions[execution_arn]['status'] = status
+
+
+class LocalAdmission:
+    def __init__(self, flows: Optional[List[str]] = None):
+        self.queue = LocalQueue()
+        self.table = LocalTable()
+        self.sfn = LocalStepFunctions(flows or [])
+
+    def install(self) -> 'LocalAdmission':
+        handler.get_queue.client = self.queue
+        handler.get_table.table = self.table
+        handler.get_sfn.client = self.sfn
+        return self
+
+    def uninstall(self) -> None:
+        for getter, attribute in ((handler.get_queue, 'client'), (handler.get_table, 'table'),
+                                  (handler.get_sfn, 'client')):
+            if hasattr(getter, attribute):
+                delattr(getter, attribute)
+
+    def dispatch(self, remaining_ms: int = 60000) -> Dict[str, int]:
+        """One scheduled run of the dispatcher"""
+        return handler.dispatch({}, SimpleNamespace(get_remaining_time_in_millis=lambda: remaining_ms))
+
+    def deliver(self, batch_size: int = 10, remaining_ms: int = 60000) -> Dict[str, Any]:
+        """One invocation by the SQS event source: a batch, and the messages not reported as failed deleted"""
+        messages = self.queue.receive_message(QueueUrl='', MaxNumberOfMessages=batch_size).get('Messages', [])
+        if not messages:
+            return {'batchItemFailures': []}
+        records = [{'messageId': m['MessageId'], 'receiptHandle': m['ReceiptHandle'], 'body': m['Body']}
+                   for m in messages]
+        response = handler.dispatch({'Records': records},
+                                    SimpleNamespace(get_remaining_time_in_millis=lambda: remaining_ms))
+        failed = {failure['itemIdentifier'] for failure in response['batchItemFailures']}
+        self.queue.delete_message_batch(QueueUrl='', Entries=[
+            {'Id': str(i), 'ReceiptHandle': m['ReceiptHandle']}
+            for i, m in enumerate(messages) if m['MessageId'] not in failed])
+        return response
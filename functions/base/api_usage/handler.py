@@ -1,9 +1,14 @@
 # functions/base/api_usage/handler.py
 import os
 import json
+import math
 import boto3
 import time
-from datetime import datetime
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
 from aws_lambda_powertools import Logger, Metrics
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
@@ -11,6 +16,24 @@ logger = Logger()
 metrics = Metrics()
 dynamodb = boto3.resource('dynamodb')
 
+TTL_SECONDS = 90 * 24 * 60 * 60
+
+# How long a user rejected for exceeding the monthly quota is refused without asking DynamoDB
+QUOTA_BLOCK_SECONDS = 60
+# Conditional writes of a call while other containers keep moving the user's bucket
+MAX_ENFORCE_ATTEMPTS = 5
+
+# The monthly item (yearMonth = YYYY-MM) only counts apiCalls, so its size (and the cost of
+# every write to it) stays constant. The breakdown of a day is a separate item under
+# yearMonth = DAY#YYYY-MM-DD, with a flat counter per route and per flow so that a single
+# UpdateItem can ADD every dimension at once (ADD creates missing attributes)
+DAY_PREFIX = 'DAY#'
+ROUTE_PREFIX = 'route#'
+FLOW_PREFIX = 'flow#'
+
+# Key of the event the warmer (functions/base/warmer) sends to keep containers warm
+WARMUP_KEY = '__warmup__'
+
 
 def get_table():
     """Lazy initialization of DynamoDB table connection"""
@@ -24,43 +47,46 @@ def get_table():
     return get_table.table
 
 
-def track_api_call(user_id: str, api_path: str, method: str) -> None:
-    """Track a single API call for a user"""
-    table = get_table()
-    if not table:
-        logger.warning("Usage tracking disabled - skipping API call tracking")
-        return
+def usage_dimensions(api_path: Optional[str], method: Optional[str], flow_name: Optional[str] = None) -> List[str]:
+    """Counter attribute names of the daily item incremented by a single API call"""
+    dimensions = ['apiCalls']
+    if api_path:
+        route = f"{method} {api_path}" if method else api_path
+        dimensions.append(f"{ROUTE_PREFIX}{route}")
+    if flow_name:
+        dimensions.append(f"{FLOW_PREFIX}{flow_name}")
+    return dimensions
 
-    current_date = datetime.utcnow()
-    year_month = current_date.strftime('%Y-%m')
 
-    try:
-        # First, initialize the item if it doesn't exist
-        table.update_item(
-            Key={
-                'userId': user_id,
-                'yearMonth': year_month
-            },
-            UpdateExpression='SET apiCalls = if_not_exists(apiCalls, :zero), #ttl = :ttl',
-            ExpressionAttributeNames={
-                '#ttl': 'ttl'
-            },
-            ExpressionAttributeValues={
-                ':zero': 0,
-                ':ttl': int(time.time()) + (90 * 24 * 60 * 60)
-            }
-        )
+def day_key(when: datetime) -> str:
+    """Range key of the daily item"""
+    return f"{DAY_PREFIX}{when.strftime('%Y-%m-%d')}"
+
 
-        # Then increment the counter
+def _counter_update(counters: Counter):
+    """ADD clause, names and values that increment the given counters and refresh the TTL"""
+    names = {'#ttl': 'ttl'}
+    values = {':ttl': int(time.time()) + TTL_SECONDS}
+    increments = []
+    for i, (dimension, count) in enumerate(counters.items()):
+        names[f"#d{i}"] = dimension
+        values[f":d{i}"] = count
+        increments.append(f"#d{i} :d{i}")
+    return f"ADD {', '.join(increments)}", names, values
+
+
+def _add_counters(table, user_id: str, range_key: str, counters: Counter) -> None:
+    """ADD the counters to one usage item"""
+    add_clause, names, values = _counter_update(counters)
+    try:
         table.update_item(
             Key={
                 'userId': user_id,
-                'yearMonth': year_month
+                'yearMonth': range_key
             },
-            UpdateExpression='ADD apiCalls :inc',
-            ExpressionAttributeValues={
-                ':inc': 1
-            }
+            UpdateExpression=f"SET #ttl = :ttl {add_clause}",
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
         )
     except Exception as e:
         logger.error(f"Error tracking API call: {str(e)}")
@@ -68,20 +94,384 @@ def track_api_call(user_id: str, api_path: str, method: str) -> None:
         # if usage tracking fails
 
 
+class UsageBatch:
+    """
+    Usage increments grouped per item, written with one UpdateItem per monthly and per daily
+    item: every dimension of a request costs a single write to each.
+    """
+
+    def __init__(self):
+        self._pending = defaultdict(Counter)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, user_id: str, api_path: Optional[str], method: Optional[str],
+            flow_name: Optional[str] = None, when: Optional[datetime] = None) -> None:
+        when = when or datetime.utcnow()
+        self._pending[(user_id, when.strftime('%Y-%m'))]['apiCalls'] += 1
+        for dimension in usage_dimensions(api_path, method, flow_name):
+            self._pending[(user_id, day_key(when))][dimension] += 1
+
+    def flush(self) -> None:
+        """Write all pending increments and clear the batch"""
+        pending, self._pending = self._pending, defaultdict(Counter)
+        if not pending:
+            return
+
+        table = get_table()
+        if not table:
+            logger.warning("Usage tracking disabled - skipping API call tracking")
+            return
+
+        for (user_id, range_key), counters in pending.items():
+            _add_counters(table, user_id, range_key, counters)
+
+
+def track_api_call(user_id: str, api_path: str, method: str, flow_name: Optional[str] = None) -> None:
+    """Track a single API call for a user"""
+    batch = UsageBatch()
+    batch.add(user_id, api_path, method, flow_name)
+    batch.flush()
+
+
+class UsageLimitExceeded(Exception):
+    """Raised when a user is over its rate limit or monthly quota"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+# user_id -> (blocked until epoch seconds, reason) for users known to be over their limits
+_blocked_users: Dict[str, tuple] = {}
+# (user_id, yearMonth) -> last rateTat (epoch ms) this container wrote or read
+_rate_state: Dict[tuple, int] = {}
+
+
+def get_enforcement_mode() -> str:
+    """'enforce' applies rate limits and quotas, anything else only tracks usage"""
+    return os.environ.get('USAGE_ENFORCEMENT', 'off').lower()
+
+
+def load_limits() -> Dict[str, Any]:
+    """
+    Parse the USAGE_LIMITS configuration (JSON), cached per container:
+    {"defaultPlan": "free",
+     "plans": {"free": {"ratePerSecond": 2, "burst": 10, "monthlyQuota": 10000}},
+     "users": {"<sub>": "pro" | {"plan": "pro", "monthlyQuota": 500000}}}
+    """
+    raw = os.environ.get('USAGE_LIMITS', '')
+    if getattr(load_limits, 'raw', None) != raw:
+        load_limits.raw = raw
+        load_limits.limits = json.loads(raw) if raw else {}
+    return load_limits.limits
+
+
+def get_user_limits(user_id: str, claims: Optional[Dict] = None) -> Optional[Dict[str, Any]]:
+    """Effective limits of a user: its plan (override, `custom:plan` claim or default) plus overrides"""
+    config = load_limits()
+    override = config.get('users', {}).get(user_id, {})
+    if isinstance(override, str):
+        override = {'plan': override}
+
+    plan_name = override.get('plan') or (claims or {}).get('custom:plan') or config.get('defaultPlan')
+    limits = {**config.get('plans', {}).get(plan_name, {}), **override}
+    limits.pop('plan', None)
+    return limits or None
+
+
+def _deserialize(item: Dict) -> Dict[str, Any]:
+    """Items returned by a failed condition check come in low-level (typed) format"""
+    deserializer = TypeDeserializer()
+    return {key: deserializer.deserialize(value) for key, value in item.items()}
+
+
+def enforce_api_call(user_id: str, api_path: str, method: str, limits: Dict[str, Any],
+                     flow_name: Optional[str] = None, now: Optional[float] = None) -> None:
+    """
+    Track an API call and enforce the user's limits with a single conditional UpdateItem.
+
+    The token bucket is kept as a GCRA theoretical arrival time (`rateTat`, epoch ms)
+    on the monthly usage item, and the same condition checks `apiCalls` against the
+    monthly quota. Raises UsageLimitExceeded when the call must be rejected; accepted
+    calls are then added to the daily item.
+    """
+    now = now or time.time()
+    blocked = _blocked_users.get(user_id)
+    if blocked and blocked[0] > now:
+        raise UsageLimitExceeded(blocked[1], math.ceil(blocked[0] - now))
+
+    table = get_table()
+    if not table:
+        logger.warning("Usage tracking disabled - skipping limit enforcement")
+        return
+
+    when = datetime.utcfromtimestamp(now)
+    key = (user_id, when.strftime('%Y-%m'))
+    counters = Counter(['apiCalls'])
+    now_ms = int(now * 1000)
+
+    rate = limits.get('ratePerSecond')
+    interval_ms = int(1000 / rate) if rate else 0
+    tolerance_ms = (int(limits.get('burst', rate or 1)) - 1) * interval_ms
+    quota = limits.get('monthlyQuota')
+
+    # Another attempt is only needed when another container moved the bucket
+    for _ in range(MAX_ENFORCE_ATTEMPTS):
+        add_clause, names, values = _counter_update(counters)
+        set_clause = 'SET #ttl = :ttl'
+        conditions = []
+
+        if quota:
+            conditions.append('(attribute_not_exists(apiCalls) OR apiCalls < :quota)')
+            values[':quota'] = quota
+
+        if rate:
+            known_tat = _rate_state.get(key)
+            if known_tat is None:
+                # Unknown state: assume a full bucket and let the condition catch other containers
+                tat = now_ms
+                conditions.append('(attribute_not_exists(rateTat) OR rateTat <= :now)')
+                values[':now'] = now_ms
+            else:
+                tat = max(known_tat, now_ms)
+                if tat - now_ms > tolerance_ms:
+                    raise UsageLimitExceeded('Rate limit exceeded',
+                                             math.ceil((tat - tolerance_ms - now_ms) / 1000))
+                conditions.append('rateTat = :known')
+                values[':known'] = known_tat
+            set_clause += ', rateTat = :tat'
+            values[':tat'] = tat + interval_ms
+
+        update = {
+            'Key': {
+                'userId': user_id,
+                'yearMonth': key[1]
+            },
+            'UpdateExpression': f"{set_clause} {add_clause}",
+            'ExpressionAttributeNames': names,
+            'ExpressionAttributeValues': values
+        }
+        if conditions:
+            update['ConditionExpression'] = ' AND '.join(conditions)
+            update['ReturnValuesOnConditionCheckFailure'] = 'ALL_OLD'
+
+        try:
+            table.update_item(**update)
+            if rate:
+                _rate_state[key] = values[':tat']
+            _add_counters(table, user_id, day_key(when), Counter(usage_dimensions(api_path, method, flow_name)))
+            return
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                # Fail open - usage tracking must not break the main functionality
+                logger.error(f"Error enforcing usage limits: {str(e)}")
+                return
+            current = _deserialize(e.response.get('Item', {}))
+
+        if quota and int(current.get('apiCalls', 0)) >= quota:
+            _blocked_users[user_id] = (now + QUOTA_BLOCK_SECONDS, 'Monthly quota exceeded')
+            raise UsageLimitExceeded('Monthly quota exceeded', QUOTA_BLOCK_SECONDS)
+
+        if 'rateTat' not in current:
+            _rate_state.pop(key, None)
+            continue
+        # Retry from the bucket the other container left, only rejecting when it is really over the limit
+        stored_tat = int(current['rateTat'])
+        _rate_state[key] = stored_tat
+        if stored_tat - now_ms > tolerance_ms:
+            retry_after = (stored_tat - tolerance_ms - now_ms) / 1000
+            _blocked_users[user_id] = (now + retry_after, 'Rate limit exceeded')
+            raise UsageLimitExceeded('Rate limit exceeded', math.ceil(retry_after))
+
+    # Still within the limits but never won the race: fail open, as on any DynamoDB error
+    logger.warning(f"Gave up enforcing limits of {user_id} after {MAX_ENFORCE_ATTEMPTS} conditional writes")
+    track_api_call(user_id, api_path, method, flow_name)
+
+
+def too_many_requests(error: UsageLimitExceeded) -> Dict[str, Any]:
+    """API Gateway response for a rejected call"""
+    return {
+        "statusCode": 429,
+        "headers": {
+            "Content-Type": "application/json",
+            "Access-Control-Allow-Origin": "*",
+            "Retry-After": str(error.retry_after)
+        },
+        "body": json.dumps({
+            "error": error.reason,
+            "retryAfter": error.retry_after,
+            "status": "ERROR"
+        })
+    }
+
+
+def _normalize_range(start: Optional[str], end: Optional[str]):
+    """Expand YYYY-MM bounds to full days and default to the last 30 days"""
+    today = datetime.utcnow().date()
+    end = end or today.isoformat()
+    start = start or (today - timedelta(days=29)).isoformat()
+    if len(start) == 7:
+        start = f"{start}-01"
+    if len(end) == 7:
+        end = f"{end}-31"
+    return start, end
+
+
+def _query_days(user_id: str, start: str, end: str) -> List[Dict]:
+    """Read the daily usage items of a user, following pagination"""
+    table = get_table()
+    if not table:
+        return []
+
+    items = []
+    kwargs = {
+        'KeyConditionExpression': 'userId = :uid AND yearMonth BETWEEN :start AND :end',
+        'ExpressionAttributeValues': {':uid': user_id, ':start': f"{DAY_PREFIX}{start}", ':end': f"{DAY_PREFIX}{end}"}
+    }
+    while True:
+        response = table.query(**kwargs)
+        items.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            return items
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def build_timeseries(items: List[Dict], start: str, end: str, flow_name: Optional[str] = None) -> List[Dict]:
+    """
+    Fold daily usage items into a series between start and end (YYYY-MM-DD).
+    When flow_name is given only that flow's counters are reported.
+    """
+    days = defaultdict(lambda: {'apiCalls': 0, 'routes': Counter(), 'flows': Counter()})
+    for item in items:
+        if not item['yearMonth'].startswith(DAY_PREFIX):
+            continue
+        day = item['yearMonth'][len(DAY_PREFIX):]
+        if not start <= day <= end:
+            continue
+        for attribute, value in item.items():
+            if attribute == 'apiCalls' and not flow_name:
+                days[day]['apiCalls'] += int(value)
+            elif attribute.startswith(ROUTE_PREFIX) and not flow_name:
+                days[day]['routes'][attribute[len(ROUTE_PREFIX):]] += int(value)
+            elif attribute.startswith(FLOW_PREFIX):
+                flow = attribute[len(FLOW_PREFIX):]
+                if flow_name in (None, flow):
+                    days[day]['flows'][flow] += int(value)
+                    if flow_name:
+                        days[day]['apiCalls'] += int(value)
+
+    return [
+        {
+            'date': day,
+            'apiCalls': days[day]['apiCalls'],
+            'routes': dict(days[day]['routes']),
+            'flows': dict(days[day]['flows'])
+        }
+        for day in sorted(days)
+    ]
+
+
+def get_user_timeseries(user_id: str, start: Optional[str] = None, end: Optional[str] = None,
+                        flow_name: Optional[str] = None) -> List[Dict]:
+    """Daily usage of a user, optionally restricted to a single flow"""
+    start, end = _normalize_range(start, end)
+    return build_timeseries(_query_days(user_id, start, end), start, end, flow_name)
+
+
+def get_flow_timeseries(flow_name: str, start: Optional[str] = None, end: Optional[str] = None,
+                        user_ids: Optional[List[str]] = None) -> List[Dict]:
+    """
+    Daily runs of a flow summed over the given users, or over every user in the
+    table when user_ids is omitted (scan - meant for admin reporting, not requests)
+    """
+    start, end = _normalize_range(start, end)
+    items = []
+    if user_ids is not None:
+        for user_id in user_ids:
+            items.extend(_query_days(user_id, start, end))
+    else:
+        table = get_table()
+        if table:
+            kwargs = {
+                'FilterExpression': 'yearMonth BETWEEN :start AND :end',
+                'ExpressionAttributeValues': {':start': f"{DAY_PREFIX}{start}", ':end': f"{DAY_PREFIX}{end}"}
+            }
+            while True:
+                response = table.scan(**kwargs)
+                items.extend(response['Items'])
+                if 'LastEvaluatedKey' not in response:
+                    break
+                kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return build_timeseries(items, start, end, flow_name)
+
+
+def _request_usage(event) -> Dict[str, Any]:
+    """Extract the user, route template and flow of an API Gateway (HTTP API) event"""
+    request_context = event.get('requestContext', {})
+    claims = request_context.get('authorizer', {}).get('jwt', {}).get('claims', {})
+    http = request_context.get('http', {})
+
+    # Prefer the route template ("POST /run/{flow_name}") so execution ids don't explode cardinality
+    route_key = request_context.get('routeKey')
+    if route_key and ' ' in route_key:
+        method, api_path = route_key.split(' ', 1)
+    else:
+        method, api_path = http.get('method'), http.get('path')
+
+    return {
+        'claims': claims,
+        'user_id': claims.get('sub'),
+        'api_path': api_path,
+        'method': method,
+        'flow_name': (event.get('pathParameters') or {}).get('flow_name')
+    }
+
+
+def is_warmup_event(event) -> bool:
+    """Whether the event is the warmer's sentinel rather than a real request"""
+    return isinstance(event, dict) and WARMUP_KEY in event
+
+
+def warmup_response(event) -> Dict[str, Any]:
+    """
+    Answer the warmer without touching DynamoDB or the handler. Invocations sent
+    together are held briefly so each one lands on (and keeps) its own container.
+    """
+    warmup = event.get(WARMUP_KEY) or {}
+    hold_ms = warmup.get('holdMs', 0) if isinstance(warmup, dict) else 0
+    if hold_ms:
+        time.sleep(hold_ms / 1000)
+    return {'warmed': True}
+
+
 # Middleware for tracking API calls
 def track_usage_middleware(handler):
     def wrapper(event, context):
+        if is_warmup_event(event):
+            return warmup_response(event)
+
         try:
-            # Extract user ID from Cognito authorizer context
-            auth_context = event.get('requestContext', {}).get('authorizer', {})
-            claims = auth_context.get('jwt', {}).get('claims', {})
-            user_id = claims.get('sub')
+            usage = _request_usage(event)
+
+            if usage['user_id']:
+                limits = None
+                if get_enforcement_mode() == 'enforce':
+                    limits = get_user_limits(usage['user_id'], usage['claims'])
 
-            if user_id:
-                # Track the API call
-                api_path = event.get('requestContext', {}).get('http', {}).get('path')
-                http_method = event.get('requestContext', {}).get('http', {}).get('method')
-                track_api_call(user_id, api_path, http_method)
+                if limits:
+                    # Track the API call and check the user's limits in the same write
+                    enforce_api_call(usage['user_id'], usage['api_path'], usage['method'], limits,
+                                     usage['flow_name'])
+                else:
+                    # Track the API call
+                    track_api_call(usage['user_id'], usage['api_path'], usage['method'], usage['flow_name'])
+
+        except UsageLimitExceeded as e:
+            logger.warning(f"Rejecting call from {usage['user_id']}: {e.reason}")
+            return too_many_requests(e)
 
         except Exception as e:
             # Log the error but don't prevent the handler from executing
@@ -90,4 +480,43 @@ def track_usage_middleware(handler):
         # Call the original handler
         return handler(event, context)
 
-    return wrapper
\ No newline at end of file
+    return wrapper
+
+
+@track_usage_middleware
+def get_usage(event, context):
+    """Daily usage time series of the authenticated user (GET /usage/{user_id})"""
+    headers = {
+        "Content-Type": "application/json",
+        "Access-Control-Allow-Origin": "*"
+    }
+    try:
+        user_id = event['requestContext']['authorizer']['jwt']['claims']['sub']
+        requested_user = (event.get('pathParameters') or {}).get('user_id', user_id)
+        if requested_user != user_id:
+            return {
+                'statusCode': 403,
+                'headers': headers,
+                'body': json.dumps({'error': 'Not authorized to access this usage data'})
+            }
+
+        params = event.get('queryStringParameters') or {}
+        series = get_user_timeseries(user_id, params.get('startDate'), params.get('endDate'), params.get('flow'))
+
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': json.dumps({
+                'userId': user_id,
+                'granularity': 'day',
+                'series': series,
+                'total': sum(day['apiCalls'] for day in series)
+            })
+        }
+    except Exception as e:
+        logger.error(f"Error getting usage data: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({'error': 'Internal server error', 'status': 'ERROR'})
+        }
@@ -0,0 +1,258 @@
+# functions/base/archive/exporter.py
+"""
+Exports finished executions to Parquet, partitioned by flow and stop date
+(<root>/flow=<name>/date=YYYY-MM-DD/part-*.parquet), on S3 or a local directory.
+
+Step Functions forgets executions after 90 days and can only be read one describe_execution
+at a time; the archive keeps one row per execution with its owner, status, timings, payload
+sizes and per-state durations, readable with column pruning and partition/row-group
+filtering (tools/runs_archive.py).
+"""
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import boto3
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+
+TERMINAL_STATUSES = {'SUCCEEDED', 'FAILED', 'TIMED_OUT', 'ABORTED'}
+WATERMARK_FILE = '_watermark.json'
+# Executions are listed newest first; stop this far before the watermark (longest expected run)
+DEFAULT_LOOKBACK = timedelta(days=1)
+# Per-state rows of one execution, a large Map can have many more
+MAX_STATE_ROWS = 1000
+# Executions written (and the watermark moved) at a time, so a run cut short keeps its progress
+BATCH_SIZE = 200
+# Stop starting batches with less time than this left in the invocation
+SAFETY_MARGIN_MS = 60 * 1000
+
+STATE_TYPE = pa.struct([
+    ('name', pa.string()),
+    ('type', pa.string()),
+    ('duration_ms', pa.int64()),
+    ('status', pa.string())
+])
+
+SCHEMA = pa.schema([
+    ('execution_arn', pa.string()),
+    ('name', pa.string()),
+    ('flow', pa.string()),
+    ('user_id', pa.string()),
+    ('status', pa.string()),
+    ('start_time', pa.timestamp('ms', tz='UTC')),
+    ('stop_time', pa.timestamp('ms', tz='UTC')),
+    ('duration_ms', pa.int64()),
+    ('input_bytes', pa.int64()),
+    ('output_bytes', pa.int64()),
+    ('error', pa.string()),
+    ('cause', pa.string()),
+    ('states', pa.list_(STATE_TYPE)),
+    ('date', pa.string())
+])
+
+PARTITIONING = ds.partitioning(pa.schema([('flow', pa.string()), ('date', pa.string())]), flavor='hive')
+
+
+def open_root(uri: str):
+    """(filesystem, path) of s3://bucket/prefix or a local directory"""
+    if '://' in uri:
+        return pafs.FileSystem.from_uri(uri)
+    return pafs.LocalFileSystem(), uri.rstrip('/') or '/'
+
+
+def read_watermark(filesystem, root: str) -> Dict[str, Any]:
+    """
+    Progress of the previous exports: {"until": <all flows done up to>, "flows": {name: {"stop", "arn"}}},
+    the last exported execution of each flow in (stopDate, executionArn) order
+    """
+    try:
+        with filesystem.open_input_stream(f"{root}/{WATERMARK_FILE}") as f:
+            return json.loads(f.read())
+    except (FileNotFoundError, OSError):
+        return {}
+
+
+def write_watermark(filesystem, root: str, watermark: Dict[str, Any]) -> None:
+    filesystem.create_dir(root, recursive=True)
+    with filesystem.open_output_stream(f"{root}/{WATERMARK_FILE}") as f:
+        f.write(json.dumps(watermark).encode())
+
+
+def flow_cursor(watermark: Dict[str, Any], flow: str) -> Optional[Tuple[datetime, str]]:
+    """(stopDate, executionArn) of the flow's last exported execution, None before the first export"""
+    position = (watermark.get('flows') or {}).get(flow)
+    if position:
+        return datetime.fromisoformat(position['stop']), position['arn']
+    # Watermarks written before progress was kept per flow
+    return (datetime.fromisoformat(watermark['until']), '') if watermark.get('until') else None
+
+
+def state_durations(events: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Time between each *StateEntered event and the matching *StateExited (or failure) event"""
+    entered = {}
+    states = []
+    for event in events:
+        event_type = event['type']
+        if event_type.endswith('StateEntered'):
+            details = event['stateEnteredEventDetails']
+            entered[event['id']] = (details['name'], event_type[:-len('StateEntered')], event['timestamp'])
+        elif event_type.endswith('StateExited'):
+            name = event['stateExitedEventDetails']['name']
+            # The entered event is the latest unmatched one with that name
+            for event_id in sorted(entered, reverse=True):
+                if entered[event_id][0] == name:
+                    _, state_type, start = entered.pop(event_id)
+                    states.append({'name': name, 'type': state_type, 'status': 'SUCCEEDED',
+                                   'duration_ms': int((event['timestamp'] - start).total_seconds() * 1000)})
+                    break
+        elif event_type in ('ExecutionFailed', 'ExecutionTimedOut', 'ExecutionAborted') and entered:
+            status = {'ExecutionFailed': 'FAILED', 'ExecutionTimedOut': 'TIMED_OUT'}.get(event_type, 'ABORTED')
+            for name, state_type, start in entered.values():
+                states.append({'name': name, 'type': state_type, 'status': status,
+                               'duration_ms': int((event['timestamp'] - start).total_seconds() * 1000)})
+            entered = {}
+    return states[:MAX_STATE_ROWS]
+
+
+def execution_row(execution: Dict[str, Any], states: Optional[List[Dict]] = None) -> Dict[str, Any]:
+    """Archive row of a describe_execution response"""
+    execution_input = execution.get('input')
+    try:
+        user_id = json.loads(execution_input).get('__user_id') if execution_input else None
+    except (ValueError, AttributeError):
+        user_id = None
+
+    def size(field):
+        details = execution.get(f"{field}Details") or {}
+        if execution.get(field) is not None:
+            return len(execution[field].encode())
+        # Payloads over 256 KB aren't returned, the size is unknown
+        return None if details.get('included') is False else 0
+
+    start, stop = execution['startDate'], execution['stopDate']
+    return {
+        'execution_arn': execution['executionArn'],
+        'name': execution['name'],
+        'flow': execution['stateMachineArn'].split(':')[-1],
+        'user_id': user_id,
+        'status': execution['status'],
+        'start_time': start,
+        'stop_time': stop,
+        'duration_ms': int((stop - start).total_seconds() * 1000),
+        'input_bytes': size('input'),
+        'output_bytes': size('output'),
+        'error': execution.get('error'),
+        'cause': execution.get('cause'),
+        'states': states,
+        'date': stop.astimezone(timezone.utc).strftime('%Y-%m-%d')
+    }
+
+
+def state_machines(sfn, flows: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+    for page in sfn.get_paginator('list_state_machines').paginate():
+        for state_machine in page['stateMachines']:
+            if not flows or state_machine['name'] in flows:
+                yield state_machine
+
+
+def finished_executions(sfn, state_machine_arn: str, cursor: Optional[Tuple[datetime, str]], until: datetime,
+                        lookback: timedelta = DEFAULT_LOOKBACK) -> List[Dict[str, Any]]:
+    """
+    list_executions entries that stopped after the cursor and before `until`, in (stopDate, executionArn)
+    order so progress can be saved after any of them
+    """
+    found = []
+    pages = sfn.get_paginator('list_executions').paginate(stateMachineArn=state_machine_arn)
+    for executions in pages:
+        done = False
+        for execution in executions['executions']:
+            if cursor and execution['startDate'] < cursor[0] - lookback:
+                done = True
+                break
+            stop = execution.get('stopDate')
+            if execution['status'] in TERMINAL_STATUSES and stop and stop < until \
+                    and (not cursor or (stop, execution['executionArn']) > cursor):
+                found.append(execution)
+        if done:
+            break
+    return sorted(found, key=lambda execution: (execution['stopDate'], execution['executionArn']))
+
+
+def export(uri: str, sfn=None, since: Optional[datetime] = None, flows: Optional[List[str]] = None,
+           with_states: bool = True, lookback: timedelta = DEFAULT_LOOKBACK,
+           now: Optional[datetime] = None, time_left: Optional[Callable[[], int]] = None) -> Dict[str, Any]:
+    """
+    Append the executions that finished since the last export (or `since`) to the archive at `uri`.
+    Executions still running are picked up by a later export once they finish.
+
+    Each flow's executions are written BATCH_SIZE at a time, moving its watermark after each batch.
+    `time_left` (ms, e.g. context.get_remaining_time_in_millis) stops the export SAFETY_MARGIN_MS
+    early: the next run resumes where it stopped instead of starting over.
+    """
+    sfn = sfn or boto3.client('stepfunctions')
+    filesystem, root = open_root(uri)
+    until = now or datetime.now(timezone.utc)
+    watermark = read_watermark(filesystem, root)
+    watermark.setdefault('flows', {})
+
+    def out_of_time():
+        return time_left is not None and time_left() < SAFETY_MARGIN_MS
+
+    exported, batches, complete = 0, 0, True
+
+    def flush(rows, flow, last):
+        nonlocal batches
+        if rows:
+            ds.write_dataset(
+                pa.Table.from_pylist(rows, schema=SCHEMA), root, filesystem=filesystem, format='parquet',
+                partitioning=PARTITIONING, existing_data_behavior='overwrite_or_ignore',
+                basename_template=f"part-{until.strftime('%Y%m%dT%H%M%S')}-{batches}-{{i}}.parquet"
+            )
+            batches += 1
+        watermark['flows'][flow] = {'stop': last[0].isoformat(), 'arn': last[1]}
+        write_watermark(filesystem, root, watermark)
+
+    for state_machine in state_machines(sfn, flows):
+        flow = state_machine['name']
+        cursor = (since, '') if since else flow_cursor(watermark, flow)
+        if out_of_time():
+            complete = False
+            break
+
+        rows = []
+        for execution in finished_executions(sfn, state_machine['stateMachineArn'], cursor, until, lookback):
+            if out_of_time():
+                complete = False
+                break
+            details = sfn.describe_execution(executionArn=execution['executionArn'])
+            states = None
+            if with_states:
+                events = []
+                pages = sfn.get_paginator('get_execution_history').paginate(
+                    executionArn=execution['executionArn'], includeExecutionData=False)
+                for page in pages:
+                    events.extend(page['events'])
+                states = state_durations(events)
+            rows.append(execution_row(details, states))
+            cursor = (execution['stopDate'], execution['executionArn'])
+            if len(rows) == BATCH_SIZE:
+                flush(rows, flow, cursor)
+                exported += len(rows)
+                rows = []
+
+        if not complete:
+            if rows:
+                flush(rows, flow, cursor)
+                exported += len(rows)
+            break
+        # Done up to `until`: executions stopping at `until` itself are still to come
+        flush(rows, flow, (until, ''))
+        exported += len(rows)
+
+    if complete and not flows:
+        watermark['until'] = until.isoformat()
+        write_watermark(filesystem, root, watermark)
+    return {'exported': exported, 'since': since.isoformat() if since else None,
+            'until': until.isoformat(), 'complete': complete}
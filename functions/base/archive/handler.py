@@ -0,0 +1,23 @@
+# functions/base/archive/handler.py
+import os
+import json
+import logging
+from typing import Any, Dict
+
+from functions.base.archive.exporter import export
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Scheduled export of the executions finished since the previous run to ARCHIVE_URI
+    (s3://bucket/prefix). The event can restrict it to some flows: {"flows": ["helloWorldFlow"]}
+    """
+    result = export(os.environ['ARCHIVE_URI'], flows=(event or {}).get('flows'),
+                    with_states=os.environ.get('ARCHIVE_STATES', 'true') == 'true',
+                    # A backlog too large for one invocation is continued by the next ones
+                    time_left=getattr(context, 'get_remaining_time_in_millis', None))
+    logger.info(f"Archived executions: {json.dumps(result)}")
+    return result
@@ -0,0 +1,212 @@
+# functions/base/auth/handler.py
+"""
+Cognito configuration for clients and local verification of Cognito JWTs.
+
+Tokens are verified in the container against the user pool's JWKS, which is downloaded
+once and kept for the life of the container: a token signed with a key that isn't in the
+cached set (after a key rotation) triggers a refresh, at most every JWKS_MIN_REFRESH_SECONDS.
+Signatures are checked with `cryptography`, part of the base requirements.
+"""
+import os
+import json
+import time
+import base64
+import hashlib
+import urllib.request
+from typing import Any, Dict, Optional
+
+from aws_lambda_powertools import Logger
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicKey, RSAPublicNumbers
+from functions.base.api_usage.handler import track_usage_middleware
+
+logger = Logger()
+
+# Seconds of clock skew tolerated on exp/nbf/iat
+LEEWAY_SECONDS = 60
+# Unknown key ids refresh the JWKS, but forged tokens must not make every request download it
+JWKS_MIN_REFRESH_SECONDS = 300
+# Keys are also refreshed this often so retired ones stop being accepted
+JWKS_MAX_AGE_SECONDS = 24 * 60 * 60
+JWKS_TIMEOUT_SECONDS = 5
+
+CONFIG_MAX_AGE_SECONDS = 3600
+
+_JSON_HEADERS = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*'
+}
+
+
+class TokenError(Exception):
+    """Raised when a token is malformed, forged, expired or not meant for this user pool"""
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + '=' * (-len(segment) % 4))
+
+
+def _int(segment: str) -> int:
+    return int.from_bytes(_b64decode(segment), 'big')
+
+
+def pool_settings() -> Dict[str, str]:
+    """User pool id, app client id, region and issuer from the environment"""
+    pool_id = os.environ.get('COGNITO_USER_POOL_ID', '')
+    region = pool_id.split('_', 1)[0] if '_' in pool_id else os.environ.get('AWS_REGION', '')
+    return {
+        'userPoolId': pool_id,
+        'clientId': os.environ.get('COGNITO_CLIENT_ID', ''),
+        'region': region,
+        'issuer': f"https://cognito-idp.{region}.amazonaws.com/{pool_id}"
+    }
+
+
+def fetch_jwks(issuer: str) -> Dict[str, Any]:
+    with urllib.request.urlopen(f"{issuer}/.well-known/jwks.json", timeout=JWKS_TIMEOUT_SECONDS) as response:
+        return json.loads(response.read())
+
+
+class KeyCache:
+    """RSA public keys of the user pool by key id, cached per container"""
+
+    def __init__(self, fetch=fetch_jwks):
+        self.fetch = fetch
+        self.keys: Dict[str, RSAPublicKey] = {}
+        self.fetched_at = 0.0
+        self.attempted_at = float('-inf')
+
+    def refresh(self, issuer: str, now: float) -> None:
+        self.attempted_at = now
+        jwks = self.fetch(issuer)
+        self.keys = {
+            key['kid']: RSAPublicNumbers(_int(key['e']), _int(key['n'])).public_key()
+            for key in jwks.get('keys', [])
+            if key.get('kty') == 'RSA' and key.get('kid')
+        }
+        self.fetched_at = now
+        logger.info(f"Loaded {len(self.keys)} signing keys from {issuer}")
+
+    def get(self, issuer: str, kid: str, now: Optional[float] = None) -> Optional[RSAPublicKey]:
+        now = now or time.time()
+        stale = kid not in self.keys or now - self.fetched_at > JWKS_MAX_AGE_SECONDS
+        if stale and now - self.attempted_at > JWKS_MIN_REFRESH_SECONDS:
+            try:
+                self.refresh(issuer, now)
+            except Exception as e:
+                # Keep serving the keys we have, a JWKS outage must not reject valid tokens
+                logger.error(f"Could not refresh the JWKS: {str(e)}")
+        return self.keys.get(kid)
+
+
+key_cache = KeyCache()
+
+
+def rs256_verify(message: bytes, signature: bytes, key: RSAPublicKey) -> bool:
+    """RSASSA-PKCS1-v1_5 with SHA-256 (the RS256 JWT algorithm)"""
+    try:
+        key.verify(signature, message, padding.PKCS1v15(), hashes.SHA256())
+        return True
+    except InvalidSignature:
+        return False
+
+
+def verify_jwt(token: str, settings: Optional[Dict[str, str]] = None, now: Optional[float] = None,
+               keys: Optional[KeyCache] = None) -> Dict[str, Any]:
+    """Claims of a Cognito ID or access token issued by the user pool to the app client"""
+    settings = settings or pool_settings()
+    keys = keys or key_cache
+    now = now or time.time()
+
+    try:
+        header_segment, payload_segment, signature_segment = token.split('.')
+        header = json.loads(_b64decode(header_segment))
+        claims = json.loads(_b64decode(payload_segment))
+        signature = _b64decode(signature_segment)
+    except (ValueError, AttributeError):
+        raise TokenError('Malformed token')
+
+    if header.get('alg') != 'RS256':
+        raise TokenError(f"Unsupported algorithm {header.get('alg')}")
+    key = keys.get(settings['issuer'], header.get('kid'), now)
+    if not key:
+        raise TokenError('Unknown signing key')
+    if not rs256_verify(f"{header_segment}.{payload_segment}".encode(), signature, key):
+        raise TokenError('Invalid signature')
+
+    if claims.get('iss') != settings['issuer']:
+        raise TokenError('Token issued by another user pool')
+    token_use = claims.get('token_use')
+    if token_use not in ('id', 'access'):
+        raise TokenError(f"Unexpected token_use {token_use}")
+    # ID tokens name the app client in aud, access tokens in client_id
+    audience = claims.get('aud') if token_use == 'id' else claims.get('client_id')
+    if settings['clientId'] and audience != settings['clientId']:
+        raise TokenError('Token issued to another app client')
+    if not isinstance(claims.get('exp'), (int, float)) or claims['exp'] + LEEWAY_SECONDS < now:
+        raise TokenError('Token expired')
+    if claims.get('nbf', 0) - LEEWAY_SECONDS > now or claims.get('iat', 0) - LEEWAY_SECONDS > now:
+        raise TokenError('Token not valid yet')
+    return claims
+
+
+def _bearer_token(event: Dict[str, Any]) -> Optional[str]:
+    headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+    authorization = headers.get('authorization', '')
+    return authorization[7:].strip() if authorization.lower().startswith('bearer ') else authorization.strip() or None
+
+
+@track_usage_middleware
+def verify_token(event, context):
+    """GET /auth/verify: whether the Authorization token is valid, with its main claims"""
+    token = _bearer_token(event)
+    if not token:
+        return {'statusCode': 401, 'headers': _JSON_HEADERS,
+                'body': json.dumps({'valid': False, 'error': 'Missing token'})}
+    try:
+        claims = verify_jwt(token)
+    except TokenError as e:
+        return {'statusCode': 401, 'headers': _JSON_HEADERS, 'body': json.dumps({'valid': False, 'error': str(e)})}
+
+    return {
+        'statusCode': 200,
+        'headers': {**_JSON_HEADERS, 'Cache-Control': 'no-store'},
+        'body': json.dumps({
+            'valid': True,
+            'sub': claims.get('sub'),
+            'username': claims.get('cognito:username') or claims.get('username'),
+            'email': claims.get('email'),
+            'tokenUse': claims['token_use'],
+            'expiresAt': claims['exp']
+        })
+    }
+
+
+def _config_response() -> tuple:
+    """Body and ETag of the configuration, computed once per container"""
+    if not hasattr(_config_response, 'cached'):
+        settings = pool_settings()
+        body = json.dumps({
+            'userPoolId': settings['userPoolId'],
+            'clientId': settings['clientId'],
+            'region': settings['region']
+        }, sort_keys=True)
+        _config_response.cached = (body, f"\"{hashlib.sha256(body.encode()).hexdigest()[:32]}\"")
+    return _config_response.cached
+
+
+@track_usage_middleware
+def get_config(event, context):
+    """GET /auth/config: Cognito settings clients need to log in, cacheable by browsers and CDNs"""
+    body, etag = _config_response()
+    headers = {
+        **_JSON_HEADERS,
+        'Cache-Control': f"public, max-age={CONFIG_MAX_AGE_SECONDS}",
+        'ETag': etag
+    }
+    request_headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+    if etag in [tag.strip() for tag in request_headers.get('if-none-match', '').split(',')]:
+        return {'statusCode': 304, 'headers': headers, 'body': ''}
+    return {'statusCode': 200, 'headers': headers, 'body': body}
@@ -3,6 +3,7 @@ import json
 import boto3
 from aws_lambda_powertools import Logger
 from functions.base.api_usage.handler import track_usage_middleware
+from functions.base.admission import handler as admission
 
 logger = Logger()
 sfn = boto3.client('stepfunctions')
@@ -26,6 +27,22 @@ def handler(event, context):
     logger.info(f"userId: {user_id}")
 
     try:
+        if not execution_id.startswith('arn:'):
+            # A ticket of queued admission (see functions/base/admission)
+            ticket = admission.get_ticket(execution_id)
+            if not ticket or ticket.get('userId') != user_id:
+                return {
+                    'statusCode': 403,
+                    'body': json.dumps({'error': 'Not authorized to access this execution'})
+                }
+            if ticket['status'] != admission.STARTED:
+                return {
+                    'statusCode': 202 if ticket['status'] == admission.QUEUED else 200,
+                    'body': json.dumps({'ticket': execution_id, 'status': ticket['status'],
+                                        'error': ticket.get('error')})
+                }
+            execution_id = ticket['executionArn']
+
         # Verify ownership (the user that makes the GET request is the same that triggered this flow)
         if not verify_execution_owner(execution_id, user_id):
             return {
@@ -39,6 +56,7 @@ def handler(event, context):
         return {
             'statusCode': 200,
             'body': json.dumps({
+                'executionArn': execution_id,
                 'status': execution['status'],
                 'output': json.loads(execution.get('output', '{}')),
                 'startDate': execution['startDate'].isoformat(),
@@ -0,0 +1,160 @@
+# functions/base/input_source/handler.py
+"""
+First state of flows whose Map reads a DynamoDB query or a generator function (see
+deploy/input-source.js): streams the items into one JSON array in INPUTS_BUCKET, uploaded in
+parts as they come, and returns where it is for the Distributed Map's ItemReader. Only a part
+of the items is in memory at a time, however many the source has.
+"""
+import os
+import json
+import logging
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Optional
+
+import boto3
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# S3 parts must be at least 5 MB (except the last one)
+PART_SIZE = 8 * 1024 * 1024
+
+
+def get_s3():
+    if not hasattr(get_s3, 'client'):
+        get_s3.client = boto3.client('s3')
+    return get_s3.client
+
+
+def get_dynamodb():
+    if not hasattr(get_dynamodb, 'resource'):
+        get_dynamodb.resource = boto3.resource('dynamodb')
+    return get_dynamodb.resource
+
+
+def get_lambda():
+    if not hasattr(get_lambda, 'client'):
+        get_lambda.client = boto3.client('lambda')
+    return get_lambda.client
+
+
+def _json_default(value):
+    # DynamoDB numbers
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return str(value)
+
+
+def dynamodb_items(source: Dict[str, Any]) -> Iterator[Dict]:
+    """
+    Items of a query, or of a scan without keyCondition:
+    {"table", "keyCondition": "pk = :pk", "values": {":pk": "a"}, "names", "filter", "index"}
+    """
+    table = get_dynamodb().Table(source['table'])
+    params: Dict[str, Any] = {}
+    if source.get('index'):
+        params['IndexName'] = source['index']
+    if source.get('keyCondition'):
+        params['KeyConditionExpression'] = source['keyCondition']
+    if source.get('filter'):
+        params['FilterExpression'] = source['filter']
+    if source.get('values'):
+        params['ExpressionAttributeValues'] = source['values']
+    if source.get('names'):
+        params['ExpressionAttributeNames'] = source['names']
+    read = table.query if 'KeyConditionExpression' in params else table.scan
+
+    while True:
+        page = read(**params)
+        yield from page.get('Items', [])
+        if 'LastEvaluatedKey' not in page:
+            return
+        params['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+
+def function_items(function_arn: str, input: Optional[Dict] = None) -> Iterator[Any]:
+    """
+    Items of a generator function, invoked page after page with {**input, "cursor"}: it returns
+    {"items": [...], "cursor": <next page or null>}
+    """
+    cursor = None
+    while True:
+        response = get_lambda().invoke(FunctionName=function_arn,
+                                       Payload=json.dumps({**(input or {}), 'cursor': cursor}).encode())
+        result = json.loads(response['Payload'].read())
+        if response.get('FunctionError'):
+            raise RuntimeError(f"Generator {function_arn} failed: {result.get('errorMessage', result)}")
+        yield from result.get('items', [])
+        cursor = result.get('cursor')
+        if not cursor:
+            return
+
+
+class JsonArrayWriter:
+    """Writes items to s3://bucket/key as one JSON array, in multipart upload parts of PART_SIZE"""
+
+    def __init__(self, bucket: str, key: str):
+        self.bucket = bucket
+        self.key = key
+        self.buffer: List[bytes] = [b'[']
+        self.buffered = 1
+        self.count = 0
+        self.upload_id: Optional[str] = None
+        self.parts: List[Dict] = []
+
+    def write(self, item: Any) -> None:
+        data = (b',' if self.count else b'') + json.dumps(item, default=_json_default, separators=(',', ':')).encode()
+        self.buffer.append(data)
+        self.buffered += len(data)
+        self.count += 1
+        if self.buffered >= PART_SIZE:
+            self._upload_part()
+
+    def _upload_part(self) -> None:
+        if self.upload_id is None:
+            self.upload_id = get_s3().create_multipart_upload(Bucket=self.bucket, Key=self.key,
+                                                              ContentType='application/json')['UploadId']
+        number = len(self.parts) + 1
+        response = get_s3().upload_part(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                        PartNumber=number, Body=b''.join(self.buffer))
+        self.parts.append({'PartNumber': number, 'ETag': response['ETag']})
+        self.buffer, self.buffered = [], 0
+
+    def close(self) -> None:
+        self.buffer.append(b']')
+        if self.upload_id is None:
+            # Small enough for one request
+            get_s3().put_object(Bucket=self.bucket, Key=self.key, Body=b''.join(self.buffer),
+                                ContentType='application/json')
+            return
+        self._upload_part()
+        get_s3().complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                           MultipartUpload={'Parts': self.parts})
+
+    def abort(self) -> None:
+        if self.upload_id is not None:
+            get_s3().abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    {"flow", "execution", "source": {"dynamodb": {...}} or {"function": <ARN>, "input": {...}}}
+    -> {"bucket", "key", "count"}
+    """
+    source = event['source']
+    items = dynamodb_items(source['dynamodb']) if 'dynamodb' in source else \
+        function_items(source['function'], source.get('input'))
+
+    bucket = os.environ['INPUTS_BUCKET']
+    key = f"inputs/{event['flow']}/{event['execution']}.json"
+    writer = JsonArrayWriter(bucket, key)
+    try:
+        for item in items:
+            writer.write(item)
+        writer.close()
+    except Exception:
+        writer.abort()
+        raise
+
+    logger.info(f"Wrote {writer.count} items of {event['flow']} to s3://{bucket}/{key} ({len(writer.parts) or 1} parts)")
+    return {'bucket': bucket, 'key': key, 'count': writer.count}
@@ -5,10 +5,12 @@ from typing import Dict, Any
 import traceback
 
 from functions.base.api_usage.handler import track_usage_middleware
+from functions.base.logs.payload import log_level, truncated
+from functions.base.run_flow.schemas import load_schemas
 
 # Enhanced logging setup
 logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger.setLevel(log_level())
 
 # Add timestamp and request id to log format
 logging.basicConfig(
@@ -17,6 +19,8 @@ logging.basicConfig(
 )
 
 sfn = boto3.client('stepfunctions')
+# The bodies POST /run/{flow_name} accepts, documented with each flow
+input_schemas = load_schemas()
 
 
 @track_usage_middleware
@@ -25,7 +29,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     Handles the API Gateway event to list all available Step Function workflows.
     """
     try:
-        logger.info(f"Received event: {json.dumps(event, indent=2)}")
+        logger.debug('Received event: %s', truncated(event))
 
         # List all state machines
         paginator = sfn.get_paginator('list_state_machines')
@@ -43,7 +47,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'name': state_machine['name'],
                     'created': state_machine['creationDate'].isoformat(),
                     'definition': json.loads(details['definition']),
-                    'description': details.get('description', 'No description available')
+                    'description': details.get('description', 'No description available'),
+                    'inputSchema': input_schemas.get(state_machine['name'])
                 }
                 flows.append(flow)
 
@@ -5,6 +5,7 @@ import logging
 from datetime import datetime, timedelta
 from typing import Dict, Any, List
 from functions.base.api_usage.handler import track_usage_middleware
+from functions.base.run_flow.names import name_owner_tag, owner_tag
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -24,6 +25,15 @@ def get_all_state_machines() -> List[str]:
     return state_machines
 
 
+def owned_by(execution: Dict, user_id: str) -> bool:
+    """Whether an execution belongs to the user, from its name unless it predates owner names"""
+    tag = name_owner_tag(execution['name'])
+    if tag is not None:
+        return tag == owner_tag(user_id)
+    execution_details = sfn.describe_execution(executionArn=execution['executionArn'])
+    return json.loads(execution_details['input']).get('__user_id') == user_id
+
+
 def get_user_executions(state_machine_arn: str, user_id: str) -> List[Dict]:
     """Get executions for a specific state machine and filter by user_id"""
     user_executions = []
@@ -38,14 +48,8 @@ def get_user_executions(state_machine_arn: str, user_id: str) -> List[Dict]:
         ):
             for execution in page['executions']:
                 try:
-                    # Get execution details to check user_id
-                    execution_details = sfn.describe_execution(
-                        executionArn=execution['executionArn']
-                    )
-                    execution_input = json.loads(execution_details['input'])
-
                     # Only include if it belongs to the user
-                    if execution_input.get('__user_id') == user_id:
+                    if owned_by(execution, user_id):
                         user_executions.append({
                             'executionArn': execution['executionArn'],
                             'status': execution['status'],
@@ -0,0 +1,107 @@
+# functions/base/logs/payload.py
+"""
+Payload logging that costs little at volume: events and results are serialized only when a
+record is actually emitted, cut to LOG_PAYLOAD_CHARS, and logged in full only for the sampled
+share of invocations (LOG_SAMPLE_RATE) and for the ones that fail. LOG_LEVEL, LOG_SAMPLE_RATE
+and LOG_PAYLOAD_CHARS come from `custom.logging` and a function's `logging:` in function.yml.
+
+    from functions.base.logs.payload import log_payloads
+
+    @track_usage_middleware
+    @log_payloads
+    def handler(event, context):
+        ...
+"""
+import os
+import json
+import random
+import hashlib
+import logging
+import functools
+from typing import Any, Callable, Optional
+
+DEFAULT_SAMPLE_RATE = 0.01
+DEFAULT_PAYLOAD_CHARS = 1024
+
+logger = logging.getLogger(__name__)
+
+
+def log_level() -> int:
+    level = logging.getLevelName(os.environ.get('LOG_LEVEL', 'INFO').upper())
+    return level if isinstance(level, int) else logging.INFO
+
+
+def sample_rate() -> float:
+    return float(os.environ.get('LOG_SAMPLE_RATE', DEFAULT_SAMPLE_RATE))
+
+
+def payload_chars() -> int:
+    return int(os.environ.get('LOG_PAYLOAD_CHARS', DEFAULT_PAYLOAD_CHARS))
+
+
+class Payload:
+    """A value serialized (and cut to `limit` characters, 0 for no limit) only when formatted"""
+    __slots__ = ('value', 'limit')
+
+    def __init__(self, value: Any, limit: int):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self) -> str:
+        try:
+            text = json.dumps(self.value, default=str, separators=(',', ':'))
+        except (TypeError, ValueError):
+            text = repr(self.value)
+        if self.limit and len(text) > self.limit:
+            return f"{text[:self.limit]}... ({len(text)} chars)"
+        return text
+
+
+def truncated(value: Any, limit: Optional[int] = None) -> Payload:
+    return Payload(value, payload_chars() if limit is None else limit)
+
+
+def full(value: Any) -> Payload:
+    return Payload(value, 0)
+
+
+def is_sampled(context: Any = None, rate: Optional[float] = None) -> bool:
+    """Whether an invocation logs its payloads in full, decided once per request id"""
+    rate = sample_rate() if rate is None else rate
+    if rate >= 1:
+        return True
+    if rate <= 0:
+        return False
+    request_id = getattr(context, 'aws_request_id', None)
+    if not request_id:
+        return random.random() < rate
+    return int(hashlib.sha1(request_id.encode()).hexdigest()[:8], 16) / 0x100000000 < rate
+
+
+def log_payloads(handler: Callable) -> Callable:
+    """
+    Logs a handler's event and result: in full at INFO for sampled invocations, cut to
+    LOG_PAYLOAD_CHARS at DEBUG otherwise, and the full event with the traceback when it raises
+    """
+    logger.setLevel(log_level())
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        sampled = is_sampled(context)
+        if sampled:
+            logger.info('Event: %s', full(event))
+        else:
+            logger.debug('Event: %s', truncated(event))
+
+        try:
+            result = handler(event, context)
+        except Exception:
+            logger.exception('Failed on event: %s', full(event))
+            raise
+
+        if sampled:
+            logger.info('Result: %s', full(result))
+        else:
+            logger.debug('Result: %s', truncated(result))
+        return result
+    return wrapper
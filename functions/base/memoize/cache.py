@@ -0,0 +1,228 @@
+# functions/base/memoize/cache.py
+import os
+import json
+import time
+import hashlib
+import functools
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+import boto3
+from aws_lambda_powertools import Logger
+from aws_lambda_powertools.metrics import MetricUnit, single_metric
+
+logger = Logger()
+
+# Fields that differ between runs of the same input (run_flow adds the caller's id)
+DEFAULT_IGNORE = ('__user_id',)
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 128
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+# DynamoDB items are limited to 400 KB, larger results go to S3 when a bucket is configured
+MAX_ITEM_BYTES = 350 * 1024
+S3_PREFIX = 'memoize/'
+
+
+class _Miss:
+    pass
+
+
+MISS = _Miss()
+
+
+def _drop(value: Any, path: list) -> Any:
+    """Copy of value without the (dotted) path"""
+    if not isinstance(value, dict) or path[0] not in value:
+        return value
+    if len(path) == 1:
+        return {key: item for key, item in value.items() if key != path[0]}
+    return {**value, path[0]: _drop(value[path[0]], path[1:])}
+
+
+def cache_key(namespace: str, event: Any, ignore: Iterable[str] = DEFAULT_IGNORE) -> str:
+    """sha256 of the canonical JSON of the event (sorted keys, no whitespace) without the ignored fields"""
+    for field in ignore:
+        event = _drop(event, field.split('.'))
+    canonical = json.dumps(event, sort_keys=True, separators=(',', ':'), default=str)
+    return f"{namespace}#{hashlib.sha256(canonical.encode()).hexdigest()}"
+
+
+class LRUCache:
+    """Per-container results (their JSON, parsed anew on every hit) bounded by entry count and size"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: 'OrderedDict[str, Tuple[float, Any, int]]' = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str, now: Optional[float] = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return MISS
+        if entry[0] <= (now or time.time()):
+            self._remove(key)
+            return MISS
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: str, value: Any, expires_at: float, size: int) -> None:
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (expires_at, value, size)
+        self.size += size
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str) -> None:
+        self.size -= self._entries.pop(key)[2]
+
+
+class PersistentStore:
+    """
+    Results shared by every container: DynamoDB (MEMOIZE_TABLE, expired by its TTL attribute)
+    and, for results over the item size limit, S3 (MEMOIZE_BUCKET, expiry checked on read).
+    """
+
+    def __init__(self, table_name: Optional[str], bucket: Optional[str]):
+        self.table = boto3.resource('dynamodb').Table(table_name) if table_name else None
+        self.bucket = bucket or None
+        self.s3 = boto3.client('s3') if bucket else None
+
+    def get(self, key: str, now: Optional[float] = None) -> Any:
+        """(JSON payload, expiry epoch seconds) of a stored result, or MISS"""
+        now = now or time.time()
+        if self.table:
+            item = self.table.get_item(Key={'cacheKey': key}).get('Item')
+            if item and int(item['ttl']) > now:
+                if 's3Key' not in item:
+                    return item['value'], int(item['ttl'])
+                body = self.s3.get_object(Bucket=self.bucket, Key=item['s3Key'])['Body'].read() if self.s3 else None
+                return (body.decode(), int(item['ttl'])) if body is not None else MISS
+            return MISS
+        if self.s3:
+            try:
+                response = self.s3.get_object(Bucket=self.bucket, Key=f"{S3_PREFIX}{key}.json")
+            except self.s3.exceptions.NoSuchKey:
+                return MISS
+            expires_at = float(response.get('Metadata', {}).get('expires-at', 0))
+            if expires_at > now:
+                return response['Body'].read().decode(), expires_at
+        return MISS
+
+    def put(self, key: str, payload: str, expires_at: float) -> bool:
+        """Store the JSON payload, False when it is too large for the configured tiers"""
+        large = len(payload.encode()) > MAX_ITEM_BYTES
+        if large and not self.s3:
+            return False
+        s3_key = f"{S3_PREFIX}{key}.json"
+        if self.s3 and (large or not self.table):
+            self.s3.put_object(Bucket=self.bucket, Key=s3_key, Body=payload.encode(),
+                               ContentType='application/json', Metadata={'expires-at': str(int(expires_at))})
+        if self.table:
+            item = {'cacheKey': key, 'ttl': int(expires_at)}
+            item.update({'s3Key': s3_key} if large else {'value': payload})
+            self.table.put_item(Item=item)
+        return True
+
+
+def get_store() -> Optional[PersistentStore]:
+    """Lazy initialization of the shared tier, None when neither MEMOIZE_TABLE nor MEMOIZE_BUCKET is set"""
+    if not hasattr(get_store, 'store'):
+        table_name = os.environ.get('MEMOIZE_TABLE')
+        bucket = os.environ.get('MEMOIZE_BUCKET')
+        get_store.store = PersistentStore(table_name, bucket) if table_name or bucket else None
+    return get_store.store
+
+
+# Counted per container and emitted as CloudWatch metrics (EMF) by every call
+stats: Dict[str, int] = {'hits': 0, 'sharedHits': 0, 'misses': 0}
+
+
+def _record(namespace: str, outcome: str) -> None:
+    stats[outcome] += 1
+    try:
+        metric = {'hits': 'MemoizeHit', 'sharedHits': 'MemoizeSharedHit', 'misses': 'MemoizeMiss'}[outcome]
+        with single_metric(name=metric, unit=MetricUnit.Count, value=1,
+                           namespace=os.environ.get('POWERTOOLS_METRICS_NAMESPACE', 'memoize')) as m:
+            m.add_dimension(name='function', value=namespace)
+    except Exception as e:
+        logger.warning(f"Could not emit memoize metric: {str(e)}")
+
+
+def _cacheable(result: Any) -> bool:
+    # API Gateway error responses are answers about this call, not results of the input
+    return not (isinstance(result, dict) and isinstance(result.get('statusCode'), int) and result['statusCode'] >= 400)
+
+
+def memoize(ttl: int = DEFAULT_TTL_SECONDS, ignore: Iterable[str] = DEFAULT_IGNORE, shared: bool = True,
+            max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES,
+            version: str = '') -> Callable:
+    """
+    Cache the results of a handler that is a pure function of its event. Results are kept in
+    this container (LRU) and, with `shared`, in the DynamoDB/S3 tier for `ttl` seconds.
+    `ignore` lists event fields (dotted for nested ones) left out of the key; bump `version`
+    when the handler's output changes for the same input. Exceptions and 4xx/5xx responses
+    are not cached. Every call gets its own copy of the result, so callers can modify it.
+    Put it under @track_usage_middleware so calls are still tracked.
+    """
+    ignore = tuple(ignore)
+
+    def decorator(handler):
+        namespace = f"{handler.__module__}.{handler.__qualname__}{f'@{version}' if version else ''}"
+        local = LRUCache(max_entries, max_bytes)
+
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            key = cache_key(namespace, event, ignore)
+            now = time.time()
+
+            payload = local.get(key, now)
+            if payload is not MISS:
+                _record(namespace, 'hits')
+                return json.loads(payload)
+
+            store = get_store() if shared else None
+            if store:
+                try:
+                    stored = store.get(key, now)
+                except Exception as e:
+                    logger.warning(f"Memoize lookup failed: {str(e)}")
+                    stored = MISS
+                if stored is not MISS:
+                    _record(namespace, 'sharedHits')
+                    payload, expires_at = stored
+                    # No longer than the shared entry has left
+                    local.put(key, payload, expires_at, len(payload))
+                    return json.loads(payload)
+
+            _record(namespace, 'misses')
+            result = handler(event, context)
+            if not _cacheable(result):
+                return result
+
+            try:
+                payload = json.dumps(result)
+            except (TypeError, ValueError):
+                logger.warning(f"Result of {namespace} is not JSON serializable, not memoized")
+                return result
+            local.put(key, payload, now + ttl, len(payload))
+            if store:
+                try:
+                    if not store.put(key, payload, now + ttl):
+                        logger.info(f"Result of {namespace} is too large for the shared cache")
+                except Exception as e:
+                    # Caching must not break the main functionality
+                    logger.warning(f"Memoize store failed: {str(e)}")
+            return result
+
+        wrapper.cache = local
+        return wrapper
+
+    return decorator
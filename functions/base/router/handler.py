@@ -0,0 +1,90 @@
+# functions/base/router/handler.py
+"""
+One Lambda serving several functions/lib functions (`router: <group>` in their function.yml,
+see deploy/router.js), so that low-traffic functions share warm containers.
+
+The function is picked from the alias the router was invoked through (flows and the warmer
+invoke one alias per function) or from the /lib/<name> path of an HTTP API request. Its
+handler module is imported the first time it is needed and kept for the life of the container.
+"""
+import re
+import json
+import logging
+import importlib
+from typing import Any, Callable, Dict, Optional
+
+from functions.base.api_usage.handler import is_warmup_event, warmup_response
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+MODULE_TEMPLATE = 'functions.lib.{name}.handler'
+FUNCTION_NAME = re.compile(r'^[A-Za-z0-9_-]+$')
+LIB_PATH = re.compile(r'/lib/([A-Za-z0-9_-]+)/?$')
+
+_handlers: Dict[str, Callable] = {}
+
+
+class UnknownFunction(LookupError):
+    """Raised when an invocation doesn't name a function this router can serve"""
+
+
+def function_name(event: Any, context: Any) -> Optional[str]:
+    """Alias qualifier of the invoked ARN, else the last segment of a /lib/<name> request path"""
+    arn = getattr(context, 'invoked_function_arn', '') or ''
+    parts = arn.split(':')
+    # arn:aws:lambda:<region>:<account>:function:<name>:<alias>
+    if len(parts) == 8 and parts[7] != '$LATEST' and not parts[7].isdigit():
+        return parts[7]
+
+    if isinstance(event, dict):
+        path = event.get('rawPath') or event.get('requestContext', {}).get('http', {}).get('path') or ''
+        match = LIB_PATH.search(path)
+        if match:
+            return match.group(1)
+    return None
+
+
+def load_handler(name: str) -> Callable:
+    """The handler of functions/lib/<name>/handler.py, imported once per container"""
+    if name not in _handlers:
+        if not FUNCTION_NAME.match(name):
+            raise UnknownFunction(f"Invalid function name {name}")
+        module_name = MODULE_TEMPLATE.format(name=name)
+        try:
+            module = importlib.import_module(module_name)
+        except ModuleNotFoundError as e:
+            if e.name and module_name.startswith(e.name):
+                raise UnknownFunction(f"Function {name} not found")
+            raise
+        _handlers[name] = module.handler
+        logger.info(f"Loaded {module_name}")
+    return _handlers[name]
+
+
+def handler(event, context):
+    name = function_name(event, context)
+    is_http = isinstance(event, dict) and 'requestContext' in event and 'http' in event['requestContext']
+
+    if is_warmup_event(event):
+        # Warming an alias also imports its function so the first real call skips it
+        if name:
+            try:
+                load_handler(name)
+            except Exception as e:
+                logger.warning(f"Could not preload {name}: {str(e)}")
+        return warmup_response(event)
+
+    try:
+        if not name:
+            raise UnknownFunction('No function in the invoked alias or request path')
+        function = load_handler(name)
+    except UnknownFunction as e:
+        if not is_http:
+            raise
+        return {
+            'statusCode': 404,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)})
+        }
+    return function(event, context)
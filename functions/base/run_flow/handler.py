@@ -5,12 +5,17 @@ import logging
 from typing import Dict, Any
 
 from functions.base.api_usage.handler import track_usage_middleware
+from functions.base.admission import handler as admission
+from functions.base.run_flow.names import execution_name
+from functions.base.run_flow.schemas import InvalidInput, get_validators, validate_input
 
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 sfn = boto3.client('stepfunctions')
+# Compiled during the cold start rather than on the first request
+get_validators()
 
 
 def get_state_machine_arn(flow_name: str) -> str:
@@ -37,23 +42,44 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         user_id = event['requestContext']['authorizer']['jwt']['claims']['sub']
         logger.info(f"userId: {user_id}")
 
-        # Get the state machine ARN
-        state_machine_arn = get_state_machine_arn(flow_name)
-
         # Parse request body if present, otherwise use empty dict
         body = {}
         if event.get('body'):
             body = json.loads(event['body'])
 
+        # Malformed input is rejected before anything is started
+        validate_input(flow_name, body)
+
+        # Get the state machine ARN
+        state_machine_arn = get_state_machine_arn(flow_name)
+
         # Add user ID to input
         execution_input = {
             **body,
             '__user_id': user_id
         }
 
-        # Start the state machine execution with user ID
+        if admission.admission_mode() == 'queued':
+            # The dispatcher starts it (functions/base/admission), the ticket resolves to the execution
+            ticket = admission.enqueue(flow_name, state_machine_arn, user_id, execution_input)
+            logger.info(f"Queued {flow_name} as ticket {ticket['ticketId']}")
+            return {
+                "statusCode": 202,
+                "headers": {
+                    "Content-Type": "application/json",
+                    "Access-Control-Allow-Origin": "*"
+                },
+                "body": json.dumps({
+                    "message": f"Queued {flow_name}",
+                    "ticket": ticket['ticketId'],
+                    "status": "QUEUED"
+                })
+            }
+
+        # Start the state machine execution with user ID, named after its owner for list_runs
         response = sfn.start_execution(
             stateMachineArn=state_machine_arn,
+            name=execution_name(user_id),
             input=json.dumps(execution_input)
         )
 
@@ -86,6 +112,21 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             })
         }
 
+    except InvalidInput as e:
+        logger.info(f"Invalid input for {flow_name}: {e}")
+        return {
+            "statusCode": 400,
+            "headers": {
+                "Content-Type": "application/json",
+                "Access-Control-Allow-Origin": "*"
+            },
+            "body": json.dumps({
+                "error": f"Invalid input: {e}",
+                "path": e.path,
+                "status": "ERROR"
+            })
+        }
+
     except json.JSONDecodeError:
         logger.error("Invalid JSON in request body")
         return {
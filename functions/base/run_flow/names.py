@@ -0,0 +1,27 @@
+# functions/base/run_flow/names.py
+"""
+Execution names that carry their owner, so a user's executions can be told apart from
+their name in list_executions instead of describing each one: the first 16 hex digits of
+the SHA-256 of the user id, a dash and 32 random hex digits.
+"""
+import re
+import uuid
+import hashlib
+from typing import Optional
+
+OWNED_NAME = re.compile(r'^([0-9a-f]{16})-[0-9a-f]{32}$')
+
+
+def owner_tag(user_id: str) -> str:
+    return hashlib.sha256(user_id.encode()).hexdigest()[:16]
+
+
+def execution_name(user_id: str, token: Optional[str] = None) -> str:
+    """Name of an execution started for `user_id`, `token` (32 hex digits) defaults to a random one"""
+    return f"{owner_tag(user_id)}-{token or uuid.uuid4().hex}"
+
+
+def name_owner_tag(name: str) -> Optional[str]:
+    """Owner tag of an execution name, None for names that don't carry one (older executions)"""
+    match = OWNED_NAME.match(name)
+    return match.group(1) if match else None
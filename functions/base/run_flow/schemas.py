@@ -0,0 +1,61 @@
+# functions/base/run_flow/schemas.py
+"""
+The `inputSchema` of each flow, written to flow_schemas.json at deploy time by
+`python -m tools.flows schemas` and compiled once per container, so run_flow rejects a
+malformed body with 400 before anything is started.
+"""
+import os
+import json
+import logging
+from typing import Any, Callable, Dict
+
+import fastjsonschema
+
+logger = logging.getLogger(__name__)
+
+SCHEMAS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'flow_schemas.json')
+
+
+class InvalidInput(ValueError):
+    def __init__(self, message: str, path: str = '$'):
+        super().__init__(message)
+        self.path = path
+
+
+def load_schemas(path: str = SCHEMAS_FILE) -> Dict[str, Dict]:
+    """{flow: inputSchema}, empty when the file wasn't generated (no flow is checked)"""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def get_validators() -> Dict[str, Callable]:
+    """
+    Compiled validators, cached for the life of the container. A schema that doesn't compile is
+    logged and skipped (`python -m tools.flows schemas` fails the deploy on it) so the other
+    flows keep working.
+    """
+    if not hasattr(get_validators, 'validators'):
+        validators = {}
+        for flow, schema in load_schemas().items():
+            try:
+                validators[flow] = fastjsonschema.compile(schema)
+            except Exception:
+                logger.exception(f"Input schema of {flow} doesn't compile, its input isn't checked")
+        get_validators.validators = validators
+    return get_validators.validators
+
+
+def validate_input(flow_name: str, body: Any) -> None:
+    """Raises InvalidInput when the body doesn't match the flow's inputSchema"""
+    validator = get_validators().get(flow_name)
+    if validator is None:
+        return
+    try:
+        validator(body)
+    except fastjsonschema.JsonSchemaValueException as e:
+        path = '$' + ''.join(f"[{part}]" if str(part).isdigit() else f".{part}" for part in e.path[1:])
+        # fastjsonschema names the validated value `data`
+        message = 'input' + e.message[len('data'):] if e.message.startswith('data') else e.message
+        raise InvalidInput(message, path) from None
@@ -0,0 +1,265 @@
+# functions/base/stream/handler.py
+"""
+Push channel for execution status: clients connect to the WebSocket API, subscribe to an
+execution or to their runs of a flow, and get every status change (with the output once
+the execution finishes) instead of polling GET /run/{flow_name}/{execution_id}.
+"""
+import os
+import json
+import time
+import boto3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from boto3.dynamodb.conditions import Key
+from aws_lambda_powertools import Logger
+
+logger = Logger()
+
+TERMINAL_STATUSES = {'SUCCEEDED', 'FAILED', 'TIMED_OUT', 'ABORTED'}
+
+# API Gateway closes WebSocket connections after 2 hours, stale items expire shortly after
+CONNECTION_TTL_SECONDS = 3 * 60 * 60
+# Messages over the WebSocket frame limit are sent without the output (fetch it with get_flow_result)
+MAX_MESSAGE_BYTES = 120 * 1024
+MAX_WORKERS = 16
+
+CONNECTION_PREFIX = 'connection#'
+EXECUTION_PREFIX = 'execution#'
+FLOW_PREFIX = 'flow#'
+
+
+def get_table():
+    """Lazy initialization of the subscriptions table (topic, connectionId)"""
+    if not hasattr(get_table, 'table'):
+        get_table.table = boto3.resource('dynamodb').Table(os.environ['STREAM_TABLE'])
+    return get_table.table
+
+
+def get_gateway():
+    """Client posting to the connections of the WebSocket API"""
+    if not hasattr(get_gateway, 'client'):
+        get_gateway.client = boto3.client('apigatewaymanagementapi', endpoint_url=os.environ['STREAM_ENDPOINT'])
+    return get_gateway.client
+
+
+def get_sfn():
+    if not hasattr(get_sfn, 'client'):
+        get_sfn.client = boto3.client('stepfunctions')
+    return get_sfn.client
+
+
+def get_cognito():
+    if not hasattr(get_cognito, 'client'):
+        get_cognito.client = boto3.client('cognito-idp')
+    return get_cognito.client
+
+
+def flow_topic(flow_name: str, user_id: str) -> str:
+    # Flow subscriptions only ever see the subscriber's own executions
+    return f"{FLOW_PREFIX}{flow_name}#{user_id}"
+
+
+def flow_name_of(execution_arn: str) -> str:
+    """arn:aws:states:<region>:<account>:execution:<flow>:<name> -> <flow>"""
+    return execution_arn.split(':')[6]
+
+
+def _reply(status_code: int, body: Dict) -> Dict[str, Any]:
+    return {'statusCode': status_code, 'body': json.dumps(body)}
+
+
+def _user_of_connection(connection_id: str) -> Optional[str]:
+    item = get_table().get_item(Key={'topic': f"{CONNECTION_PREFIX}{connection_id}",
+                                     'connectionId': connection_id}).get('Item')
+    return item['userId'] if item else None
+
+
+def connect(event, context):
+    """$connect: the Cognito access token comes in the `token` query string parameter"""
+    connection_id = event['requestContext']['connectionId']
+    token = (event.get('queryStringParameters') or {}).get('token')
+    if not token:
+        return _reply(401, {'error': 'Missing token'})
+    try:
+        user = get_cognito().get_user(AccessToken=token)
+    except Exception as e:
+        logger.warning(f"Rejecting connection {connection_id}: {str(e)}")
+        return _reply(401, {'error': 'Invalid token'})
+
+    user_id = next((attribute['Value'] for attribute in user['UserAttributes'] if attribute['Name'] == 'sub'),
+                   user['Username'])
+    get_table().put_item(Item={
+        'topic': f"{CONNECTION_PREFIX}{connection_id}",
+        'connectionId': connection_id,
+        'userId': user_id,
+        'ttl': int(time.time()) + CONNECTION_TTL_SECONDS
+    })
+    return _reply(200, {'connected': True})
+
+
+def remove_connection(connection_id: str) -> None:
+    """Delete the connection and all its subscriptions"""
+    table = get_table()
+    kwargs = {'IndexName': 'connectionId-index', 'KeyConditionExpression': Key('connectionId').eq(connection_id)}
+    with table.batch_writer() as batch:
+        while True:
+            response = table.query(**kwargs)
+            for item in response['Items']:
+                batch.delete_item(Key={'topic': item['topic'], 'connectionId': connection_id})
+            if 'LastEvaluatedKey' not in response:
+                break
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def disconnect(event, context):
+    remove_connection(event['requestContext']['connectionId'])
+    return _reply(200, {'disconnected': True})
+
+
+def execution_message(execution: Dict[str, Any]) -> Dict[str, Any]:
+    """Message sent to subscribers, from describe_execution or a status change event's detail"""
+    def timestamp(value):
+        # datetimes from describe_execution, epoch milliseconds in events
+        return value.isoformat() if hasattr(value, 'isoformat') else value
+
+    message = {
+        'type': 'execution',
+        'executionArn': execution['executionArn'],
+        'flow': flow_name_of(execution['executionArn']),
+        'status': execution['status'],
+        'startDate': timestamp(execution.get('startDate')),
+        'stopDate': timestamp(execution.get('stopDate'))
+    }
+    if execution['status'] in TERMINAL_STATUSES:
+        output = execution.get('output')
+        message['output'] = json.loads(output) if output else None
+        if execution.get('error'):
+            message['error'] = execution['error']
+            message['cause'] = execution.get('cause')
+        if len(json.dumps(message, default=str)) > MAX_MESSAGE_BYTES or (
+                output is None and execution.get('outputDetails', {}).get('included') is False):
+            message['output'] = None
+            message['outputTruncated'] = True
+    return message
+
+
+def send(connection_id: str, message: Dict[str, Any]) -> bool:
+    """Post a message, False (and the connection cleaned up) when the client is gone"""
+    gateway = get_gateway()
+    try:
+        gateway.post_to_connection(ConnectionId=connection_id, Data=json.dumps(message, default=str).encode())
+        return True
+    except gateway.exceptions.GoneException:
+        remove_connection(connection_id)
+        return False
+
+
+def subscribe(connection_id: str, user_id: str, request: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Store the subscription, returning the messages to send back"""
+    table = get_table()
+    expires = int(time.time()) + CONNECTION_TTL_SECONDS
+
+    if request.get('executionArn'):
+        execution_arn = request['executionArn']
+        try:
+            execution = get_sfn().describe_execution(executionArn=execution_arn)
+            owner = json.loads(execution.get('input') or '{}').get('__user_id')
+        except Exception:
+            execution, owner = None, None
+        # Same rule as get_flow_result: only the user that started the execution can follow it
+        if owner != user_id:
+            return [{'type': 'error', 'error': 'Not authorized to access this execution', 'executionArn': execution_arn}]
+
+        table.put_item(Item={'topic': f"{EXECUTION_PREFIX}{execution_arn}", 'connectionId': connection_id,
+                             'userId': user_id, 'ttl': expires})
+        replies = [{'type': 'subscribed', 'executionArn': execution_arn}]
+        # It may have finished before the subscription was stored
+        if execution['status'] in TERMINAL_STATUSES:
+            replies.append(execution_message(execution))
+        return replies
+
+    if request.get('flow'):
+        table.put_item(Item={'topic': flow_topic(request['flow'], user_id), 'connectionId': connection_id,
+                             'userId': user_id, 'ttl': expires})
+        return [{'type': 'subscribed', 'flow': request['flow']}]
+
+    return [{'type': 'error', 'error': 'subscribe needs an executionArn or a flow'}]
+
+
+def unsubscribe(connection_id: str, user_id: str, request: Dict[str, Any]) -> Dict[str, Any]:
+    if request.get('executionArn'):
+        topic = f"{EXECUTION_PREFIX}{request['executionArn']}"
+    elif request.get('flow'):
+        topic = flow_topic(request['flow'], user_id)
+    else:
+        return {'type': 'error', 'error': 'unsubscribe needs an executionArn or a flow'}
+    get_table().delete_item(Key={'topic': topic, 'connectionId': connection_id})
+    return {'type': 'unsubscribed', **{key: request[key] for key in ('executionArn', 'flow') if key in request}}
+
+
+def message(event, context):
+    """subscribe / unsubscribe routes (and $default): {"action": "subscribe", "executionArn" | "flow": ...}"""
+    connection_id = event['requestContext']['connectionId']
+    try:
+        request = json.loads(event.get('body') or '{}')
+    except json.JSONDecodeError:
+        request = {}
+
+    user_id = _user_of_connection(connection_id)
+    if not user_id:
+        return _reply(403, {'error': 'Unknown connection'})
+
+    action = request.get('action')
+    if action == 'subscribe':
+        replies = subscribe(connection_id, user_id, request)
+    elif action == 'unsubscribe':
+        replies = [unsubscribe(connection_id, user_id, request)]
+    else:
+        replies = [{'type': 'error', 'error': f"Unknown action '{action}', use subscribe or unsubscribe"}]
+    for reply in replies:
+        send(connection_id, reply)
+    return _reply(200, replies[0])
+
+
+def subscribers(topics: List[str]) -> List[Dict[str, Any]]:
+    table = get_table()
+    items = []
+    for topic in topics:
+        kwargs = {'KeyConditionExpression': Key('topic').eq(topic)}
+        while True:
+            response = table.query(**kwargs)
+            items.extend(response['Items'])
+            if 'LastEvaluatedKey' not in response:
+                break
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return items
+
+
+def notify(event, context):
+    """EventBridge 'Step Functions Execution Status Change': fan the new status out to the subscribers"""
+    detail = event['detail']
+    execution_arn = detail['executionArn']
+    try:
+        user_id = json.loads(detail.get('input') or '{}').get('__user_id')
+    except json.JSONDecodeError:
+        user_id = None
+
+    topics = [f"{EXECUTION_PREFIX}{execution_arn}"]
+    if user_id:
+        topics.append(flow_topic(flow_name_of(execution_arn), user_id))
+    connections = sorted({item['connectionId'] for item in subscribers(topics)})
+    if not connections:
+        return {'sent': 0}
+
+    body = execution_message(detail)
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(connections))) as executor:
+        sent = sum(executor.map(lambda connection_id: send(connection_id, body), connections))
+
+    # Nobody needs the execution once it has finished
+    if detail['status'] in TERMINAL_STATUSES:
+        with get_table().batch_writer() as batch:
+            for connection_id in connections:
+                batch.delete_item(Key={'topic': topics[0], 'connectionId': connection_id})
+
+    logger.info(f"{execution_arn} {detail['status']}: sent to {sent} of {len(connections)} connections")
+    return {'sent': sent}
@@ -0,0 +1,152 @@
+# functions/base/stream/local.py
+"""
+In-memory stand-in for the WebSocket API, the subscriptions table, Cognito and Step Functions,
+so the stream handlers can be exercised without AWS:
+
+    stream = LocalStream(users={'token-1': 'user-1'}).install()
+    connection = stream.connect('token-1')
+    stream.message(connection, {'action': 'subscribe', 'flow': 'helloWorldFlow'})
+    stream.status_change(arn, 'SUCCEEDED', input={'__user_id': 'user-1'}, output={'ok': True})
+    stream.received(connection)
+"""
+import json
+import itertools
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from functions.base.stream import handler
+
+
+class GoneException(Exception):
+    pass
+
+
+class _Exceptions:
+    GoneException = GoneException
+
+
+class LocalTable:
+    """The subset of a DynamoDB Table (with the connectionId-index GSI) the handlers use"""
+
+    def __init__(self):
+        self.items: Dict[tuple, Dict] = {}
+
+    def put_item(self, Item):
+        self.items[(Item['topic'], Item['connectionId'])] = dict(Item)
+
+    def get_item(self, Key):
+        item = self.items.get((Key['topic'], Key['connectionId']))
+        return {'Item': dict(item)} if item else {}
+
+    def delete_item(self, Key):
+        self.items.pop((Key['topic'], Key['connectionId']), None)
+
+    def query(self, KeyConditionExpression, IndexName=None, **kwargs):
+        key, value = KeyConditionExpression.get_expression()['values']
+        return {'Items': [dict(item) for item in self.items.values() if item.get(key.name) == value]}
+
+    @contextmanager
+    def batch_writer(self):
+        yield self
+
+
+class LocalGateway:
+    """Records what is posted to each connection; closed connections raise GoneException"""
+
+    exceptions = _Exceptions
+
+    def __init__(self):
+        self.messages: Dict[str, List[Dict]] = {}
+        self.closed = set()
+
+    def post_to_connection(self, ConnectionId, Data):
+        if ConnectionId in self.closed:
+            raise GoneException(ConnectionId)
+        self.messages.setdefault(ConnectionId, []).append(json.loads(Data))
+
+
+class LocalCognito:
+    def __init__(self, users: Dict[str, str]):
+        self.users = users
+
+    def get_user(self, AccessToken):
+        if AccessToken not in self.users:
+            raise ValueError('Invalid Access Token')
+        return {'Username': AccessToken, 'UserAttributes': [{'Name': 'sub', 'Value': self.users[AccessToken]}]}
+
+
+class LocalStepFunctions:
+    def __init__(self):
+        self.executions: Dict[str, Dict] = {}
+
+    def describe_execution(self, executionArn):
+        if executionArn not in self.executions:
+            raise ValueError(f"Execution does not exist: {executionArn}")
+        return dict(self.executions[executionArn])
+
+
+class LocalStream:
+    """Drives the handlers the way API Gateway and EventBridge would"""
+
+    def __init__(self, users: Optional[Dict[str, str]] = None):
+        self.table = LocalTable()
+        self.gateway = LocalGateway()
+        self.cognito = LocalCognito(users or {})
+        self.sfn = LocalStepFunctions()
+        self._ids = itertools.count(1)
+
+    def install(self) -> 'LocalStream':
+        handler.get_table.table = self.table
+        handler.get_gateway.client = self.gateway
+        handler.get_cognito.client = self.cognito
+        handler.get_sfn.client = self.sfn
+        return self
+
+    def uninstall(self) -> None:
+        for getter, attribute in ((handler.get_table, 'table'), (handler.get_gateway, 'client'),
+                                  (handler.get_cognito, 'client'), (handler.get_sfn, 'client')):
+            if hasattr(getter, attribute):
+                delattr(getter, attribute)
+
+    def connect(self, token: Optional[str]) -> Optional[str]:
+        """Connection id, or None when $connect rejects the token"""
+        connection_id = f"conn-{next(self._ids)}"
+        event = {'requestContext': {'connectionId': connection_id, 'routeKey': '$connect'},
+                 'queryStringParameters': {'token': token} if token else None}
+        return connection_id if handler.connect(event, None)['statusCode'] == 200 else None
+
+    def disconnect(self, connection_id: str) -> None:
+        handler.disconnect({'requestContext': {'connectionId': connection_id, 'routeKey': '$disconnect'}}, None)
+
+    def close(self, connection_id: str) -> None:
+        """Client went away without $disconnect (the next post gets GoneException)"""
+        self.gateway.closed.add(connection_id)
+
+    def message(self, connection_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        event = {'requestContext': {'connectionId': connection_id, 'routeKey': body.get('action', '$default')},
+                 'body': json.dumps(body)}
+        return json.loads(handler.message(event, None)['body'])
+
+    def start(self, execution_arn: str, input: Dict[str, Any]) -> None:
+        self.sfn.executions[execution_arn] = {'executionArn': execution_arn, 'status': 'RUNNING',
+                                              'input': json.dumps(input), 'startDate': 0}
+
+    def status_change(self, execution_arn: str, status: str, input: Optional[Dict] = None,
+                      output: Any = None) -> Dict[str, Any]:
+        """Send the EventBridge event Step Functions emits when an execution changes status"""
+        execution = self.sfn.executions.setdefault(execution_arn, {'executionArn': execution_arn, 'startDate': 0})
+        if input is not None:
+            execution['input'] = json.dumps(input)
+        execution['status'] = status
+        if output is not None:
+            execution['output'] = json.dumps(output)
+            execution['stopDate'] = 1
+        event = {
+            'source': 'aws.states',
+            'detail-type': 'Step Functions Execution Status Change',
+            'detail': {**execution, 'stateMachineArn': execution_arn.replace(':execution:', ':stateMachine:').rsplit(':', 1)[0]}
+        }
+        return handler.notify(event, None)
+
+    def received(self, connection_id: str) -> List[Dict]:
+        return self.gateway.messages.get(connection_id, [])
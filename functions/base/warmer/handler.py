@@ -0,0 +1,65 @@
+# functions/base/warmer/handler.py
+import json
+import boto3
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from functions.base.api_usage.handler import WARMUP_KEY
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# How long each of a target's concurrent invocations keeps its container busy,
+# so that Lambda can't serve two of them with the same container
+HOLD_MS = 100
+MAX_WORKERS = 32
+
+lambda_client = boto3.client('lambda')
+
+
+def warmup_event(concurrency: int, index: int) -> Dict[str, Any]:
+    """Sentinel event short-circuited by track_usage_middleware"""
+    return {WARMUP_KEY: {'concurrency': concurrency, 'index': index, 'holdMs': HOLD_MS if concurrency > 1 else 0}}
+
+
+def invoke(function_name: str, concurrency: int, index: int) -> bool:
+    try:
+        response = lambda_client.invoke(
+            FunctionName=function_name,
+            InvocationType='RequestResponse',
+            Payload=json.dumps(warmup_event(concurrency, index))
+        )
+        if response.get('FunctionError'):
+            logger.warning(f"Warming {function_name} failed: {response['Payload'].read().decode()}")
+            return False
+        return True
+    except Exception as e:
+        # A target that can't be warmed must not stop the others
+        logger.warning(f"Could not warm {function_name}: {str(e)}")
+        return False
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Invoked on a schedule by the rules generated from `warmup:` in function.yml and flow
+    files (see deploy/warmup.js), with {"targets": [{"function": name, "concurrency": n}]}.
+    Every invocation of every target is sent at once so that n containers stay warm.
+    """
+    targets: List[Dict[str, Any]] = event.get('targets', [])
+    calls = [
+        (target['function'], int(target.get('concurrency', 1)), index)
+        for target in targets
+        for index in range(int(target.get('concurrency', 1)))
+    ]
+    if not calls:
+        return {'warmed': {}}
+
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(calls))) as executor:
+        results = list(executor.map(lambda call: invoke(*call), calls))
+
+    warmed: Dict[str, int] = {}
+    for (function_name, _, _), ok in zip(calls, results):
+        warmed[function_name] = warmed.get(function_name, 0) + int(ok)
+    logger.info(f"Warmed containers: {json.dumps(warmed)}")
+    return {'warmed': warmed}
@@ -0,0 +1,89 @@
+# functions/base/watchdog/handler.py
+import json
+import boto3
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+STOP_ERROR = 'Watchdog.BudgetExceeded'
+# Executions stopped per run, the next run picks up the rest
+MAX_STOPS = 200
+
+sfn = boto3.client('stepfunctions')
+
+
+def running_executions(state_machine_arn: str):
+    for page in sfn.get_paginator('list_executions').paginate(stateMachineArn=state_machine_arn,
+                                                                statusFilter='RUNNING'):
+        yield from page['executions']
+
+
+def state_transitions(execution_arn: str, limit: int) -> int:
+    """States entered so far, counting no further than just over `limit`"""
+    count = 0
+    pages = sfn.get_paginator('get_execution_history').paginate(executionArn=execution_arn,
+                                                                includeExecutionData=False)
+    for page in pages:
+        count += sum(1 for event in page['events'] if event['type'].endswith('StateEntered'))
+        if count > limit:
+            break
+    return count
+
+
+def over_budget(execution: Dict[str, Any], budget: Dict[str, Any], now: datetime) -> Optional[Dict[str, Any]]:
+    """Why the execution must be stopped, with what it had used, or None"""
+    running_seconds = int((now - execution['startDate']).total_seconds())
+    max_duration = budget.get('maxDurationSeconds')
+    if max_duration and running_seconds > max_duration:
+        # TimeoutSeconds stops these, unless they started before the budget was deployed
+        return {'reason': f"ran {running_seconds}s, budget {max_duration}s", 'runningSeconds': running_seconds}
+
+    max_transitions = budget.get('maxStateTransitions')
+    if max_transitions:
+        transitions = state_transitions(execution['executionArn'], max_transitions)
+        if transitions > max_transitions:
+            return {'reason': f"over {max_transitions} state transitions", 'runningSeconds': running_seconds,
+                    'stateTransitions': transitions}
+    return None
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Invoked on a schedule by the rule generated from the flows' `maxDurationSeconds` and
+    `maxStateTransitions` (see deploy/watchdog.js), with {"flows": [{"flow", "stateMachineArn",
+    "maxDurationSeconds", "maxStateTransitions"}]}. Stops the RUNNING executions over their
+    flow's budget and reports them; {"dryRun": true} only reports.
+    """
+    now = datetime.now(timezone.utc)
+    dry_run = bool(event.get('dryRun'))
+    checked = 0
+    stopped: List[Dict[str, Any]] = []
+
+    for budget in event.get('flows', []):
+        try:
+            for execution in running_executions(budget['stateMachineArn']):
+                if len(stopped) >= MAX_STOPS:
+                    break
+                checked += 1
+                usage = over_budget(execution, budget, now)
+                if not usage:
+                    continue
+                if not dry_run:
+                    try:
+                        sfn.stop_execution(executionArn=execution['executionArn'], error=STOP_ERROR,
+                                           cause=f"{budget['flow']} {usage['reason']}")
+                    except sfn.exceptions.ExecutionDoesNotExist:
+                        continue
+                stopped.append({'executionArn': execution['executionArn'], 'flow': budget['flow'], **usage})
+        except Exception as e:
+            # One flow failing to list must not spare the others
+            logger.error(f"Could not check {budget.get('flow')}: {str(e)}")
+
+    logger.info(json.dumps({'checked': checked, 'stopped': len(stopped), 'dryRun': dry_run}))
+    for item in stopped:
+        logger.warning(f"{'Would stop' if dry_run else 'Stopped'} {item['executionArn']}: {item['reason']}")
+
+    return {'checked': checked, 'stopped': stopped, 'dryRun': dry_run}
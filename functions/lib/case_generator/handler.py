@@ -0,0 +1,21 @@
+# functions/lib/case_generator/handler.py
+from functions.base.api_usage.handler import track_usage_middleware
+
+DEFAULT_PAGE_SIZE = 1000
+
+
+@track_usage_middleware
+def handler(event, context):
+    """
+    Generator of an `inputSource` (see flows/streamedMapFlow.yml): one page of cases per call,
+    {"count", "pageSize", "cursor"} -> {"items": [...], "cursor": <next page or None>}
+    """
+    count = int(event.get('count', 10))
+    page_size = int(event.get('pageSize', DEFAULT_PAGE_SIZE))
+    start = int(event.get('cursor') or 0)
+    end = min(start + page_size, count)
+    return {
+        "items": [{"id": f"case{i + 1}", "variables": {"param1": f"value{i + 1}", "param2": i}}
+                  for i in range(start, end)],
+        "cursor": end if end < count else None
+    }
@@ -4,16 +4,16 @@ import random
 
 
 from functions.base.api_usage.handler import track_usage_middleware
+from functions.base.logs.payload import log_payloads
 
 
 @track_usage_middleware
+@log_payloads
 def handler(event, context):
     """
     First step: Process incoming data
     Simulates data processing by adding random metrics
     """
-    print(f"ProcessData received event: {event}")
-
     # Simulate some processing
     processed_data = {
         "input": event,
@@ -23,6 +23,4 @@ def handler(event, context):
             "timestamp": "2024-01-01T00:00:00Z"
         }
     }
-
-    print(f"ProcessData output: {processed_data}")
     return processed_data
\ No newline at end of file
@@ -1,22 +1,12 @@
 # functions/lib/hello_world/handler.py
-import logging
 from functions.base.api_usage.handler import track_usage_middleware
-
-
-# Set up logging
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+from functions.base.logs.payload import log_payloads
 
 
 @track_usage_middleware
+@log_payloads
 def handler(event, context):
-    logger.info('Event received: %s', event)
-
-    try:
-        return {
-            "message": "Hello World!",
-            "input": event
-        }
-    except Exception as e:
-        logger.error('Error: %s', str(e))
-        raise
\ No newline at end of file
+    return {
+        "message": "Hello World!",
+        "input": event
+    }
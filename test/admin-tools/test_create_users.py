@@ -0,0 +1,77 @@
+import json
+import os
+import stat
+import threading
+
+from botocore.exceptions import ClientError
+
+from admin_tools import create_user
+
+
+class FakeCognito:
+    """Rejects existing users and fails to set some passwords"""
+
+    def __init__(self, existing=(), password_errors=()):
+        self.existing = set(existing)
+        self.password_errors = set(password_errors)
+        self.created = []
+        self.temporary_passwords = {}
+        self.lock = threading.Lock()
+
+    def admin_create_user(self, UserPoolId, Username, TemporaryPassword, **kwargs):
+        if Username in self.existing:
+            raise ClientError({'Error': {'Code': 'UsernameExistsException', 'Message': 'User already exists'}},
+                              'AdminCreateUser')
+        with self.lock:
+            self.created.append(Username)
+            self.temporary_passwords[Username] = TemporaryPassword
+
+    def admin_set_user_password(self, Username, **kwargs):
+        if Username in self.password_errors:
+            raise ClientError({'Error': {'Code': 'InvalidPasswordException', 'Message': 'Password too weak'}},
+                              'AdminSetUserPassword')
+
+
+def test_bulk_creation_reports_per_row():
+    cognito = FakeCognito(existing={'taken@example.com'})
+    emails = [f'user{i}@example.com' for i in range(20)] + ['taken@example.com']
+
+    results = create_user.create_users(emails, 'pool-id', workers=4, cognito=cognito)
+
+    assert [r['email'] for r in results] == emails
+    assert sorted(cognito.created) == sorted(emails[:-1])
+    assert all(r['status'] == 'created' and r['password'] for r in results[:-1])
+    assert results[-1] == {'email': 'taken@example.com', 'status': 'exists', 'password': '',
+                           'error': 'User already exists'}
+
+
+def test_users_without_a_permanent_password_keep_their_temporary_one():
+    cognito = FakeCognito(password_errors={'weak@example.com'})
+    [result] = create_user.create_users(['weak@example.com'], 'pool-id', workers=1, cognito=cognito)
+    assert result == {'email': 'weak@example.com', 'status': 'created_password_not_set',
+                      'password': cognito.temporary_passwords['weak@example.com'], 'error': 'Password too weak'}
+
+
+def test_throttles_are_retried_by_botocore_only(monkeypatch):
+    configs = []
+    monkeypatch.setattr(create_user.boto3, 'client', lambda name, config=None: configs.append(config))
+    create_user.cognito_client(workers=16)
+    assert configs[0].retries == {'mode': 'adaptive', 'max_attempts': create_user.MAX_ATTEMPTS}
+    assert configs[0].max_pool_connections == 16
+    assert not hasattr(create_user, 'with_throttle_retry')
+
+
+def test_read_users_file_and_secure_results(tmp_path):
+    csv_file = tmp_path / 'users.csv'
+    csv_file.write_text('email,name\na@example.com,A\n b@example.com ,B\n')
+    json_file = tmp_path / 'users.json'
+    json_file.write_text(json.dumps(['c@example.com', {'email': 'd@example.com'}]))
+
+    assert create_user.read_users_file(str(csv_file)) == ['a@example.com', 'b@example.com']
+    assert create_user.read_users_file(str(json_file)) == ['c@example.com', 'd@example.com']
+
+    output = tmp_path / 'created.json'
+    create_user.write_results([{'email': 'a@example.com', 'status': 'created', 'password': 'x', 'error': ''}],
+                              str(output))
+    assert stat.S_IMODE(os.stat(output).st_mode) == 0o600
+    assert json.loads(output.read_text())[0]['password'] == 'x'
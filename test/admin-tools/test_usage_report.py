@@ -0,0 +1,154 @@
+import csv
+import os
+import stat
+import threading
+
+import pytest
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-west-1')
+
+from admin_tools import get_user_usage
+
+
+class FakeTable:
+    """Serves scan segments and user queries between the yearMonth bounds, two items per page"""
+
+    def __init__(self, items):
+        self.items = items
+
+    def _between(self, kwargs):
+        values = kwargs['ExpressionAttributeValues']
+        return [item for item in self.items if values[':start'] <= item['yearMonth'] <= values[':end']]
+
+    def _page(self, items, kwargs):
+        start = kwargs.get('ExclusiveStartKey', {}).get('offset', 0)
+        response = {'Items': items[start:start + 2]}
+        if start + 2 < len(items):
+            response['LastEvaluatedKey'] = {'offset': start + 2}
+        return response
+
+    def scan(self, **kwargs):
+        segment_items = [item for i, item in enumerate(self._between(kwargs))
+                         if i % kwargs['TotalSegments'] == kwargs['Segment']]
+        return self._page(segment_items, kwargs)
+
+    def query(self, **kwargs):
+        user_id = kwargs['ExpressionAttributeValues'][':uid']
+        return self._page([item for item in self._between(kwargs) if item['userId'] == user_id], kwargs)
+
+
+class FakeSession:
+    table = None
+
+    def resource(self, name):
+        return self
+
+    def Table(self, name):
+        return FakeSession.table
+
+
+ITEMS = [
+    {'userId': f'user-{i}', 'yearMonth': '2024-05', 'apiCalls': i} for i in range(7)
+] + [
+    {'userId': f'user-{i}', 'yearMonth': 'DAY#2024-05-01', 'apiCalls': i} for i in range(2)
+] + [
+    {'userId': 'user-1', 'yearMonth': month, 'apiCalls': 10} for month in ('2024-01', '2024-02', '2024-03')
+]
+
+
+def test_parallel_scan_follows_pagination(monkeypatch):
+    FakeSession.table = FakeTable(ITEMS)
+    monkeypatch.setattr(get_user_usage.boto3.session, 'Session', FakeSession)
+
+    items = list(get_user_usage.iter_usage_items('2024-01', '2024-05', workers=3))
+    monthly = [i for i in ITEMS if not i['yearMonth'].startswith('DAY#')]
+    assert sorted((i['userId'], i['yearMonth']) for i in items) == sorted((i['userId'], i['yearMonth']) for i in monthly)
+
+    items = list(get_user_usage.iter_usage_items(*get_user_usage.usage_key_range('2024-05', '2024-05', daily=True)))
+    assert sorted(i['userId'] for i in items) == ['user-0', 'user-1']
+
+    items = list(get_user_usage.iter_usage_items('2024-01', '2024-05', user_ids=['user-1', 'user-2'], workers=2))
+    assert len(items) == 5
+
+
+def test_workers_get_the_table_name_from_the_caller(monkeypatch):
+    FakeSession.table = FakeTable(ITEMS)
+    monkeypatch.setattr(get_user_usage.boto3.session, 'Session', FakeSession)
+    lookups = []
+    monkeypatch.setattr(get_user_usage, 'get_table_name', lambda: lookups.append(1) or 'usage')
+
+    def no_default_session_clients(*args, **kwargs):
+        raise AssertionError('client created on the default session')
+
+    monkeypatch.setattr(get_user_usage.boto3, 'client', no_default_session_clients)
+    assert len(list(get_user_usage.iter_usage_items('2024-01', '2024-05', workers=4))) == 10
+    assert lookups == [1]
+
+
+@pytest.mark.parametrize('consume', ['close', 'raise'])
+def test_workers_stop_when_the_consumer_does(monkeypatch, consume):
+    FakeSession.table = FakeTable([{'userId': f'user-{i}', 'yearMonth': '2024-05'} for i in range(200)])
+    monkeypatch.setattr(get_user_usage.boto3.session, 'Session', FakeSession)
+    monkeypatch.setattr(get_user_usage, 'QUEUE_SIZE', 1)
+
+    def read_three():
+        items = get_user_usage.iter_usage_items('2024-05', '2024-05', workers=4)
+        try:
+            for i, _ in enumerate(items):
+                if i == 2 and consume == 'raise':
+                    raise ValueError('write failed')
+                if i == 2:
+                    break
+        except ValueError:
+            pass
+        items.close()
+
+    reader = threading.Thread(target=read_three, daemon=True)
+    reader.start()
+    reader.join(timeout=5)
+    assert not reader.is_alive(), 'workers blocked on the full queue'
+
+
+def test_single_email_is_one_filtered_lookup(monkeypatch):
+    calls = []
+
+    class FakeCognito:
+        def list_users(self, **kwargs):
+            calls.append(kwargs)
+            return {'Users': [{'Username': 'sub-1'}] if kwargs['Filter'] == 'email = "one@example.com"' else []}
+
+    monkeypatch.setattr(get_user_usage, 'get_user_pool_id', lambda refresh=False: 'pool')
+    monkeypatch.setattr(get_user_usage.boto3, 'client', lambda name: FakeCognito())
+    assert get_user_usage.find_user_id('one@example.com') == 'sub-1'
+    assert get_user_usage.find_user_id('nobody@example.com') is None
+    assert [call['UserPoolId'] for call in calls] == ['pool', 'pool']
+
+
+def test_cache_is_private(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_user_usage, 'CACHE_DIR', str(tmp_path / 'cache'))
+    (tmp_path / 'cache').mkdir()
+    (tmp_path / 'cache' / 'users-pool.json').write_text('{}')
+    os.chmod(tmp_path / 'cache' / 'users-pool.json', 0o644)
+
+    get_user_usage._write_cache('users-pool', {'one@example.com': 'sub-1'})
+    assert stat.S_IMODE(os.stat(tmp_path / 'cache' / 'users-pool.json').st_mode) == 0o600
+    assert get_user_usage._read_cache('users-pool') == {'one@example.com': 'sub-1'}
+
+
+def test_report_rows():
+    rows = list(get_user_usage.usage_rows(ITEMS[7:9], {'user-1': 'one@example.com'}))
+    assert rows[1] == {'userId': 'user-1', 'email': 'one@example.com', 'period': '2024-05-01', 'apiCalls': 1}
+    assert get_user_usage.usage_key_range('2024-05', '2024-06', daily=True) == ('DAY#2024-05-01', 'DAY#2024-06-31')
+    assert get_user_usage.usage_key_range('2024-05-03', '2024-05-09') == ('2024-05', '2024-05')
+
+    monthly = list(get_user_usage.usage_rows(ITEMS[:3], {}))
+    assert [row['period'] for row in monthly] == ['2024-05'] * 3
+    assert [row['apiCalls'] for row in monthly] == [0, 1, 2]
+
+
+def test_write_report_to_file(tmp_path):
+    output = tmp_path / 'report.csv'
+    count = get_user_usage.write_report(get_user_usage.usage_rows(ITEMS, {}), str(output))
+    assert count == len(ITEMS)
+    with open(output) as f:
+        assert len(list(csv.DictReader(f))) == len(ITEMS)
@@ -0,0 +1,202 @@
+import asyncio
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from workflows_client import AsyncWorkflowsClient, CognitoAuth, TokenCache, WorkflowsApiError, WorkflowsClient
+
+
+class StubApi(BaseHTTPRequestHandler):
+    """
+    Local stand-in for the API Gateway routes; executions finish after two polls. With `queued`,
+    runs get a ticket that starts its execution on its second poll
+    """
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    valid_tokens = {'token-1'}
+    executions = {}
+    tickets = {}
+    queued = False
+    polled = []
+    connections = set()
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorized(self):
+        with self.lock:
+            self.connections.add(self.client_address)
+        token = self.headers.get('Authorization', '').replace('Bearer ', '')
+        if token not in self.valid_tokens:
+            self._reply(401, {'message': 'Unauthorized'})
+            return False
+        return True
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if not self._authorized():
+            return
+        flow_name = self.path.split('/')[2]
+        if flow_name == 'missingFlow':
+            return self._reply(404, {'error': f"Flow '{flow_name}' not found", 'status': 'ERROR'})
+        if self.queued:
+            with self.lock:
+                ticket = f"ticket-{len(self.tickets)}"
+                self.tickets[ticket] = {'polls': 0, 'flow': flow_name, 'input': json.loads(body or b'{}')}
+            return self._reply(202, {'message': f"Queued {flow_name}", 'ticket': ticket, 'status': 'QUEUED'})
+        with self.lock:
+            arn = self._start(flow_name, json.loads(body or b'{}'))
+        self._reply(200, {'message': f"Started {flow_name}", 'executionArn': arn, 'status': 'SUCCESS'})
+
+    def _start(self, flow_name, execution_input):
+        arn = f"arn:aws:states:eu-west-1:123:execution:{flow_name}:{len(self.executions)}"
+        self.executions[arn] = {'polls': 0, 'input': execution_input}
+        return arn
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        parts = self.path.split('/')
+        if self.path == '/flows':
+            return self._reply(200, {'flows': [{'name': 'helloWorldFlow'}], 'count': 1})
+        if self.path == '/runs':
+            return self._reply(200, {'executions': [{'executionArn': arn} for arn in self.executions],
+                                     'count': len(self.executions)})
+        arn = urllib.parse.unquote(parts[3])
+        with self.lock:
+            self.polled.append(arn)
+            ticket = self.tickets.get(arn)
+            if ticket:
+                ticket['polls'] += 1
+                if ticket['polls'] < 2:
+                    return self._reply(202, {'ticket': arn, 'status': 'QUEUED', 'error': None})
+                ticket.setdefault('arn', self._start(ticket['flow'], ticket['input']))
+                arn = ticket['arn']
+            execution = self.executions[arn]
+            execution['polls'] += 1
+            done = execution['polls'] >= 2
+        self._reply(200, {'executionArn': arn, 'status': 'SUCCEEDED' if done else 'RUNNING',
+                          'output': execution['input'] if done else {}})
+
+
+@pytest.fixture
+def api():
+    StubApi.executions = {}
+    StubApi.tickets = {}
+    StubApi.queued = False
+    StubApi.polled = []
+    StubApi.connections = set()
+    StubApi.valid_tokens = {'token-1'}
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubApi)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+class FakeCognito:
+    def __init__(self):
+        self.calls = []
+
+    def initiate_auth(self, ClientId, AuthFlow, AuthParameters):
+        self.calls.append(AuthFlow)
+        result = {'IdToken': f"token-{len(self.calls)}", 'AccessToken': 'access', 'ExpiresIn': 3600}
+        if AuthFlow == 'USER_PASSWORD_AUTH':
+            result['RefreshToken'] = 'refresh'
+        return {'AuthenticationResult': result}
+
+
+def test_run_and_wait_reuses_connections(api):
+    with WorkflowsClient(api, token='token-1') as client:
+        results = [client.run_and_wait('helloWorldFlow', {'n': i}, poll_interval=0.01) for i in range(5)]
+        assert [r['output'] for r in results] == [{'n': i} for i in range(5)]
+        assert len(client.list_runs()) == 5
+        assert client.list_flows() == [{'name': 'helloWorldFlow'}]
+
+    # Keep-alive: 20 requests went through a single pooled connection
+    assert len(StubApi.connections) == 1
+
+
+def test_queued_runs_return_tickets_that_resolve_to_executions(api):
+    StubApi.queued = True
+    with WorkflowsClient(api, token='token-1') as client:
+        ticket = client.run('helloWorldFlow', {'n': 1})
+        assert ticket == 'ticket-0'
+        assert client.get_result('helloWorldFlow', ticket)['status'] == 'QUEUED'
+
+        result = client.run_and_wait('helloWorldFlow', {'n': 2}, poll_interval=0.01)
+        assert result['status'] == 'SUCCEEDED' and result['output'] == {'n': 2}
+        # Once started, the execution is polled instead of the ticket
+        assert StubApi.polled[-3:] == ['ticket-1', 'ticket-1', result['executionArn']]
+
+    async def main():
+        async with AsyncWorkflowsClient.create(api, token='token-1', concurrency=4) as client:
+            return await client.run_batch_and_wait('helloWorldFlow', [{'n': i} for i in range(10)],
+                                                   poll_interval=0.01)
+
+    assert [r['output'] for r in asyncio.run(main())] == [{'n': i} for i in range(10)]
+
+
+def test_errors_are_raised_with_status(api):
+    client = WorkflowsClient(api, token='token-1')
+    with pytest.raises(WorkflowsApiError) as error:
+        client.run('missingFlow')
+    assert error.value.status_code == 404
+
+
+def test_tokens_are_cached_on_disk_and_refreshed(api, tmp_path):
+    cache = TokenCache(str(tmp_path))
+    cognito = FakeCognito()
+    auth = CognitoAuth('client', 'user@example.com', 'secret', cache=cache, cognito=cognito)
+    assert auth.get_token() == 'token-1'
+
+    # A new process (new provider) reads the cached token instead of logging in again
+    auth = CognitoAuth('client', 'user@example.com', cache=cache, cognito=cognito)
+    assert auth.get_token() == 'token-1'
+    assert cognito.calls == ['USER_PASSWORD_AUTH']
+
+    # Close to expiry the refresh token is used
+    tokens = cache.load('client', 'user@example.com')
+    tokens['expires_at'] = time.time() + 60
+    cache.save('client', 'user@example.com', tokens)
+    auth = CognitoAuth('client', 'user@example.com', cache=cache, cognito=cognito)
+    assert auth.get_token() == 'token-2'
+    assert cognito.calls == ['USER_PASSWORD_AUTH', 'REFRESH_TOKEN_AUTH']
+
+
+def test_rejected_token_is_refreshed_once(api, tmp_path):
+    cognito = FakeCognito()
+    auth = CognitoAuth('client', 'user@example.com', 'secret', cache=TokenCache(str(tmp_path)), cognito=cognito)
+    auth.get_token()
+    StubApi.valid_tokens = {'token-2'}
+
+    client = WorkflowsClient(api, auth=auth)
+    assert client.list_flows() == [{'name': 'helloWorldFlow'}]
+    assert cognito.calls == ['USER_PASSWORD_AUTH', 'REFRESH_TOKEN_AUTH']
+
+
+def test_async_batch_launch_and_wait(api):
+    async def main():
+        async with AsyncWorkflowsClient.create(api, token='token-1', concurrency=8) as client:
+            return await client.run_batch_and_wait('helloWorldFlow', [{'n': i} for i in range(200)],
+                                                   poll_interval=0.01)
+
+    results = asyncio.run(main())
+    assert len(results) == 200
+    assert all(r['status'] == 'SUCCEEDED' for r in results)
+    assert [r['output']['n'] for r in results] == list(range(200))
+    assert len(StubApi.connections) <= 8
@@ -0,0 +1,8 @@
+import os
+
+# These call a deployed API and only run with API_URL and TOKEN set (see admin_tools/get_user_token.py),
+# everything else is hermetic
+LIVE_TEST_DIRS = ['api', 'flows', 'functions-lib']
+
+if not (os.getenv('API_URL') and os.getenv('TOKEN')):
+    collect_ignore_glob = [f"{directory}/*" for directory in LIVE_TEST_DIRS]
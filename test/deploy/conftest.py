@@ -0,0 +1,21 @@
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def node():
+    """Run a node script from the repo root with JSON arguments and return its JSON output"""
+    if not shutil.which('node') or not os.path.isdir(os.path.join(REPO_ROOT, 'node_modules', 'js-yaml')):
+        pytest.skip('node and js-yaml (npm install) are required')
+
+    def run(script, *args):
+        result = subprocess.run(['node', '-e', script, *[json.dumps(arg) for arg in args]],
+                                cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+        return json.loads(result.stdout)
+    return run
@@ -0,0 +1,83 @@
+PLAN = (
+    "const m = require('./deploy/deploy-manifest');"
+    "const [servicePath, manifest, images] = process.argv.slice(1).map(JSON.parse);"
+    "const current = m.snapshot(servicePath);"
+    "const deployed = { snapshot: current, images: {} };"
+    "Object.entries(images).forEach(([name, options]) => {"
+    "  deployed.images[name] = { inputs: m.imageInputs(current, name, options), uri: `repo@sha256:${name}` };"
+    "});"
+    "console.log(JSON.stringify({ deployed, plan: m.buildPlan(manifest, current, images) }));"
+)
+
+IMAGES = {
+    'baseimage': {'locked': True, 'withPlugins': False},
+    'deps-1234abcd': {'locked': True, 'withPlugins': False},
+}
+
+
+def make_service(root):
+    for path, content in {
+        'functions/lib/ping/handler.py': 'def handler(event, context): pass\n',
+        'functions/base/run_flow/handler.py': 'def handler(event, context): pass\n',
+        'flows/pingFlow.yml': 'name: pingFlow\ndefinition: {}\n',
+        'flows/otherFlow.yml': "name: 'otherFlow'\ndefinition: {}\n",
+        'layer/requirements-base.lock': 'boto3==1.34.11\n',
+        'layer/requirements-deps-1234abcd.lock': 'pandas==2.2.2\n',
+    }.items():
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_text(content)
+
+
+def actions(plan, section):
+    return {entry['name']: (entry['action'], entry['reasons']) for entry in plan[section]}
+
+
+def test_first_deploy_builds_everything(node, tmp_path):
+    make_service(tmp_path)
+    plan = node(PLAN, str(tmp_path), None, IMAGES)['plan']
+    assert {action for action, _ in actions(plan, 'images').values()} == {'build'}
+    assert actions(plan, 'stateMachines')['pingFlow'] == ('create', ['flows/pingFlow.yml'])
+
+
+def test_only_changed_inputs_are_rebuilt(node, tmp_path):
+    make_service(tmp_path)
+    deployed = node(PLAN, str(tmp_path), None, IMAGES)['deployed']
+
+    plan = node(PLAN, str(tmp_path), deployed, IMAGES)['plan']
+    assert {action for action, _ in actions(plan, 'images').values()} == {'reuse'}
+    assert {action for action, _ in actions(plan, 'stateMachines').values()} == {'unchanged'}
+
+    (tmp_path / 'layer/requirements-deps-1234abcd.lock').write_text('pandas==2.2.3\n')
+    (tmp_path / 'flows/pingFlow.yml').write_text('name: pingFlow\ndefinition: {StartAt: Ping}\n')
+    (tmp_path / 'flows/otherFlow.yml').unlink()
+    plan = node(PLAN, str(tmp_path), deployed, IMAGES)['plan']
+    assert actions(plan, 'images') == {
+        'baseimage': ('reuse', []),
+        'deps-1234abcd': ('build', ['layer/requirements-deps-1234abcd.lock changed'])
+    }
+    assert actions(plan, 'stateMachines') == {
+        'otherFlow': ('delete', ['flows/otherFlow.yml removed']),
+        'pingFlow': ('update', ['flows/pingFlow.yml changed'])
+    }
+
+    (tmp_path / 'functions/lib/ping/handler.py').write_text('def handler(event, context): return 1\n')
+    plan = node(PLAN, str(tmp_path), deployed, IMAGES)['plan']
+    assert actions(plan, 'images')['baseimage'] == ('build', ['functions/lib/ping changed'])
+
+
+def test_generator_modules_update_every_state_machine(node, tmp_path):
+    make_service(tmp_path)
+    deployed = node(PLAN, str(tmp_path), None, IMAGES)['deployed']
+    modules = deployed['snapshot']['generators']['stepFunctions']
+    assert {'deploy/generate-step-functions.js', 'deploy/retry.js', 'deploy/input-source.js',
+            'deploy/watchdog.js', 'deploy/function-config.js'} <= set(modules)
+
+    deployed['snapshot']['generators']['stepFunctions'] = {**modules, 'deploy/retry.js': 'before'}
+    plan = node(PLAN, str(tmp_path), deployed, IMAGES)['plan']
+    assert actions(plan, 'stateMachines') == {name: ('update', ['deploy/retry.js changed'])
+                                              for name in ('otherFlow', 'pingFlow')}
+
+    # Manifests from before the modules were hashed one by one
+    deployed['snapshot']['generators']['stepFunctions'] = 'abcdef0123456789'
+    plan = node(PLAN, str(tmp_path), deployed, IMAGES)['plan']
+    assert actions(plan, 'stateMachines')['pingFlow'] == ('update', ['deploy/generate-step-functions.js changed'])
@@ -0,0 +1,28 @@
+FLOW = (
+    "const { addFlowResources } = require('./deploy/generate-step-functions');"
+    "const flows = process.argv.slice(1).map(JSON.parse);"
+    "const resources = {};"
+    "flows.forEach(flow => addFlowResources(resources, flow, 'Lib'));"
+    "console.log(JSON.stringify(resources));"
+)
+
+
+def flow(name, **extra):
+    definition = {'StartAt': 'Ping', 'States': {'Ping': {'Type': 'Task', 'Resource': '${libPingArn}', 'End': True}}}
+    return {'name': name, 'definition': definition,
+            'functions': [{'name': 'libPing', 'handler': 'functions/lib/ping/handler.handler'}], **extra}
+
+
+def test_flows_log_errors_unless_they_say_otherwise(node):
+    resources = node(FLOW, flow('plainFlow'), flow('debugFlow', logging={'level': 'all'}),
+                     flow('leanFlow', logging={'includeExecutionData': False}), flow('quietFlow', logging=False))
+    logging = {name: resources[f"{name}StateMachine"]['Properties']['LoggingConfiguration']
+               for name in ('plainFlow', 'debugFlow', 'leanFlow', 'quietFlow')}
+
+    assert {name: (config['Level'], config['IncludeExecutionData']) for name, config in logging.items()} == {
+        'plainFlow': ('ERROR', True),
+        'debugFlow': ('ALL', True),
+        'leanFlow': ('ERROR', False),
+        'quietFlow': ('OFF', False),
+    }
+    assert all(len(config['Destinations']) == 1 for config in logging.values())
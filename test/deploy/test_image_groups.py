@@ -0,0 +1,58 @@
+from tools import image_report
+
+CLUSTER = (
+    "const { clusterFunctions } = require('./deploy/image-groups');"
+    "const [entries, maxImages, weights] = process.argv.slice(1).map(JSON.parse);"
+    "console.log(JSON.stringify(clusterFunctions(entries, maxImages, weights)));"
+)
+
+
+ENTRIES = [
+    {'name': 'libPing', 'requirements': []},
+    {'name': 'libCsv', 'requirements': ['pandas==2.2.2']},
+    {'name': 'libExcel', 'requirements': ['pandas==2.2.2', 'openpyxl']},
+    {'name': 'libModel', 'requirements': ['torch']},
+    {'name': 'libOldCsv', 'requirements': ['pandas==1.5.3']},
+]
+
+
+def test_functions_without_dependencies_use_base_image(node):
+    plan = node(CLUSTER, ENTRIES, 3, {})
+    assert plan['assignments']['libPing'] == 'baseimage'
+    assert all(name.startswith('deps-') for name in plan['images'])
+
+
+def test_plugin_functions_without_dependencies_get_plugin_code(node):
+    plan = node(CLUSTER, ENTRIES + [{'name': 'PrivateLibReport', 'requirements': [], 'plugin': True}], 3, {})
+    # Dockerfile.base doesn't copy .plugins/
+    assert plan['assignments']['PrivateLibReport'] == 'heavyimage'
+    assert plan['assignments']['libPing'] == 'baseimage'
+
+
+def test_merges_cheapest_sets_and_never_conflicting_pins(node):
+    plan = node(CLUSTER, ENTRIES, 3, {'torch': 50, 'pandas': 5})
+    assignments = plan['assignments']
+    assert len(plan['images']) == 3
+    # openpyxl is the cheapest package to share; torch stays on its own
+    assert assignments['libCsv'] == assignments['libExcel']
+    assert assignments['libModel'] not in (assignments['libCsv'], assignments['libOldCsv'])
+
+    # Conflicting pandas pins are kept apart even below the image budget
+    plan = node(CLUSTER, ENTRIES, 1, {})
+    assert plan['assignments']['libCsv'] != plan['assignments']['libOldCsv']
+
+
+def test_image_names_are_stable(node):
+    assert node(CLUSTER, ENTRIES, 3, {}) == node(CLUSTER, list(reversed(ENTRIES)), 3, {})
+
+
+def test_report_from_plan():
+    plan = {
+        'images': {'deps-12345678': {'requirements': ['requests'], 'functions': ['libFetch']}},
+        'assignments': {'libFetch': 'deps-12345678', 'libPing': 'baseimage'},
+        'modules': {'libPing': 'functions.lib.ping.handler'}
+    }
+    rows = {row['function']: row for row in image_report.build_report(plan)}
+    assert rows['libPing']['image'] == 'baseimage' and rows['libPing']['importMs'] is not None
+    assert rows['libFetch']['packages'] == 1 and rows['libFetch']['importMs'] is None
+    assert rows['libFetch']['sizeMb'] >= rows['libPing']['sizeMb']
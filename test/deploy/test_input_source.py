@@ -0,0 +1,133 @@
+import json
+
+FLOW = (
+    "const { addFlowResources } = require('./deploy/generate-step-functions');"
+    "const flows = process.argv.slice(1).map(JSON.parse);"
+    "const resources = {};"
+    "flows.forEach(flow => addFlowResources(resources, flow, 'Lib'));"
+    "console.log(JSON.stringify(resources));"
+)
+PERMISSIONS = (
+    "const { addFlowResources } = require('./deploy/generate-step-functions');"
+    "const { addInputSourceResources } = require('./deploy/input-source');"
+    "const flows = process.argv.slice(1).map(JSON.parse);"
+    "const resources = {};"
+    "const sources = [];"
+    "flows.forEach(flow => addFlowResources(resources, flow, 'Lib', [], {}, [], sources));"
+    "addInputSourceResources(resources, sources);"
+    "console.log(JSON.stringify(resources));"
+)
+
+
+def flow(name, source, start='Process'):
+    states = {
+        'Prepare': {'Type': 'Pass', 'Next': 'Process'},
+        'Process': {'Type': 'Map', 'ItemsPath': '$.cases', 'Parameters': {'id.$': '$$.Map.Item.Value.id'},
+                    'Iterator': {'StartAt': 'Ping', 'States': {
+                        'Ping': {'Type': 'Task', 'Resource': '${libPingArn}', 'End': True}}},
+                    'End': True}
+    }
+    functions = [{'name': 'libPing', 'handler': 'functions/lib/ping/handler.handler'},
+                 {'name': 'libCases', 'handler': 'functions/lib/cases/handler.handler'}]
+    return {'name': name, 'definition': {'StartAt': start, 'States': states}, 'functions': functions,
+            'inputSource': source}
+
+
+def generated(resources, name):
+    machine = resources[f"{name}StateMachine"]
+    json_definition, variables = machine['Properties']['DefinitionString']['Fn::Sub']
+    return json.loads(json_definition), variables, machine['DependsOn']
+
+
+def test_s3_sources_are_read_by_the_map(node):
+    resources = node(FLOW,
+                     flow('prefixFlow', {'s3': {'bucket': 'cases', 'prefix': 'daily/'}}),
+                     flow('csvFlow', {'s3': {'bucket': 'cases', 'key': 'daily/cases.csv'}, 'maxConcurrency': 20,
+                                      'batchSize': 50, 'executionType': 'EXPRESS'}),
+                     flow('inventoryFlow', {'s3': {'bucket': 'cases', 'key': 'inventory/manifest.json'}}))
+
+    definition, variables, depends_on = generated(resources, 'prefixFlow')
+    assert definition['StartAt'] == 'Process' and 'LoadInputSource' not in definition['States']
+    process = definition['States']['Process']
+    assert process['ItemReader'] == {'Resource': 'arn:aws:states:::s3:listObjectsV2',
+                                     'Parameters': {'Bucket': 'cases', 'Prefix': 'daily/'}}
+    assert process['ItemProcessor']['ProcessorConfig'] == {'Mode': 'DISTRIBUTED', 'ExecutionType': 'STANDARD'}
+    assert process['ItemProcessor']['StartAt'] == 'Ping'
+    assert process['ItemSelector'] == {'id.$': '$$.Map.Item.Value.id'}
+    assert not {'Iterator', 'ItemsPath', 'Parameters', 'ItemBatcher'} & set(process)
+    assert process['MaxConcurrency'] == 100
+    assert process['ResultWriter'] == {'Resource': 'arn:aws:states:::s3:putObject',
+                                       'Parameters': {'Bucket': '${InputsBucket}', 'Prefix': 'results/prefixFlow'}}
+    assert variables['InputsBucket'] == {'Ref': 'InputsBucket'} and 'InputSourceArn' not in variables
+    assert 'InputsBucket' in depends_on and 'InputSourceLambdaFunction' not in depends_on
+
+    process = generated(resources, 'csvFlow')[0]['States']['Process']
+    assert process['ItemReader']['ReaderConfig'] == {'InputType': 'CSV', 'CSVHeaderLocation': 'FIRST_ROW'}
+    assert process['ItemReader']['Parameters'] == {'Bucket': 'cases', 'Key': 'daily/cases.csv'}
+    assert process['ItemProcessor']['ProcessorConfig']['ExecutionType'] == 'EXPRESS'
+    assert process['MaxConcurrency'] == 20 and process['ItemBatcher'] == {'MaxItemsPerBatch': 50}
+
+    reader = generated(resources, 'inventoryFlow')[0]['States']['Process']['ItemReader']
+    assert reader['ReaderConfig'] == {'InputType': 'MANIFEST'}
+
+
+def test_dynamodb_and_generator_sources_are_loaded_before_the_map(node):
+    table = {'table': 'cases', 'keyCondition': 'day = :day', 'values': {':day': '2026-10-19'}}
+    resources = node(FLOW,
+                     flow('tableFlow', {'dynamodb': table, 'map': 'Process'}, start='Prepare'),
+                     flow('generatedFlow', {'function': 'libCases', 'input': {'count': 10}}))
+
+    definition, variables, depends_on = generated(resources, 'tableFlow')
+    states = definition['States']
+    # Whatever led to the Map now leads to the load
+    assert definition['StartAt'] == 'Prepare' and states['Prepare']['Next'] == 'LoadInputSource'
+    load = states['LoadInputSource']
+    assert load['Next'] == 'Process' and load['ResultPath'] == '$.inputSource'
+    assert load['Parameters']['FunctionName'] == '${InputSourceArn}'
+    assert load['Parameters']['Payload'] == {'flow': 'tableFlow', 'execution.$': '$$.Execution.Name',
+                                             'source': {'dynamodb': table}}
+    assert states['Process']['ItemReader'] == {
+        'Resource': 'arn:aws:states:::s3:getObject', 'ReaderConfig': {'InputType': 'JSON'},
+        'Parameters': {'Bucket.$': '$.inputSource.bucket', 'Key.$': '$.inputSource.key'}}
+    assert variables['InputSourceArn'] == {'Fn::GetAtt': ['InputSourceLambdaFunction', 'Arn']}
+    assert {'InputsBucket', 'InputSourceLambdaFunction'} <= set(depends_on)
+
+    definition, variables, _ = generated(resources, 'generatedFlow')
+    assert definition['StartAt'] == 'LoadInputSource'
+    assert definition['States']['LoadInputSource']['Parameters']['Payload']['source'] == {
+        'function': '${libCasesArn}', 'input': {'count': 10}}
+    assert 'libCasesArn' in variables
+
+
+def test_permissions_cover_only_the_declared_sources(node):
+    resources = node(PERMISSIONS,
+                     flow('prefixFlow', {'s3': {'bucket': 'cases', 'prefix': 'daily/'}}),
+                     flow('tableFlow', {'dynamodb': {'table': 'cases'}}),
+                     flow('generatedFlow', {'function': 'libCases'}))
+
+    policy = resources['DistributedMapPolicy']['Properties']
+    assert policy['Roles'] == [{'Ref': 'StepFunctionsExecutionRole'}]
+    statements = policy['PolicyDocument']['Statement']
+    s3_resources = [resource for statement in statements if any(a.startswith('s3:') for a in statement['Action'])
+                    for resource in (statement['Resource'] if isinstance(statement['Resource'], list)
+                                     else [statement['Resource']])]
+    assert '*' not in s3_resources
+    assert {'Fn::Sub': '${InputsBucket.Arn}/*'} in s3_resources
+    assert 'arn:aws:s3:::cases' in s3_resources and 'arn:aws:s3:::cases/*' in s3_resources
+    assert 'DistributedMapPolicy' in resources['prefixFlowStateMachine']['DependsOn']
+
+    role = resources['InputSourceRole']['Properties']
+    statements = {tuple(statement['Action']): statement['Resource']
+                  for statement in role['Policies'][0]['PolicyDocument']['Statement']}
+    assert statements[('dynamodb:Query', 'dynamodb:Scan')] == [
+        {'Fn::Sub': 'arn:aws:dynamodb:${AWS::Region}:${AWS::AccountId}:table/cases'},
+        {'Fn::Sub': 'arn:aws:dynamodb:${AWS::Region}:${AWS::AccountId}:table/cases/index/*'}]
+    assert statements[('lambda:InvokeFunction',)] == [{'Fn::GetAtt': ['LibCasesLambdaFunction', 'Arn']}]
+    assert statements[('s3:PutObject', 's3:AbortMultipartUpload')] == {'Fn::Sub': '${InputsBucket.Arn}/inputs/*'}
+
+
+def test_no_table_access_without_dynamodb_sources(node):
+    role = node(PERMISSIONS)['InputSourceRole']['Properties']
+    actions = [action for statement in role['Policies'][0]['PolicyDocument']['Statement']
+               for action in statement['Action']]
+    assert not [action for action in actions if action.startswith('dynamodb:') or action.startswith('lambda:')]
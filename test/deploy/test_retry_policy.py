@@ -0,0 +1,78 @@
+import json
+
+FLOW = (
+    "const { addFlowResources } = require('./deploy/generate-step-functions');"
+    "const flows = process.argv.slice(1).map(JSON.parse);"
+    "const resources = {};"
+    "flows.forEach(flow => addFlowResources(resources, flow, 'Lib'));"
+    "console.log(JSON.stringify(resources));"
+)
+TRANSIENT = ['Lambda.ServiceException', 'Lambda.AWSLambdaException', 'Lambda.SdkClientException',
+             'Lambda.TooManyRequestsException', 'StepFunctions.ExecutionLimitExceededException',
+             'StepFunctions.SdkClientException']
+
+
+def flow(name, **extra):
+    definition = {
+        'StartAt': 'Fan',
+        'States': {
+            'Fan': {'Type': 'Parallel', 'Next': 'Each', 'Branches': [
+                {'StartAt': 'Ping', 'States': {'Ping': {'Type': 'Task', 'Resource': '${libPingArn}', 'End': True}}},
+                {'StartAt': 'Child', 'States': {'Child': {
+                    'Type': 'Task', 'Resource': 'arn:aws:states:::states:startExecution.sync:2',
+                    'Parameters': {'StateMachineArn': '${childFlow}'}, 'End': True}}}]},
+            'Each': {'Type': 'Map', 'Next': 'Report', 'ItemProcessor': {'StartAt': 'Slow', 'States': {
+                'Slow': {'Type': 'Task', 'Resource': 'arn:aws:states:::lambda:invoke',
+                         'Parameters': {'FunctionName': '${libSlowArn}', 'Payload.$': '$'}, 'End': True}}}},
+            'Report': {'Type': 'Task', 'Resource': '${libPingArn}', 'End': True,
+                       'Retry': [{'ErrorEquals': ['States.ALL'], 'MaxAttempts': 1}]}
+        }
+    }
+    functions = [{'name': 'libPing', 'handler': 'functions/lib/ping/handler.handler'},
+                 {'name': 'libSlow', 'handler': 'functions/lib/slow/handler.handler', **extra.pop('slow', {})}]
+    return {'name': name, 'definition': definition, 'functions': functions, **extra}
+
+
+def retries(resources, name):
+    states = json.loads(resources[f"{name}StateMachine"]['Properties']['DefinitionString']['Fn::Sub'][0])['States']
+    return {
+        'Ping': states['Fan']['Branches'][0]['States']['Ping'].get('Retry'),
+        'Child': states['Fan']['Branches'][1]['States']['Child'].get('Retry'),
+        'Slow': states['Each']['ItemProcessor']['States']['Slow'].get('Retry'),
+        'Report': states['Report'].get('Retry'),
+    }
+
+
+def test_flow_policy_reaches_every_task(node):
+    result = retries(node(FLOW, flow('reportFlow', retryPolicy=True)), 'reportFlow')
+    default = [{'ErrorEquals': TRANSIENT, 'IntervalSeconds': 1, 'MaxAttempts': 3, 'BackoffRate': 2,
+                'MaxDelaySeconds': 30, 'JitterStrategy': 'FULL'}]
+    assert result == {'Ping': default, 'Child': default, 'Slow': default,
+                      # Written in the definition: kept
+                      'Report': [{'ErrorEquals': ['States.ALL'], 'MaxAttempts': 1}]}
+
+
+def test_function_policy_overrides_the_flow_policy(node):
+    resources = node(FLOW,
+                     flow('tunedFlow', retryPolicy={'maxAttempts': 2, 'jitter': False},
+                          slow={'retryPolicy': {'maxAttempts': 6, 'errors': ['States.Timeout']}}),
+                     flow('slowOnlyFlow', slow={'retryPolicy': True}),
+                     flow('offFlow', retryPolicy=True, slow={'retryPolicy': False}))
+
+    tuned = retries(resources, 'tunedFlow')
+    assert tuned['Ping'] == [{'ErrorEquals': TRANSIENT, 'IntervalSeconds': 1, 'MaxAttempts': 2, 'BackoffRate': 2,
+                              'MaxDelaySeconds': 30}]
+    assert tuned['Slow'] == [{'ErrorEquals': ['States.Timeout'], 'IntervalSeconds': 1, 'MaxAttempts': 6,
+                              'BackoffRate': 2, 'MaxDelaySeconds': 30}]
+
+    slow_only = retries(resources, 'slowOnlyFlow')
+    assert slow_only['Ping'] is None and slow_only['Child'] is None and slow_only['Slow'][0]['MaxAttempts'] == 3
+
+    off = retries(resources, 'offFlow')
+    assert off['Slow'] is None and off['Ping'][0]['MaxAttempts'] == 3
+
+
+def test_no_policy_leaves_the_definition_alone(node):
+    result = retries(node(FLOW, flow('plainFlow')), 'plainFlow')
+    assert result == {'Ping': None, 'Child': None, 'Slow': None,
+                      'Report': [{'ErrorEquals': ['States.ALL'], 'MaxAttempts': 1}]}
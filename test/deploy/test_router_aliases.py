@@ -0,0 +1,53 @@
+ROUTES = (
+    "const r = require('./deploy/router');"
+    "const [routes] = process.argv.slice(1).map(JSON.parse);"
+    "const resources = {};"
+    "const aliases = r.addRouterAliases(resources, routes);"
+    "console.log(JSON.stringify({ aliases, resources, groups: [true, 'reports', false].map(r.routerGroup) }));"
+)
+
+FLOW = (
+    "const { addFlowResources } = require('./deploy/generate-step-functions');"
+    "const [flow, routed] = process.argv.slice(1).map(JSON.parse);"
+    "const resources = {};"
+    "const warmTargets = [];"
+    "addFlowResources(resources, flow, 'Lib', warmTargets, routed);"
+    "console.log(JSON.stringify({ machine: resources[`${flow.name}StateMachine`], warmTargets }));"
+)
+
+
+def test_one_alias_per_routed_function(node):
+    result = node(ROUTES, [
+        {'dirName': 'ping', 'group': 'shared', 'logicalName': 'LibPing'},
+        {'dirName': 'hello_world', 'group': 'reports', 'logicalName': 'LibHelloWorld'},
+    ])
+    assert result['groups'] == ['shared', 'reports', None]
+    assert result['aliases'] == {'LibPing': 'LibPingRouterAlias', 'LibHelloWorld': 'LibHelloWorldRouterAlias'}
+    alias = result['resources']['LibHelloWorldRouterAlias']
+    assert alias['Type'] == 'AWS::Lambda::Alias'
+    assert alias['Properties']['FunctionName'] == {'Ref': 'RouterReportsLambdaFunction'}
+    assert alias['Properties']['FunctionVersion'] == '$LATEST'
+    assert alias['Properties']['Name'] == 'hello_world'
+
+
+def test_flows_invoke_routed_functions_through_their_alias(node):
+    flow = {
+        'name': 'twoStepFlow',
+        'warmup': True,
+        'definition': {'StartAt': 'Ping', 'States': {
+            'Ping': {'Type': 'Task', 'Resource': '${libPingArn}', 'Next': 'Hello'},
+            'Hello': {'Type': 'Task', 'Resource': '${libHelloArn}', 'End': True},
+        }},
+        'functions': [
+            {'name': 'libPing', 'handler': 'functions/lib/ping/handler.handler'},
+            {'name': 'libHello', 'handler': 'functions/lib/hello_world/handler.handler'},
+        ]
+    }
+    result = node(FLOW, flow, {'LibPing': 'LibPingRouterAlias'})
+    machine = result['machine']
+    variables = machine['Properties']['DefinitionString']['Fn::Sub'][1]
+
+    assert variables['libPingArn'] == {'Ref': 'LibPingRouterAlias'}
+    assert variables['libHelloArn'] == {'Fn::GetAtt': ['LibHelloWorldLambdaFunction', 'Arn']}
+    assert {'LibPingRouterAlias', 'LibHelloWorldLambdaFunction'} <= set(machine['DependsOn'])
+    assert [target['logicalId'] for target in result['warmTargets']] == ['LibPingRouterAlias']
@@ -0,0 +1,11 @@
+GENERATE = (
+    "require('./deploy/generate-step-functions')()"
+    ".then(template => console.log(JSON.stringify(template.Resources)));"
+)
+
+
+def test_composite_flows_depend_on_the_flows_they_start(node):
+    resources = node(GENERATE)
+    depends_on = resources['compositeFlowStateMachine']['DependsOn']
+    assert {'helloWorldFlowStateMachine', 'dummy2StepFlowStateMachine'} <= set(depends_on)
+    assert 'LibHelloWorldLambdaFunction' in resources['dummy2StepFlowStateMachine']['DependsOn']
@@ -0,0 +1,58 @@
+WARMUP = (
+    "const w = require('./deploy/warmup');"
+    "const [flow, targets] = process.argv.slice(1).map(JSON.parse);"
+    "const resources = {};"
+    "w.addWarmupResources(resources, targets);"
+    "const settings = w.warmupSettings(flow.warmup);"
+    "console.log(JSON.stringify({ settings, functions: settings ? w.warmupFunctions(flow, settings).map(f => f.name) : [], resources }));"
+)
+
+FLOW = {
+    'name': 'reportFlow',
+    'warmup': {'concurrency': 2},
+    'definition': {
+        'StartAt': 'Fetch',
+        'States': {
+            'Fetch': {
+                'Type': 'Parallel',
+                'Branches': [
+                    {'StartAt': 'A', 'States': {'A': {'Type': 'Task', 'Resource': '${libFetchArn}', 'End': True}}},
+                    {'StartAt': 'B', 'States': {'B': {'Type': 'Task', 'Resource': 'arn:aws:states:::lambda:invoke',
+                                                      'Parameters': {'FunctionName': '${libPingArn}'}, 'End': True}}},
+                ],
+                'Next': 'Render'
+            },
+            'Render': {'Type': 'Task', 'Resource': '${libRenderArn}', 'End': True},
+        }
+    },
+    'functions': [
+        {'name': 'libFetch', 'handler': 'functions/lib/fetch/handler.handler'},
+        {'name': 'libPing', 'handler': 'functions/lib/ping/handler.handler'},
+        {'name': 'libRender', 'handler': 'functions/lib/render/handler.handler'},
+    ]
+}
+
+
+def test_flows_warm_the_functions_of_their_first_states(node):
+    result = node(WARMUP, FLOW, [])
+    assert result['settings'] == {'schedule': 'rate(5 minutes)', 'concurrency': 2}
+    assert result['functions'] == ['libFetch', 'libPing']
+
+
+def test_one_rule_per_schedule_with_the_highest_concurrency(node):
+    targets = [
+        {'logicalId': 'LibPingLambdaFunction', 'schedule': 'rate(5 minutes)', 'concurrency': 1},
+        {'logicalId': 'LibPingLambdaFunction', 'schedule': 'rate(5 minutes)', 'concurrency': 3},
+        {'logicalId': 'LibFetchLambdaFunction', 'schedule': 'rate(1 minute)', 'concurrency': 1},
+    ]
+    resources = node(WARMUP, FLOW, targets)['resources']
+
+    assert set(resources) == {'WarmupRate5MinutesRule', 'WarmupRate5MinutesPermission',
+                              'WarmupRate1MinuteRule', 'WarmupRate1MinutePermission'}
+    target = resources['WarmupRate5MinutesRule']['Properties']['Targets'][0]
+    assert target['Arn'] == {'Fn::GetAtt': ['WarmerLambdaFunction', 'Arn']}
+    assert target['Input'] == {'Fn::Sub': '{"targets":[{"function":"${LibPingLambdaFunction}","concurrency":3}]}'}
+
+
+def test_disabled_warmup(node):
+    assert node(WARMUP, {**FLOW, 'warmup': {'enabled': False}}, [])['settings'] is None
@@ -0,0 +1,49 @@
+import json
+
+FLOW = (
+    "const { addFlowResources } = require('./deploy/generate-step-functions');"
+    "const { addWatchdogResources } = require('./deploy/watchdog');"
+    "const flows = process.argv.slice(1).map(JSON.parse);"
+    "const resources = {};"
+    "const budgets = [];"
+    "flows.forEach(flow => addFlowResources(resources, flow, 'Lib', [], {}, budgets));"
+    "addWatchdogResources(resources, budgets);"
+    "console.log(JSON.stringify({ resources, budgets }));"
+)
+
+
+def flow(name, **extra):
+    definition = {'StartAt': 'Ping', 'States': {'Ping': {'Type': 'Task', 'Resource': '${libPingArn}', 'End': True}}}
+    return {'name': name, 'definition': {**definition, **extra.pop('definition', {})},
+            'functions': [{'name': 'libPing', 'handler': 'functions/lib/ping/handler.handler'}], **extra}
+
+
+def definition(resources, name):
+    return json.loads(resources[f"{name}StateMachine"]['Properties']['DefinitionString']['Fn::Sub'][0])
+
+
+def test_budgets_become_timeouts_and_a_watchdog_rule(node):
+    result = node(FLOW,
+                  flow('reportFlow', maxDurationSeconds=3600),
+                  flow('mapFlow', maxStateTransitions=1000, definition={'TimeoutSeconds': 600}),
+                  flow('shortFlow', maxDurationSeconds=3600, definition={'TimeoutSeconds': 60}),
+                  flow('plainFlow'))
+    resources = result['resources']
+
+    assert definition(resources, 'reportFlow')['TimeoutSeconds'] == 3600
+    assert definition(resources, 'mapFlow')['TimeoutSeconds'] == 600
+    assert definition(resources, 'shortFlow')['TimeoutSeconds'] == 60
+    assert 'TimeoutSeconds' not in definition(resources, 'plainFlow')
+
+    target = resources['WatchdogRule']['Properties']['Targets'][0]
+    assert target['Arn'] == {'Fn::GetAtt': ['WatchdogLambdaFunction', 'Arn']}
+    assert json.loads(target['Input']['Fn::Sub'])['flows'] == [
+        {'flow': 'mapFlow', 'stateMachineArn': '${mapFlowStateMachine}', 'maxStateTransitions': 1000},
+        {'flow': 'reportFlow', 'stateMachineArn': '${reportFlowStateMachine}', 'maxDurationSeconds': 3600},
+        {'flow': 'shortFlow', 'stateMachineArn': '${shortFlowStateMachine}', 'maxDurationSeconds': 3600},
+    ]
+    assert resources['WatchdogPermission']['Properties']['SourceArn'] == {'Fn::GetAtt': ['WatchdogRule', 'Arn']}
+
+
+def test_no_rule_without_budgets(node):
+    assert 'WatchdogRule' not in node(FLOW, flow('plainFlow'))['resources']
@@ -0,0 +1,148 @@
+import os
+import json
+
+import pytest
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-west-1')
+
+from functions.base.admission import handler
+from functions.base.admission.local import LocalAdmission
+from functions.base.get_flow_result import handler as get_flow_result
+from functions.base.run_flow import handler as run_flow
+from tools.load_test.runner import lambda_context
+
+FLOW_ARN = 'arn:aws:states:eu-west-1:123456789012:stateMachine:{}'
+
+
+@pytest.fixture
+def admission(monkeypatch):
+    monkeypatch.setenv('ADMISSION_MODE', 'queued')
+    monkeypatch.setenv('ADMISSION_QUEUE_URL', 'https://sqs.local/admission')
+    monkeypatch.setenv('ADMISSION_LIMITS', json.dumps({'ratePerSecond': 1000, 'maxConcurrent': 50}))
+    monkeypatch.setattr(run_flow, 'get_state_machine_arn', FLOW_ARN.format)
+    admission = LocalAdmission(flows=['helloWorldFlow', 'slowFlow']).install()
+    yield admission
+    admission.uninstall()
+
+
+def enqueue(flow, user, count=1):
+    return [handler.enqueue(flow, FLOW_ARN.format(flow), user, {'__user_id': user})['ticketId']
+            for _ in range(count)]
+
+
+def api_event(user, path_parameters, body=None):
+    return {'pathParameters': path_parameters, 'body': json.dumps(body) if body else None,
+            'requestContext': {'authorizer': {'jwt': {'claims': {'sub': user}}}}}
+
+
+def test_fair_order_takes_users_in_turn():
+    requests = [{'userId': user, 'n': n} for n, user in enumerate('aaaabbc')]
+    assert [(r['userId'], r['n']) for r in handler.fair_order(requests)] == [
+        ('a', 0), ('b', 4), ('c', 6), ('a', 1), ('b', 5), ('a', 2), ('a', 3)]
+
+
+def test_queued_run_resolves_to_its_execution(admission):
+    response = run_flow.handler(api_event('user-1', {'flow_name': 'helloWorldFlow'}, {'x': 1}), None)
+    assert response['statusCode'] == 202
+    ticket = json.loads(response['body'])['ticket']
+    assert admission.sfn.started == [] and admission.queue.waiting() == 1
+
+    result = get_flow_result.handler(api_event('user-1', {'flow_name': 'helloWorldFlow', 'execution_id': ticket}),
+                                     lambda_context('getFlowResult'))
+    assert (result['statusCode'], json.loads(result['body'])['status']) == (202, 'QUEUED')
+    forbidden = get_flow_result.handler(api_event('user-2', {'flow_name': 'helloWorldFlow', 'execution_id': ticket}),
+                                        lambda_context('getFlowResult'))
+    assert forbidden['statusCode'] == 403
+
+    assert admission.dispatch()['started'] == 1
+    assert admission.queue.waiting() == 0
+    started = handler.get_ticket(ticket)
+    assert started['status'] == 'STARTED'
+    assert json.loads(admission.sfn.executions[started['executionArn']]['input']) == {'x': 1, '__user_id': 'user-1'}
+
+
+def test_flow_concurrency_cap_leaves_the_rest_queued(admission, monkeypatch):
+    monkeypatch.setenv('ADMISSION_LIMITS', json.dumps({'ratePerSecond': 1000, 'maxConcurrent': 50,
+                                                       'flows': {'slowFlow': {'maxConcurrent': 2}}}))
+    enqueue('slowFlow', 'user-1', 5)
+    enqueue('helloWorldFlow', 'user-2', 3)
+
+    assert admission.dispatch() == {'started': 5, 'failed': 0, 'deferred': 3}
+    assert admission.queue.waiting() == 3
+
+    # Finished executions free their slots for the next run
+    for arn in admission.sfn.started[:]:
+        admission.sfn.finish(arn)
+    assert admission.dispatch()['started'] == 2
+
+
+def test_burst_of_one_user_does_not_starve_the_others(admission, monkeypatch):
+    monkeypatch.setenv('ADMISSION_LIMITS', json.dumps({'ratePerSecond': 1000, 'maxConcurrent': 3}))
+    enqueue('helloWorldFlow', 'heavy', 20)
+    light = enqueue('helloWorldFlow', 'light', 1)
+
+    admission.dispatch()
+    assert handler.get_ticket(light[0])['status'] == 'STARTED'
+
+
+def test_backlog_larger_than_a_buffer_does_not_starve_the_others(admission, monkeypatch):
+    monkeypatch.setenv('ADMISSION_LIMITS', json.dumps({'ratePerSecond': 1000, 'maxConcurrent': 2}))
+    enqueue('helloWorldFlow', 'heavy', handler.BUFFER_SIZE * 3)
+    light = enqueue('helloWorldFlow', 'light', 1)
+
+    # The heavy user's group delivers one batch at a time, the rest of the buffer goes to the others
+    assert len(handler.receive('')) == 11
+    admission.queue.change_message_visibility_batch(QueueUrl='', Entries=[
+        {'Id': '0', 'ReceiptHandle': m['ReceiptHandle'], 'VisibilityTimeout': 0}
+        for m in admission.queue.messages if not m['visible']])
+
+    admission.dispatch()
+    assert handler.get_ticket(light[0])['status'] == 'STARTED'
+    assert len(admission.sfn.started) == 2
+
+
+def test_requests_start_as_the_queue_delivers_them(admission, monkeypatch):
+    monkeypatch.setenv('ADMISSION_LIMITS', json.dumps({'ratePerSecond': 1000, 'maxConcurrent': 2}))
+    tickets = enqueue('helloWorldFlow', 'user-1', 3)
+
+    # No wait for the schedule; what the caps leave is reported failed and held back
+    response = admission.deliver()
+    assert len(admission.sfn.started) == 2
+    assert response['batchItemFailures'] == [{'itemIdentifier': 'msg-3'}]
+    assert admission.queue.waiting() == 1 and admission.deliver() == {'batchItemFailures': []}
+
+    admission.sfn.finish(admission.sfn.started[0])
+    admission.queue.expire()
+    assert admission.deliver() == {'batchItemFailures': []}
+    assert {handler.get_ticket(t)['status'] for t in tickets} == {'STARTED'}
+    assert admission.queue.waiting() == 0
+
+
+def test_throttling_keeps_requests_queued(admission):
+    tickets = enqueue('helloWorldFlow', 'user-1', 3)
+    admission.sfn.throttle = 1
+
+    assert admission.dispatch()['started'] == 0
+    assert admission.queue.waiting() == 3
+    assert admission.dispatch()['started'] == 3
+    assert {handler.get_ticket(t)['status'] for t in tickets} == {'STARTED'}
+
+
+def test_redelivered_request_starts_one_execution(admission):
+    ticket = enqueue('helloWorldFlow', 'user-1')[0]
+    admission.dispatch()
+    # The message comes back, as if the delete had been lost
+    admission.queue.send_message(QueueUrl='', MessageGroupId='user-1', MessageBody=json.dumps({
+        'ticketId': ticket, 'flow': 'helloWorldFlow', 'stateMachineArn': FLOW_ARN.format('helloWorldFlow'),
+        'userId': 'user-1', 'input': {}}))
+    admission.dispatch()
+    assert len(admission.sfn.started) == 1 and admission.queue.waiting() == 0
+    assert handler.get_ticket(ticket)['executionArn'] == admission.sfn.started[0]
+
+
+def test_unknown_flow_fails_its_ticket(admission):
+    ticket = enqueue('missingFlow', 'user-1')[0]
+    assert admission.dispatch()['failed'] == 1
+    result = get_flow_result.handler(api_event('user-1', {'flow_name': 'missingFlow', 'execution_id': ticket}),
+                                     lambda_context('getFlowResult'))
+    assert json.loads(result['body'])['status'] == 'FAILED'
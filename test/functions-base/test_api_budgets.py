@@ -0,0 +1,180 @@
+"""
+Hermetic run of the HTTP base handlers and track_usage_middleware: their boto3 clients
+are stubbed at the botocore level (tools/load_test/stubs.py) with a synthetic account,
+and every request is held to a budget of AWS calls so that added round trips, or calls
+growing faster than the data, fail here instead of in production.
+"""
+import json
+import os
+
+import boto3
+import fastjsonschema
+import pytest
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-west-1')
+
+from functions.base.api_usage import handler as api_usage
+from functions.base.get_flow_result import handler as get_flow_result
+from functions.base.list_flows import handler as list_flows
+from functions.base.list_runs import handler as list_runs
+from functions.base.run_flow import handler as run_flow
+from functions.base.run_flow import schemas
+from tools.load_test import SyntheticAccount, SyntheticAWS, api_event, lambda_context
+from tools.load_test.backend import PAGE_SIZE
+from tools.load_test.stubs import BotocoreStub, UnstubbedOperation
+
+
+def stubbed(state_machines=3, users=2, executions_per_user=5):
+    aws = SyntheticAWS(SyntheticAccount(state_machines, users, executions_per_user))
+    return aws, BotocoreStub(aws)
+
+
+@pytest.fixture
+def install(monkeypatch):
+    """Attach a stub to the handlers' clients, the usage table and clients created per request"""
+    stubs = []
+
+    def attach(aws, stub):
+        for module in (run_flow, list_runs, list_flows, get_flow_result):
+            stub.attach(module.sfn)
+        stub.attach(api_usage.dynamodb.meta.client)
+        if boto3.DEFAULT_SESSION is None:
+            boto3.setup_default_session()
+        stub.attach(boto3.DEFAULT_SESSION)
+        monkeypatch.setattr(api_usage.get_table, 'table', api_usage.dynamodb.Table('api-usage'), raising=False)
+        stubs.append(stub)
+        return aws
+
+    yield attach
+    for stub in stubs:
+        stub.detach()
+
+
+def call(aws, module, event):
+    with aws.recording() as calls:
+        response = module.handler(event, lambda_context('budget'))
+    return response, dict(calls)
+
+
+def sfn_calls(calls):
+    return sum(count for operation, count in calls.items() if operation.startswith('stepfunctions.'))
+
+
+def pages(count):
+    return max(1, -(-count // PAGE_SIZE))
+
+
+@pytest.mark.parametrize('state_machines, executions_per_user', [(2, 5), (5, 40), (10, 120)])
+def test_list_runs_budget(install, state_machines, executions_per_user):
+    aws = install(*stubbed(state_machines, users=3, executions_per_user=executions_per_user))
+
+    response, calls = call(aws, list_runs, api_event('GET /runs', '/runs', 'user-0'))
+    assert json.loads(response['body'])['count'] == executions_per_user
+
+    # One listing of the state machines and the list_executions pages, nothing per execution
+    listing_pages = sum(pages(len(machine['executions'])) for machine in aws.account.state_machines.values())
+    assert calls['stepfunctions.list_state_machines'] == 1
+    assert sfn_calls(calls) <= 1 + listing_pages
+    assert calls['dynamodb.update_item'] == 2
+
+
+@pytest.mark.parametrize('state_machines', [1, 10, 40])
+def test_list_flows_budget(install, state_machines):
+    aws = install(*stubbed(state_machines))
+    response, calls = call(aws, list_flows, api_event('GET /flows', '/flows', 'user-0'))
+
+    assert json.loads(response['body'])['count'] == state_machines
+    assert sfn_calls(calls) <= pages(state_machines) + state_machines
+    assert calls['dynamodb.update_item'] == 2
+
+
+def test_run_flow_budget(install):
+    aws = install(*stubbed())
+    event = api_event('POST /run/{flow_name}', '/run/flow1', 'user-1', {'flow_name': 'flow1'}, {'x': 1})
+    response, calls = call(aws, run_flow, event)
+
+    assert response['statusCode'] == 200
+    started = aws.account.executions[json.loads(response['body'])['executionArn']]
+    assert json.loads(started['input']) == {'x': 1, '__user_id': 'user-1'}
+    assert calls == {'dynamodb.update_item': 2, 'sts.get_caller_identity': 1, 'stepfunctions.start_execution': 1}
+
+
+def test_run_flow_unknown_flow(install):
+    aws = install(*stubbed())
+    event = api_event('POST /run/{flow_name}', '/run/missing', 'user-1', {'flow_name': 'missing'})
+    response, calls = call(aws, run_flow, event)
+
+    # The modeled StateMachineDoesNotExist error reaches the handler
+    assert response['statusCode'] == 404
+    assert calls['stepfunctions.start_execution'] == 1
+
+
+def test_run_flow_invalid_input_starts_nothing(install, monkeypatch):
+    aws = install(*stubbed())
+    monkeypatch.setattr(schemas.get_validators, 'validators', {'flow1': fastjsonschema.compile(
+        {'type': 'object', 'required': ['x'], 'properties': {'x': {'type': 'integer'}}})})
+    event = api_event('POST /run/{flow_name}', '/run/flow1', 'user-1', {'flow_name': 'flow1'}, {'x': 'one'})
+    response, calls = call(aws, run_flow, event)
+
+    assert response['statusCode'] == 400
+    assert json.loads(response['body'])['path'] == '$.x'
+    assert calls == {'dynamodb.update_item': 2}
+
+
+def test_get_flow_result_budget(install):
+    aws = install(*stubbed())
+    arn = aws.account.executions_of('user-0')[0]
+    event = api_event('GET /run/{flow_name}/{execution_id}', f"/run/x/{arn}", 'user-0',
+                      {'flow_name': 'x', 'execution_id': arn})
+    response, calls = call(aws, get_flow_result, event)
+
+    assert response['statusCode'] == 200
+    assert calls == {'dynamodb.update_item': 2, 'stepfunctions.describe_execution': 2}
+
+    # Someone else's execution is refused after the ownership check
+    response, calls = call(aws, get_flow_result, {**event, 'requestContext': {
+        **event['requestContext'], 'authorizer': {'jwt': {'claims': {'sub': 'user-1'}}}}})
+    assert response['statusCode'] == 403
+    assert calls['stepfunctions.describe_execution'] == 1
+
+
+def test_middleware_writes_the_month_and_the_day_once_per_request(install, monkeypatch):
+    aws = install(*stubbed())
+    monkeypatch.setenv('USAGE_ENFORCEMENT', 'enforce')
+    monkeypatch.setenv('USAGE_LIMITS', json.dumps({'defaultPlan': 'free', 'plans': {
+        'free': {'ratePerSecond': 100, 'burst': 100, 'monthlyQuota': 1000}}}))
+
+    @api_usage.track_usage_middleware
+    def handler(event, context):
+        return {'statusCode': 200}
+
+    # The conditional write of the monthly item, then the day's breakdown
+    for _ in range(3):
+        with aws.recording() as calls:
+            handler(api_event('GET /flows', '/flows', 'user-0'), None)
+        assert dict(calls) == {'dynamodb.update_item': 2}
+
+    # Warmup events never reach DynamoDB
+    with aws.recording() as calls:
+        handler({api_usage.WARMUP_KEY: {}}, None)
+    assert not calls
+
+
+def test_usage_series_budget(install):
+    aws = install(*stubbed())
+    event = api_event('GET /usage/{user_id}', '/usage/user-0', 'user-0', {'user_id': 'user-0'})
+    event['queryStringParameters'] = {'startDate': '2024-01-01', 'endDate': '2024-06-30'}
+    with aws.recording() as calls:
+        response = api_usage.get_usage(event, lambda_context('budget'))
+
+    assert response['statusCode'] == 200
+    # Six months are one query, not one per month or day
+    assert dict(calls) == {'dynamodb.update_item': 2, 'dynamodb.query': 1}
+
+
+def test_unstubbed_operations_fail_instead_of_reaching_aws(install):
+    aws, stub = stubbed()
+    client = stub.attach(boto3.client('stepfunctions'))
+    with pytest.raises(UnstubbedOperation):
+        client.list_activities()
+    stub.detach()
@@ -0,0 +1,132 @@
+import base64
+import json
+import os
+import time
+
+import pytest
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-west-1')
+
+from functions.base.auth import handler as auth
+
+POOL_ID = 'eu-west-1_TestPool'
+CLIENT_ID = 'client-123'
+ISSUER = f"https://cognito-idp.eu-west-1.amazonaws.com/{POOL_ID}"
+
+
+def generate_keypair():
+    """Local stand-in for a Cognito signing key"""
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def b64int(value):
+    return b64(value.to_bytes((value.bit_length() + 7) // 8, 'big'))
+
+
+def jwk(kid, key):
+    numbers = key.public_key().public_numbers()
+    return {'kty': 'RSA', 'kid': kid, 'alg': 'RS256', 'n': b64int(numbers.n), 'e': b64int(numbers.e)}
+
+
+def sign(claims, key, kid='key-1'):
+    signing_input = f"{b64(json.dumps({'alg': 'RS256', 'kid': kid}).encode())}.{b64(json.dumps(claims).encode())}"
+    signature = key.sign(signing_input.encode(), padding.PKCS1v15(), hashes.SHA256())
+    return f"{signing_input}.{b64(signature)}"
+
+
+def claims(**overrides):
+    now = int(time.time())
+    return {'sub': 'user-1', 'iss': ISSUER, 'aud': CLIENT_ID, 'token_use': 'id', 'email': 'a@example.com',
+            'iat': now, 'exp': now + 3600, **overrides}
+
+
+@pytest.fixture(scope='module')
+def keys():
+    return generate_keypair(), generate_keypair()
+
+
+@pytest.fixture
+def jwks(monkeypatch, keys):
+    monkeypatch.setenv('COGNITO_USER_POOL_ID', POOL_ID)
+    monkeypatch.setenv('COGNITO_CLIENT_ID', CLIENT_ID)
+    published = {'key-1': keys[0]}
+    fetches = []
+
+    def fetch(issuer):
+        fetches.append(issuer)
+        return {'keys': [jwk(kid, key) for kid, key in published.items()]}
+
+    monkeypatch.setattr(auth, 'key_cache', auth.KeyCache(fetch))
+    return published, fetches
+
+
+def verify(token):
+    response = auth.verify_token({'headers': {'Authorization': f"Bearer {token}"}}, None)
+    return response['statusCode'], json.loads(response['body'])
+
+
+def test_valid_tokens_are_verified_without_refetching_keys(jwks, keys):
+    _, fetches = jwks
+    for _ in range(3):
+        assert verify(sign(claims(), keys[0])) == (200, {
+            'valid': True, 'sub': 'user-1', 'username': None, 'email': 'a@example.com', 'tokenUse': 'id',
+            'expiresAt': claims()['exp']})
+    access = claims(token_use='access', client_id=CLIENT_ID, username='alice')
+    del access['aud']
+    assert verify(sign(access, keys[0]))[1]['username'] == 'alice'
+    assert fetches == [ISSUER]
+
+
+@pytest.mark.parametrize('overrides, error', [
+    ({'exp': int(time.time()) - 3600}, 'Token expired'),
+    ({'aud': 'other-client'}, 'Token issued to another app client'),
+    ({'iss': 'https://cognito-idp.eu-west-1.amazonaws.com/other'}, 'Token issued by another user pool'),
+    ({'token_use': 'refresh'}, 'Unexpected token_use refresh'),
+])
+def test_invalid_claims_are_rejected(jwks, keys, overrides, error):
+    assert verify(sign(claims(**overrides), keys[0])) == (401, {'valid': False, 'error': error})
+
+
+def test_forged_and_tampered_tokens_are_rejected(jwks, keys):
+    assert verify(sign(claims(), keys[1]))[1]['error'] == 'Invalid signature'
+    header, payload, signature = sign(claims(), keys[0]).split('.')
+    tampered = b64(json.dumps(claims(sub='admin')).encode())
+    assert verify(f"{header}.{tampered}.{signature}")[1]['error'] == 'Invalid signature'
+    assert verify('not-a-token')[1]['error'] == 'Malformed token'
+
+
+def test_rotated_keys_refresh_the_jwks_at_most_once_per_interval(jwks, keys, monkeypatch):
+    published, fetches = jwks
+    assert verify(sign(claims(), keys[0]))[0] == 200
+
+    # Unknown kid right after the first download: not refetched yet
+    published['key-2'] = keys[1]
+    assert verify(sign(claims(), keys[1], kid='key-2'))[1]['error'] == 'Unknown signing key'
+    assert len(fetches) == 1
+
+    later = time.time() + auth.JWKS_MIN_REFRESH_SECONDS + 1
+    monkeypatch.setattr(auth.time, 'time', lambda: later)
+    assert verify(sign(claims(), keys[1], kid='key-2'))[0] == 200
+    assert verify(sign(claims(), keys[1], kid='key-3'))[1]['error'] == 'Unknown signing key'
+    assert len(fetches) == 2
+
+
+def test_config_is_cacheable(monkeypatch):
+    monkeypatch.setenv('COGNITO_USER_POOL_ID', POOL_ID)
+    monkeypatch.setenv('COGNITO_CLIENT_ID', CLIENT_ID)
+    monkeypatch.delattr(auth._config_response, 'cached', raising=False)
+
+    response = auth.get_config({'headers': {}}, None)
+    assert response['statusCode'] == 200
+    assert json.loads(response['body']) == {'userPoolId': POOL_ID, 'clientId': CLIENT_ID, 'region': 'eu-west-1'}
+    assert response['headers']['Cache-Control'] == f"public, max-age={auth.CONFIG_MAX_AGE_SECONDS}"
+
+    etag = response['headers']['ETag']
+    assert auth.get_config({'headers': {'If-None-Match': etag}}, None)['statusCode'] == 304
+    assert auth.get_config({'headers': {'if-none-match': '"stale"'}}, None)['statusCode'] == 200
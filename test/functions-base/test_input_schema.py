@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+from functions.base.run_flow import schemas
+from functions.base.run_flow.schemas import InvalidInput, load_schemas, validate_input
+
+CASES = {
+    'type': 'object',
+    'required': ['cases'],
+    'properties': {'cases': {'type': 'array', 'items': {'type': 'object', 'required': ['id'],
+                                                        'properties': {'id': {'type': 'string'}}}}}
+}
+
+
+@pytest.fixture
+def validators(tmp_path, monkeypatch):
+    path = tmp_path / 'flow_schemas.json'
+    path.write_text(json.dumps({'mapFlow': CASES}))
+    monkeypatch.setattr(schemas, 'SCHEMAS_FILE', str(path))
+    monkeypatch.delattr(schemas.get_validators, 'validators', raising=False)
+    monkeypatch.setattr(schemas, 'load_schemas', lambda: load_schemas(str(path)))
+    yield schemas.get_validators()
+    monkeypatch.delattr(schemas.get_validators, 'validators', raising=False)
+
+
+def test_inputs_are_checked_against_the_flow_schema(validators):
+    validate_input('mapFlow', {'cases': [{'id': 'case1'}]})
+    # Flows without a schema take anything
+    validate_input('otherFlow', 'anything')
+
+    with pytest.raises(InvalidInput) as missing:
+        validate_input('mapFlow', {})
+    assert (str(missing.value), missing.value.path) == ("input must contain ['cases'] properties", '$')
+
+    with pytest.raises(InvalidInput) as wrong_type:
+        validate_input('mapFlow', {'cases': [{'id': 'case1'}, {'id': 2}]})
+    assert (str(wrong_type.value), wrong_type.value.path) == ('input.cases[1].id must be string', '$.cases[1].id')
+
+
+def test_validators_are_compiled_once(validators):
+    assert schemas.get_validators() is validators
+
+
+def test_schemas_that_dont_compile_are_skipped(tmp_path, monkeypatch, caplog):
+    path = tmp_path / 'flow_schemas.json'
+    path.write_text(json.dumps({'mapFlow': CASES, 'typoFlow': {'type': 'objekt'}}))
+    monkeypatch.delattr(schemas.get_validators, 'validators', raising=False)
+    monkeypatch.setattr(schemas, 'load_schemas', lambda: load_schemas(str(path)))
+    try:
+        assert set(schemas.get_validators()) == {'mapFlow'}
+        assert "typoFlow doesn't compile" in caplog.text
+        validate_input('typoFlow', 'anything')
+        with pytest.raises(InvalidInput):
+            validate_input('mapFlow', {})
+    finally:
+        monkeypatch.delattr(schemas.get_validators, 'validators', raising=False)
+
+
+def test_missing_file_checks_nothing(tmp_path):
+    assert load_schemas(str(tmp_path / 'missing.json')) == {}
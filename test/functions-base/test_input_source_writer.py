@@ -0,0 +1,126 @@
+import io
+import json
+from decimal import Decimal
+
+import pytest
+
+from functions.base.input_source import handler
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+        self.aborted = []
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[(Bucket, Key)] = Body
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        upload_id = f"upload-{len(self.uploads)}"
+        self.uploads[upload_id] = {}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.uploads[UploadId][PartNumber] = Body
+        return {'ETag': f"etag-{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        self.objects[(Bucket, Key)] = b''.join(parts[part['PartNumber']] for part in MultipartUpload['Parts'])
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId)
+        self.aborted.append(Key)
+
+
+class FakeTable:
+    """Pages of 3 items"""
+    def __init__(self, items):
+        self.items = items
+        self.calls = []
+
+    def _page(self, **params):
+        self.calls.append(params)
+        start = params.get('ExclusiveStartKey', 0)
+        page = {'Items': self.items[start:start + 3]}
+        if start + 3 < len(self.items):
+            page['LastEvaluatedKey'] = start + 3
+        return page
+
+    query = scan = _page
+
+
+class FakeLambda:
+    """A generator of `count` items, `pageSize` at a time, failing at `failAt`"""
+    def __init__(self):
+        self.payloads = []
+
+    def invoke(self, FunctionName, Payload):
+        event = json.loads(Payload)
+        self.payloads.append(event)
+        start = event['cursor'] or 0
+        if start >= event.get('failAt', float('inf')):
+            return {'FunctionError': 'Unhandled', 'Payload': io.BytesIO(b'{"errorMessage": "boom"}')}
+        end = min(start + event['pageSize'], event['count'])
+        result = {'items': [{'n': n} for n in range(start, end)], 'cursor': end if end < event['count'] else None}
+        return {'Payload': io.BytesIO(json.dumps(result).encode())}
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    s3, table, lambda_client = FakeS3(), FakeTable([]), FakeLambda()
+    dynamodb = type('FakeDynamoDB', (), {'Table': lambda self, name: table})()
+    monkeypatch.setattr(handler.get_s3, 'client', s3, raising=False)
+    monkeypatch.setattr(handler.get_dynamodb, 'resource', dynamodb, raising=False)
+    monkeypatch.setattr(handler.get_lambda, 'client', lambda_client, raising=False)
+    monkeypatch.setenv('INPUTS_BUCKET', 'inputs')
+    return s3, table, lambda_client
+
+
+def run(source, execution='exec-1'):
+    return handler.handler({'flow': 'casesFlow', 'execution': execution, 'source': source}, None)
+
+
+def test_small_sources_are_one_object(aws):
+    s3, table, _ = aws
+    table.items = [{'id': 'a', 'score': Decimal('2')}, {'id': 'b', 'score': Decimal('2.5')}]
+
+    result = run({'dynamodb': {'table': 'cases'}})
+    assert result == {'bucket': 'inputs', 'key': 'inputs/casesFlow/exec-1.json', 'count': 2}
+    assert json.loads(s3.objects[('inputs', 'inputs/casesFlow/exec-1.json')]) == [
+        {'id': 'a', 'score': 2}, {'id': 'b', 'score': 2.5}]
+    assert s3.uploads == {}
+
+
+def test_dynamodb_queries_are_read_page_by_page(aws):
+    s3, table, _ = aws
+    table.items = [{'id': n} for n in range(8)]
+
+    run({'dynamodb': {'table': 'cases', 'keyCondition': 'pk = :pk', 'values': {':pk': 'a'}, 'index': 'byDay'}})
+    assert json.loads(s3.objects[('inputs', 'inputs/casesFlow/exec-1.json')]) == table.items
+    assert [call.get('ExclusiveStartKey') for call in table.calls] == [None, 3, 6]
+    assert table.calls[0] == {'IndexName': 'byDay', 'KeyConditionExpression': 'pk = :pk',
+                              'ExpressionAttributeValues': {':pk': 'a'}}
+
+
+def test_large_sources_are_uploaded_in_parts(aws, monkeypatch):
+    s3, _, lambda_client = aws
+    monkeypatch.setattr(handler, 'PART_SIZE', 100)
+
+    result = run({'function': 'arn:aws:lambda:eu-west-1:123456789012:function:cases',
+                  'input': {'count': 250, 'pageSize': 40}})
+    assert result['count'] == 250
+    assert json.loads(s3.objects[('inputs', result['key'])]) == [{'n': n} for n in range(250)]
+    assert s3.uploads == {}
+    # Page after page until the generator returns no cursor
+    assert [payload['cursor'] for payload in lambda_client.payloads] == [None, 40, 80, 120, 160, 200, 240]
+
+
+def test_failed_sources_abort_the_upload(aws, monkeypatch):
+    s3, _, _ = aws
+    monkeypatch.setattr(handler, 'PART_SIZE', 100)
+
+    with pytest.raises(RuntimeError, match='boom'):
+        run({'function': 'cases', 'input': {'count': 250, 'pageSize': 40, 'failAt': 120}})
+    assert s3.aborted == ['inputs/casesFlow/exec-1.json'] and s3.uploads == {} and s3.objects == {}
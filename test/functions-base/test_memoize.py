@@ -0,0 +1,112 @@
+import os
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-west-1')
+
+from functions.base.memoize import cache
+
+
+class FakeTable:
+    def __init__(self):
+        self.items = {}
+
+    def get_item(self, Key):
+        item = self.items.get(Key['cacheKey'])
+        return {'Item': item} if item else {}
+
+    def put_item(self, Item):
+        self.items[Item['cacheKey']] = Item
+
+
+class FakeStore(cache.PersistentStore):
+    def __init__(self):
+        self.table = FakeTable()
+        self.bucket = None
+        self.s3 = None
+
+
+def test_key_ignores_configured_fields_and_key_order():
+    a = cache.cache_key('f', {'x': 1, 'y': {'z': 2, 'trace': 'a'}, '__user_id': 'alice'}, ('__user_id', 'y.trace'))
+    b = cache.cache_key('f', {'y': {'trace': 'b', 'z': 2}, 'x': 1, '__user_id': 'bob'}, ('__user_id', 'y.trace'))
+    assert a == b
+    assert a != cache.cache_key('f', {'x': 2, 'y': {'z': 2}}, ('__user_id', 'y.trace'))
+
+
+def test_lru_evicts_least_recently_used_and_respects_size():
+    lru = cache.LRUCache(max_entries=2, max_bytes=100)
+    lru.put('a', 1, 2e9, 10)
+    lru.put('b', 2, 2e9, 10)
+    lru.get('a')
+    lru.put('c', 3, 2e9, 10)
+    assert lru.get('b') is cache.MISS and lru.get('a') == 1
+    lru.put('big', 'x', 2e9, 101)
+    assert lru.get('big') is cache.MISS
+    lru.put('old', 4, 1, 10)
+    assert lru.get('old') is cache.MISS
+
+
+def test_results_are_reused_across_containers(monkeypatch):
+    store = FakeStore()
+    monkeypatch.setattr(cache.get_store, 'store', store, raising=False)
+    calls = []
+
+    def step(event, context):
+        calls.append(event)
+        return {'total': sum(event['values'])}
+
+    first = cache.memoize(ttl=60)(step)
+    assert first({'values': [1, 2], '__user_id': 'a'}, None) == {'total': 3}
+    assert first({'values': [1, 2], '__user_id': 'b'}, None) == {'total': 3}
+    assert len(calls) == 1 and len(store.table.items) == 1
+
+    # A new container only has the shared tier
+    second = cache.memoize(ttl=60)(step)
+    hits = cache.stats['sharedHits']
+    assert second({'values': [1, 2]}, None) == {'total': 3}
+    assert len(calls) == 1 and cache.stats['sharedHits'] == hits + 1
+
+
+def test_errors_are_not_memoized(monkeypatch):
+    monkeypatch.setattr(cache.get_store, 'store', None, raising=False)
+    calls = []
+
+    @cache.memoize()
+    def handler(event, context):
+        calls.append(event)
+        return {'statusCode': 500, 'body': 'boom'}
+
+    handler({}, None)
+    handler({}, None)
+    assert len(calls) == 2
+
+
+def test_shared_hits_expire_with_the_shared_entry(monkeypatch):
+    store = FakeStore()
+    monkeypatch.setattr(cache.get_store, 'store', store, raising=False)
+    now = 1_700_000_000.0
+    monkeypatch.setattr(cache.time, 'time', lambda: now)
+
+    def step(event, context):
+        return {'total': sum(event['values'])}
+
+    cache.memoize(ttl=60)(step)({'values': [1]}, None)
+
+    # Another container reads the entry 50 s later: it keeps it for the 10 s left, not another 60
+    now += 50
+    second = cache.memoize(ttl=60)(step)
+    second({'values': [1]}, None)
+    key = cache.cache_key(f"{step.__module__}.{step.__qualname__}", {'values': [1]})
+    assert second.cache.get(key, now + 9) == '{"total": 1}'
+    assert second.cache.get(key, now + 11) is cache.MISS
+
+
+def test_callers_get_their_own_copy(monkeypatch):
+    monkeypatch.setattr(cache.get_store, 'store', None, raising=False)
+
+    @cache.memoize()
+    def handler(event, context):
+        return {'items': [1, 2]}
+
+    handler({}, None)['items'].append(3)
+    hit = handler({}, None)
+    hit['items'].append(4)
+    assert handler({}, None) == {'items': [1, 2]}
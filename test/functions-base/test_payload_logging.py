@@ -0,0 +1,75 @@
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+from functions.base.logs import payload
+from functions.base.logs.payload import is_sampled, log_payloads, truncated
+
+
+class Counted:
+    """Counts how many times it is serialized"""
+    calls = 0
+
+    def __str__(self):
+        Counted.calls += 1
+        return 'counted'
+
+
+def context(request_id):
+    return SimpleNamespace(aws_request_id=request_id)
+
+
+@pytest.fixture
+def handler(monkeypatch):
+    monkeypatch.setenv('LOG_PAYLOAD_CHARS', '40')
+
+    @log_payloads
+    def handler(event, context):
+        if event.get('fail'):
+            raise ValueError('boom')
+        return {'ok': True, 'echo': event}
+    payload.logger.setLevel(logging.INFO)
+    return handler
+
+
+def test_payloads_are_serialized_only_when_logged():
+    Counted.calls = 0
+    logger = logging.getLogger('test_payload_logging')
+    logger.setLevel(logging.INFO)
+    logger.debug('Event: %s', truncated({'value': Counted()}))
+    assert Counted.calls == 0
+
+    assert str(truncated({'items': list(range(100))}, limit=20)) == '{"items":[0,1,2,3,4,... (301 chars)'
+    assert str(truncated({'a': 1}, limit=20)) == '{"a":1}'
+
+
+def test_sampling_is_per_request_and_close_to_the_rate(monkeypatch):
+    monkeypatch.setenv('LOG_SAMPLE_RATE', '0.1')
+    sampled = [is_sampled(context(f"request-{i}")) for i in range(5000)]
+    assert 400 < sum(sampled) < 600
+    assert sampled == [is_sampled(context(f"request-{i}")) for i in range(5000)]
+    assert not any(is_sampled(context(f"request-{i}"), rate=0) for i in range(100))
+    assert all(is_sampled(context(f"request-{i}"), rate=1) for i in range(100))
+
+
+def test_unsampled_invocations_log_nothing_at_info(handler, monkeypatch, caplog):
+    monkeypatch.setenv('LOG_SAMPLE_RATE', '0')
+    with caplog.at_level(logging.INFO, logger=payload.logger.name):
+        assert handler({'big': 'x' * 1000}, context('r-1'))['ok']
+    assert caplog.records == []
+
+
+def test_sampled_invocations_log_full_payloads(handler, monkeypatch, caplog):
+    monkeypatch.setenv('LOG_SAMPLE_RATE', '1')
+    with caplog.at_level(logging.INFO, logger=payload.logger.name):
+        handler({'big': 'x' * 1000}, context('r-1'))
+    assert [len(record.getMessage()) > 1000 for record in caplog.records] == [True, True]
+
+
+def test_failures_log_the_full_event(handler, monkeypatch, caplog):
+    monkeypatch.setenv('LOG_SAMPLE_RATE', '0')
+    with caplog.at_level(logging.INFO, logger=payload.logger.name), pytest.raises(ValueError):
+        handler({'fail': True, 'big': 'x' * 1000}, context('r-1'))
+    [record] = caplog.records
+    assert record.levelno == logging.ERROR and 'x' * 1000 in record.getMessage() and record.exc_info
@@ -0,0 +1,57 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-west-1')
+
+from functions.base.router import handler as router
+
+ROUTER_ARN = 'arn:aws:lambda:eu-west-1:123456789012:function:workflows-dev-routerShared'
+
+
+def context(alias=None):
+    return SimpleNamespace(invoked_function_arn=f"{ROUTER_ARN}:{alias}" if alias else ROUTER_ARN)
+
+
+def http_event(path):
+    return {'rawPath': path, 'requestContext': {'http': {'method': 'POST', 'path': path}}}
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(router, '_handlers', {})
+
+
+def test_dispatches_on_the_invoked_alias():
+    assert router.handler({'name': 'flow'}, context('hello_world')) == {
+        'message': 'Hello World!', 'input': {'name': 'flow'}}
+
+
+def test_dispatches_on_the_http_path():
+    assert router.handler(http_event('/lib/ping'), context())['body'] == 'I am alive'
+
+
+def test_handlers_are_imported_once(monkeypatch):
+    imports = []
+    real_import = router.importlib.import_module
+    monkeypatch.setattr(router.importlib, 'import_module', lambda name: imports.append(name) or real_import(name))
+    for _ in range(3):
+        router.handler(http_event('/lib/ping'), context())
+    assert imports == ['functions.lib.ping.handler']
+
+
+def test_unknown_functions():
+    response = router.handler(http_event('/lib/missing'), context())
+    assert response['statusCode'] == 404
+    with pytest.raises(router.UnknownFunction):
+        router.handler({}, context('missing'))
+    with pytest.raises(router.UnknownFunction):
+        router.handler({}, context())
+
+
+def test_warmup_preloads_the_aliased_function():
+    assert router.handler({'__warmup__': {}}, context('ping')) == {'warmed': True}
+    assert 'ping' in router._handlers
+    # Unqualified warmup (the router itself) has nothing to preload
+    assert router.handler({'__warmup__': {}}, context()) == {'warmed': True}
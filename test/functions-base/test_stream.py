@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-west-1')
+
+from functions.base.stream.local import LocalStream
+
+ARN = 'arn:aws:states:eu-west-1:123:execution:helloWorldFlow:run-1'
+
+
+@pytest.fixture
+def stream():
+    stream = LocalStream(users={'token-1': 'user-1', 'token-2': 'user-2'}).install()
+    yield stream
+    stream.uninstall()
+
+
+def test_connect_requires_a_valid_token(stream):
+    assert stream.connect(None) is None
+    assert stream.connect('forged') is None
+    assert stream.connect('token-1')
+
+
+def test_flow_subscribers_get_their_own_terminal_results(stream):
+    alice, bob = stream.connect('token-1'), stream.connect('token-2')
+    for connection in (alice, bob):
+        assert stream.message(connection, {'action': 'subscribe', 'flow': 'helloWorldFlow'})['type'] == 'subscribed'
+
+    stream.status_change(ARN, 'RUNNING', input={'__user_id': 'user-1'})
+    stream.status_change(ARN, 'SUCCEEDED', output={'message': 'Hello World!'})
+
+    statuses = [(m['status'], m.get('output')) for m in stream.received(alice) if m['type'] == 'execution']
+    assert statuses == [('RUNNING', None), ('SUCCEEDED', {'message': 'Hello World!'})]
+    assert [m['type'] for m in stream.received(bob)] == ['subscribed']
+
+
+def test_execution_subscriptions_check_ownership_and_catch_up(stream):
+    alice, bob = stream.connect('token-1'), stream.connect('token-2')
+    stream.start(ARN, {'__user_id': 'user-1'})
+    assert stream.message(bob, {'action': 'subscribe', 'executionArn': ARN})['type'] == 'error'
+
+    # Finished before the client subscribed: the result is sent right after the ack
+    stream.status_change(ARN, 'SUCCEEDED', output={'ok': True})
+    stream.message(alice, {'action': 'subscribe', 'executionArn': ARN})
+    assert [(m['type'], m.get('status')) for m in stream.received(alice)] == [
+        ('subscribed', None), ('execution', 'SUCCEEDED')]
+
+
+def test_gone_connections_are_cleaned_up(stream):
+    alice = stream.connect('token-1')
+    stream.message(alice, {'action': 'subscribe', 'flow': 'helloWorldFlow'})
+    stream.close(alice)
+
+    assert stream.status_change(ARN, 'SUCCEEDED', input={'__user_id': 'user-1'}, output={}) == {'sent': 0}
+    assert stream.table.items == {}
@@ -0,0 +1,261 @@
+import os
+import json
+from datetime import datetime
+
+import pytest
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-west-1')
+
+from functions.base.api_usage import handler as api_usage
+
+
+class FakeTable:
+    def __init__(self, items=None):
+        self.updates = []
+        self.items = items or []
+
+    def update_item(self, **kwargs):
+        self.updates.append(kwargs)
+
+    def query(self, **kwargs):
+        return {'Items': self.items}
+
+
+def api_event(route_key, path, user_id='user-1', path_parameters=None, query=None):
+    method = route_key.split(' ')[0]
+    return {
+        'routeKey': route_key,
+        'pathParameters': path_parameters,
+        'queryStringParameters': query,
+        'requestContext': {
+            'routeKey': route_key,
+            'http': {'method': method, 'path': path},
+            'authorizer': {'jwt': {'claims': {'sub': user_id}}}
+        }
+    }
+
+
+def counts(update):
+    names, values = update['ExpressionAttributeNames'], update['ExpressionAttributeValues']
+    return {names[name]: values[name.replace('#', ':')] for name in names if name != '#ttl'}
+
+
+def test_middleware_writes_the_month_and_the_day_breakdown(monkeypatch):
+    table = FakeTable()
+    monkeypatch.setattr(api_usage.get_table, 'table', table, raising=False)
+
+    @api_usage.track_usage_middleware
+    def handler(event, context):
+        return 'ok'
+
+    event = api_event('POST /run/{flow_name}', '/run/helloWorldFlow',
+                      path_parameters={'flow_name': 'helloWorldFlow'})
+    assert handler(event, None) == 'ok'
+
+    month, day = table.updates
+    today = datetime.utcnow().strftime('%Y-%m-%d')
+    # The monthly item keeps a constant size, the breakdown goes to the item of the day
+    assert month['Key'] == {'userId': 'user-1', 'yearMonth': today[:7]}
+    assert counts(month) == {'apiCalls': 1}
+    assert day['Key'] == {'userId': 'user-1', 'yearMonth': f'DAY#{today}'}
+    assert counts(day) == {'apiCalls': 1, 'route#POST /run/{flow_name}': 1, 'flow#helloWorldFlow': 1}
+    assert all(update['UpdateExpression'].startswith('SET #ttl = :ttl ADD ') for update in table.updates)
+
+
+def test_batch_merges_increments_per_item(monkeypatch):
+    table = FakeTable()
+    monkeypatch.setattr(api_usage.get_table, 'table', table, raising=False)
+
+    batch = api_usage.UsageBatch()
+    when = datetime(2024, 5, 17)
+    batch.add('user-1', '/lib/ping', 'POST', when=when)
+    batch.add('user-1', '/lib/ping', 'POST', when=when)
+    batch.add('user-2', '/flows', 'GET', when=when)
+    batch.flush()
+
+    written = {update['Key']['userId'] + ' ' + update['Key']['yearMonth']: counts(update) for update in table.updates}
+    assert written == {
+        'user-1 2024-05': {'apiCalls': 2},
+        'user-1 DAY#2024-05-17': {'apiCalls': 2, 'route#POST /lib/ping': 2},
+        'user-2 2024-05': {'apiCalls': 1},
+        'user-2 DAY#2024-05-17': {'apiCalls': 1, 'route#GET /flows': 1}
+    }
+    assert len(batch) == 0
+
+
+def test_timeseries_folds_daily_items():
+    items = [
+        {'userId': 'user-1', 'yearMonth': 'DAY#2024-05-01', 'apiCalls': 2, 'route#POST /run/{flow_name}': 2,
+         'flow#helloWorldFlow': 2},
+        {'userId': 'user-1', 'yearMonth': 'DAY#2024-05-02', 'apiCalls': 3, 'route#GET /runs': 3},
+        {'userId': 'user-1', 'yearMonth': 'DAY#2024-06-01', 'apiCalls': 1, 'route#GET /runs': 1}
+    ]
+
+    series = api_usage.build_timeseries(items, '2024-05-01', '2024-05-31')
+    assert series == [
+        {'date': '2024-05-01', 'apiCalls': 2, 'routes': {'POST /run/{flow_name}': 2}, 'flows': {'helloWorldFlow': 2}},
+        {'date': '2024-05-02', 'apiCalls': 3, 'routes': {'GET /runs': 3}, 'flows': {}}
+    ]
+
+    flow_series = api_usage.build_timeseries(items, '2024-05-01', '2024-05-31', 'helloWorldFlow')
+    assert flow_series == [
+        {'date': '2024-05-01', 'apiCalls': 2, 'routes': {}, 'flows': {'helloWorldFlow': 2}}
+    ]
+
+
+def test_get_usage_rejects_other_users(monkeypatch):
+    table = FakeTable()
+    monkeypatch.setattr(api_usage.get_table, 'table', table, raising=False)
+
+    event = api_event('GET /usage/{user_id}', '/usage/user-2', path_parameters={'user_id': 'user-2'})
+    response = api_usage.get_usage(event, None)
+    assert response['statusCode'] == 403
+
+    event = api_event('GET /usage/{user_id}', '/usage/user-1', path_parameters={'user_id': 'user-1'},
+                      query={'startDate': '2024-05', 'endDate': '2024-05'})
+    table.items = [{'userId': 'user-1', 'yearMonth': 'DAY#2024-05-03', 'apiCalls': 4}]
+    response = api_usage.get_usage(event, None)
+    body = json.loads(response['body'])
+    assert response['statusCode'] == 200
+    assert body['total'] == 4
+    assert body['series'][0]['date'] == '2024-05-03'
+
+
+class ConditionalTable(FakeTable):
+    """
+    Evaluates the quota and rate conditions of enforce_api_call against a single stored monthly
+    item; `updates` are the writes to it, `daily` those to the daily items
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.item = {}
+        self.daily = []
+
+    def update_item(self, **kwargs):
+        from botocore.exceptions import ClientError
+        from boto3.dynamodb.types import TypeSerializer
+
+        if kwargs['Key']['yearMonth'].startswith('DAY#'):
+            self.daily.append(kwargs)
+            return
+        self.updates.append(kwargs)
+        values = kwargs['ExpressionAttributeValues']
+        condition = kwargs.get('ConditionExpression', '')
+        ok = True
+        if ':quota' in condition:
+            ok &= self.item.get('apiCalls', 0) < values[':quota']
+        if ':now' in condition:
+            ok &= self.item.get('rateTat', 0) <= values[':now']
+        if ':known' in condition:
+            ok &= self.item.get('rateTat') == values[':known']
+        if not ok:
+            serializer = TypeSerializer()
+            raise ClientError({
+                'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'failed'},
+                'Item': {k: serializer.serialize(v) for k, v in self.item.items()}
+            }, 'UpdateItem')
+
+        self.item['apiCalls'] = self.item.get('apiCalls', 0) + 1
+        if ':tat' in values:
+            self.item['rateTat'] = values[':tat']
+
+
+def enforcing(monkeypatch, limits):
+    table = ConditionalTable()
+    monkeypatch.setattr(api_usage.get_table, 'table', table, raising=False)
+    monkeypatch.setenv('USAGE_ENFORCEMENT', 'enforce')
+    monkeypatch.setenv('USAGE_LIMITS', json.dumps(limits))
+    monkeypatch.setattr(api_usage, '_blocked_users', {})
+    monkeypatch.setattr(api_usage, '_rate_state', {})
+    return table
+
+
+def test_monthly_quota_returns_429_and_caches_the_block(monkeypatch):
+    table = enforcing(monkeypatch, {'defaultPlan': 'tiny', 'plans': {'tiny': {'monthlyQuota': 2}}})
+
+    @api_usage.track_usage_middleware
+    def handler(event, context):
+        return {'statusCode': 200}
+
+    event = api_event('GET /runs', '/runs')
+    assert handler(event, None)['statusCode'] == 200
+    assert handler(event, None)['statusCode'] == 200
+
+    response = handler(event, None)
+    assert response['statusCode'] == 429
+    assert json.loads(response['body'])['error'] == 'Monthly quota exceeded'
+    assert len(table.updates) == 3
+
+    # Over-quota users are rejected from the container cache without touching DynamoDB
+    assert handler(event, None)['statusCode'] == 429
+    assert len(table.updates) == 3
+    # Only the accepted calls are in the daily breakdown
+    assert len(table.daily) == 2
+
+
+def test_token_bucket_allows_burst_then_limits(monkeypatch):
+    table = enforcing(monkeypatch, {'users': {'user-1': {'ratePerSecond': 1, 'burst': 2}}})
+
+    now = 1_700_000_000.0
+    api_usage.enforce_api_call('user-1', '/runs', 'GET', api_usage.get_user_limits('user-1'), now=now)
+    api_usage.enforce_api_call('user-1', '/runs', 'GET', api_usage.get_user_limits('user-1'), now=now)
+    with pytest.raises(api_usage.UsageLimitExceeded) as exceeded:
+        api_usage.enforce_api_call('user-1', '/runs', 'GET', api_usage.get_user_limits('user-1'), now=now)
+    assert exceeded.value.retry_after == 1
+    assert len(table.updates) == 2
+
+    # One token is back a second later
+    api_usage.enforce_api_call('user-1', '/runs', 'GET', api_usage.get_user_limits('user-1'), now=now + 1)
+    assert len(table.updates) == 3
+
+
+def test_users_without_limits_are_only_tracked(monkeypatch):
+    table = enforcing(monkeypatch, {'plans': {'pro': {'monthlyQuota': 1}}})
+    assert api_usage.get_user_limits('user-1') is None
+    assert api_usage.get_user_limits('user-1', {'custom:plan': 'pro'}) == {'monthlyQuota': 1}
+
+    @api_usage.track_usage_middleware
+    def handler(event, context):
+        return {'statusCode': 200}
+
+    assert handler(api_event('GET /runs', '/runs'), None)['statusCode'] == 200
+    assert 'ConditionExpression' not in table.updates[0]
+
+
+class RacingTable(ConditionalTable):
+    """Other containers take a token of the same user just before each of the first `races` writes"""
+
+    def __init__(self, races, now_ms, interval_ms):
+        super().__init__()
+        self.races = races
+        self.now_ms = now_ms
+        self.interval_ms = interval_ms
+
+    def update_item(self, **kwargs):
+        if self.races and not kwargs['Key']['yearMonth'].startswith('DAY#'):
+            self.races -= 1
+            self.item['rateTat'] = max(self.item.get('rateTat', 0), self.now_ms) + self.interval_ms
+            self.item['apiCalls'] = self.item.get('apiCalls', 0) + 1
+        return super().update_item(**kwargs)
+
+
+@pytest.mark.parametrize('burst, admitted', [(50, True), (3, False)])
+def test_concurrent_writers_only_cause_rejections_over_the_limit(monkeypatch, burst, admitted):
+    now = 1_700_000_000.0
+    enforcing(monkeypatch, {'users': {'user-1': {'ratePerSecond': 10, 'burst': burst}}})
+    table = RacingTable(races=4, now_ms=int(now * 1000), interval_ms=100)
+    monkeypatch.setattr(api_usage.get_table, 'table', table, raising=False)
+
+    call = lambda: api_usage.enforce_api_call('user-1', '/runs', 'GET', api_usage.get_user_limits('user-1'), now=now)
+    if admitted:
+        # Every write lost the race, each retry starts from the bucket it was told about
+        call()
+        assert len(table.updates) == 5 and table.item['apiCalls'] == 5
+        assert len(table.daily) == 1
+    else:
+        with pytest.raises(api_usage.UsageLimitExceeded):
+            call()
+        # Rejected once the stored bucket was really over the burst, not after a fixed number of tries
+        assert table.item['rateTat'] - table.now_ms > 2 * 100
+        assert not table.daily
@@ -0,0 +1,47 @@
+import io
+import json
+import os
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-west-1')
+
+from functions.base.api_usage import handler as api_usage
+from functions.base.warmer import handler as warmer
+
+
+class FakeLambda:
+    def __init__(self):
+        self.calls = []
+
+    def invoke(self, **kwargs):
+        self.calls.append(kwargs)
+        if kwargs['FunctionName'] == 'broken':
+            return {'FunctionError': 'Unhandled', 'Payload': io.BytesIO(b'{"errorMessage": "boom"}')}
+        return {'StatusCode': 200, 'Payload': io.BytesIO(b'{"warmed": true}')}
+
+
+def test_middleware_answers_the_warmer_without_tracking_or_running_the_handler(monkeypatch):
+    monkeypatch.setattr(api_usage, 'track_api_call', lambda *args: (_ for _ in ()).throw(AssertionError('tracked')))
+    calls = []
+
+    @api_usage.track_usage_middleware
+    def handler(event, context):
+        calls.append(event)
+        return 'ran'
+
+    assert handler(warmer.warmup_event(1, 0), None) == {'warmed': True}
+    assert calls == []
+
+
+def test_warmer_sends_one_sentinel_per_container(monkeypatch):
+    fake = FakeLambda()
+    monkeypatch.setattr(warmer, 'lambda_client', fake)
+    monkeypatch.setattr(warmer, 'HOLD_MS', 0)
+
+    result = warmer.handler({'targets': [{'function': 'ping', 'concurrency': 3},
+                                         {'function': 'broken'}]}, None)
+
+    assert result == {'warmed': {'ping': 3, 'broken': 0}}
+    payloads = [json.loads(call['Payload']) for call in fake.calls if call['FunctionName'] == 'ping']
+    assert sorted(payload[api_usage.WARMUP_KEY]['index'] for payload in payloads) == [0, 1, 2]
+    assert all(call['InvocationType'] == 'RequestResponse' for call in fake.calls)
+    assert all(api_usage.is_warmup_event(payload) for payload in payloads)
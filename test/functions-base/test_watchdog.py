@@ -0,0 +1,98 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-west-1')
+
+from functions.base.watchdog import handler as watchdog
+
+NOW = datetime.now(timezone.utc)
+MACHINE = 'arn:aws:states:eu-west-1:123:stateMachine:{}'
+EXECUTION = 'arn:aws:states:eu-west-1:123:execution:{}:{}'
+
+
+class ExecutionDoesNotExist(Exception):
+    pass
+
+
+class FakeSFN:
+    class exceptions:
+        ExecutionDoesNotExist = ExecutionDoesNotExist
+
+    def __init__(self, running, transitions=None):
+        self.running = running
+        self.transitions = transitions or {}
+        self.history_pages = 0
+        self.stopped = []
+
+    def get_paginator(self, name):
+        return self
+
+    def paginate(self, **kwargs):
+        if 'stateMachineArn' in kwargs:
+            assert kwargs['statusFilter'] == 'RUNNING'
+            flow = kwargs['stateMachineArn'].split(':')[-1]
+            yield {'executions': [e for e in self.running if e['executionArn'].split(':')[6] == flow]}
+            return
+        # 100 states entered per history page
+        for _ in range(0, self.transitions.get(kwargs['executionArn'], 0), 100):
+            self.history_pages += 1
+            yield {'events': [{'type': 'TaskStateEntered'}, {'type': 'TaskStateExited'}] * 100}
+
+    def stop_execution(self, executionArn, error, cause):
+        self.stopped.append((executionArn, error, cause))
+
+
+def execution(flow, name, minutes):
+    return {'executionArn': EXECUTION.format(flow, name), 'startDate': NOW - timedelta(minutes=minutes)}
+
+
+@pytest.fixture
+def sfn(monkeypatch):
+    fake = FakeSFN(
+        running=[execution('reportFlow', 'fresh', 5), execution('reportFlow', 'stuck', 180),
+                 execution('mapFlow', 'looping', 10), execution('mapFlow', 'ok', 10)],
+        transitions={EXECUTION.format('mapFlow', 'looping'): 5000, EXECUTION.format('mapFlow', 'ok'): 200}
+    )
+    monkeypatch.setattr(watchdog, 'sfn', fake)
+    return fake
+
+
+FLOWS = [
+    {'flow': 'reportFlow', 'stateMachineArn': MACHINE.format('reportFlow'), 'maxDurationSeconds': 3600},
+    {'flow': 'mapFlow', 'stateMachineArn': MACHINE.format('mapFlow'), 'maxStateTransitions': 1000},
+]
+
+
+def test_stops_executions_over_budget(sfn):
+    result = watchdog.handler({'flows': FLOWS}, None)
+
+    assert result['checked'] == 4
+    assert [(item['flow'], item['executionArn'].split(':')[-1]) for item in result['stopped']] == [
+        ('reportFlow', 'stuck'), ('mapFlow', 'looping')]
+    assert [arn.split(':')[-1] for arn, _, _ in sfn.stopped] == ['stuck', 'looping']
+    assert all(error == watchdog.STOP_ERROR for _, error, _ in sfn.stopped)
+    assert result['stopped'][0]['runningSeconds'] >= 180 * 60
+    # The history of a runaway execution is only read until it's over budget
+    assert result['stopped'][1]['stateTransitions'] == 1100
+    assert sfn.history_pages == 11 + 2
+
+
+def test_dry_run_only_reports(sfn):
+    result = watchdog.handler({'flows': FLOWS, 'dryRun': True}, None)
+    assert len(result['stopped']) == 2
+    assert sfn.stopped == []
+
+
+def test_a_failing_flow_does_not_spare_the_others(sfn):
+    flows = [{'flow': 'gone', 'stateMachineArn': None, 'maxDurationSeconds': 1}] + FLOWS
+    sfn_paginate = sfn.paginate
+
+    def paginate(**kwargs):
+        if kwargs.get('stateMachineArn', '') is None:
+            raise RuntimeError('StateMachineDoesNotExist')
+        return sfn_paginate(**kwargs)
+
+    sfn.paginate = paginate
+    assert len(watchdog.handler({'flows': flows}, None)['stopped']) == 2
@@ -0,0 +1,56 @@
+import pytest
+import yaml
+
+from tools.flows import load_flows
+from tools.flows.graph import dependency_graph, deploy_layers, impacted_flows
+
+
+def write_flow(root, name, functions=(), references=(), plugin=None):
+    base = root / '.plugins' / plugin if plugin else root
+    path = base / 'flows' / f"{name}.yml"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(yaml.safe_dump({
+        'name': name,
+        'definition': {'StartAt': 'Run', 'States': {'Run': {'Type': 'Pass', 'End': True}}},
+        'functions': [{'name': f"lib{d}", 'handler': f"functions/lib/{d}/handler.handler"} for d in functions],
+        'stateMachineReferences': list(references),
+    }))
+
+
+@pytest.fixture
+def repo(tmp_path):
+    write_flow(tmp_path, 'ingest', functions=['fetch', 'parse'])
+    write_flow(tmp_path, 'score', functions=['model'])
+    write_flow(tmp_path, 'report', functions=['render'], plugin='reports')
+    write_flow(tmp_path, 'daily', references=['ingest', 'score'])
+    write_flow(tmp_path, 'weekly', references=['daily', 'report'])
+    return tmp_path
+
+
+def test_graph_and_layers(repo):
+    graph = dependency_graph(load_flows(str(repo)))
+    assert graph['weekly'] == {'flows': ['daily', 'report'], 'functions': []}
+    assert graph['report']['functions'] == ['.plugins/reports/functions/lib/render']
+    assert deploy_layers(graph) == [['ingest', 'report', 'score'], ['daily'], ['weekly']]
+
+
+def test_cycles_have_no_deploy_order(repo):
+    write_flow(repo, 'ingest', functions=['fetch'], references=['weekly'])
+    with pytest.raises(ValueError, match='cycle'):
+        deploy_layers(dependency_graph(load_flows(str(repo))))
+
+
+def test_impact_follows_composite_flows(repo):
+    flows = load_flows(str(repo))
+    graph = dependency_graph(flows)
+
+    assert impacted_flows(graph, flows, ['functions/lib/model/handler.py'], str(repo)) == {
+        'daily': 'starts score', 'score': 'uses functions/lib/model', 'weekly': 'starts daily'
+    }
+    assert list(impacted_flows(graph, flows, ['.plugins/reports/flows/report.yml'], str(repo))) == ['report', 'weekly']
+    assert impacted_flows(graph, flows, ['README.md'], str(repo)) == {}
+    assert len(impacted_flows(graph, flows, ['deploy/generate-step-functions.js'], str(repo))) == 5
+    # Modules the generator requires change every state machine too
+    for module in ('deploy/retry.js', 'deploy/input-source.js', 'deploy/function-config.js'):
+        assert len(impacted_flows(graph, flows, [module], str(repo))) == 5
+    assert impacted_flows(graph, flows, ['deploy/setup-containers.js'], str(repo)) == {}
@@ -0,0 +1,226 @@
+import argparse
+import json
+import time
+
+import yaml
+
+from tools.flows import input_schemas, load_flows, validate
+from tools.flows.__main__ import run_schemas
+
+HANDLER = 'def handler(event, context):\n    return event\n'
+
+
+def write(root, path, content):
+    (root / path).parent.mkdir(parents=True, exist_ok=True)
+    (root / path).write_text(content if isinstance(content, str) else yaml.safe_dump(content, sort_keys=False))
+
+
+def task_flow(name, *function_dirs, references=(), **extra):
+    states = {}
+    for i, function_dir in enumerate(function_dirs):
+        states[f"Step{i}"] = {'Type': 'Task', 'Resource': f"${{lib{function_dir.title()}Arn}}"}
+    for i, reference in enumerate(references):
+        states[f"Start{i}"] = {'Type': 'Task', 'Resource': 'arn:aws:states:::states:startExecution.sync:2',
+                               'Parameters': {'StateMachineArn': f"${{{reference}}}", 'Input.$': '$'}}
+    order = list(states)
+    for state, next_state in zip(order, order[1:] + [None]):
+        states[state].update({'Next': next_state} if next_state else {'End': True})
+    return {
+        'name': name,
+        'definition': {'StartAt': next(iter(states)), 'States': states, **extra},
+        'functions': [{'name': f"lib{d.title()}", 'handler': f"functions/lib/{d}/handler.handler"} for d in function_dirs],
+        **({'stateMachineReferences': list(references)} if references else {})
+    }
+
+
+def codes(issues, level=None):
+    return sorted(i['code'] for i in issues if level is None or i['level'] == level)
+
+
+def test_valid_flows_have_no_errors(tmp_path):
+    write(tmp_path, 'functions/lib/ping/handler.py', HANDLER)
+    write(tmp_path, 'flows/pingFlow.yml', task_flow('pingFlow', 'ping'))
+    write(tmp_path, '.plugins/reports/functions/lib/report/handler.py', HANDLER)
+    write(tmp_path, '.plugins/reports/flows/reportFlow.yml', task_flow('reportFlow', 'report'))
+
+    flows = load_flows(str(tmp_path))
+    assert sorted(flow.name for flow in flows) == ['pingFlow', 'reportFlow']
+    assert validate(flows) == []
+
+
+def test_broken_references_and_structure(tmp_path):
+    write(tmp_path, 'functions/lib/ping/handler.py', HANDLER)
+    flow = task_flow('brokenFlow', 'ping', 'missing')
+    flow['functions'] = flow['functions'][:1]
+    flow['stateMachineReferences'] = ['noSuchFlow']
+    flow['definition']['States']['Step0']['Next'] = 'Nowhere'
+    flow['definition']['States']['Orphan'] = {'Type': 'Wait', 'End': True}
+    write(tmp_path, 'flows/brokenFlow.yml', flow)
+    write(tmp_path, 'flows/unparsable.yml', 'name: [')
+
+    issues = validate(load_flows(str(tmp_path)))
+    assert codes(issues, 'error') == ['invalid-wait', 'parse-error', 'undefined-variable', 'unknown-flow',
+                                      'unknown-state']
+    assert codes(issues, 'warning') == ['unreachable-state', 'unreachable-state', 'unused-variable']
+    undefined = next(i for i in issues if i['code'] == 'undefined-variable')
+    assert "functions entry named 'libMissing'" in undefined['message']
+
+
+def test_missing_handler_and_cycles(tmp_path):
+    write(tmp_path, 'functions/lib/ping/handler.py', 'def other(event, context):\n    pass\n')
+    write(tmp_path, 'flows/a.yml', task_flow('flowA', references=['flowB']))
+    write(tmp_path, 'flows/b.yml', task_flow('flowB', references=['flowA']))
+    write(tmp_path, 'flows/c.yml', task_flow('flowC', 'ping', references=['flowA']))
+
+    issues = validate(load_flows(str(tmp_path)))
+    assert codes(issues, 'error') == ['cycle', 'missing-handler']
+    cycle = next(i for i in issues if i['code'] == 'cycle')
+    assert cycle['message'].endswith('flowA -> flowB -> flowA')
+
+    # Only the requested files are reported, but they are checked against every flow
+    issues = validate(load_flows(str(tmp_path)), only=[str(tmp_path / 'flows/c.yml')])
+    assert codes(issues) == ['missing-handler']
+
+
+def test_performance_lints(tmp_path):
+    write(tmp_path, 'functions/lib/ping/handler.py', HANDLER)
+    states = {
+        'Fetch': {'Type': 'Task', 'Resource': '${libPingArn}', 'ResultPath': '$.fetched', 'Next': 'Enrich'},
+        'Enrich': {'Type': 'Task', 'Resource': '${libPingArn}', 'ResultPath': '$.enriched', 'Next': 'Notify'},
+        'Notify': {'Type': 'Task', 'Resource': '${libPingArn}', 'ResultPath': None, 'Next': 'Audit'},
+        'Audit': {'Type': 'Task', 'Resource': '${libPingArn}', 'Next': 'Each'},
+        'Each': {'Type': 'Map', 'ItemsPath': '$.items', 'End': True,
+                 'Iterator': {'StartAt': 'One', 'States': {'One': {'Type': 'Task', 'Resource': '${libPingArn}',
+                                                                   'End': True}}}},
+    }
+    write(tmp_path, 'flows/slow.yml', {
+        'name': 'slowFlow', 'definition': {'StartAt': 'Fetch', 'States': states},
+        'functions': [{'name': 'libPing', 'handler': 'functions/lib/ping/handler.handler'}]
+    })
+
+    issues = validate(load_flows(str(tmp_path)))
+    assert codes(issues) == ['payload-echo', 'sequential-independent', 'unbounded-map']
+    assert next(i for i in issues if i['code'] == 'sequential-independent')['location'] == 'States.Notify'
+
+
+def test_budgets(tmp_path):
+    write(tmp_path, 'functions/lib/ping/handler.py', HANDLER)
+    write(tmp_path, 'flows/ok.yml', {**task_flow('okFlow', 'ping'), 'maxDurationSeconds': 600,
+                                     'maxStateTransitions': 50})
+    write(tmp_path, 'flows/bad.yml', {**task_flow('badFlow', 'ping'), 'maxDurationSeconds': '1h',
+                                      'maxStateTransitions': 0})
+    write(tmp_path, 'flows/long.yml', {**task_flow('longFlow', 'ping', TimeoutSeconds=7200),
+                                       'maxDurationSeconds': 3600})
+
+    issues = validate(load_flows(str(tmp_path)))
+    assert [(i['flow'], i['code'], i['location']) for i in sorted(issues, key=lambda i: (i['flow'], i['location']))] == [
+        ('badFlow', 'invalid-budget', 'maxDurationSeconds'),
+        ('badFlow', 'invalid-budget', 'maxStateTransitions'),
+        ('longFlow', 'timeout-over-budget', 'definition.TimeoutSeconds'),
+    ]
+
+
+def test_retry_policies(tmp_path):
+    write(tmp_path, 'functions/lib/ping/handler.py', HANDLER)
+    ok = task_flow('okFlow', 'ping')
+    ok['functions'][0]['retryPolicy'] = {'maxAttempts': 0}
+    write(tmp_path, 'flows/ok.yml', {**ok, 'retryPolicy': {'maxAttempts': 5, 'backoffRate': 1.5, 'jitter': False}})
+    bad = task_flow('badFlow', 'ping')
+    bad['functions'][0]['retryPolicy'] = 'always'
+    write(tmp_path, 'flows/bad.yml', {**bad, 'retryPolicy': {'backoffRate': 0.5, 'errors': [], 'retries': 3}})
+
+    issues = validate(load_flows(str(tmp_path)))
+    assert sorted((i['flow'], i['code'], i['location']) for i in issues) == [
+        ('badFlow', 'invalid-retry-policy', 'functions[0].retryPolicy'),
+        ('badFlow', 'invalid-retry-policy', 'retryPolicy.backoffRate'),
+        ('badFlow', 'invalid-retry-policy', 'retryPolicy.errors'),
+        ('badFlow', 'invalid-retry-policy', 'retryPolicy.retries'),
+    ]
+
+
+def test_logging(tmp_path):
+    write(tmp_path, 'functions/lib/ping/handler.py', HANDLER)
+    write(tmp_path, 'flows/off.yml', {**task_flow('offFlow', 'ping'), 'logging': False})
+    write(tmp_path, 'flows/lean.yml', {**task_flow('leanFlow', 'ping'), 'logging': {'level': 'all',
+                                                                                     'includeExecutionData': False}})
+    write(tmp_path, 'flows/debug.yml', {**task_flow('debugFlow', 'ping'), 'logging': {'level': 'ALL'}})
+    write(tmp_path, 'flows/bad.yml', {**task_flow('badFlow', 'ping'), 'logging': {'level': 'DEBUG'}})
+
+    issues = validate(load_flows(str(tmp_path)))
+    assert sorted((i['flow'], i['level'], i['code']) for i in issues) == [
+        ('badFlow', 'error', 'invalid-logging'),
+        ('debugFlow', 'warning', 'verbose-logging'),
+    ]
+
+
+def test_input_schemas(tmp_path):
+    write(tmp_path, 'functions/lib/ping/handler.py', HANDLER)
+    schema = {'type': 'object', 'required': ['id']}
+    write(tmp_path, 'flows/ok.yml', {**task_flow('okFlow', 'ping'), 'inputSchema': schema})
+    write(tmp_path, 'flows/bad.yml', {**task_flow('badFlow', 'ping'), 'inputSchema': {'type': 'record'}})
+    write(tmp_path, 'flows/broken.yml', {**task_flow('brokenFlow', 'ping'), 'inputSchema': {'properties': 3}})
+    write(tmp_path, 'flows/plain.yml', task_flow('plainFlow', 'ping'))
+
+    flows = load_flows(str(tmp_path))
+    assert sorted((i['flow'], i['code']) for i in validate(flows)) == [
+        ('badFlow', 'invalid-input-schema'), ('brokenFlow', 'invalid-input-schema')]
+    assert input_schemas(flows) == {'okFlow': schema, 'badFlow': {'type': 'record'}, 'brokenFlow': {'properties': 3}}
+
+
+def test_schemas_command_fails_on_schemas_run_flow_cant_compile(tmp_path, capsys):
+    write(tmp_path, 'functions/lib/ping/handler.py', HANDLER)
+    write(tmp_path, 'flows/ok.yml', {**task_flow('okFlow', 'ping'), 'inputSchema': {'type': 'object'}})
+    output = 'flow_schemas.json'
+    args = argparse.Namespace(root=str(tmp_path), output=output)
+    assert run_schemas(args) == 0
+    assert json.loads((tmp_path / output).read_text()) == {'okFlow': {'type': 'object'}}
+
+    write(tmp_path, 'flows/bad.yml', {**task_flow('badFlow', 'ping'), 'inputSchema': {'type': 'objekt'}})
+    assert run_schemas(args) == 1
+    assert 'badFlow: invalid inputSchema' in capsys.readouterr().err
+    # The last good file is left alone
+    assert json.loads((tmp_path / output).read_text()) == {'okFlow': {'type': 'object'}}
+
+
+def map_flow(name, *function_dirs, source):
+    flow = task_flow(name, *function_dirs)
+    flow['definition'] = {'StartAt': 'Process', 'States': {'Process': {
+        'Type': 'Map', 'Iterator': task_flow(name, function_dirs[0])['definition'], 'End': True}}}
+    return {**flow, 'inputSource': source}
+
+
+def test_input_sources(tmp_path):
+    write(tmp_path, 'functions/lib/ping/handler.py', HANDLER)
+    write(tmp_path, 'functions/lib/cases/handler.py', HANDLER)
+    write(tmp_path, 'flows/s3.yml', map_flow('s3Flow', 'ping', source={'s3': {'bucket': 'b', 'prefix': 'in/'}}))
+    write(tmp_path, 'flows/gen.yml', map_flow('genFlow', 'ping', 'cases', source={'function': 'libCases'}))
+    write(tmp_path, 'flows/table.yml', map_flow('tableFlow', 'ping', source={'dynamodb': {'keyCondition': 'pk = :a'}}))
+    write(tmp_path, 'flows/both.yml', map_flow('bothFlow', 'ping', source={'s3': {'bucket': 'b', 'key': 'k'},
+                                                                          'function': 'libPing'}))
+    write(tmp_path, 'flows/unknown.yml', map_flow('unknownFlow', 'ping', source={'function': 'libCases'}))
+    write(tmp_path, 'flows/nomap.yml', {**task_flow('noMapFlow', 'ping'),
+                                        'inputSource': {'s3': {'bucket': 'b', 'key': 'k.csv'}}})
+
+    issues = validate(load_flows(str(tmp_path)))
+    # The generator's ARN counts as used and the source Map gets its MaxConcurrency at deploy
+    assert sorted((i['flow'], i['code'], i['location']) for i in issues) == [
+        ('bothFlow', 'invalid-input-source', 'inputSource'),
+        ('noMapFlow', 'invalid-input-source', 'inputSource'),
+        ('tableFlow', 'invalid-input-source', 'inputSource.dynamodb'),
+        ('unknownFlow', 'invalid-input-source', 'inputSource.function'),
+    ]
+
+
+def test_hundreds_of_flows_in_well_under_a_second(tmp_path):
+    for i in range(20):
+        write(tmp_path, f"functions/lib/fn{i}/handler.py", HANDLER)
+    for i in range(300):
+        references = [f"flow{j}" for j in range(max(0, i - 3), i)]
+        write(tmp_path, f"flows/flow{i}.yml", task_flow(f"flow{i}", *[f"fn{(i + k) % 20}" for k in range(5)],
+                                                        references=references))
+
+    started = time.perf_counter()
+    issues = validate(load_flows(str(tmp_path)))
+    elapsed = time.perf_counter() - started
+    assert codes(issues, 'error') == []
+    assert elapsed < 1.0, f"took {elapsed:.2f}s"
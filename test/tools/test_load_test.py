@@ -0,0 +1,83 @@
+import json
+import os
+import time
+
+import pytest
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-west-1')
+
+from tools.load_test import Latency, LoadTest, SyntheticAccount, SyntheticAWS, api_event, lambda_context
+
+
+@pytest.fixture
+def aws():
+    aws = SyntheticAWS(SyntheticAccount(state_machines=3, users=2, executions_per_user=4)).install()
+    yield aws
+    aws.uninstall()
+
+
+def call(aws, module, event):
+    with aws.recording() as calls:
+        response = module.handler(event, lambda_context('load-test'))
+    return response, dict(calls)
+
+
+def test_list_runs_tells_owners_from_execution_names(aws):
+    from functions.base.list_runs import handler as list_runs
+
+    response, calls = call(aws, list_runs, api_event('GET /runs', '/runs', 'user-0'))
+    assert json.loads(response['body'])['count'] == 4
+    assert calls == {
+        'dynamodb.update_item': 2,
+        'stepfunctions.list_state_machines': 1,
+        'stepfunctions.list_executions': 3,
+    }
+
+    # Executions named before names carried their owner are still described
+    arn = next(iter(aws.account.state_machines))
+    aws.account.start_execution(arn, 'legacy-run', {'__user_id': 'user-0'})
+    response, calls = call(aws, list_runs, api_event('GET /runs', '/runs', 'user-1'))
+    assert json.loads(response['body'])['count'] == 4
+    assert calls['stepfunctions.describe_execution'] == 1
+
+
+def test_started_executions_are_listed(aws):
+    from functions.base.list_runs import handler as list_runs
+    from functions.base.run_flow import handler as run_flow
+
+    response, calls = call(aws, run_flow, api_event('POST /run/{flow_name}', '/run/flow1', 'user-1',
+                                                    {'flow_name': 'flow1'}, {'x': 1}))
+    arn = json.loads(response['body'])['executionArn']
+    assert calls['stepfunctions.start_execution'] == 1 and calls['sts.get_caller_identity'] == 1
+
+    runs = json.loads(call(aws, list_runs, api_event('GET /runs', '/runs', 'user-1'))[0]['body'])['executions']
+    assert runs[0]['executionArn'] == arn and runs[0]['status'] == 'RUNNING'
+
+
+def test_report_per_endpoint(aws):
+    mix = {'run_flow': 1, 'get_flow_result': 1, 'list_runs': 1, 'list_flows': 1, 'lib:ping': 1}
+    result = LoadTest(aws, mix, users=3, requests=10).run()
+
+    assert result['requests'] == 30
+    assert sum(endpoint['requests'] for endpoint in result['endpoints'].values()) == 30
+    for endpoint in result['endpoints'].values():
+        assert endpoint['errors'] == 0
+        assert endpoint['p50_ms'] <= endpoint['p95_ms'] <= endpoint['max_ms']
+    assert result['endpoints']['get_flow_result']['aws_calls_per_request']['stepfunctions.describe_execution'] == 2
+
+
+def test_latency_is_injected_per_operation(aws):
+    from functions.base.get_flow_result import handler as get_flow_result
+
+    aws.latency = Latency(0, describe_execution=25)
+    arn = aws.account.executions_of('user-0')[0]
+    started = time.perf_counter()
+    response, _ = call(aws, get_flow_result, api_event('GET /run/{flow_name}/{execution_id}', f"/run/x/{arn}",
+                                                       'user-0', {'flow_name': 'x', 'execution_id': arn}))
+    assert response['statusCode'] == 200
+    assert time.perf_counter() - started >= 0.05
+
+
+def test_unknown_endpoints_are_rejected(aws):
+    with pytest.raises(ValueError):
+        LoadTest(aws, {'list_users': 1})
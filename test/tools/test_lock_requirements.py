@@ -0,0 +1,62 @@
+import pytest
+
+from tools import lock_requirements
+
+SOURCES = {
+    'base': ['aws-lambda-powertools', 'boto3'],
+    'main': ['boto3==1.34.11', 'Requests>=2.28'],
+    'plugin:reports': ['requests[socks]<3', 'pandas'],
+}
+
+RESOLVED = [
+    {'name': 'boto3', 'version': '1.34.11', 'sha256': 'a' * 64, 'filename': 'boto3-1.34.11-py3-none-any.whl'},
+    {'name': 'requests', 'version': '2.32.3', 'sha256': 'b' * 64, 'filename': 'requests-2.32.3-py3-none-any.whl'},
+]
+
+
+def test_merge_combines_constraints_of_every_source():
+    assert lock_requirements.parse_requirements('# tools\nboto3  # pinned below\n-r other.txt\n\n') == ['boto3']
+    merged = lock_requirements.merge_sources(SOURCES)
+    assert lock_requirements.find_conflicts(merged) == []
+    assert lock_requirements.merged_lines(merged) == [
+        'aws-lambda-powertools', 'boto3==1.34.11', 'pandas', 'requests[socks]<3,>=2.28'
+    ]
+
+
+def test_conflicting_pins_name_their_sources():
+    merged = lock_requirements.merge_sources({**SOURCES, 'plugin:legacy': ['boto3<1.30']})
+    assert lock_requirements.find_conflicts(merged) == [
+        'boto3: main pins 1.34.11, incompatible with plugin:legacy (boto3<1.30)'
+    ]
+    with pytest.raises(lock_requirements.RequirementsConflict):
+        lock_requirements.lock({**SOURCES, 'plugin:legacy': ['boto3<1.30']}, 'unused.lock')
+
+
+def test_unchanged_inputs_skip_the_resolver(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(lock_requirements, 'resolve', lambda lines, *args: calls.append(lines) or RESOLVED)
+    output = tmp_path / 'requirements.lock'
+
+    first = lock_requirements.lock(SOURCES, str(output), cache_dir=str(tmp_path / 'cache'))
+    second = lock_requirements.lock(dict(reversed(list(SOURCES.items()))), str(output),
+                                    cache_dir=str(tmp_path / 'cache'))
+    assert len(calls) == 1 and not first['cached'] and second['cached']
+    assert first['key'] == second['key']
+
+    lock = output.read_text()
+    assert f"boto3==1.34.11 \\\n    --hash=sha256:{'a' * 64}  # via base, main" in lock
+    assert 'via main, plugin:reports' in lock
+
+    lock_requirements.lock({**SOURCES, 'main': ['boto3==1.34.11']}, str(output), cache_dir=str(tmp_path / 'cache'))
+    assert len(calls) == 2
+
+
+def test_wheels_are_copied_from_the_wheelhouse(tmp_path, monkeypatch):
+    wheelhouse = tmp_path / 'cache' / 'wheels'
+    wheelhouse.mkdir(parents=True)
+    for package in RESOLVED:
+        (wheelhouse / package['filename']).write_bytes(b'wheel')
+    monkeypatch.setattr(lock_requirements.subprocess, 'run', lambda *args, **kwargs: pytest.fail('downloaded'))
+
+    lock_requirements.fetch_wheels(RESOLVED, 'unused.lock', str(tmp_path / 'wheels'), str(tmp_path / 'cache'))
+    assert sorted(p.name for p in (tmp_path / 'wheels').iterdir()) == sorted(p['filename'] for p in RESOLVED)
@@ -0,0 +1,43 @@
+import yaml
+
+from tools import power_tuning
+
+
+def measurements(cpu_ms, wait_ms, peak_mb=50.0, init_ms=300.0):
+    run = {'wall_ms': cpu_ms + wait_ms, 'cpu_ms': cpu_ms, 'error': None}
+    return {'init_ms': init_ms, 'peak_mb': peak_mb, 'runs': [run] * 5}
+
+
+def test_cpu_bound_work_scales_with_memory_and_io_does_not():
+    cpu_bound = {e['memorySize']: e for e in power_tuning.estimate(measurements(cpu_ms=1000, wait_ms=0))}
+    assert cpu_bound[1769]['durationMs'] == 1000
+    assert round(cpu_bound[128]['durationMs']) == round(1000 * 1769 / 128)
+    assert cpu_bound[3008]['durationMs'] == 1000
+
+    io_bound = {e['memorySize']: e for e in power_tuning.estimate(measurements(cpu_ms=0, wait_ms=500))}
+    assert io_bound[128]['durationMs'] == io_bound[3008]['durationMs'] == 500
+
+
+def test_recommendation_respects_peak_memory_and_strategy():
+    estimates = power_tuning.estimate(measurements(cpu_ms=2000, wait_ms=10, peak_mb=400))
+    assert [e['fits'] for e in estimates] == [False, False, True, True, True, True]
+
+    # Below one vCPU the cost of CPU-bound work is flat, so 'cost' keeps the smallest fitting size
+    assert power_tuning.recommend(estimates, 'cost')['memorySize'] == 512
+    assert power_tuning.recommend(estimates, 'speed')['memorySize'] == 1769
+
+
+def test_write_config_keeps_other_settings(tmp_path):
+    (tmp_path / 'function.yml').write_text('warmup: true\nmemorySize: 256\n')
+    power_tuning.write_config(str(tmp_path), 128, 10)
+    assert yaml.safe_load((tmp_path / 'function.yml').read_text()) == {
+        'warmup': True, 'memorySize': 128, 'timeout': 10
+    }
+
+
+def test_tune_measures_a_real_handler():
+    report = power_tuning.tune('ping', repeat=2)
+    assert report['errors'] == 0
+    assert report['peakMemoryMb'] > 0
+    assert report['recommended']['memorySize'] == 128
+    assert power_tuning.MIN_TIMEOUT <= report['recommended']['timeout'] <= power_tuning.MAX_TIMEOUT
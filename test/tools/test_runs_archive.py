@@ -0,0 +1,133 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from functions.base.archive import exporter
+from tools import runs_archive
+
+T0 = datetime(2024, 3, 1, 12, 0, tzinfo=timezone.utc)
+MACHINE = 'arn:aws:states:eu-west-1:123:stateMachine:{}'
+
+
+class FakePaginator:
+    def __init__(self, pages):
+        self.pages = pages
+
+    def paginate(self, **kwargs):
+        return self.pages(**kwargs)
+
+
+class FakeStepFunctions:
+    """Executions of two flows, one page each, newest first"""
+
+    def __init__(self, executions):
+        self.executions = executions
+        self.described = []
+
+    def get_paginator(self, operation):
+        if operation == 'list_state_machines':
+            flows = sorted({e['flow'] for e in self.executions})
+            return FakePaginator(lambda: [{'stateMachines': [
+                {'name': flow, 'stateMachineArn': MACHINE.format(flow)} for flow in flows]}])
+        if operation == 'list_executions':
+            return FakePaginator(lambda stateMachineArn: [{'executions': sorted(
+                (self._summary(e) for e in self.executions if MACHINE.format(e['flow']) == stateMachineArn),
+                key=lambda e: e['startDate'], reverse=True)}])
+        return FakePaginator(lambda executionArn, includeExecutionData: [{'events': self._history(executionArn)}])
+
+    def _find(self, arn):
+        return next(e for e in self.executions if e['arn'] == arn)
+
+    def _summary(self, e):
+        return {'executionArn': e['arn'], 'status': e['status'], 'startDate': e['start'], 'stopDate': e.get('stop')}
+
+    def describe_execution(self, executionArn):
+        self.described.append(executionArn)
+        e = self._find(executionArn)
+        return {'executionArn': e['arn'], 'name': e['arn'].split(':')[-1], 'stateMachineArn': MACHINE.format(e['flow']),
+                'status': e['status'], 'startDate': e['start'], 'stopDate': e['stop'],
+                'input': json.dumps({'__user_id': e['user'], 'n': 1}), 'output': '{"ok": true}'}
+
+    def _history(self, arn):
+        e = self._find(arn)
+        middle = e['start'] + (e['stop'] - e['start']) / 2
+        return [
+            {'id': 1, 'type': 'ExecutionStarted', 'timestamp': e['start']},
+            {'id': 2, 'type': 'TaskStateEntered', 'timestamp': e['start'], 'stateEnteredEventDetails': {'name': 'A'}},
+            {'id': 3, 'type': 'TaskStateExited', 'timestamp': middle, 'stateExitedEventDetails': {'name': 'A'}},
+            {'id': 4, 'type': 'TaskStateEntered', 'timestamp': middle, 'stateEnteredEventDetails': {'name': 'B'}},
+            {'id': 5, 'type': 'TaskStateExited', 'timestamp': e['stop'], 'stateExitedEventDetails': {'name': 'B'}},
+        ]
+
+
+def execution(i, flow, status='SUCCEEDED', user='user-1', seconds=10, running=False):
+    start = T0 + timedelta(minutes=i)
+    return {'arn': f"arn:aws:states:eu-west-1:123:execution:{flow}:run-{i}", 'flow': flow, 'user': user,
+            'status': 'RUNNING' if running else status, 'start': start,
+            'stop': None if running else start + timedelta(seconds=seconds)}
+
+
+def test_export_is_incremental_and_query_filters(tmp_path):
+    archive = str(tmp_path / 'archive')
+    runs = [execution(0, 'helloWorldFlow'), execution(1, 'helloWorldFlow', 'FAILED', user='user-2', seconds=30),
+            execution(2, 'dummy2StepFlow', seconds=4), execution(3, 'dummy2StepFlow', running=True)]
+    sfn = FakeStepFunctions(runs)
+
+    assert exporter.export(archive, sfn, now=T0 + timedelta(hours=1))['exported'] == 3
+    assert list((tmp_path / 'archive').glob('flow=helloWorldFlow/date=2024-03-01/*.parquet'))
+
+    # The running execution finishes; only it is exported next time
+    runs[3].update(status='SUCCEEDED', stop=T0 + timedelta(hours=1, minutes=30))
+    sfn.described.clear()
+    assert exporter.export(archive, sfn, now=T0 + timedelta(hours=2))['exported'] == 1
+    assert sfn.described == [runs[3]['arn']]
+
+    failed = runs_archive.query(archive, columns=['execution_arn', 'user_id'], statuses=['failed'])
+    assert failed.to_pylist() == [{'execution_arn': runs[1]['arn'], 'user_id': 'user-2'}]
+    assert runs_archive.query(archive, flows=['dummy2StepFlow']).num_rows == 2
+
+    summary = {row['flow']: row for row in runs_archive.query(archive, group_by=['flow']).to_pylist()}
+    assert summary['helloWorldFlow']['runs'] == 2 and summary['helloWorldFlow']['max_ms'] == 30000
+
+    states = runs_archive.query(archive, states=True, group_by=['flow', 'state'], flows=['helloWorldFlow'])
+    assert sorted((row['state'], row['runs']) for row in states.to_pylist()) == [('A', 2), ('B', 2)]
+
+
+def test_export_cut_short_resumes_where_it_stopped(tmp_path, monkeypatch):
+    archive = str(tmp_path / 'archive')
+    runs = [execution(i, flow) for i in range(7) for flow in ('helloWorldFlow', 'dummy2StepFlow')]
+    sfn = FakeStepFunctions(runs)
+    monkeypatch.setattr(exporter, 'BATCH_SIZE', 2)
+    calls = []
+
+    def time_left():
+        # Out of time after 5 executions
+        calls.append(1)
+        return 10 * 60 * 1000 if len(calls) <= 6 else 0
+
+    first = exporter.export(archive, sfn, now=T0 + timedelta(hours=1), time_left=time_left)
+    assert first['complete'] is False and first['exported'] == 5
+    assert runs_archive.query(archive).num_rows == 5
+    first_described = list(sfn.described)
+
+    sfn.described.clear()
+    second = exporter.export(archive, sfn, now=T0 + timedelta(hours=2))
+    assert second['complete'] is True and second['exported'] == len(runs) - 5
+    assert not set(first_described) & set(sfn.described)
+    assert sorted(runs_archive.query(archive, columns=['execution_arn']).column('execution_arn').to_pylist()) == \
+        sorted(run['arn'] for run in runs)
+
+    sfn.described.clear()
+    assert exporter.export(archive, sfn, now=T0 + timedelta(hours=3))['exported'] == 0
+
+
+def test_failed_executions_close_open_states():
+    start = T0
+    events = [
+        {'id': 2, 'type': 'TaskStateEntered', 'timestamp': start, 'stateEnteredEventDetails': {'name': 'A'}},
+        {'id': 3, 'type': 'ExecutionFailed', 'timestamp': start + timedelta(seconds=2)},
+    ]
+    assert exporter.state_durations(events) == [{'name': 'A', 'type': 'Task', 'status': 'FAILED', 'duration_ms': 2000}]
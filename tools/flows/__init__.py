@@ -0,0 +1,8 @@
+# tools/flows/__init__.py
+from tools.flows.graph import (dependency_graph, deploy_layers, find_cycles, impacted_flows, reference_graph,
+                               variables)
+from tools.flows.loader import Flow, load_flow, load_flows
+from tools.flows.validate import input_schemas, validate
+
+__all__ = ['Flow', 'dependency_graph', 'deploy_layers', 'find_cycles', 'impacted_flows', 'input_schemas', 'load_flow',
+           'load_flows', 'reference_graph', 'validate', 'variables']
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# tools/flows/__main__.py
+"""
+Flow tooling.
+
+    python -m tools.flows validate                    # every flow, including .plugins/*/flows
+    python -m tools.flows validate flows/myFlow.yml   # only these files (checked against all flows)
+    python -m tools.flows graph [--dot]               # flow -> flow and flow -> function dependencies
+    python -m tools.flows layers                      # deploy order, one line per parallel layer
+    python -m tools.flows impact functions/lib/hello_world
+    python -m tools.flows impact --since origin/main  # flows affected by the changes since a git ref
+    python -m tools.flows schemas                     # write the flows' inputSchema for run_flow
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from tools.flows.graph import dependency_graph, deploy_layers, impacted_flows
+from tools.flows.loader import load_flows
+from tools.flows.validate import fastjsonschema, input_schemas, schema_error, validate
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SCHEMAS_FILE = os.path.join('functions', 'base', 'run_flow', 'flow_schemas.json')
+
+
+def run_validate(args) -> int:
+    issues = validate(load_flows(args.root), args.files or None)
+    errors = [i for i in issues if i['level'] == 'error']
+    warnings = [i for i in issues if i['level'] == 'warning']
+    shown = errors if args.errors_only else issues
+
+    if args.json:
+        print(json.dumps(shown, indent=2))
+    else:
+        for item in shown:
+            file = os.path.relpath(item['file'], args.root)
+            location = f" {item['location']}" if item['location'] else ''
+            print(f"{file}:{location} {item['level']} [{item['code']}] {item['message']}")
+        print(f"{len(errors)} errors, {len(warnings)} warnings", file=sys.stderr)
+
+    return 1 if errors or (args.strict and warnings) else 0
+
+
+def run_graph(args) -> int:
+    graph = dependency_graph(load_flows(args.root))
+    if args.json:
+        print(json.dumps(graph, indent=2))
+    elif args.dot:
+        print('digraph flows {')
+        for name, node in sorted(graph.items()):
+            print(f'  "{name}";')
+            for dep in node['flows']:
+                print(f'  "{name}" -> "{dep}";')
+            for directory in node['functions']:
+                print(f'  "{name}" -> "{directory}" [style=dashed];')
+        print('}')
+    else:
+        for name, node in sorted(graph.items()):
+            print(name)
+            for dep in node['flows']:
+                print(f"  starts {dep}")
+            for directory in node['functions']:
+                print(f"  invokes {directory}")
+    return 0
+
+
+def run_layers(args) -> int:
+    try:
+        layers = deploy_layers(dependency_graph(load_flows(args.root)))
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    if args.json:
+        print(json.dumps(layers))
+    else:
+        for i, layer in enumerate(layers):
+            print(f"{i}: {' '.join(layer)}")
+    return 0
+
+
+def run_impact(args) -> int:
+    changed = [os.path.relpath(os.path.abspath(path), args.root) for path in args.paths]
+    if args.since:
+        output = subprocess.run(['git', 'diff', '--name-only', args.since, '--'], cwd=args.root,
+                                capture_output=True, text=True, check=True).stdout
+        changed += [line for line in output.splitlines() if line]
+
+    flows = load_flows(args.root)
+    affected = impacted_flows(dependency_graph(flows), flows, changed, args.root)
+    if args.json:
+        print(json.dumps(affected, indent=2))
+    elif args.names:
+        print(' '.join(affected))
+    else:
+        for name, reason in affected.items():
+            print(f"{name}  ({reason})")
+    return 0
+
+
+def run_schemas(args) -> int:
+    schemas = input_schemas(load_flows(args.root))
+    if schemas and fastjsonschema is None:
+        print('fastjsonschema is needed to check the input schemas: pip install fastjsonschema', file=sys.stderr)
+        return 1
+    # run_flow would skip a schema it can't compile: fail the deploy instead
+    errors = {flow: schema_error(schema) for flow, schema in schemas.items()}
+    errors = {flow: error for flow, error in errors.items() if error}
+    for flow, error in sorted(errors.items()):
+        print(f"{flow}: invalid inputSchema: {error}", file=sys.stderr)
+    if errors:
+        return 1
+
+    content = json.dumps(schemas, indent=2, sort_keys=True) + '\n'
+    if args.output == '-':
+        print(content, end='')
+        return 0
+    output = os.path.join(args.root, args.output)
+    current = open(output).read() if os.path.exists(output) else None
+    # Rewriting an unchanged file would change the image and redeploy every base function
+    if content != current:
+        with open(output, 'w') as f:
+            f.write(content)
+    print(f"{len(schemas)} input schemas in {args.output}", file=sys.stderr)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m tools.flows', description='Flow tooling')
+    parser.add_argument('--root', default=REPO_ROOT, help='Repository root (default: this checkout)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    validate_parser = commands.add_parser('validate', help='Check flow definitions before deploying')
+    validate_parser.add_argument('files', nargs='*', help='Flow files to report on (default: all)')
+    validate_parser.add_argument('--strict', action='store_true', help='Fail on warnings too')
+    validate_parser.add_argument('--errors-only', action='store_true', help="Don't print warnings")
+    validate_parser.add_argument('--json', action='store_true', help='Print the issues as JSON')
+    validate_parser.set_defaults(run=run_validate)
+
+    graph_parser = commands.add_parser('graph', help='Print the flow dependency graph')
+    graph_parser.add_argument('--dot', action='store_true', help='Graphviz output')
+    graph_parser.add_argument('--json', action='store_true', help='JSON output')
+    graph_parser.set_defaults(run=run_graph)
+
+    layers_parser = commands.add_parser('layers', help='Print the flows in deploy order, by parallel layer')
+    layers_parser.add_argument('--json', action='store_true', help='JSON output')
+    layers_parser.set_defaults(run=run_layers)
+
+    impact_parser = commands.add_parser('impact', help='Print the flows affected by changed files or functions')
+    impact_parser.add_argument('paths', nargs='*', help='Changed files or directories')
+    impact_parser.add_argument('--since', help='Also use the files changed since this git ref')
+    impact_parser.add_argument('--names', action='store_true', help='Only print the flow names, space separated')
+    impact_parser.add_argument('--json', action='store_true', help='JSON output')
+    impact_parser.set_defaults(run=run_impact)
+
+    schemas_parser = commands.add_parser('schemas', help="Write the flows' inputSchema for run_flow")
+    schemas_parser.add_argument('--output', default=SCHEMAS_FILE, help=f"File to write, - for stdout (default: {SCHEMAS_FILE})")
+    schemas_parser.set_defaults(run=run_schemas)
+
+    args = parser.parse_args()
+    sys.exit(args.run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+# tools/flows/graph.py
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Iterator, List, Set
+
+from tools.flows.loader import Flow
+
+VARIABLE = re.compile(r'\$\{([^}]+)\}')
+# Changes to these, or to the deploy/ modules they require, affect the state machine of every flow
+GENERATORS = ('deploy/generate-step-functions.js',)
+LOCAL_REQUIRE = re.compile(r"""require\(['"](\./[^'"]+)['"]\)""")
+CHECKOUT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def variables(value) -> Iterator[str]:
+    """Every ${...} substitution in a definition, CloudFormation pseudo parameters and escapes excluded"""
+    if isinstance(value, str):
+        for match in VARIABLE.finditer(value):
+            name = match.group(1).strip()
+            if not name.startswith(('AWS::', '!')):
+                yield name
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from variables(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from variables(item)
+
+
+@lru_cache(maxsize=None)
+def generator_modules(root: str = CHECKOUT) -> frozenset:
+    """GENERATORS and the local modules they require, transitively (deploy/deploy-manifest.js hashes the same)"""
+    modules = set()
+    todo = list(GENERATORS)
+    while todo:
+        module = todo.pop()
+        if module in modules:
+            continue
+        modules.add(module)
+        full_path = os.path.join(root, module)
+        if not os.path.exists(full_path):
+            continue
+        with open(full_path) as f:
+            for required in LOCAL_REQUIRE.findall(f.read()):
+                required = os.path.normpath(os.path.join(os.path.dirname(module), required)).replace(os.sep, '/')
+                todo.append(required if required.endswith('.js') else f"{required}.js")
+    return frozenset(modules)
+
+
+def reference_graph(flows: List[Flow]) -> Dict[str, Set[str]]:
+    """flow name -> names of the flows it starts (stateMachineReferences and ${flowName} variables)"""
+    names = {flow.name for flow in flows if flow.name}
+    graph = {}
+    for flow in flows:
+        if not flow.name:
+            continue
+        used = set(flow.references) | {name for name in variables(flow.definition) if name in names}
+        graph.setdefault(flow.name, set()).update(used)
+    return graph
+
+
+def find_cycles(graph: Dict[str, Set[str]]) -> List[List[str]]:
+    """Elementary cycles found by depth-first search, each reported once as [a, b, ..., a]"""
+    cycles, seen = [], set()
+    state = {}  # 1 while on the DFS stack, 2 once finished
+    stack = []
+
+    def visit(node):
+        state[node] = 1
+        stack.append(node)
+        for child in sorted(graph.get(node, ())):
+            if state.get(child) == 1:
+                cycle = stack[stack.index(child):] + [child]
+                key = frozenset(cycle)
+                if key not in seen:
+                    seen.add(key)
+                    cycles.append(cycle)
+            elif child in graph and child not in state:
+                visit(child)
+        stack.pop()
+        state[node] = 2
+
+    for node in sorted(graph):
+        if node not in state:
+            visit(node)
+    return cycles
+
+
+def function_dir(handler: str) -> str:
+    """Directory of a handler, functions/lib/hello_world/handler.handler -> functions/lib/hello_world"""
+    return handler.rsplit('/', 1)[0] if '/' in handler else handler
+
+
+def dependency_graph(flows: List[Flow]) -> Dict[str, Dict[str, List[str]]]:
+    """flow name -> {'flows': flows it starts, 'functions': function directories it invokes}"""
+    references = reference_graph(flows)
+    graph = {}
+    for flow in flows:
+        if not flow.name:
+            continue
+        prefix = '' if flow.plugin is None else f".plugins/{flow.plugin}/"
+        functions = {prefix + function_dir(f['handler']) for f in flow.functions if f.get('handler')}
+        graph[flow.name] = {'flows': sorted(references.get(flow.name, ())), 'functions': sorted(functions)}
+    return graph
+
+
+def deploy_layers(graph: Dict[str, Dict[str, List[str]]]) -> List[List[str]]:
+    """
+    Topological layers: every flow comes after the flows it starts, flows of the same layer
+    don't depend on each other and can be deployed (or tested) in parallel.
+    Raises ValueError when the flows form a cycle.
+    """
+    pending = {name: {dep for dep in node['flows'] if dep in graph} for name, node in graph.items()}
+    layers = []
+    while pending:
+        ready = sorted(name for name, deps in pending.items() if not deps)
+        if not ready:
+            cycle = find_cycles({name: deps for name, deps in pending.items()})
+            raise ValueError(f"flows form a cycle: {' -> '.join(cycle[0]) if cycle else ', '.join(sorted(pending))}")
+        layers.append(ready)
+        for name in ready:
+            del pending[name]
+        for deps in pending.values():
+            deps.difference_update(ready)
+    return layers
+
+
+def dependents(graph: Dict[str, Dict[str, List[str]]]) -> Dict[str, Set[str]]:
+    """flow name -> flows that start it"""
+    reverse = {name: set() for name in graph}
+    for name, node in graph.items():
+        for dep in node['flows']:
+            reverse.setdefault(dep, set()).add(name)
+    return reverse
+
+
+def impacted_flows(graph: Dict[str, Dict[str, List[str]]], flows: List[Flow], changed: List[str],
+                   repo_root: str) -> Dict[str, str]:
+    """
+    Flows affected by changed paths (relative to the repo root), with the reason: flows whose
+    file changed, flows invoking a changed function directory, and every composite flow that
+    starts an affected flow, transitively.
+    """
+    files = {os.path.relpath(flow.path, repo_root): flow.name for flow in flows if flow.name}
+    changed = [path.rstrip('/') for path in changed]
+    affected = {}
+    for path in changed:
+        if path in generator_modules():
+            return {name: f"{path} changed" for name in sorted(graph)}
+        if path in files:
+            affected.setdefault(files[path], f"{path} changed")
+    for name, node in graph.items():
+        for directory in node['functions']:
+            hit = next((path for path in changed if path == directory or path.startswith(directory + '/')
+                        or directory.startswith(path + '/')), None)
+            if hit:
+                affected.setdefault(name, f"uses {directory}")
+                break
+
+    reverse = dependents(graph)
+    todo = list(affected)
+    while todo:
+        name = todo.pop()
+        for parent in sorted(reverse.get(name, ())):
+            if parent not in affected:
+                affected[parent] = f"starts {name}"
+                todo.append(parent)
+    return dict(sorted(affected.items()))
@@ -0,0 +1,74 @@
+# tools/flows/loader.py
+import glob
+import os
+from typing import Dict, List, Optional
+
+import yaml
+
+try:
+    _Loader = yaml.CSafeLoader
+except AttributeError:  # PyYAML built without libyaml
+    _Loader = yaml.SafeLoader
+
+
+class _FlowLoader(_Loader):
+    """Safe loader that also understands the CloudFormation tags flows may use"""
+
+
+_FlowLoader.add_constructor('!GetAtt', lambda loader, node: {'Fn::GetAtt': loader.construct_scalar(node).split('.')})
+_FlowLoader.add_constructor('!Ref', lambda loader, node: {'Ref': loader.construct_scalar(node)})
+
+
+class Flow:
+    """A flow file: its parsed content and the checkout it belongs to (repo root or plugin)"""
+
+    def __init__(self, path: str, root: str, data: Optional[Dict], plugin: Optional[str] = None,
+                 error: Optional[str] = None):
+        self.path = path
+        self.root = root
+        self.data = data if isinstance(data, dict) else {}
+        self.plugin = plugin
+        self.error = error
+
+    @property
+    def name(self) -> Optional[str]:
+        return self.data.get('name')
+
+    @property
+    def definition(self) -> Dict:
+        return self.data.get('definition') or {}
+
+    @property
+    def functions(self) -> List[Dict]:
+        return [f for f in self.data.get('functions') or [] if isinstance(f, dict)]
+
+    @property
+    def references(self) -> List[str]:
+        return [str(ref) for ref in self.data.get('stateMachineReferences') or []]
+
+    def __repr__(self):
+        return f"Flow({self.name!r}, {self.path!r})"
+
+
+def flow_files(repo_root: str) -> List[tuple]:
+    """(path, checkout root, plugin name) of every flow file: flows/ and .plugins/*/flows/"""
+    files = []
+    for pattern in ('*.yml', '*.yaml'):
+        files += [(path, repo_root, None) for path in glob.glob(os.path.join(repo_root, 'flows', pattern))]
+        for path in glob.glob(os.path.join(repo_root, '.plugins', '*', 'flows', pattern)):
+            plugin_root = os.path.dirname(os.path.dirname(path))
+            files.append((path, plugin_root, os.path.basename(plugin_root)))
+    return sorted(files)
+
+
+def load_flow(path: str, root: str, plugin: Optional[str] = None) -> Flow:
+    try:
+        with open(path) as f:
+            return Flow(path, root, yaml.load(f, Loader=_FlowLoader), plugin)
+    except yaml.YAMLError as e:
+        return Flow(path, root, None, plugin, error=str(e).replace('\n', ' '))
+
+
+def load_flows(repo_root: str) -> List[Flow]:
+    """Every flow of the repo and of its plugin checkouts"""
+    return [load_flow(path, root, plugin) for path, root, plugin in flow_files(repo_root)]
@@ -0,0 +1,433 @@
+# tools/flows/validate.py
+"""
+Static checks for flow definitions, run before deploying instead of finding out from CloudFormation.
+
+Errors are things the deploy or the first execution would fail on: malformed ASL, transitions to
+states that don't exist, ${...} variables with no matching `functions` entry or flow, handlers
+missing from functions/lib and cycles between composite flows. Warnings are performance lints.
+"""
+import os
+import re
+from typing import Dict, Iterator, List, Optional
+
+from tools.flows.graph import find_cycles, reference_graph, variables
+from tools.flows.loader import Flow
+
+try:
+    import fastjsonschema
+except ImportError:  # Only the shape of the schemas is checked
+    fastjsonschema = None
+
+STATE_TYPES = {'Task', 'Pass', 'Choice', 'Wait', 'Succeed', 'Fail', 'Parallel', 'Map'}
+TERMINAL_TYPES = {'Choice', 'Succeed', 'Fail'}
+WAIT_FIELDS = ('Seconds', 'Timestamp', 'SecondsPath', 'TimestampPath')
+START_EXECUTION = 'arn:aws:states:::states:startExecution'
+BUDGET_KEYS = ('maxDurationSeconds', 'maxStateTransitions')
+FLOW_LOG_LEVELS = ('ALL', 'ERROR', 'FATAL', 'OFF')
+INPUT_SOURCES = ('s3', 'dynamodb', 'function')
+# retryPolicy keys (see deploy/retry.js) and whether each must be positive
+RETRY_POLICY_KEYS = {'maxAttempts': False, 'intervalSeconds': True, 'backoffRate': True, 'maxDelaySeconds': True}
+
+_handler_cache: Dict[str, bool] = {}
+
+
+def issue(level: str, code: str, flow: Flow, message: str, location: str = '') -> Dict:
+    return {
+        'level': level,
+        'code': code,
+        'flow': flow.name or os.path.basename(flow.path),
+        'file': flow.path,
+        'location': location,
+        'message': message
+    }
+
+
+def _transitions(state: Dict) -> Iterator[str]:
+    if 'Next' in state:
+        yield state['Next']
+    if 'Default' in state:
+        yield state['Default']
+    for choice in state.get('Choices') or []:
+        if isinstance(choice, dict) and 'Next' in choice:
+            yield choice['Next']
+    for catcher in state.get('Catch') or []:
+        if isinstance(catcher, dict) and 'Next' in catcher:
+            yield catcher['Next']
+
+
+def _reachable(machine: Dict) -> set:
+    states = machine.get('States') or {}
+    seen, todo = set(), [machine.get('StartAt')]
+    while todo:
+        name = todo.pop()
+        if name in seen or name not in states:
+            continue
+        seen.add(name)
+        if isinstance(states[name], dict):
+            todo.extend(_transitions(states[name]))
+    return seen
+
+
+def _sub_machines(state: Dict) -> Iterator[tuple]:
+    for i, branch in enumerate(state.get('Branches') or []):
+        yield f"Branches[{i}]", branch
+    for key in ('Iterator', 'ItemProcessor'):
+        if key in state:
+            yield key, state[key]
+
+
+def check_machine(flow: Flow, machine, location: str) -> Iterator[Dict]:
+    """ASL structure of a state machine, recursing into Parallel branches and Map iterators"""
+    if not isinstance(machine, dict) or not isinstance(machine.get('States'), dict) or not machine['States']:
+        yield issue('error', 'missing-states', flow, 'state machine has no States', location)
+        return
+    states = machine['States']
+    if machine.get('StartAt') not in states:
+        yield issue('error', 'missing-start', flow, f"StartAt '{machine.get('StartAt')}' is not a state", location)
+
+    for name, state in states.items():
+        where = f"{location}.States.{name}" if location else f"States.{name}"
+        if not isinstance(state, dict):
+            yield issue('error', 'invalid-state', flow, 'state is not a mapping', where)
+            continue
+        state_type = state.get('Type')
+        if state_type not in STATE_TYPES:
+            yield issue('error', 'invalid-type', flow, f"unknown Type '{state_type}'", where)
+            continue
+
+        for target in _transitions(state):
+            if target not in states:
+                yield issue('error', 'unknown-state', flow, f"transition to unknown state '{target}'", where)
+        if state_type not in TERMINAL_TYPES:
+            if 'Next' in state and state.get('End'):
+                yield issue('error', 'next-and-end', flow, 'state has both Next and End', where)
+            elif 'Next' not in state and not state.get('End'):
+                yield issue('error', 'missing-transition', flow, 'state has neither Next nor End: true', where)
+
+        if state_type == 'Task' and not state.get('Resource'):
+            yield issue('error', 'missing-resource', flow, 'Task has no Resource', where)
+        elif state_type == 'Choice' and not state.get('Choices'):
+            yield issue('error', 'missing-choices', flow, 'Choice has no Choices', where)
+        elif state_type == 'Wait' and sum(field in state for field in WAIT_FIELDS) != 1:
+            yield issue('error', 'invalid-wait', flow, f"Wait needs exactly one of {', '.join(WAIT_FIELDS)}", where)
+        elif state_type == 'Parallel' and not state.get('Branches'):
+            yield issue('error', 'missing-branches', flow, 'Parallel has no Branches', where)
+        elif state_type == 'Map' and not any(key in state for key in ('Iterator', 'ItemProcessor')):
+            yield issue('error', 'missing-iterator', flow, 'Map has no Iterator or ItemProcessor', where)
+
+        for key, sub_machine in _sub_machines(state):
+            yield from check_machine(flow, sub_machine, f"{where}.{key}")
+
+    for name in sorted(set(states) - _reachable(machine)):
+        where = f"{location}.States.{name}" if location else f"States.{name}"
+        yield issue('warning', 'unreachable-state', flow, 'state can never be reached', where)
+
+
+def _handler_exists(flow: Flow, handler: str) -> bool:
+    """Whether `functions/lib/<dir>/handler.handler` resolves to a module defining that function"""
+    module, _, attribute = handler.rpartition('.')
+    path = os.path.join(flow.root, module.replace('/', os.sep) + '.py')
+    key = f"{path}:{attribute}"
+    if key not in _handler_cache:
+        found = False
+        if os.path.exists(path):
+            with open(path) as f:
+                found = re.search(rf"^(async\s+)?def\s+{re.escape(attribute)}\s*\(|^{re.escape(attribute)}\s*=",
+                                  f.read(), re.M) is not None
+        _handler_cache[key] = found
+    return _handler_cache[key]
+
+
+def check_variables(flow: Flow, flow_names: set) -> Iterator[Dict]:
+    """Every ${...} must come from a `functions` entry (<name>Arn) or a flow in stateMachineReferences"""
+    defined = {}
+    for i, function in enumerate(flow.functions):
+        if not function.get('name') or not function.get('handler'):
+            yield issue('error', 'invalid-function', flow, 'functions entries need a name and a handler',
+                        f"functions[{i}]")
+            continue
+        defined[f"{function['name']}Arn"] = f"functions[{i}]"
+        if not _handler_exists(flow, function['handler']):
+            yield issue('error', 'missing-handler', flow, f"handler '{function['handler']}' not found",
+                        f"functions[{i}]")
+
+    for reference in flow.references:
+        defined[reference] = 'stateMachineReferences'
+        if reference not in flow_names:
+            yield issue('error', 'unknown-flow', flow, f"stateMachineReferences: no flow named '{reference}'",
+                        'stateMachineReferences')
+
+    warmup = flow.data.get('warmup')
+    if isinstance(warmup, dict):
+        names = {function.get('name') for function in flow.functions}
+        for name in warmup.get('functions') or []:
+            if name not in names:
+                yield issue('error', 'unknown-warmup-function', flow,
+                            f"warmup.functions: no functions entry named '{name}'", 'warmup')
+
+    used = set(variables(flow.definition))
+    source = flow.data.get('inputSource')
+    if isinstance(source, dict) and f"{source.get('function')}Arn" in defined:
+        # The generator's ARN is substituted in the state deploy/input-source.js adds (unknown ones: check_input_source)
+        used.add(f"{source['function']}Arn")
+    for name in sorted(used - set(defined)):
+        hint = ''
+        if name in flow_names:
+            hint = f" (add '{name}' to stateMachineReferences)"
+        elif name.endswith('Arn'):
+            hint = f" (add a functions entry named '{name[:-3]}')"
+        yield issue('error', 'undefined-variable', flow, f"${{{name}}} is not defined{hint}", 'definition')
+    for name in sorted(set(defined) - used):
+        yield issue('warning', 'unused-variable', flow, f"{name} is defined but never used", defined[name])
+
+
+def _passes_whole_input(state: Dict) -> bool:
+    parameters = state.get('Parameters')
+    if 'InputPath' in state and state['InputPath'] not in ('$', None):
+        return False
+    return parameters is None or (isinstance(parameters, dict) and '$' in parameters.values())
+
+
+def _chains(machine: Dict) -> Iterator[List[str]]:
+    """Linear Next chains of the machine, from each state that isn't the Next of another"""
+    states = machine.get('States') or {}
+    targets = {state.get('Next') for state in states.values() if isinstance(state, dict)}
+    for name in states:
+        if name in targets:
+            continue
+        chain, seen = [], set()
+        while name in states and name not in seen and isinstance(states[name], dict):
+            chain.append(name)
+            seen.add(name)
+            name = states[name].get('Next')
+        yield chain
+
+
+def check_performance(flow: Flow, machine, location: str = '') -> Iterator[Dict]:
+    """Unbounded Maps, payloads that grow step after step and independent states run one after another"""
+    if not isinstance(machine, dict) or not isinstance(machine.get('States'), dict):
+        return
+    states = machine['States']
+    prefix = f"{location}.States." if location else 'States.'
+    # The inputSource Map gets a MaxConcurrency when it is deployed
+    source_map = None if location else _source_map(flow)
+
+    for name, state in states.items():
+        if not isinstance(state, dict):
+            continue
+        if state.get('Type') == 'Map' and not state.get('MaxConcurrency') and 'MaxConcurrencyPath' not in state \
+                and name != source_map:
+            yield issue('warning', 'unbounded-map', flow,
+                        'Map starts every item at once; set MaxConcurrency to stay under Lambda concurrency '
+                        'and downstream limits', prefix + name)
+        if state.get('Type') == 'Task' and state.get('Resource') == START_EXECUTION:
+            yield issue('warning', 'async-child-execution', flow,
+                        "startExecution doesn't wait for the child flow or return its output; "
+                        "use arn:aws:states:::states:startExecution.sync:2", prefix + name)
+        for key, sub_machine in _sub_machines(state):
+            yield from check_performance(flow, sub_machine, f"{prefix}{name}.{key}")
+
+    for chain in _chains(machine):
+        tasks = [name for name in chain if states[name].get('Type') == 'Task']
+
+        # The whole input goes into each task and its result is added next to it
+        echo = [name for name in tasks
+                if _passes_whole_input(states[name]) and states[name].get('ResultPath') not in (None, '$')
+                and 'ResultPath' in states[name] and 'OutputPath' not in states[name]]
+        for first, second in zip(chain, chain[1:]):
+            if first in echo and second in echo:
+                run = [name for name in chain[chain.index(first):] if name in echo]
+                yield issue('warning', 'payload-echo', flow,
+                            f"payload grows through {' -> '.join(run)}: each state passes its whole input on and "
+                            "appends its result; narrow it with Parameters, ResultSelector or OutputPath "
+                            "(256 KB limit)", prefix + first)
+                break
+
+        # The next task can't depend on this one: its result is discarded or it doesn't wait
+        for first, second in zip(chain, chain[1:]):
+            a, b = states[first], states[second]
+            if a.get('Type') != 'Task' or b.get('Type') != 'Task':
+                continue
+            if ('ResultPath' in a and a['ResultPath'] is None) or a.get('Resource') == START_EXECUTION:
+                yield issue('warning', 'sequential-independent', flow,
+                            f"'{second}' doesn't use the result of '{first}'; run them as branches of a "
+                            "Parallel state", prefix + first)
+
+
+def check_budget(flow: Flow) -> Iterator[Dict]:
+    """maxDurationSeconds / maxStateTransitions must be positive integers (see deploy/watchdog.js)"""
+    for key in BUDGET_KEYS:
+        value = flow.data.get(key)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int) or value <= 0):
+            yield issue('error', 'invalid-budget', flow, f"{key} must be a positive integer, got {value!r}", key)
+    max_duration = flow.data.get('maxDurationSeconds')
+    timeout = flow.definition.get('TimeoutSeconds') if isinstance(flow.definition, dict) else None
+    if isinstance(max_duration, int) and isinstance(timeout, int) and timeout > max_duration:
+        yield issue('warning', 'timeout-over-budget', flow,
+                    f"TimeoutSeconds {timeout} is over maxDurationSeconds {max_duration}, the budget wins",
+                    'definition.TimeoutSeconds')
+
+
+def _retry_policy_issues(flow: Flow, policy, location: str) -> Iterator[Dict]:
+    if policy is None or isinstance(policy, bool):
+        return
+    if not isinstance(policy, dict):
+        yield issue('error', 'invalid-retry-policy', flow, f"retryPolicy must be true, false or a map, got {policy!r}",
+                    location)
+        return
+    for key, value in policy.items():
+        if key in RETRY_POLICY_KEYS:
+            positive = RETRY_POLICY_KEYS[key]
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0 or (positive and value <= 0):
+                yield issue('error', 'invalid-retry-policy', flow,
+                            f"{key} must be a {'positive' if positive else 'non-negative'} number, got {value!r}",
+                            f"{location}.{key}")
+            elif key == 'backoffRate' and value < 1:
+                yield issue('error', 'invalid-retry-policy', flow, f"backoffRate must be at least 1, got {value!r}",
+                            f"{location}.{key}")
+        elif key == 'errors':
+            if not isinstance(value, list) or not value or not all(isinstance(error, str) for error in value):
+                yield issue('error', 'invalid-retry-policy', flow, 'errors must be a list of error names',
+                            f"{location}.{key}")
+        elif key != 'jitter':
+            yield issue('error', 'invalid-retry-policy', flow, f"unknown retryPolicy key {key!r}", f"{location}.{key}")
+
+
+def check_retry_policy(flow: Flow) -> Iterator[Dict]:
+    """retryPolicy of the flow and of its `functions` entries (see deploy/retry.js)"""
+    yield from _retry_policy_issues(flow, flow.data.get('retryPolicy'), 'retryPolicy')
+    for i, func in enumerate(flow.data.get('functions') or []):
+        if isinstance(func, dict):
+            yield from _retry_policy_issues(flow, func.get('retryPolicy'), f"functions[{i}].retryPolicy")
+
+
+def check_logging(flow: Flow) -> Iterator[Dict]:
+    """`logging` is false or {level, includeExecutionData} (see deploy/generate-step-functions.js)"""
+    logging = flow.data.get('logging')
+    if logging is None or logging is False:
+        return
+    if not isinstance(logging, dict):
+        yield issue('error', 'invalid-logging', flow, f"logging must be false or a map, got {logging!r}", 'logging')
+        return
+    level = logging.get('level')
+    if level is not None and str(level).upper() not in FLOW_LOG_LEVELS:
+        yield issue('error', 'invalid-logging', flow, f"level must be one of {', '.join(FLOW_LOG_LEVELS)}, got {level!r}",
+                    'logging.level')
+    elif str(level).upper() == 'ALL' and logging.get('includeExecutionData', True):
+        yield issue('warning', 'verbose-logging', flow, 'level ALL with execution data logs every input and output '
+                    'of every state; keep it for debugging', 'logging.level')
+
+
+def check_input_schema(flow: Flow) -> Iterator[Dict]:
+    """inputSchema must be a JSON Schema run_flow can compile (see functions/base/run_flow/schemas.py)"""
+    schema = flow.data.get('inputSchema')
+    if schema is None:
+        return
+    if not isinstance(schema, dict):
+        yield issue('error', 'invalid-input-schema', flow, f"inputSchema must be a map, got {schema!r}", 'inputSchema')
+        return
+    if fastjsonschema is not None:
+        error = schema_error(schema)
+        if error:
+            yield issue('error', 'invalid-input-schema', flow, error, 'inputSchema')
+
+
+def schema_error(schema: Dict) -> Optional[str]:
+    """Why fastjsonschema can't compile the schema, as run_flow would (None when it can)"""
+    try:
+        fastjsonschema.compile(schema)
+    except fastjsonschema.JsonSchemaException as e:
+        return str(e)
+    except Exception as e:  # Malformed schemas also raise AttributeError, re.error...
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+def _source_map(flow: Flow) -> Optional[str]:
+    source = flow.data.get('inputSource')
+    if not isinstance(source, dict):
+        return None
+    return source.get('map') or flow.definition.get('StartAt')
+
+
+def check_input_source(flow: Flow) -> Iterator[Dict]:
+    """inputSource is one of s3, dynamodb or function, read by a top-level Map (see deploy/input-source.js)"""
+    source = flow.data.get('inputSource')
+    if source is None:
+        return
+    if not isinstance(source, dict):
+        yield issue('error', 'invalid-input-source', flow, f"inputSource must be a map, got {source!r}", 'inputSource')
+        return
+    kinds = [kind for kind in INPUT_SOURCES if source.get(kind)]
+    if len(kinds) != 1:
+        yield issue('error', 'invalid-input-source', flow,
+                    f"inputSource needs exactly one of {', '.join(INPUT_SOURCES)}, got {', '.join(kinds) or 'none'}",
+                    'inputSource')
+    elif kinds == ['s3']:
+        s3 = source['s3']
+        if not isinstance(s3, dict) or not s3.get('bucket') or not (s3.get('prefix') is not None or s3.get('key')):
+            yield issue('error', 'invalid-input-source', flow, 's3 needs a bucket and a prefix or a key',
+                        'inputSource.s3')
+    elif kinds == ['dynamodb']:
+        if not isinstance(source['dynamodb'], dict) or not source['dynamodb'].get('table'):
+            yield issue('error', 'invalid-input-source', flow, 'dynamodb needs a table', 'inputSource.dynamodb')
+    elif source['function'] not in {function.get('name') for function in flow.functions}:
+        yield issue('error', 'invalid-input-source', flow,
+                    f"function: no functions entry named '{source['function']}'", 'inputSource.function')
+
+    name = _source_map(flow)
+    state = (flow.definition.get('States') or {}).get(name)
+    if not isinstance(state, dict) or state.get('Type') != 'Map':
+        yield issue('error', 'invalid-input-source', flow,
+                    f"inputSource is read by a top-level Map; {name!r} is not one (set inputSource.map)",
+                    'inputSource.map' if source.get('map') else 'inputSource')
+
+
+def input_schemas(flows: List[Flow]) -> Dict[str, Dict]:
+    """{flow: inputSchema} of the flows declaring one"""
+    return {flow.name: flow.data['inputSchema'] for flow in flows
+            if flow.name and isinstance(flow.data.get('inputSchema'), dict)}
+
+
+def validate(flows: List[Flow], only: Optional[List[str]] = None) -> List[Dict]:
+    """Issues of every flow (or of the flows in the `only` files), checked against all flows"""
+    issues = []
+    by_name = {}
+    for flow in flows:
+        if flow.name:
+            by_name.setdefault(flow.name, []).append(flow)
+    flow_names = set(by_name)
+
+    selected = {os.path.abspath(path) for path in only} if only else None
+    for flow in flows:
+        if selected is not None and os.path.abspath(flow.path) not in selected:
+            continue
+        if flow.error:
+            issues.append(issue('error', 'parse-error', flow, flow.error))
+            continue
+        if not flow.name:
+            issues.append(issue('error', 'missing-name', flow, 'flow has no name'))
+            continue
+        if len(by_name[flow.name]) > 1:
+            others = ', '.join(other.path for other in by_name[flow.name] if other is not flow)
+            issues.append(issue('error', 'duplicate-name', flow, f"another flow has the same name: {others}"))
+        if not flow.data.get('definition'):
+            issues.append(issue('error', 'missing-definition', flow, 'flow has no definition'))
+            continue
+
+        issues.extend(check_machine(flow, flow.definition, ''))
+        issues.extend(check_variables(flow, flow_names))
+        issues.extend(check_performance(flow, flow.definition))
+        issues.extend(check_budget(flow))
+        issues.extend(check_retry_policy(flow))
+        issues.extend(check_logging(flow))
+        issues.extend(check_input_schema(flow))
+        issues.extend(check_input_source(flow))
+
+    involved = {flow.name for flow in flows if selected is None or os.path.abspath(flow.path) in selected}
+    for cycle in find_cycles(reference_graph(flows)):
+        if involved.intersection(cycle):
+            flow = by_name[cycle[0]][0]
+            issues.append(issue('error', 'cycle', flow, f"composite flows start each other: {' -> '.join(cycle)}",
+                                'stateMachineReferences'))
+    return issues
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# tools/image_report.py
+"""
+Image size and import time per function for the dependency-grouped images.
+
+Reads the plan written at deploy time (layer/image-plan.json). With --docker the
+images are built from their Dockerfiles (or taken from --tag-prefix) and the
+handler import is timed inside the container; without it, sizes are the installed
+size of each image's packages in the local environment and imports are timed in a
+fresh local interpreter.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from importlib import metadata
+from typing import Dict, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLAN_PATH = os.path.join(REPO_ROOT, 'layer', 'image-plan.json')
+BASE_REQUIREMENTS = ['aws-lambda-powertools', 'boto3']
+
+IMPORT_TIMER = (
+    "import sys, time; sys.path.insert(0, {root!r}); t = time.perf_counter(); "
+    "import {module}; print((time.perf_counter() - t) * 1000)"
+)
+
+
+def requirement_name(line: str) -> str:
+    return re.split(r'[=<>!~\[;@ ]', line.strip(), maxsplit=1)[0].lower().replace('_', '-')
+
+
+def distribution_size(name: str, seen: Optional[set] = None) -> int:
+    """Installed bytes of a distribution and its dependencies (0 if not installed locally)"""
+    seen = seen if seen is not None else set()
+    if name in seen:
+        return 0
+    seen.add(name)
+    try:
+        dist = metadata.distribution(name)
+    except metadata.PackageNotFoundError:
+        return 0
+
+    size = 0
+    for file in dist.files or []:
+        try:
+            size += os.path.getsize(file.locate())
+        except OSError:
+            pass
+    for requirement in dist.requires or []:
+        if 'extra ==' not in requirement:
+            size += distribution_size(requirement_name(requirement), seen)
+    return size
+
+
+def local_import_ms(module: str) -> Optional[float]:
+    env = {**os.environ, 'AWS_DEFAULT_REGION': os.environ.get('AWS_DEFAULT_REGION', 'eu-west-1')}
+    env.pop('API_USAGE_TABLE', None)
+    result = subprocess.run([sys.executable, '-c', IMPORT_TIMER.format(root=REPO_ROOT, module=module)],
+                            capture_output=True, text=True, env=env)
+    return float(result.stdout.strip().splitlines()[-1]) if result.returncode == 0 else None
+
+
+def docker_image(image: str, tag_prefix: Optional[str], build: bool) -> str:
+    tag = f"{tag_prefix or 'serverless-dynamic-workflows'}:{image}"
+    if build:
+        dockerfile = 'Dockerfile.base' if image == 'baseimage' else f"Dockerfile.{image}"
+        subprocess.run(['docker', 'build', '-q', '-f', dockerfile, '-t', tag, '.'], cwd=REPO_ROOT, check=True)
+    return tag
+
+
+def docker_size(tag: str) -> int:
+    result = subprocess.run(['docker', 'image', 'inspect', '--format', '{{.Size}}', tag],
+                            capture_output=True, text=True, check=True)
+    return int(result.stdout.strip())
+
+
+def docker_import_ms(tag: str, module: str) -> Optional[float]:
+    result = subprocess.run(
+        ['docker', 'run', '--rm', '--entrypoint', 'python', '-e', 'AWS_DEFAULT_REGION=eu-west-1', tag,
+         '-c', IMPORT_TIMER.format(root='/var/task', module=module)],
+        capture_output=True, text=True
+    )
+    return float(result.stdout.strip().splitlines()[-1]) if result.returncode == 0 else None
+
+
+def build_report(plan: Dict, docker: bool = False, tag_prefix: Optional[str] = None,
+                 build: bool = False) -> List[Dict]:
+    images = {'baseimage': {'requirements': [], 'functions': []}, **plan.get('images', {})}
+    for function_name, image in plan.get('assignments', {}).items():
+        if image == 'baseimage':
+            images['baseimage']['functions'].append(function_name)
+
+    rows = []
+    for image, spec in images.items():
+        if docker:
+            tag = docker_image(image, tag_prefix, build)
+            size = docker_size(tag)
+        else:
+            seen = set()
+            size = sum(distribution_size(requirement_name(r), seen)
+                       for r in BASE_REQUIREMENTS + spec['requirements'])
+
+        for function_name in sorted(spec['functions']):
+            module = plan.get('modules', {}).get(function_name)
+            rows.append({
+                'function': function_name,
+                'image': image,
+                'packages': len(spec['requirements']),
+                'sizeMb': round(size / (1024 * 1024), 1),
+                'importMs': None if not module
+                else docker_import_ms(tag, module) if docker else local_import_ms(module)
+            })
+    return rows
+
+
+def print_report(rows: List[Dict]) -> None:
+    print(f"{'Function':<32} {'Image':<16} {'Packages':>8} {'Size MB':>9} {'Import ms':>10}")
+    for row in rows:
+        import_ms = f"{row['importMs']:.1f}" if row['importMs'] is not None else 'error'
+        print(f"{row['function']:<32} {row['image']:<16} {row['packages']:>8} {row['sizeMb']:>9} {import_ms:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report image size and import time per function')
+    parser.add_argument('--plan', default=PLAN_PATH, help='Image plan written by the deploy (layer/image-plan.json)')
+    parser.add_argument('--docker', action='store_true', help='Measure the container images instead of locally')
+    parser.add_argument('--build', action='store_true', help='Build the images before measuring (with --docker)')
+    parser.add_argument('--tag-prefix', help='Repository of already built images, tagged by image name')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.plan):
+        print(f"Error: {args.plan} not found - run `serverless package` first")
+        sys.exit(1)
+    with open(args.plan) as f:
+        plan = json.load(f)
+
+    rows = build_report(plan, args.docker, args.tag_prefix, args.build)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_report(rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,5 @@
+# tools/load_test/__init__.py
+from tools.load_test.backend import Latency, SyntheticAccount, SyntheticAWS
+from tools.load_test.runner import LoadTest, api_event, format_report, lambda_context
+
+__all__ = ['Latency', 'LoadTest', 'SyntheticAWS', 'SyntheticAccount', 'api_event', 'format_report', 'lambda_context']
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# tools/load_test/__main__.py
+"""
+Offline load test of the HTTP handlers.
+
+Virtual users call run_flow, get_flow_result, list_runs, list_flows and /lib/* handlers
+in-process against a synthetic account, with the latency of each AWS operation simulated,
+and the throughput, latency percentiles and AWS calls per request are reported per endpoint:
+
+    python -m tools.load_test --users 20 --duration 10 --state-machines 50 --executions-per-user 200
+    python -m tools.load_test --mix list_runs=1 --latency 10 --latency describe_execution=25
+    python -m tools.load_test --mix run_flow=3,lib:ping=1 --requests 100 --json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from typing import Dict, List, Optional
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-west-1')
+os.environ.setdefault('POWERTOOLS_TRACE_DISABLED', 'true')
+# The handlers log every request at INFO, which would be most of the run's time and output
+os.environ.setdefault('POWERTOOLS_LOG_LEVEL', 'WARNING')
+_stderr = logging.StreamHandler()
+_stderr.setLevel(logging.WARNING)
+logging.getLogger().addHandler(_stderr)
+
+from tools.load_test.backend import Latency, SyntheticAccount, SyntheticAWS
+from tools.load_test.runner import DEFAULT_MIX, LoadTest, format_report
+
+
+def parse_weights(value: str) -> Dict[str, float]:
+    """endpoint=weight,... (a missing weight counts as 1)"""
+    weights = {}
+    for item in value.split(','):
+        name, _, weight = item.strip().partition('=')
+        if name:
+            weights[name] = float(weight) if weight else 1.0
+    return weights
+
+
+def parse_latency(values: List[str], jitter: float) -> Latency:
+    """Milliseconds for every operation (--latency 5) or one operation (--latency describe_execution=20)"""
+    default_ms, operations = 0.0, {}
+    for value in values:
+        name, _, ms = value.partition('=')
+        if ms:
+            operations[name] = float(ms)
+        else:
+            default_ms = float(name)
+    return Latency(default_ms, jitter, **operations)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', type=int, default=10, help='Concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds to run (default 10)')
+    parser.add_argument('--requests', type=int, help='Requests per user instead of a duration')
+    parser.add_argument('--mix', default=','.join(f"{name}={weight}" for name, weight in DEFAULT_MIX.items()),
+                        help='Weighted endpoints: run_flow, get_flow_result, list_runs, list_flows, lib:<name>')
+    parser.add_argument('--state-machines', type=int, default=5)
+    parser.add_argument('--accounts', type=int, default=10, help='Synthetic users owning executions')
+    parser.add_argument('--executions-per-user', type=int, default=20)
+    parser.add_argument('--latency', action='append', default=[],
+                        help='Simulated AWS latency in ms, for every operation (5) or one (describe_execution=20)')
+    parser.add_argument('--jitter', type=float, default=0.2, help='Latency variation, as a fraction (default 0.2)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args(argv)
+
+    account = SyntheticAccount(args.state_machines, args.accounts, args.executions_per_user, seed=args.seed)
+    aws = SyntheticAWS(account, parse_latency(args.latency, args.jitter)).install()
+    try:
+        result = LoadTest(aws, parse_weights(args.mix), args.users, args.duration, args.requests, args.seed).run()
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        aws.uninstall()
+
+    print(json.dumps(result, indent=2) if args.json else format_report(result))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
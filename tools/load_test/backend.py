@@ -0,0 +1,303 @@
+# tools/load_test/backend.py
+"""
+In-memory Step Functions, STS and usage table standing in for AWS while the base handlers
+run in-process, with a synthetic account (N state machines, M executions per user) and a
+configurable latency per operation. Every call is counted per thread, so the AWS round
+trips of a single request can be measured:
+
+    aws = SyntheticAWS(SyntheticAccount(state_machines=20, users=5, executions_per_user=50),
+                       Latency(default_ms=5, describe_execution=20)).install()
+    with aws.recording() as calls:
+        list_runs.handler(event, context)
+    calls['stepfunctions.describe_execution']
+"""
+import json
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional
+
+from functions.base.run_flow.names import execution_name
+
+REGION = 'eu-west-1'
+ACCOUNT_ID = '123456789012'
+PAGE_SIZE = 100
+STATUSES = ['SUCCEEDED', 'SUCCEEDED', 'SUCCEEDED', 'FAILED', 'RUNNING']
+
+_MISSING = object()
+
+
+class StateMachineDoesNotExist(Exception):
+    pass
+
+
+class ExecutionDoesNotExist(Exception):
+    pass
+
+
+class Latency:
+    """Simulated service time of each operation, in milliseconds, with +/- `jitter` (a fraction)"""
+
+    def __init__(self, default_ms: float = 0, jitter: float = 0.0, **operations_ms: float):
+        self.default_ms = default_ms
+        self.jitter = jitter
+        self.operations_ms = operations_ms
+
+    def wait(self, operation: str) -> None:
+        ms = self.operations_ms.get(operation, self.default_ms)
+        if self.jitter:
+            ms *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        if ms > 0:
+            time.sleep(ms / 1000)
+
+
+class SyntheticAccount:
+    """State machines and executions of several users, generated deterministically from `seed`"""
+
+    def __init__(self, state_machines: int = 5, users: int = 10, executions_per_user: int = 20,
+                 seed: int = 0, now: Optional[datetime] = None):
+        rng = random.Random(seed)
+        now = now or datetime.now(timezone.utc)
+        self.users = [f"user-{i}" for i in range(users)]
+        self.state_machines: Dict[str, Dict[str, Any]] = {}
+        self.executions: Dict[str, Dict[str, Any]] = {}
+        self.user_executions: Dict[str, List[str]] = {user_id: [] for user_id in self.users}
+        self._lock = threading.Lock()
+
+        for i in range(state_machines):
+            name = f"flow{i}"
+            arn = f"arn:aws:states:{REGION}:{ACCOUNT_ID}:stateMachine:{name}"
+            self.state_machines[arn] = {
+                'stateMachineArn': arn,
+                'name': name,
+                'type': 'STANDARD',
+                'creationDate': now - timedelta(days=100 + i),
+                'definition': json.dumps({'StartAt': 'Run', 'States': {'Run': {'Type': 'Pass', 'End': True}}}),
+                'executions': []
+            }
+
+        arns = list(self.state_machines)
+        for user_id in self.users:
+            for j in range(executions_per_user if arns else 0):
+                start = now - timedelta(minutes=rng.randint(1, 60 * 24 * 89))
+                status = rng.choice(STATUSES)
+                name = execution_name(user_id, f"{rng.getrandbits(128):032x}")
+                self._add_execution(rng.choice(arns), name, {'__user_id': user_id, 'run': j},
+                                    start, status, {'ok': True} if status == 'SUCCEEDED' else None)
+
+        # list_executions returns the newest first
+        for state_machine in self.state_machines.values():
+            state_machine['executions'].sort(key=lambda arn: self.executions[arn]['startDate'], reverse=True)
+
+    def _add_execution(self, state_machine_arn: str, name: str, execution_input: Dict[str, Any], start: datetime,
+                       status: str, output: Any = None) -> Dict[str, Any]:
+        flow = self.state_machines[state_machine_arn]['name']
+        arn = f"arn:aws:states:{REGION}:{ACCOUNT_ID}:execution:{flow}:{name}"
+        execution = {
+            'executionArn': arn,
+            'stateMachineArn': state_machine_arn,
+            'name': name,
+            'status': status,
+            'startDate': start,
+            'input': json.dumps(execution_input)
+        }
+        if status != 'RUNNING':
+            execution['stopDate'] = start + timedelta(seconds=5)
+            execution['output'] = json.dumps(output) if output is not None else None
+        self.executions[arn] = execution
+        self.state_machines[state_machine_arn]['executions'].append(arn)
+        self.user_executions.setdefault(execution_input.get('__user_id'), []).append(arn)
+        return execution
+
+    def start_execution(self, state_machine_arn: str, name: str, execution_input: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            execution = self._add_execution(state_machine_arn, name, execution_input,
+                                            datetime.now(timezone.utc), 'RUNNING')
+            # Newest first
+            executions = self.state_machines[state_machine_arn]['executions']
+            executions.insert(0, executions.pop())
+        return execution
+
+    def executions_of(self, user_id: str) -> List[str]:
+        return self.user_executions.get(user_id, [])
+
+
+class _Paginator:
+    def __init__(self, operation):
+        self.operation = operation
+
+    def paginate(self, **kwargs) -> Iterator[Dict[str, Any]]:
+        while True:
+            page = self.operation(**kwargs)
+            yield page
+            if not page.get('nextToken'):
+                return
+            kwargs['nextToken'] = page['nextToken']
+
+
+def _page(items: List[Any], max_results: Optional[int], next_token: Optional[str]):
+    start = int(next_token or 0)
+    end = start + (max_results or PAGE_SIZE)
+    return items[start:end], (str(end) if end < len(items) else None)
+
+
+class _Service:
+    """Counts and delays every call made through `_call`"""
+
+    service = ''
+
+    def __init__(self, aws: 'SyntheticAWS'):
+        self.aws = aws
+
+    def _call(self, operation: str) -> None:
+        self.aws.record(f"{self.service}.{operation}")
+        self.aws.latency.wait(operation)
+
+
+class FakeStepFunctions(_Service):
+    service = 'stepfunctions'
+    exceptions = SimpleNamespace(StateMachineDoesNotExist=StateMachineDoesNotExist,
+                                 ExecutionDoesNotExist=ExecutionDoesNotExist)
+
+    @property
+    def account(self) -> SyntheticAccount:
+        return self.aws.account
+
+    def get_paginator(self, operation: str) -> _Paginator:
+        return _Paginator(getattr(self, operation))
+
+    def list_state_machines(self, maxResults: Optional[int] = None, nextToken: Optional[str] = None):
+        self._call('list_state_machines')
+        machines, token = _page(list(self.account.state_machines.values()), maxResults, nextToken)
+        page = {'stateMachines': [{key: machine[key] for key in ('stateMachineArn', 'name', 'type', 'creationDate')}
+                                  for machine in machines]}
+        return {**page, 'nextToken': token} if token else page
+
+    def describe_state_machine(self, stateMachineArn: str):
+        self._call('describe_state_machine')
+        if stateMachineArn not in self.account.state_machines:
+            raise StateMachineDoesNotExist(stateMachineArn)
+        machine = self.account.state_machines[stateMachineArn]
+        return {key: machine[key] for key in ('stateMachineArn', 'name', 'type', 'creationDate', 'definition')}
+
+    def list_executions(self, stateMachineArn: str, maxResults: Optional[int] = None,
+                        nextToken: Optional[str] = None, statusFilter: Optional[str] = None):
+        self._call('list_executions')
+        if stateMachineArn not in self.account.state_machines:
+            raise StateMachineDoesNotExist(stateMachineArn)
+        executions = [self.account.executions[arn] for arn in self.account.state_machines[stateMachineArn]['executions']]
+        if statusFilter:
+            executions = [execution for execution in executions if execution['status'] == statusFilter]
+        executions, token = _page(executions, maxResults, nextToken)
+        page = {'executions': [{key: execution[key] for key in
+                                ('executionArn', 'stateMachineArn', 'name', 'status', 'startDate', 'stopDate')
+                                if key in execution} for execution in executions]}
+        return {**page, 'nextToken': token} if token else page
+
+    def describe_execution(self, executionArn: str):
+        self._call('describe_execution')
+        if executionArn not in self.account.executions:
+            raise ExecutionDoesNotExist(executionArn)
+        return {key: value for key, value in self.account.executions[executionArn].items() if value is not None}
+
+    def start_execution(self, stateMachineArn: str, input: str = '{}', name: Optional[str] = None):
+        self._call('start_execution')
+        if stateMachineArn not in self.account.state_machines:
+            raise StateMachineDoesNotExist(stateMachineArn)
+        execution = self.account.start_execution(stateMachineArn, name or f"run-{time.time_ns()}", json.loads(input))
+        return {'executionArn': execution['executionArn'], 'startDate': execution['startDate']}
+
+
+class FakeSTS(_Service):
+    service = 'sts'
+
+    def get_caller_identity(self):
+        self._call('get_caller_identity')
+        return {'Account': ACCOUNT_ID, 'Arn': f"arn:aws:iam::{ACCOUNT_ID}:role/load-test", 'UserId': 'load-test'}
+
+
+class FakeUsageTable(_Service):
+    """The usage table writes of track_usage_middleware (enforcement off)"""
+
+    service = 'dynamodb'
+
+    def update_item(self, **kwargs):
+        self._call('update_item')
+        return {}
+
+    def query(self, **kwargs):
+        self._call('query')
+        return {'Items': []}
+
+
+class _Boto3:
+    """Stands in for the boto3 module of handlers that create clients per request"""
+
+    def __init__(self, aws: 'SyntheticAWS'):
+        self.aws = aws
+        self.session = SimpleNamespace(Session=lambda: SimpleNamespace(region_name=REGION))
+
+    def client(self, service_name: str, *args, **kwargs):
+        return self.aws.clients[service_name]
+
+
+class SyntheticAWS:
+    """Installs the fakes in the base handler modules and counts the calls they make"""
+
+    def __init__(self, account: Optional[SyntheticAccount] = None, latency: Optional[Latency] = None):
+        self.account = account or SyntheticAccount()
+        self.latency = latency or Latency()
+        self.clients = {'stepfunctions': FakeStepFunctions(self), 'sts': FakeSTS(self)}
+        self.usage_table = FakeUsageTable(self)
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._patches: List[tuple] = []
+
+    def record(self, operation: str) -> None:
+        with self._lock:
+            self.calls[operation] += 1
+        recording = getattr(self._local, 'calls', None)
+        if recording is not None:
+            recording[operation] += 1
+
+    @contextmanager
+    def recording(self) -> Iterator[Counter]:
+        """Counter of the calls made by the current thread inside the block"""
+        previous = getattr(self._local, 'calls', None)
+        self._local.calls = Counter()
+        try:
+            yield self._local.calls
+        finally:
+            self._local.calls = previous
+
+    def _patch(self, target: Any, name: str, value: Any) -> None:
+        self._patches.append((target, name, target.__dict__.get(name, _MISSING)))
+        setattr(target, name, value)
+
+    def install(self) -> 'SyntheticAWS':
+        from functions.base.api_usage import handler as api_usage
+        from functions.base.get_flow_result import handler as get_flow_result
+        from functions.base.list_flows import handler as list_flows
+        from functions.base.list_runs import handler as list_runs
+        from functions.base.run_flow import handler as run_flow
+
+        sfn = self.clients['stepfunctions']
+        for module in (get_flow_result, list_flows, list_runs, run_flow):
+            self._patch(module, 'sfn', sfn)
+        self._patch(run_flow, 'boto3', _Boto3(self))
+        self._patch(api_usage.get_table, 'table', self.usage_table)
+        return self
+
+    def uninstall(self) -> None:
+        while self._patches:
+            target, name, original = self._patches.pop()
+            if original is _MISSING:
+                delattr(target, name)
+            else:
+                setattr(target, name, original)
+
@@ -0,0 +1,212 @@
+# tools/load_test/runner.py
+"""
+Concurrent virtual users calling the HTTP handlers in-process with API Gateway (HTTP API,
+payload v2.0) events, and the per-endpoint throughput, latency percentiles and AWS calls.
+"""
+import importlib
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+from tools.load_test.backend import ACCOUNT_ID, REGION, SyntheticAWS
+
+# Endpoint -> (route key, handler module)
+ENDPOINTS = {
+    'run_flow': ('POST /run/{flow_name}', 'functions.base.run_flow.handler'),
+    'get_flow_result': ('GET /run/{flow_name}/{execution_id}', 'functions.base.get_flow_result.handler'),
+    'list_runs': ('GET /runs', 'functions.base.list_runs.handler'),
+    'list_flows': ('GET /flows', 'functions.base.list_flows.handler'),
+}
+LIB_PREFIX = 'lib:'
+DEFAULT_MIX = {'run_flow': 2, 'get_flow_result': 4, 'list_runs': 1, 'list_flows': 1, 'lib:ping': 2}
+
+
+def api_event(route_key: str, path: str, user_id: str, path_parameters: Optional[Dict[str, str]] = None,
+              body: Optional[Any] = None) -> Dict[str, Any]:
+    """Event API Gateway sends for a request authorized by the Cognito JWT authorizer"""
+    method = route_key.split(' ', 1)[0]
+    now = datetime.now(timezone.utc)
+    return {
+        'version': '2.0',
+        'routeKey': route_key,
+        'rawPath': path,
+        'rawQueryString': '',
+        'headers': {'content-type': 'application/json', 'authorization': 'Bearer load-test'},
+        'requestContext': {
+            'accountId': ACCOUNT_ID,
+            'apiId': 'loadtest',
+            'authorizer': {'jwt': {'claims': {'sub': user_id, 'token_use': 'access'}, 'scopes': None}},
+            'domainName': 'loadtest.execute-api.eu-west-1.amazonaws.com',
+            'http': {'method': method, 'path': path, 'protocol': 'HTTP/1.1', 'sourceIp': '127.0.0.1',
+                     'userAgent': 'load-test'},
+            'requestId': uuid.uuid4().hex,
+            'routeKey': route_key,
+            'stage': '$default',
+            'time': now.strftime('%d/%b/%Y:%H:%M:%S +0000'),
+            'timeEpoch': int(now.timestamp() * 1000)
+        },
+        'pathParameters': path_parameters,
+        'body': json.dumps(body) if body is not None else None,
+        'isBase64Encoded': False
+    }
+
+
+def lambda_context(function_name: str) -> SimpleNamespace:
+    return SimpleNamespace(
+        function_name=function_name,
+        function_version='$LATEST',
+        invoked_function_arn=f"arn:aws:lambda:{REGION}:{ACCOUNT_ID}:function:{function_name}",
+        memory_limit_in_mb=256,
+        aws_request_id=uuid.uuid4().hex,
+        log_group_name=f"/aws/lambda/{function_name}",
+        log_stream_name='load-test',
+        get_remaining_time_in_millis=lambda: 30000
+    )
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of already sorted values"""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(q / 100 * len(sorted_values)) - 1)]
+
+
+class LoadTest:
+    """
+    Runs `users` virtual users for `duration` seconds (or `requests` requests each),
+    every request picking an endpoint from the weighted `mix`.
+    """
+
+    def __init__(self, aws: SyntheticAWS, mix: Optional[Dict[str, float]] = None, users: int = 10,
+                 duration: Optional[float] = 10, requests: Optional[int] = None, seed: int = 0):
+        self.aws = aws
+        self.mix = mix or DEFAULT_MIX
+        self.users = users
+        self.duration = duration
+        self.requests = requests
+        self.seed = seed
+        self.handlers: Dict[str, Callable] = {}
+        self.samples: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._lock = threading.Lock()
+        unknown = [name for name in self.mix if name not in ENDPOINTS and not name.startswith(LIB_PREFIX)]
+        if unknown:
+            raise ValueError(f"Unknown endpoints {', '.join(unknown)} (use {', '.join(ENDPOINTS)} or lib:<name>)")
+
+    def handler(self, endpoint: str) -> Callable:
+        if endpoint not in self.handlers:
+            module = ENDPOINTS[endpoint][1] if endpoint in ENDPOINTS else \
+                f"functions.lib.{endpoint[len(LIB_PREFIX):]}.handler"
+            self.handlers[endpoint] = importlib.import_module(module).handler
+        return self.handlers[endpoint]
+
+    def request(self, endpoint: str, user_id: str, rng: random.Random) -> Dict[str, Any]:
+        """Event of a request of `user_id` to `endpoint`"""
+        account = self.aws.account
+        flows = [machine['name'] for machine in account.state_machines.values()]
+        if endpoint == 'run_flow':
+            flow = rng.choice(flows) if flows else 'missingFlow'
+            return api_event(ENDPOINTS[endpoint][0], f"/run/{flow}", user_id, {'flow_name': flow},
+                             {'loadTest': True})
+        if endpoint == 'get_flow_result':
+            executions = account.executions_of(user_id)
+            arn = rng.choice(executions) if executions else \
+                f"arn:aws:states:{REGION}:{ACCOUNT_ID}:execution:missingFlow:missing"
+            flow = arn.split(':')[6]
+            return api_event(ENDPOINTS[endpoint][0], f"/run/{flow}/{arn}", user_id,
+                             {'flow_name': flow, 'execution_id': arn})
+        if endpoint in ENDPOINTS:
+            route_key = ENDPOINTS[endpoint][0]
+            return api_event(route_key, route_key.split(' ', 1)[1], user_id)
+        name = endpoint[len(LIB_PREFIX):]
+        return api_event(f"POST /lib/{name}", f"/lib/{name}", user_id, body={'loadTest': True})
+
+    def call(self, endpoint: str, user_id: str, rng: random.Random) -> None:
+        event = self.request(endpoint, user_id, rng)
+        handler = self.handler(endpoint)
+        with self.aws.recording() as calls:
+            started = time.perf_counter()
+            try:
+                response = handler(event, lambda_context(endpoint))
+                status = response.get('statusCode', 200) if isinstance(response, dict) else 200
+            except Exception:
+                status = 'exception'
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.samples[endpoint].append({'ms': elapsed_ms, 'status': status, 'calls': dict(calls)})
+
+    def virtual_user(self, index: int, deadline: float) -> None:
+        rng = random.Random(self.seed * 100003 + index)
+        users = self.aws.account.users or ['user-0']
+        user_id = users[index % len(users)]
+        endpoints, weights = list(self.mix), list(self.mix.values())
+        sent = 0
+        while sent < self.requests if self.requests is not None else time.perf_counter() < deadline:
+            self.call(rng.choices(endpoints, weights)[0], user_id, rng)
+            sent += 1
+
+    def run(self) -> Dict[str, Any]:
+        # Imported before the clock starts, like a warm container
+        for endpoint in self.mix:
+            self.handler(endpoint)
+        started = time.perf_counter()
+        deadline = started + (self.duration or 0)
+        threads = [threading.Thread(target=self.virtual_user, args=(i, deadline), daemon=True)
+                   for i in range(self.users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return report(self.samples, time.perf_counter() - started, self.users)
+
+
+def report(samples: Dict[str, List[Dict[str, Any]]], elapsed: float, users: int) -> Dict[str, Any]:
+    endpoints = {}
+    for endpoint, runs in sorted(samples.items()):
+        latencies = sorted(run['ms'] for run in runs)
+        calls = Counter()
+        for run in runs:
+            calls.update(run['calls'])
+        statuses = Counter(str(run['status']) for run in runs)
+        endpoints[endpoint] = {
+            'requests': len(runs),
+            'errors': sum(1 for run in runs if run['status'] == 'exception' or run['status'] >= 500),
+            'statuses': dict(statuses),
+            'throughput_rps': round(len(runs) / elapsed, 1) if elapsed else None,
+            'mean_ms': round(sum(latencies) / len(latencies), 2),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'max_ms': round(latencies[-1], 2),
+            'aws_calls_per_request': {operation: round(count / len(runs), 2) for operation, count in sorted(calls.items())}
+        }
+    total = sum(endpoint['requests'] for endpoint in endpoints.values())
+    return {
+        'users': users,
+        'elapsed_s': round(elapsed, 2),
+        'requests': total,
+        'throughput_rps': round(total / elapsed, 1) if elapsed else None,
+        'endpoints': endpoints
+    }
+
+
+def format_report(result: Dict[str, Any]) -> str:
+    header = ['endpoint', 'requests', 'errors', 'rps', 'mean', 'p50', 'p95', 'p99', 'max', 'aws calls/req']
+    rows = []
+    for name, endpoint in result['endpoints'].items():
+        calls = sum(endpoint['aws_calls_per_request'].values())
+        rows.append([name, endpoint['requests'], endpoint['errors'], endpoint['throughput_rps'], endpoint['mean_ms'],
+                     endpoint['p50_ms'], endpoint['p95_ms'], endpoint['p99_ms'], endpoint['max_ms'], round(calls, 2)])
+    rows = [[str(value) for value in row] for row in rows]
+    widths = [max([len(name)] + [len(row[i]) for row in rows]) for i, name in enumerate(header)]
+    lines = ['  '.join(name.ljust(width) for name, width in zip(header, widths)).rstrip()]
+    lines.extend('  '.join(value.ljust(width) for value, width in zip(row, widths)).rstrip() for row in rows)
+    lines.append(f"{result['requests']} requests from {result['users']} users in {result['elapsed_s']} s "
+                 f"({result['throughput_rps']} req/s), latencies in ms")
+    return '\n'.join(lines)
@@ -0,0 +1,71 @@
+# tools/load_test/stubs.py
+"""
+Botocore-level stubbing: real boto3 clients keep building and validating their requests
+against the service model, but instead of being sent each request is answered by the
+synthetic account of a SyntheticAWS (like botocore's Stubber, without a fixed order of
+expected calls). Calls are counted by SyntheticAWS, so tests can hold the handlers to a
+budget of AWS round trips per request.
+
+    stub = BotocoreStub(SyntheticAWS(account))
+    stub.attach(list_runs.sfn)           # an existing client
+    stub.attach(boto3.DEFAULT_SESSION)   # clients created later from this session
+"""
+from typing import Any, Dict, List
+
+from botocore import xform_name
+from botocore.awsrequest import AWSResponse
+
+from tools.load_test.backend import ExecutionDoesNotExist, StateMachineDoesNotExist, SyntheticAWS
+
+# Errors of the fakes returned as the service's modeled error codes
+MODELED_ERRORS = (StateMachineDoesNotExist, ExecutionDoesNotExist)
+
+
+class UnstubbedOperation(Exception):
+    """Raised when a handler calls an operation the synthetic account doesn't implement"""
+
+
+class BotocoreStub:
+    def __init__(self, aws: SyntheticAWS):
+        self.aws = aws
+        self.services = {
+            'stepfunctions': aws.clients['stepfunctions'],
+            'sts': aws.clients['sts'],
+            'dynamodb': aws.usage_table
+        }
+        self._unique_id = f"load-test-stub-{id(self)}"
+        self._emitters: List[Any] = []
+
+    def attach(self, target: Any) -> Any:
+        """Stub a client, or a boto3 Session for the clients it creates from now on"""
+        events = target.meta.events if hasattr(target, 'meta') else target.events
+        events.register_first('before-parameter-build.*.*', self._keep_params, unique_id=f"{self._unique_id}-params")
+        events.register_first('before-call.*.*', self._respond, unique_id=self._unique_id)
+        self._emitters.append(events)
+        return target
+
+    def detach(self) -> None:
+        while self._emitters:
+            events = self._emitters.pop()
+            events.unregister('before-parameter-build.*.*', unique_id=f"{self._unique_id}-params")
+            events.unregister('before-call.*.*', unique_id=self._unique_id)
+
+    @staticmethod
+    def _keep_params(params: Dict[str, Any], context: Dict[str, Any], **kwargs) -> None:
+        # before-call only gets the serialized request, the fakes take the API parameters
+        context['load_test_params'] = dict(params)
+
+    def _respond(self, model, context: Dict[str, Any], **kwargs):
+        service = model.service_model.service_name
+        operation = xform_name(model.name)
+        fake = self.services.get(service)
+        if fake is None or not hasattr(fake, operation):
+            raise UnstubbedOperation(f"{service}.{operation} is not stubbed")
+
+        try:
+            result = getattr(fake, operation)(**context.get('load_test_params', {}))
+        except MODELED_ERRORS as e:
+            return (AWSResponse(f"https://{service}.stub", 400, {}, None),
+                    {'Error': {'Code': type(e).__name__, 'Message': str(e)},
+                     'ResponseMetadata': {'HTTPStatusCode': 400}})
+        return AWSResponse(f"https://{service}.stub", 200, {}, None), {**result, 'ResponseMetadata': {'HTTPStatusCode': 200}}
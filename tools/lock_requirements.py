@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# tools/lock_requirements.py
+"""
+Merge requirement sources (base, main, plugins, ...) into one locked, hashed requirements file.
+
+Every source keeps its own constraints: a package required by several sources must satisfy all
+of them, and pins that cannot be satisfied together are reported with the sources that asked for
+them instead of being silently overridden. pip resolves the merged set for the Lambda platform
+and the result is written as `name==version --hash=sha256:...` lines for `pip install --require-hashes`.
+
+Resolutions are cached by a hash of their inputs, so an unchanged deploy never runs the resolver,
+and the locked wheels are kept in a wheelhouse that later deploys copy from instead of downloading.
+
+    python -m tools.lock_requirements --source base=layer/requirements-base.txt \\
+        --source main=layer/requirements.txt --output layer/requirements.lock --wheels layer/wheels
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+try:
+    from packaging.requirements import InvalidRequirement, Requirement
+    from packaging.utils import canonicalize_name
+except ImportError:  # pip always vendors packaging
+    from pip._vendor.packaging.requirements import InvalidRequirement, Requirement
+    from pip._vendor.packaging.utils import canonicalize_name
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'serverless-dynamic-workflows')
+PYTHON_VERSION = '3.9'
+PLATFORM = 'manylinux2014_x86_64'
+
+
+class RequirementsConflict(Exception):
+    """Requirements that no single version can satisfy"""
+
+
+def parse_requirements(text: str) -> List[str]:
+    """Requirement lines of a requirements.txt, without comments or pip options"""
+    lines = []
+    for line in text.splitlines():
+        line = line.split(' #', 1)[0].strip()
+        if line and not line.startswith(('#', '-')):
+            lines.append(line)
+    return lines
+
+
+def read_sources(specs: List[str]) -> Dict[str, List[str]]:
+    """Read `name=path` (or bare path) source arguments, skipping files that don't exist"""
+    sources = {}
+    for spec in specs:
+        name, _, path = spec.rpartition('=')
+        name = name or os.path.basename(path)
+        if os.path.exists(path):
+            with open(path) as f:
+                sources[name] = parse_requirements(f.read())
+    return sources
+
+
+def merge_sources(sources: Dict[str, List[str]]) -> Dict[str, List[Tuple[str, Requirement]]]:
+    """Group every requirement by canonical package name, remembering which source asked for it"""
+    merged = {}
+    for source, lines in sources.items():
+        for line in lines:
+            try:
+                requirement = Requirement(line)
+            except InvalidRequirement as e:
+                raise RequirementsConflict(f"{source}: invalid requirement '{line}': {e}")
+            merged.setdefault(canonicalize_name(requirement.name), []).append((source, requirement))
+    return dict(sorted(merged.items()))
+
+
+def _pinned_version(requirement: Requirement) -> Optional[str]:
+    pins = [spec.version for spec in requirement.specifier if spec.operator in ('==', '===')]
+    return pins[0] if pins and '*' not in pins[0] else None
+
+
+def find_conflicts(merged: Dict[str, List[Tuple[str, Requirement]]]) -> List[str]:
+    """
+    Conflicts visible without resolving: a pin that another source's specifier excludes.
+    Overlapping ranges are left to the resolver, which reports what it can't satisfy.
+    """
+    conflicts = []
+    for name, entries in merged.items():
+        for source, requirement in entries:
+            version = _pinned_version(requirement)
+            if version is None:
+                continue
+            rejected_by = [f"{other} ({other_requirement})" for other, other_requirement in entries
+                           if other != source and not other_requirement.specifier.contains(version, prereleases=True)]
+            if rejected_by:
+                conflicts.append(f"{name}: {source} pins {version}, incompatible with {', '.join(rejected_by)}")
+    return sorted(set(conflicts))
+
+
+def merged_lines(merged: Dict[str, List[Tuple[str, Requirement]]]) -> List[str]:
+    """One requirement per package, combining the specifiers and extras of every source"""
+    lines = []
+    for name, entries in merged.items():
+        extras = sorted({extra for _, requirement in entries for extra in requirement.extras})
+        specifiers = sorted({str(spec) for _, requirement in entries for spec in requirement.specifier})
+        markers = {str(requirement.marker) for _, requirement in entries if requirement.marker}
+        line = name + (f"[{','.join(extras)}]" if extras else '') + ','.join(specifiers)
+        if len(markers) == 1 and len(entries) == 1:
+            line += f"; {markers.pop()}"
+        lines.append(line)
+    return lines
+
+
+def input_key(lines: List[str], python_version: str, platform: str) -> str:
+    """Cache key of a resolution: the merged requirements and the target interpreter"""
+    payload = json.dumps({'requirements': lines, 'python': python_version, 'platform': platform}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _platform_args(python_version: str, platform: str) -> List[str]:
+    return ['--only-binary=:all:', '--platform', platform, '--python-version', python_version,
+            '--implementation', 'cp']
+
+
+def resolve(lines: List[str], python_version: str = PYTHON_VERSION, platform: str = PLATFORM) -> List[Dict]:
+    """Resolve the requirements for the target platform with pip; returns the packages to install"""
+    with tempfile.TemporaryDirectory() as tmp:
+        requirements_path = os.path.join(tmp, 'requirements.txt')
+        with open(requirements_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+        # --target is only there because pip refuses platform options without it; nothing is installed
+        result = subprocess.run(
+            [sys.executable, '-m', 'pip', 'install', '--dry-run', '--ignore-installed', '--quiet',
+             '--report', '-', '--target', os.path.join(tmp, 'target'),
+             *_platform_args(python_version, platform), '-r', requirements_path],
+            capture_output=True, text=True
+        )
+
+    if result.returncode != 0:
+        detail = result.stderr.strip()
+        if 'conflict is caused by' in detail:
+            detail = detail[detail.index('The conflict is caused by'):]
+        raise RequirementsConflict(detail)
+
+    packages = []
+    for item in json.loads(result.stdout)['install']:
+        archive = item['download_info'].get('archive_info', {})
+        sha256 = archive.get('hashes', {}).get('sha256') or archive.get('hash', '').partition('sha256=')[2]
+        packages.append({
+            'name': canonicalize_name(item['metadata']['name']),
+            'version': item['metadata']['version'],
+            'sha256': sha256,
+            'filename': os.path.basename(unquote(urlparse(item['download_info']['url']).path))
+        })
+    return sorted(packages, key=lambda package: package['name'])
+
+
+def render_lock(packages: List[Dict], merged: Dict[str, List[Tuple[str, Requirement]]], key: str) -> str:
+    lines = [
+        '# Generated by tools/lock_requirements.py - do not edit',
+        f"# inputs: {key}"
+    ]
+    for package in packages:
+        via = sorted({source for source, _ in merged.get(package['name'], [])})
+        lines.append(f"{package['name']}=={package['version']} \\")
+        lines.append(f"    --hash=sha256:{package['sha256']}" + (f"  # via {', '.join(via)}" if via else ''))
+    return '\n'.join(lines) + '\n'
+
+
+def fetch_wheels(packages: List[Dict], lock_path: str, dest: str, cache_dir: str,
+                 python_version: str = PYTHON_VERSION, platform: str = PLATFORM) -> None:
+    """Copy the locked wheels into dest, downloading only the ones missing from the wheelhouse"""
+    wheelhouse = os.path.join(cache_dir, 'wheels')
+    os.makedirs(wheelhouse, exist_ok=True)
+    if any(not os.path.exists(os.path.join(wheelhouse, p['filename'])) for p in packages):
+        result = subprocess.run([sys.executable, '-m', 'pip', 'download', '--quiet', '--no-deps', '--require-hashes',
+                                 *_platform_args(python_version, platform), '-d', wheelhouse, '-r', lock_path],
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            # Not fatal: the image build downloads whatever is missing from the wheel directory
+            print(f"Warning: could not download the locked wheels: {result.stderr.strip()}", file=sys.stderr)
+
+    os.makedirs(dest, exist_ok=True)
+    for package in packages:
+        source = os.path.join(wheelhouse, package['filename'])
+        target = os.path.join(dest, package['filename'])
+        if os.path.exists(source) and not os.path.exists(target):
+            shutil.copy2(source, target)
+
+
+def lock(sources: Dict[str, List[str]], output: str, wheels: Optional[str] = None,
+         python_version: str = PYTHON_VERSION, platform: str = PLATFORM,
+         cache_dir: str = CACHE_DIR, refresh: bool = False) -> Dict:
+    """Resolve the sources into a lock file (from the cache when the inputs are unchanged)"""
+    merged = merge_sources(sources)
+    conflicts = find_conflicts(merged)
+    if conflicts:
+        raise RequirementsConflict('\n'.join(conflicts))
+
+    lines = merged_lines(merged)
+    key = input_key(lines, python_version, platform)
+    cache_path = os.path.join(cache_dir, 'requirements', f"{key}.json")
+
+    cached = not refresh and os.path.exists(cache_path)
+    if cached:
+        with open(cache_path) as f:
+            packages = json.load(f)
+    else:
+        try:
+            packages = resolve(lines, python_version, platform) if lines else []
+        except RequirementsConflict as e:
+            involved = [f"  {name}: " + ', '.join(f"{source} ({requirement})" for source, requirement in entries)
+                        for name, entries in merged.items() if name in str(e).lower()]
+            raise RequirementsConflict(str(e) + ('\nRequested by:\n' + '\n'.join(involved) if involved else ''))
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path, 'w') as f:
+            json.dump(packages, f, indent=2)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        f.write(render_lock(packages, merged, key))
+
+    if wheels:
+        fetch_wheels(packages, output, wheels, cache_dir, python_version, platform)
+
+    return {'key': key, 'cached': cached, 'packages': packages}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Merge requirement files into a locked, hashed requirements file')
+    parser.add_argument('--source', action='append', default=[],
+                        help='Requirements file as name=path, in priority order (repeatable)')
+    parser.add_argument('--output', required=True, help='Lock file to write')
+    parser.add_argument('--wheels', help='Directory to copy the locked wheels to')
+    parser.add_argument('--python-version', default=PYTHON_VERSION, help=f"Target Python (default: {PYTHON_VERSION})")
+    parser.add_argument('--platform', default=PLATFORM, help=f"Target platform (default: {PLATFORM})")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help='Resolution cache and wheelhouse directory')
+    parser.add_argument('--refresh', action='store_true', help='Resolve again even if the inputs are unchanged')
+    args = parser.parse_args()
+
+    try:
+        result = lock(read_sources(args.source), args.output, args.wheels, args.python_version,
+                      args.platform, args.cache_dir, args.refresh)
+    except RequirementsConflict as e:
+        print(f"Error: conflicting requirements for {args.output}\n{e}", file=sys.stderr)
+        sys.exit(1)
+
+    state = 'unchanged inputs, cached resolution' if result['cached'] else 'resolved'
+    print(f"Locked {len(result['packages'])} packages to {args.output} ({state})")
+
+
+if __name__ == '__main__':
+    main()
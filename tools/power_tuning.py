@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# tools/power_tuning.py
+"""
+Local power tuning for functions/lib handlers.
+
+Runs a handler against its sample events (functions/lib/<name>/events/*.json) in a
+fresh process, measures wall time, CPU time and peak memory, and models the
+duration at each Lambda memory size: Lambda allocates CPU in proportion to memory
+(one full vCPU at 1769 MB), so the CPU-bound part of a run slows down below that
+while waiting on I/O does not. Memory sizes below the measured peak are rejected.
+The recommended memorySize/timeout are written to the function's function.yml.
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import resource
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import yaml
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LIB_DIR = os.path.join(REPO_ROOT, 'functions', 'lib')
+CONFIG_FILE = 'function.yml'
+
+MEMORY_SIZES = [128, 256, 512, 1024, 1769, 3008]
+FULL_VCPU_MEMORY = 1769
+# x86 on-demand pricing (eu-west-1)
+PRICE_PER_GB_SECOND = 0.0000166667
+PRICE_PER_REQUEST = 0.0000002
+# Headroom over measured values for the memory check and the timeout
+MEMORY_HEADROOM = 1.2
+TIMEOUT_FACTOR = 3
+MIN_TIMEOUT, MAX_TIMEOUT = 3, 900
+
+
+def run_worker(function_name: str) -> None:
+    """Worker mode: import the handler, run every event read from stdin and print measurements"""
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-west-1')
+    # No usage table - the middleware skips tracking instead of calling DynamoDB
+    os.environ.pop('API_USAGE_TABLE', None)
+    sys.path.insert(0, REPO_ROOT)
+
+    started = time.perf_counter()
+    module = __import__(f"functions.lib.{function_name}.handler", fromlist=['handler'])
+    init_ms = (time.perf_counter() - started) * 1000
+
+    events = json.load(sys.stdin)
+    runs = []
+    for event in events:
+        wall, cpu = time.perf_counter(), time.process_time()
+        error = None
+        try:
+            module.handler(event, None)
+        except Exception as e:
+            error = str(e)
+        runs.append({
+            'wall_ms': (time.perf_counter() - wall) * 1000,
+            'cpu_ms': (time.process_time() - cpu) * 1000,
+            'error': error
+        })
+
+    json.dump({'init_ms': init_ms, 'peak_mb': peak_memory_mb(), 'runs': runs}, sys.stdout)
+
+
+def peak_memory_mb() -> float:
+    """Peak RSS of this process"""
+    # Linux keeps ru_maxrss across exec, so a worker started by a large process (e.g. pytest with
+    # pyarrow loaded) would report its parent's size; VmHWM only covers this process' memory
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak_kb / (1024 * 1024) if sys.platform == 'darwin' else peak_kb / 1024
+
+
+def load_events(function_dir: str, event_files: List[str] = None) -> List[Dict]:
+    paths = event_files or sorted(glob.glob(os.path.join(function_dir, 'events', '*.json')))
+    events = []
+    for path in paths:
+        with open(path) as f:
+            events.append(json.load(f))
+    return events or [{}]
+
+
+def measure(function_name: str, events: List[Dict], repeat: int = 5, timeout: int = MAX_TIMEOUT) -> Dict:
+    """Run the events `repeat` times in a fresh process; the first pass is the cold start"""
+    result = subprocess.run(
+        [sys.executable, '-m', 'tools.power_tuning', '--worker', function_name],
+        input=json.dumps(events * repeat), capture_output=True, text=True, cwd=REPO_ROOT, timeout=timeout
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Worker for {function_name} failed:\n{result.stderr}")
+    # Handlers may print - the measurements are the last line
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(math.ceil(pct / 100 * len(values))) - 1)]
+
+
+def estimate(measurements: Dict, memory_sizes: List[int] = MEMORY_SIZES) -> List[Dict]:
+    """Modelled p95 duration and cost per million invocations at each memory size"""
+    warm_runs = measurements['runs'][1:] or measurements['runs']
+    cpu_ms = _percentile([r['cpu_ms'] for r in warm_runs], 95)
+    wait_ms = _percentile([max(0.0, r['wall_ms'] - r['cpu_ms']) for r in warm_runs], 95)
+    required_mb = measurements['peak_mb'] * MEMORY_HEADROOM
+
+    estimates = []
+    for memory in memory_sizes:
+        duration_ms = wait_ms + cpu_ms * max(1.0, FULL_VCPU_MEMORY / memory)
+        billed_ms = max(1, math.ceil(duration_ms))
+        cost = 1_000_000 * (billed_ms / 1000 * memory / 1024 * PRICE_PER_GB_SECOND + PRICE_PER_REQUEST)
+        estimates.append({
+            'memorySize': memory,
+            'durationMs': round(duration_ms, 2),
+            'coldStartMs': round(measurements['init_ms'] * max(1.0, FULL_VCPU_MEMORY / memory), 2),
+            'costPerMillion': round(cost, 4),
+            'fits': memory >= required_mb
+        })
+    return estimates
+
+
+def recommend(estimates: List[Dict], strategy: str = 'cost') -> Dict:
+    """Pick a memory size: cheapest, fastest, or cheapest within 10% of the fastest ('balanced')"""
+    candidates = [e for e in estimates if e['fits']] or estimates[-1:]
+    if strategy == 'speed':
+        return min(candidates, key=lambda e: (e['durationMs'], e['costPerMillion']))
+    if strategy == 'balanced':
+        fastest = min(e['durationMs'] for e in candidates)
+        candidates = [e for e in candidates if e['durationMs'] <= fastest * 1.1]
+    return min(candidates, key=lambda e: (e['costPerMillion'], e['durationMs']))
+
+
+def recommended_timeout(measurements: Dict, memory_size: int) -> int:
+    """Worst observed run (cold start included) scaled to the chosen memory, with headroom"""
+    slowdown = max(1.0, FULL_VCPU_MEMORY / memory_size)
+    worst_ms = max(r['wall_ms'] for r in measurements['runs']) * slowdown + measurements['init_ms'] * slowdown
+    return int(min(MAX_TIMEOUT, max(MIN_TIMEOUT, math.ceil(worst_ms / 1000 * TIMEOUT_FACTOR))))
+
+
+def write_config(function_dir: str, memory_size: int, timeout: int) -> str:
+    """Update memorySize/timeout in function.yml, keeping the other settings"""
+    path = os.path.join(function_dir, CONFIG_FILE)
+    config = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            config = yaml.safe_load(f) or {}
+    config.update({'memorySize': memory_size, 'timeout': timeout})
+    with open(path, 'w') as f:
+        yaml.safe_dump(config, f, default_flow_style=False, sort_keys=False)
+    return path
+
+
+def tune(function_name: str, event_files: List[str] = None, repeat: int = 5, strategy: str = 'cost',
+         memory_sizes: List[int] = MEMORY_SIZES, write: bool = False) -> Dict:
+    function_dir = os.path.join(LIB_DIR, function_name)
+    if not os.path.exists(os.path.join(function_dir, 'handler.py')):
+        raise FileNotFoundError(f"No handler.py in {function_dir}")
+
+    measurements = measure(function_name, load_events(function_dir, event_files), repeat)
+    estimates = estimate(measurements, memory_sizes)
+    best = recommend(estimates, strategy)
+    report = {
+        'function': function_name,
+        'peakMemoryMb': round(measurements['peak_mb'], 1),
+        'initMs': round(measurements['init_ms'], 2),
+        'errors': sum(1 for r in measurements['runs'] if r['error']),
+        'estimates': estimates,
+        'recommended': {'memorySize': best['memorySize'],
+                        'timeout': recommended_timeout(measurements, best['memorySize'])}
+    }
+    if write:
+        report['config'] = write_config(function_dir, report['recommended']['memorySize'],
+                                        report['recommended']['timeout'])
+    return report
+
+
+def print_report(report: Dict) -> None:
+    print(f"\n{report['function']}: peak {report['peakMemoryMb']} MB, init {report['initMs']} ms"
+          + (f", {report['errors']} failed runs" if report['errors'] else ''))
+    print(f"{'Memory':>8} {'p95 ms':>10} {'Cold ms':>10} {'$/1M':>10}")
+    for e in report['estimates']:
+        marker = '' if e['fits'] else '  (too small)'
+        if e['memorySize'] == report['recommended']['memorySize']:
+            marker = '  <- recommended'
+        print(f"{e['memorySize']:>8} {e['durationMs']:>10} {e['coldStartMs']:>10} {e['costPerMillion']:>10}{marker}")
+    print(f"Recommended: memorySize={report['recommended']['memorySize']} timeout={report['recommended']['timeout']}")
+    if report.get('config'):
+        print(f"Written to {report['config']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure lib functions and recommend memorySize/timeout')
+    parser.add_argument('functions', nargs='*', help='Function directories under functions/lib (default: all)')
+    parser.add_argument('--event', action='append', help='Sample event JSON file (default: <function>/events/*.json)')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per event (default: 5)')
+    parser.add_argument('--strategy', choices=['cost', 'speed', 'balanced'], default='cost')
+    parser.add_argument('--memory', type=int, action='append', help='Memory sizes to evaluate (MB)')
+    parser.add_argument('--write', action='store_true', help='Write the recommendation to function.yml')
+    parser.add_argument('--json', action='store_true', help='Print the reports as JSON')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker)
+        return
+
+    names = args.functions or sorted(
+        d for d in os.listdir(LIB_DIR) if os.path.exists(os.path.join(LIB_DIR, d, 'handler.py'))
+    )
+    reports = [tune(name, args.event, args.repeat, args.strategy, sorted(args.memory or MEMORY_SIZES), args.write)
+               for name in names]
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        for report in reports:
+            print_report(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# tools/runs_archive.py
+"""
+Export and query the execution archive (see functions/base/archive/exporter.py).
+
+Queries only read the columns they use and skip the flow/date partitions and Parquet
+row groups their filters exclude, so no Step Functions API is called:
+
+    python -m tools.runs_archive export --archive ./archive
+    python -m tools.runs_archive query --archive s3://bucket/executions --flow helloWorldFlow \
+        --since 2024-01-01 --status FAILED --columns execution_arn,user_id,error
+    python -m tools.runs_archive query --archive ./archive --group-by flow,status
+    python -m tools.runs_archive query --archive ./archive --states --group-by flow,state
+"""
+import argparse
+import json
+import sys
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from functions.base.archive.exporter import PARTITIONING, SCHEMA, export, open_root
+
+DEFAULT_COLUMNS = ['execution_arn', 'flow', 'user_id', 'status', 'start_time', 'duration_ms']
+
+
+def open_archive(uri: str) -> ds.Dataset:
+    filesystem, root = open_root(uri)
+    return ds.dataset(root, schema=SCHEMA, format='parquet', filesystem=filesystem,
+                      partitioning=PARTITIONING, exclude_invalid_files=True)
+
+
+def build_filter(flows: Optional[List[str]] = None, users: Optional[List[str]] = None,
+                 statuses: Optional[List[str]] = None, since: Optional[str] = None,
+                 until: Optional[str] = None) -> Optional[ds.Expression]:
+    """Filter on partition columns (flow, date) prunes files, the others use row group statistics"""
+    conditions = []
+    if flows:
+        conditions.append(pc.field('flow').isin(flows))
+    if users:
+        conditions.append(pc.field('user_id').isin(users))
+    if statuses:
+        conditions.append(pc.field('status').isin([status.upper() for status in statuses]))
+    if since:
+        conditions.append(pc.field('date') >= since[:10])
+        conditions.append(pc.field('stop_time') >= pc.scalar(_timestamp(since)))
+    if until:
+        conditions.append(pc.field('date') <= until[:10])
+        conditions.append(pc.field('stop_time') < pc.scalar(_timestamp(until)))
+    if not conditions:
+        return None
+    expression = conditions[0]
+    for condition in conditions[1:]:
+        expression = expression & condition
+    return expression
+
+
+def _timestamp(value: str) -> pa.Scalar:
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return pa.scalar(parsed, type=pa.timestamp('ms', tz='UTC'))
+
+
+def explode_states(table: pa.Table, keep: List[str]) -> pa.Table:
+    """One row per state of each execution: the `keep` columns plus state, state_type, state_status, duration_ms"""
+    states = table['states']
+    parents = pc.list_parent_indices(states)
+    flat = pc.list_flatten(states)
+    columns = {name: pc.take(table[name], parents) for name in keep if name != 'duration_ms'}
+    columns.update({
+        'state': pc.struct_field(flat, 'name'),
+        'state_type': pc.struct_field(flat, 'type'),
+        'state_status': pc.struct_field(flat, 'status'),
+        'duration_ms': pc.struct_field(flat, 'duration_ms')
+    })
+    return pa.table(columns)
+
+
+def summarize(table: pa.Table, group_by: List[str]) -> pa.Table:
+    """Runs and duration statistics per group"""
+    aggregated = table.group_by(group_by).aggregate([
+        ('duration_ms', 'count'),
+        ('duration_ms', 'mean'),
+        ('duration_ms', 'tdigest', pc.TDigestOptions(q=[0.5, 0.95])),
+        ('duration_ms', 'max')
+    ])
+    percentiles = aggregated['duration_ms_tdigest'].to_pylist()
+    columns = {name: aggregated[name] for name in group_by}
+    columns.update({
+        'runs': aggregated['duration_ms_count'],
+        'mean_ms': pc.round(aggregated['duration_ms_mean'], 1),
+        'p50_ms': pa.array([p[0] if p else None for p in percentiles]),
+        'p95_ms': pa.array([p[1] if p else None for p in percentiles]),
+        'max_ms': aggregated['duration_ms_max']
+    })
+    return pa.table(columns).sort_by([('runs', 'descending')])
+
+
+def query(uri: str, columns: Optional[List[str]] = None, group_by: Optional[List[str]] = None,
+          states: bool = False, limit: Optional[int] = None, **filters) -> pa.Table:
+    dataset = open_archive(uri)
+    expression = build_filter(**filters)
+
+    if states:
+        keep = [name for name in (group_by or columns or DEFAULT_COLUMNS)
+                if name in SCHEMA.names and name not in ('states', 'duration_ms')]
+        table = explode_states(dataset.to_table(columns=keep + ['states'], filter=expression), keep)
+    elif group_by:
+        table = dataset.to_table(columns=list(dict.fromkeys(group_by + ['duration_ms'])), filter=expression)
+    else:
+        table = dataset.to_table(columns=columns or DEFAULT_COLUMNS, filter=expression)
+        table = table.sort_by([('start_time', 'descending')]) if 'start_time' in table.column_names else table
+
+    if group_by:
+        table = summarize(table, group_by)
+    elif states and columns:
+        table = table.select([name for name in columns if name in table.column_names])
+    return table.slice(0, limit) if limit else table
+
+
+def format_table(table: pa.Table) -> str:
+    rows = [[str(value) if value is not None else '' for value in row.values()] for row in table.to_pylist()]
+    header = table.column_names
+    widths = [max([len(name)] + [len(row[i]) for row in rows]) for i, name in enumerate(header)]
+    lines = ['  '.join(name.ljust(width) for name, width in zip(header, widths)).rstrip()]
+    lines.extend('  '.join(value.ljust(width) for value, width in zip(row, widths)).rstrip() for row in rows)
+    return '\n'.join(lines)
+
+
+def _list(value: Optional[str]) -> Optional[List[str]]:
+    return [item.strip() for item in value.split(',') if item.strip()] if value else None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='Archive the executions finished since the last export')
+    export_parser.add_argument('--archive', required=True, help='Directory or s3://bucket/prefix')
+    export_parser.add_argument('--since', help='ISO date or time to start from instead of the last export')
+    export_parser.add_argument('--flows', help='Comma-separated flows (default: all)')
+    export_parser.add_argument('--no-states', action='store_true', help="Don't read the history for per-state durations")
+
+    query_parser = subparsers.add_parser('query', help='Read archived executions')
+    query_parser.add_argument('--archive', required=True, help='Directory or s3://bucket/prefix')
+    query_parser.add_argument('--flow', help='Comma-separated flows')
+    query_parser.add_argument('--user', help='Comma-separated user ids')
+    query_parser.add_argument('--status', help='Comma-separated statuses')
+    query_parser.add_argument('--since', help='Stopped at or after this ISO date/time')
+    query_parser.add_argument('--until', help='Stopped before this ISO date/time')
+    query_parser.add_argument('--columns', help=f"Comma-separated columns (default: {','.join(DEFAULT_COLUMNS)})")
+    query_parser.add_argument('--group-by', help='Comma-separated columns to summarize durations by')
+    query_parser.add_argument('--states', action='store_true', help='One row per state (group by `state`)')
+    query_parser.add_argument('--limit', type=int)
+    query_parser.add_argument('--json', action='store_true', help='Print JSON lines')
+
+    args = parser.parse_args(argv)
+    if args.command == 'export':
+        since = datetime.fromisoformat(args.since) if args.since else None
+        if since and since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        print(json.dumps(export(args.archive, since=since, flows=_list(args.flows), with_states=not args.no_states)))
+        return 0
+
+    table = query(args.archive, columns=_list(args.columns), group_by=_list(args.group_by), states=args.states,
+                  limit=args.limit, flows=_list(args.flow), users=_list(args.user), statuses=_list(args.status),
+                  since=args.since, until=args.until)
+    if args.json:
+        for row in table.to_pylist():
+            print(json.dumps(row, default=str))
+    else:
+        print(format_table(table))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,12 @@
+from workflows_client.client import WorkflowsApiError, WorkflowsClient
+from workflows_client.aio import AsyncWorkflowsClient
+from workflows_client.tokens import CognitoAuth, StaticToken, TokenCache
+
+__all__ = [
+    'AsyncWorkflowsClient',
+    'CognitoAuth',
+    'StaticToken',
+    'TokenCache',
+    'WorkflowsApiError',
+    'WorkflowsClient',
+]
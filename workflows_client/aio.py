@@ -0,0 +1,79 @@
+# workflows_client/aio.py
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Iterable, List, Optional
+
+from workflows_client.client import TERMINAL_STATUSES, WorkflowsClient
+
+
+class AsyncWorkflowsClient:
+    """
+    asyncio front end of WorkflowsClient. Requests run on a bounded thread pool sharing
+    the pooled session, so thousands of executions can be launched and awaited while
+    at most `concurrency` requests are in flight.
+    """
+
+    def __init__(self, client: WorkflowsClient, concurrency: int = 32):
+        self.client = client
+        self.concurrency = concurrency
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    @classmethod
+    def create(cls, api_url: str, auth=None, token: Optional[str] = None, concurrency: int = 32):
+        return cls(WorkflowsClient(api_url, auth=auth, token=token, pool_size=concurrency), concurrency)
+
+    async def _call(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        self.client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def run(self, flow_name: str, payload: Optional[Dict] = None) -> str:
+        return await self._call(self.client.run, flow_name, payload)
+
+    async def get_result(self, flow_name: str, execution_arn: str) -> Dict:
+        return await self._call(self.client.get_result, flow_name, execution_arn)
+
+    async def list_runs(self) -> List[Dict]:
+        return await self._call(self.client.list_runs)
+
+    async def list_flows(self) -> List[Dict]:
+        return await self._call(self.client.list_flows)
+
+    async def wait_for_result(self, flow_name: str, execution_arn: str, max_wait: float = 300,
+                              poll_interval: float = 1.0, max_poll_interval: float = 10.0) -> Dict:
+        """Poll without blocking the event loop between polls"""
+        deadline = time.time() + max_wait
+        while True:
+            result = await self.get_result(flow_name, execution_arn)
+            if result['status'] in TERMINAL_STATUSES:
+                return result
+            execution_arn = result.get('executionArn') or execution_arn
+            if time.time() + poll_interval > deadline:
+                raise TimeoutError(f"Execution timeout after {max_wait}s")
+            await asyncio.sleep(poll_interval)
+            poll_interval = min(poll_interval * 2, max_poll_interval)
+
+    async def run_batch(self, flow_name: str, payloads: Iterable[Dict]) -> List[str]:
+        return await asyncio.gather(*(self.run(flow_name, payload) for payload in payloads))
+
+    async def wait_all(self, flow_name: str, execution_arns: Iterable[str], **wait_kwargs) -> List[Dict]:
+        return await asyncio.gather(*(self.wait_for_result(flow_name, arn, **wait_kwargs)
+                                      for arn in execution_arns))
+
+    async def run_batch_and_wait(self, flow_name: str, payloads: Iterable[Dict], **wait_kwargs) -> List[Dict]:
+        """Launch one execution per payload and return their final results in order"""
+        async def run_one(payload):
+            return await self.wait_for_result(flow_name, await self.run(flow_name, payload), **wait_kwargs)
+
+        return await asyncio.gather(*(run_one(payload) for payload in payloads))
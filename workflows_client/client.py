@@ -0,0 +1,115 @@
+# workflows_client/client.py
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from workflows_client.tokens import StaticToken
+
+TERMINAL_STATUSES = {'SUCCEEDED', 'FAILED', 'TIMED_OUT', 'ABORTED'}
+
+
+class WorkflowsApiError(Exception):
+    """Raised for non-2xx API responses"""
+
+    def __init__(self, status_code: int, body: Any):
+        super().__init__(f"API error {status_code}: {body}")
+        self.status_code = status_code
+        self.body = body
+
+
+class WorkflowsClient:
+    """
+    Client for the workflows API. Keeps one pooled HTTP session for all calls and gets
+    its tokens from a provider (CognitoAuth refreshes them before they expire).
+    """
+
+    def __init__(self, api_url: str, auth=None, token: Optional[str] = None,
+                 pool_size: int = 32, timeout: float = 30.0):
+        self.api_url = api_url.rstrip('/')
+        self.auth = auth or StaticToken(token)
+        self.timeout = timeout
+        self.session = requests.Session()
+
+        # Retry idempotent calls on throttling and gateway errors; POST /run is never retried
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 502, 503, 504],
+                      allowed_methods=['GET'], respect_retry_after_header=True)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _request(self, method: str, path: str, **kwargs) -> Any:
+        for attempt in range(2):
+            headers = {'Authorization': f"Bearer {self.auth.get_token(force_refresh=attempt > 0)}"}
+            response = self.session.request(method, f"{self.api_url}{path}", headers=headers,
+                                            timeout=self.timeout, **kwargs)
+            # A token revoked or expired early gets one retry with a fresh token
+            if response.status_code != 401:
+                break
+
+        try:
+            body = response.json()
+        except ValueError:
+            body = response.text
+        if response.status_code >= 400:
+            raise WorkflowsApiError(response.status_code, body)
+        return body
+
+    def run(self, flow_name: str, payload: Optional[Dict] = None) -> str:
+        """
+        Start a flow and return its executionArn. With queued admission the API answers 202
+        with a ticket instead: the ticket is returned, get_result and wait_for_result take either
+        """
+        body = self._request('POST', f"/run/{flow_name}", json=payload or {})
+        return body.get('executionArn') or body['ticket']
+
+    def run_batch(self, flow_name: str, payloads: Iterable[Dict], max_workers: int = 16) -> List[str]:
+        """Start one execution per payload concurrently, returning the executionArns (or tickets) in order"""
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(lambda payload: self.run(flow_name, payload), payloads))
+
+    def get_result(self, flow_name: str, execution_arn: str) -> Dict:
+        """Current status (and output once finished) of an execution, or QUEUED for a ticket not started yet"""
+        encoded_arn = urllib.parse.quote(execution_arn, safe='')
+        return self._request('GET', f"/run/{flow_name}/{encoded_arn}")
+
+    def wait_for_result(self, flow_name: str, execution_arn: str, max_wait: float = 300,
+                        poll_interval: float = 1.0, max_poll_interval: float = 10.0) -> Dict:
+        """Poll an execution (or a ticket, until it started and then its execution) until it finishes"""
+        deadline = time.time() + max_wait
+        while True:
+            result = self.get_result(flow_name, execution_arn)
+            if result['status'] in TERMINAL_STATUSES:
+                return result
+            # A started ticket names its execution, poll that directly
+            execution_arn = result.get('executionArn') or execution_arn
+            if time.time() + poll_interval > deadline:
+                raise TimeoutError(f"Execution timeout after {max_wait}s")
+            time.sleep(poll_interval)
+            poll_interval = min(poll_interval * 2, max_poll_interval)
+
+    def run_and_wait(self, flow_name: str, payload: Optional[Dict] = None, **wait_kwargs) -> Dict:
+        return self.wait_for_result(flow_name, self.run(flow_name, payload), **wait_kwargs)
+
+    def list_runs(self) -> List[Dict]:
+        return self._request('GET', '/runs')['executions']
+
+    def list_flows(self) -> List[Dict]:
+        return self._request('GET', '/flows')['flows']
+
+    def input_schemas(self) -> Dict[str, Dict]:
+        """JSON Schema of the body each flow accepts, for the flows declaring an inputSchema"""
+        return {flow['name']: flow['inputSchema'] for flow in self.list_flows() if flow.get('inputSchema')}
@@ -0,0 +1,126 @@
+# workflows_client/tokens.py
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import boto3
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'serverless-dynamic-workflows', 'tokens')
+# Refresh this many seconds before the token expires so in-flight requests never carry a stale token
+REFRESH_MARGIN = 300
+
+
+class TokenCache:
+    """Stores Cognito tokens on disk (one 0600 file per user and client) so processes can reuse them"""
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def _path(self, client_id: str, username: str) -> str:
+        key = hashlib.sha256(f"{client_id}:{username}".encode()).hexdigest()[:32]
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def load(self, client_id: str, username: str) -> Optional[Dict]:
+        try:
+            with open(self._path(client_id, username)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, client_id: str, username: str, tokens: Dict) -> None:
+        os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+        path = self._path(client_id, username)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(tokens, f)
+        os.replace(tmp_path, path)
+
+
+class CognitoAuth:
+    """
+    Token provider for a Cognito user: serves the cached ID token, refreshes it with the
+    refresh token shortly before expiry and only falls back to the password when that fails.
+    """
+
+    def __init__(self, client_id: str, username: str, password: Optional[str] = None,
+                 cache: Optional[TokenCache] = None, cognito=None, region: Optional[str] = None):
+        self.client_id = client_id
+        self.username = username
+        self.password = password
+        self.cache = cache if cache is not None else TokenCache()
+        self._cognito = cognito
+        self._region = region
+        self._tokens = None
+        self._lock = threading.Lock()
+
+    @property
+    def cognito(self):
+        if self._cognito is None:
+            self._cognito = boto3.client('cognito-idp', region_name=self._region)
+        return self._cognito
+
+    def _store(self, result: Dict, refresh_token: Optional[str] = None) -> Dict:
+        self._tokens = {
+            'id_token': result['IdToken'],
+            'access_token': result['AccessToken'],
+            # REFRESH_TOKEN_AUTH doesn't return a new refresh token
+            'refresh_token': result.get('RefreshToken', refresh_token),
+            'expires_at': time.time() + result['ExpiresIn']
+        }
+        self.cache.save(self.client_id, self.username, self._tokens)
+        return self._tokens
+
+    def _login(self) -> Dict:
+        if not self.password:
+            raise RuntimeError(f"No valid cached token for {self.username} and no password to log in")
+        response = self.cognito.initiate_auth(
+            ClientId=self.client_id,
+            AuthFlow='USER_PASSWORD_AUTH',
+            AuthParameters={'USERNAME': self.username, 'PASSWORD': self.password}
+        )
+        return self._store(response['AuthenticationResult'])
+
+    def _refresh(self, refresh_token: str) -> Dict:
+        response = self.cognito.initiate_auth(
+            ClientId=self.client_id,
+            AuthFlow='REFRESH_TOKEN_AUTH',
+            AuthParameters={'REFRESH_TOKEN': refresh_token}
+        )
+        return self._store(response['AuthenticationResult'], refresh_token)
+
+    def _valid_tokens(self, force_refresh: bool = False) -> Dict:
+        with self._lock:
+            tokens = self._tokens or self.cache.load(self.client_id, self.username)
+            if tokens and not force_refresh and tokens['expires_at'] - REFRESH_MARGIN > time.time():
+                self._tokens = tokens
+                return tokens
+
+            if tokens and tokens.get('refresh_token'):
+                try:
+                    return self._refresh(tokens['refresh_token'])
+                except Exception:
+                    # Expired or revoked refresh token - log in again below
+                    pass
+            return self._login()
+
+    def get_token(self, force_refresh: bool = False) -> str:
+        """A valid ID token for the Authorization header"""
+        return self._valid_tokens(force_refresh)['id_token']
+
+    def get_access_token(self, force_refresh: bool = False) -> str:
+        """A valid access token, for the `token` parameter of the stream (WebSocket) URL"""
+        return self._valid_tokens(force_refresh)['access_token']
+
+
+class StaticToken:
+    """Token provider for a token obtained elsewhere (e.g. the TOKEN environment variable)"""
+
+    def __init__(self, token: str):
+        self.token = token
+
+    def get_token(self, force_refresh: bool = False) -> str:
+        return self.token